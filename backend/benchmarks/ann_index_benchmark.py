@@ -0,0 +1,89 @@
+"""
+Benchmark de recall vs latencia de los índices de EmbeddingService
+Compara flat (exacto) con IVF-Flat, HNSW e IVF-PQ sobre corpus sintéticos
+
+Uso:
+    python benchmarks/ann_index_benchmark.py --sizes 10000 100000 1000000
+
+Un corpus de 1M vectores de 384 dimensiones ocupa ~1.5 GB en float32.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.memory.vector_index_factory import IndexConfig, INDEX_TYPES, create_index  # noqa: E402
+
+
+def synthetic_vectors(centers: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """Genera vectores normalizados agrupados, parecidos a embeddings reales"""
+    assignments = rng.integers(0, len(centers), size)
+    vectors = centers[assignments] + 0.5 * rng.standard_normal((size, centers.shape[1])).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def run_index(config: IndexConfig, corpus: np.ndarray, queries: np.ndarray, top_k: int):
+    """Construye un índice y mide construcción y latencia por consulta"""
+    start = time.perf_counter()
+    index = create_index(config, corpus.shape[1], corpus)
+    index.add_with_ids(corpus, np.arange(len(corpus), dtype='int64'))
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    results = np.empty((len(queries), top_k), dtype='int64')
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[i] = ids[0]
+
+    return build_seconds, np.array(latencies), results
+
+
+def recall_at_k(results: np.ndarray, ground_truth: np.ndarray) -> float:
+    """Fracción de los top_k exactos recuperados"""
+    hits = sum(len(set(r) & set(g)) for r, g in zip(results, ground_truth))
+    return hits / ground_truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--index-types', nargs='+', default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument('--nlist', type=int, default=None, help='Por defecto ~sqrt(N)')
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--ef-search', type=int, default=64)
+    parser.add_argument('--pq-m', type=int, default=IndexConfig.pq_m)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'N':>9} {'index':>9} {'build_s':>9} {'p50_ms':>8} {'p95_ms':>8} {'recall@k':>9}")
+    for size in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        centers = rng.standard_normal((max(16, size // 1000), args.dimension)).astype('float32')
+        corpus = synthetic_vectors(centers, size, rng)
+        queries = synthetic_vectors(centers, args.queries, rng)
+        nlist = args.nlist or int(np.sqrt(size))
+
+        ground_truth = None
+        for index_type in ['flat'] + [t for t in args.index_types if t != 'flat']:
+            config = IndexConfig(index_type=index_type, nlist=nlist, nprobe=args.nprobe,
+                                 ef_search=args.ef_search, pq_m=args.pq_m, min_train_vectors=min(size, nlist * 39))
+            build_seconds, latencies, results = run_index(config, corpus, queries, args.top_k)
+            if ground_truth is None:
+                ground_truth = results
+            print(f"{size:>9} {index_type:>9} {build_seconds:>9.2f} {np.percentile(latencies, 50):>8.3f} "
+                  f"{np.percentile(latencies, 95):>8.3f} {recall_at_k(results, ground_truth):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark de memoria por registro de los almacenes de memoria
+Compara los dataclasses actuales (__slots__ + cadenas internadas) con
+equivalentes con __dict__ por instancia, a la capacidad por defecto de
+AdvancedMemoryManager
+
+Uso:
+    python benchmarks/memory_record_benchmark.py
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from dataclasses import MISSING, field, fields, make_dataclass
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.memory.episodic_memory_store import Episode  # noqa: E402
+from src.memory.semantic_memory_store import SemanticConcept, SemanticFact  # noqa: E402
+from src.memory.procedural_memory_store import Procedure, ToolStrategy  # noqa: E402
+
+# Capacidades por defecto de AdvancedMemoryManager
+CAPACITIES = {
+    Episode: 1000,
+    SemanticConcept: 10000,
+    SemanticFact: 50000,
+    Procedure: 1000,
+    ToolStrategy: 5000,
+}
+
+SUBJECTS = [f"concept_{i}" for i in range(500)]
+PREDICATES = ['is_a', 'part_of', 'uses', 'requires', 'produces', 'related_to', 'located_in']
+TAGS = ['chat', 'user_interaction', 'web_search', 'analysis', 'report', 'planning', 'error']
+TOOLS = ['web_search', 'shell', 'file_manager', 'analysis', 'creation', 'browser']
+CATEGORIES = ['general', 'research', 'development', 'analysis', 'creative']
+
+
+def legacy_class(cls):
+    """Equivalente del dataclass con __dict__ y sin internado de cadenas"""
+    spec = []
+    for f in fields(cls):
+        if f.default is not MISSING:
+            spec.append((f.name, f.type, field(default=f.default)))
+        elif f.default_factory is not MISSING:
+            spec.append((f.name, f.type, field(default_factory=f.default_factory)))
+        else:
+            spec.append((f.name, f.type))
+    return make_dataclass(f"Legacy{cls.__name__}", spec)
+
+
+def fresh(text: str) -> str:
+    """Copia nueva de una cadena, como la que produce un parser o una respuesta JSON"""
+    return ''.join(list(text))
+
+
+def record_kwargs(cls, i: int, rng: random.Random):
+    """Argumentos realistas para el registro i"""
+    now = datetime.now()
+    if cls is Episode:
+        return dict(id=f"ep_{i}", title=f"Tarea {i}", description=f"Descripción del episodio {i}",
+                    context={'task_id': f"task_{i % 50}", 'task_type': fresh(rng.choice(CATEGORIES))},
+                    actions=[{'type': 'tool_call', 'tool': fresh(rng.choice(TOOLS))}],
+                    outcomes=[{'type': 'result', 'success': True}], timestamp=now,
+                    tags=[fresh(rng.choice(TAGS)) for _ in range(3)],
+                    tools_used=[fresh(rng.choice(TOOLS)) for _ in range(2)])
+    if cls is SemanticConcept:
+        return dict(id=f"concept_{i}", name=fresh(rng.choice(SUBJECTS)), description=f"Concepto {i}",
+                    category=fresh(rng.choice(CATEGORIES)), attributes={}, relations={}, created_at=now,
+                    updated_at=now, metadata={})
+    if cls is SemanticFact:
+        return dict(id=f"fact_{i}", subject=fresh(rng.choice(SUBJECTS)), predicate=fresh(rng.choice(PREDICATES)),
+                    object=fresh(rng.choice(SUBJECTS)), context={}, source=fresh('agent_execution'),
+                    created_at=now)
+    if cls is Procedure:
+        return dict(id=f"proc_{i}", name=f"Procedimiento {i}", description=f"Procedimiento aprendido {i}",
+                    steps=[{'tool': fresh(rng.choice(TOOLS))}], context_conditions={'category': 'general'},
+                    category=fresh(rng.choice(CATEGORIES)), created_at=now, metadata={})
+    return dict(id=f"strategy_{i}", tool_name=fresh(rng.choice(TOOLS)), strategy_name=fresh('default'),
+                parameters={}, context_pattern='general', created_at=now)
+
+
+def measure(factory, cls, count: int, seed: int) -> int:
+    """Bytes retenidos por count registros (incluye cadenas y contenedores propios)"""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [factory(**record_kwargs(cls, i, rng)) for i in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplicador de las capacidades')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'record':>16} {'count':>7} {'dict_B/rec':>11} {'slots_B/rec':>12} {'saved':>7}")
+    total_before = total_after = 0
+    for cls, capacity in CAPACITIES.items():
+        count = max(1, int(capacity * args.scale))
+        before = measure(legacy_class(cls), cls, count, args.seed)
+        after = measure(cls, cls, count, args.seed)
+        total_before += before
+        total_after += after
+        print(f"{cls.__name__:>16} {count:>7} {before / count:>11.0f} {after / count:>12.0f} "
+              f"{1 - after / before:>7.1%}")
+    print(f"{'total MB':>16} {'':>7} {total_before / 2**20:>11.1f} {total_after / 2**20:>12.1f} "
+          f"{1 - total_after / total_before:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
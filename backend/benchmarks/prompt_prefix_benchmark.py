@@ -0,0 +1,84 @@
+"""
+Benchmark de reutilización del prefijo del prompt en tareas de varios pasos
+Ejecuta la misma secuencia de pasos contra Ollama dos veces: reenviando en
+cada paso el system prompt y la conversación previa, y continuando la sesión
+de la tarea (contexto de Ollama + solo el turno nuevo). Muestra por paso los
+tokens y segundos de prompt eval que informa Ollama
+
+Requiere un servidor Ollama accesible (OLLAMA_BASE_URL o --base-url)
+
+Uso:
+    python benchmarks/prompt_prefix_benchmark.py --base-url http://localhost:11434 --steps 6
+"""
+
+import argparse
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.ollama_service import OllamaService  # noqa: E402
+
+STEPS = [
+    "Enumera los tres aspectos clave para investigar el mercado de baterías de estado sólido.",
+    "Para el primer aspecto, indica qué fuentes consultarías y por qué.",
+    "Resume en cinco puntos lo que esperas encontrar en esas fuentes.",
+    "Identifica dos riesgos de la tecnología mencionados hasta ahora.",
+    "Propón una estructura de informe final con sus secciones.",
+    "Redacta la introducción del informe en un párrafo.",
+    "Lista las preguntas abiertas que quedan por resolver.",
+    "Cierra con una conclusión de tres frases.",
+]
+
+
+def run_task(service: OllamaService, steps: int, reuse_prefix: bool):
+    """Ejecuta los pasos de una tarea y devuelve (prompt_eval_count, prompt_eval_seconds, reused) por paso"""
+    task_id = f"bench-{uuid.uuid4().hex[:8]}"
+    history = []
+    results = []
+    for i in range(steps):
+        prompt = STEPS[i % len(STEPS)]
+        context = {'task_id': task_id, 'previous_messages': history}
+        response = service.generate_response(prompt, context, use_tools=False, task_id=task_id,
+                                             step_id=f"step-{i + 1}", reuse_prefix=reuse_prefix)
+        if response.get('error'):
+            raise RuntimeError(f"Paso {i + 1}: {response['error']}")
+        history = history + [{'sender': 'user', 'content': prompt},
+                             {'sender': 'assistant', 'content': response.get('raw_response', '')}]
+        results.append((response.get('prompt_eval_count') or 0, response.get('prompt_eval_seconds') or 0.0,
+                        response.get('prefix_reused', False)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default=os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434'))
+    parser.add_argument('--model', default=None, help='Modelo (por defecto OLLAMA_DEFAULT_MODEL)')
+    parser.add_argument('--steps', type=int, default=6)
+    args = parser.parse_args()
+
+    service = OllamaService(base_url=args.base_url)
+    if args.model:
+        service.set_model(args.model)
+    if not service.is_healthy():
+        sys.exit(f"Ollama no responde en {args.base_url}")
+
+    full = run_task(service, args.steps, reuse_prefix=False)
+    reused = run_task(service, args.steps, reuse_prefix=True)
+
+    print(f"model: {service.get_current_model()}")
+    print(f"{'step':>4} {'full_tok':>9} {'full_s':>8} {'reuse_tok':>10} {'reuse_s':>8} {'saved':>7}")
+    total_full = total_reused = 0.0
+    for i, ((full_tok, full_s, _), (reuse_tok, reuse_s, was_reused)) in enumerate(zip(full, reused), start=1):
+        total_full += full_s
+        total_reused += reuse_s
+        saved = f"{1 - reuse_s / full_s:>7.1%}" if full_s else f"{'-':>7}"
+        marker = '' if was_reused else ' (completo)'
+        print(f"{i:>4} {full_tok:>9} {full_s:>8.3f} {reuse_tok:>10} {reuse_s:>8.3f} {saved}{marker}")
+    saved = f"{1 - total_reused / total_full:>7.1%}" if total_full else f"{'-':>7}"
+    print(f"{'total':>4} {'':>9} {total_full:>8.3f} {'':>10} {total_reused:>8.3f} {saved}")
+
+
+if __name__ == '__main__':
+    main()
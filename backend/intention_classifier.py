@@ -14,6 +14,8 @@ import re
 import time
 from datetime import datetime
 
+from src.services.llm_response_cache import get_llm_response_cache
+
 class IntentionType(Enum):
     """Tipos de intención identificables por el clasificador"""
     CASUAL_CONVERSATION = "casual_conversation"
@@ -54,6 +56,7 @@ class IntentionClassifier:
         # Cache de resultados para optimización
         self.result_cache = {}
         self.cache_ttl = 300  # 5 minutos
+        self.llm_cache_ttl = 86400  # Respuestas LLM crudas (caché compartido opt-in)
         
         self.logger.info("IntentionClassifier inicializado correctamente")
         
@@ -144,11 +147,27 @@ ANALIZA EL MENSAJE Y RESPONDE SOLO CON EL JSON:"""
                 active_tasks=tasks_summary
             )
             
+            # Caché compartido de respuestas LLM (prompts idénticos entre sesiones)
+            llm_cache = get_llm_response_cache()
+            llm_cache_key = None
+            if llm_cache:
+                llm_cache_key = llm_cache.make_key(classification_model.id, prompt,
+                                                   {'max_tokens': 500, 'temperature': 0.1})
+                cached_response = llm_cache.get(llm_cache_key)
+                if cached_response:
+                    result = self._parse_classification_response(cached_response.get('response', ''))
+                    if result and result.confidence >= self.confidence_threshold:
+                        self.logger.info(f"Respuesta LLM de clasificación servida desde caché: {user_message[:50]}...")
+                        self._cache_result(cache_key, result)
+                        return result
+                    llm_cache.invalidate(llm_cache_key)
+            
             # Realizar clasificación con reintentos
             for attempt in range(self.max_retries + 1):
                 try:
                     self.logger.info(f"Clasificando intención (intento {attempt + 1}): {user_message[:50]}...")
                     
+                    started = time.time()
                     response = self.model_manager.generate_response(
                         prompt,
                         model=classification_model,
@@ -158,6 +177,11 @@ ANALIZA EL MENSAJE Y RESPONDE SOLO CON EL JSON:"""
                     
                     if response:
                         result = self._parse_classification_response(response)
+                        # Solo se comparten respuestas fiables: las de baja confianza
+                        # deben poder mejorar en la siguiente llamada al modelo
+                        if llm_cache and result and result.confidence >= self.confidence_threshold:
+                            llm_cache.put(llm_cache_key, classification_model.id, {'response': response},
+                                          time.time() - started, ttl=self.llm_cache_ttl)
                         if result and result.confidence >= self.confidence_threshold:
                             self.logger.info(f"Intención clasificada: {result.intention_type.value} (confianza: {result.confidence})")
                             # Cachear resultado exitoso
@@ -6,14 +6,23 @@ Maneja memoria a corto plazo (contexto de conversación) y largo plazo (base de
 import sqlite3
 import json
 import logging
+import queue
+import re
 import time
 import hashlib
-from typing import List, Dict, Optional, Any, Tuple
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Any, Tuple, Iterable
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 import pickle
 import os
 
+KNOWLEDGE_COLUMNS = ('id', 'content', 'category', 'source', 'confidence', 'created_at',
+                     'accessed_count', 'last_accessed', 'tags')
+KNOWLEDGE_SELECT = ', '.join(f'kb.{column}' for column in KNOWLEDGE_COLUMNS)
+FTS_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+FTS_MIN_PREFIX_LENGTH = 3  # Tokens más cortos ('C' de 'C++') buscan la palabra exacta
+
 @dataclass
 class Message:
     """Representa un mensaje en la conversación"""
@@ -57,18 +66,64 @@ class KnowledgeItem:
     accessed_count: int = 0
     last_accessed: float = 0
     tags: List[str] = None
+    snippet: Optional[str] = None  # Fragmento resaltado de la búsqueda FTS
     
     def __post_init__(self):
         if self.tags is None:
             self.tags = []
 
+class SQLiteConnectionPool:
+    """Pool de conexiones SQLite de larga duración en modo WAL"""
+    
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._connections.put(self._create_connection())
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """Abre una conexión compartible entre hilos con WAL y escrituras agrupadas"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+        # Los triggers FTS deben dispararse también en INSERT OR REPLACE
+        conn.execute('PRAGMA recursive_triggers=ON')
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Presta una conexión; confirma la transacción al salir o la revierte si hay error"""
+        conn = self._connections.get(timeout=self.timeout)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._connections.put(conn)
+    
+    def close(self):
+        """Cierra todas las conexiones del pool"""
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                break
+
 class MemoryManager:
     """Gestor de memoria para el agente Mitosis"""
     
-    def __init__(self, db_path: str = "mitosis_memory.db", max_short_term_messages: int = 50):
+    def __init__(self, db_path: str = "mitosis_memory.db", max_short_term_messages: int = 50,
+                 pool_size: int = 4):
         self.db_path = db_path
         self.max_short_term_messages = max_short_term_messages
         self.logger = logging.getLogger(__name__)
+        self._pool = SQLiteConnectionPool(db_path, size=pool_size)
+        self._fts_enabled = False
         
         # Memoria a corto plazo (en memoria)
         self.short_term_memory: List[Message] = []
@@ -89,67 +144,140 @@ class MemoryManager:
     def _init_database(self):
         """Inicializa la base de datos SQLite para la memoria a largo plazo"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Tabla para el historial de conversaciones
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS conversation_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp REAL NOT NULL,
-                    metadata TEXT
-                )
-            ''')
-            
-            # Tabla para la memoria de tareas
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS task_memory (
-                    task_id TEXT PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    status TEXT NOT NULL,
-                    created_at REAL NOT NULL,
-                    updated_at REAL NOT NULL,
-                    phases TEXT,
-                    results TEXT,
-                    tools_used TEXT
-                )
-            ''')
-            
-            # Tabla para elementos de conocimiento
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS knowledge_base (
-                    id TEXT PRIMARY KEY,
-                    content TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    source TEXT NOT NULL,
-                    confidence REAL NOT NULL,
-                    created_at REAL NOT NULL,
-                    accessed_count INTEGER DEFAULT 0,
-                    last_accessed REAL DEFAULT 0,
-                    tags TEXT
-                )
-            ''')
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
+                self._create_tables(cursor)
+                self._fts_enabled = self._create_knowledge_fts(cursor)
             
-            # Índices para mejorar el rendimiento
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversation_session ON conversation_history(session_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversation_timestamp ON conversation_history(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_status ON task_memory(status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_knowledge_category ON knowledge_base(category)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_knowledge_confidence ON knowledge_base(confidence)')
-            
-            conn.commit()
-            conn.close()
-            
-            self.logger.info(f"Base de datos de memoria inicializada: {self.db_path}")
+            self.logger.info(f"Base de datos de memoria inicializada: {self.db_path} "
+                             f"(FTS5: {'sí' if self._fts_enabled else 'no'})")
             
         except Exception as e:
             self.logger.error(f"Error al inicializar la base de datos: {e}")
             raise
     
+    def _create_tables(self, cursor: sqlite3.Cursor):
+        """Crea las tablas e índices base"""
+        # Tabla para el historial de conversaciones
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                metadata TEXT
+            )
+        ''')
+        
+        # Tabla para la memoria de tareas
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS task_memory (
+                task_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                description TEXT,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                phases TEXT,
+                results TEXT,
+                tools_used TEXT
+            )
+        ''')
+        
+        # Tabla para elementos de conocimiento
+        self._create_knowledge_table(cursor)
+        
+        # Índices para mejorar el rendimiento
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversation_session ON conversation_history(session_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversation_timestamp ON conversation_history(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_status ON task_memory(status)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_knowledge_category ON knowledge_base(category)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_knowledge_confidence ON knowledge_base(confidence)')
+    
+    def _create_knowledge_table(self, cursor: sqlite3.Cursor):
+        """
+        Crea knowledge_base con una clave entera estable para el índice FTS5
+        
+        El rowid implícito de una tabla con PRIMARY KEY TEXT puede renumerarse
+        con VACUUM y desincronizar el índice de contenido externo; fts_rowid es
+        un alias de rowid (INTEGER PRIMARY KEY) y se conserva. Las tablas
+        creadas sin él se migran y su índice FTS se reconstruye.
+        """
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(knowledge_base)')]
+        if 'fts_rowid' in columns:
+            return
+        if columns:
+            cursor.execute('ALTER TABLE knowledge_base RENAME TO knowledge_base_legacy')
+        cursor.execute('''
+            CREATE TABLE knowledge_base (
+                id TEXT NOT NULL UNIQUE,
+                content TEXT NOT NULL,
+                category TEXT NOT NULL,
+                source TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_count INTEGER DEFAULT 0,
+                last_accessed REAL DEFAULT 0,
+                tags TEXT,
+                fts_rowid INTEGER PRIMARY KEY
+            )
+        ''')
+        if columns:
+            column_list = ', '.join(KNOWLEDGE_COLUMNS)
+            cursor.execute(f'INSERT INTO knowledge_base ({column_list}) '
+                           f'SELECT {column_list} FROM knowledge_base_legacy')
+            cursor.execute('DROP TABLE knowledge_base_legacy')
+            try:
+                cursor.execute('DROP TABLE IF EXISTS knowledge_fts')
+            except sqlite3.OperationalError:
+                pass
+            self.logger.info("knowledge_base migrada a clave fts_rowid estable")
+    
+    def _create_knowledge_fts(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        Crea el índice FTS5 de contenido externo sobre knowledge_base
+        
+        Los triggers lo mantienen sincronizado; si la tabla es nueva se indexa
+        el contenido existente. Devuelve False si SQLite no incluye FTS5.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_fts'")
+        existed = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(
+                    content,
+                    content='knowledge_base',
+                    content_rowid='fts_rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"FTS5 no disponible, búsqueda de conocimiento por LIKE: {e}")
+            return False
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_insert AFTER INSERT ON knowledge_base BEGIN
+                INSERT INTO knowledge_fts(rowid, content) VALUES (new.fts_rowid, new.content);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_delete AFTER DELETE ON knowledge_base BEGIN
+                INSERT INTO knowledge_fts(knowledge_fts, rowid, content) VALUES ('delete', old.fts_rowid, old.content);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_update AFTER UPDATE OF content ON knowledge_base BEGIN
+                INSERT INTO knowledge_fts(knowledge_fts, rowid, content) VALUES ('delete', old.fts_rowid, old.content);
+                INSERT INTO knowledge_fts(rowid, content) VALUES (new.fts_rowid, new.content);
+            END
+        ''')
+        
+        if not existed:
+            cursor.execute("INSERT INTO knowledge_fts(knowledge_fts) VALUES ('rebuild')")
+            self.logger.info("Índice FTS5 de conocimiento construido")
+        return True
+    
     # === MEMORIA A CORTO PLAZO ===
     
     def add_message(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> Message:
@@ -206,24 +334,21 @@ class MemoryManager:
     def _persist_messages_to_db(self, messages: List[Message]):
         """Persiste mensajes a la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for message in messages:
-                cursor.execute('''
-                    INSERT INTO conversation_history 
-                    (session_id, role, content, timestamp, metadata)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    self.current_session_id,
-                    message.role,
-                    message.content,
-                    message.timestamp,
-                    json.dumps(message.metadata)
-                ))
-            
-            conn.commit()
-            conn.close()
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                for message in messages:
+                    cursor.execute('''
+                        INSERT INTO conversation_history 
+                        (session_id, role, content, timestamp, metadata)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (
+                        self.current_session_id,
+                        message.role,
+                        message.content,
+                        message.timestamp,
+                        json.dumps(message.metadata)
+                    ))
             
         except Exception as e:
             self.logger.error(f"Error al persistir mensajes: {e}")
@@ -233,27 +358,24 @@ class MemoryManager:
     def save_task_memory(self, task_memory: TaskMemory):
         """Guarda o actualiza la memoria de una tarea"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO task_memory 
-                (task_id, title, description, status, created_at, updated_at, phases, results, tools_used)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                task_memory.task_id,
-                task_memory.title,
-                task_memory.description,
-                task_memory.status,
-                task_memory.created_at,
-                task_memory.updated_at,
-                json.dumps(task_memory.phases),
-                json.dumps(task_memory.results),
-                json.dumps(task_memory.tools_used)
-            ))
-            
-            conn.commit()
-            conn.close()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO task_memory 
+                    (task_id, title, description, status, created_at, updated_at, phases, results, tools_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    task_memory.task_id,
+                    task_memory.title,
+                    task_memory.description,
+                    task_memory.status,
+                    task_memory.created_at,
+                    task_memory.updated_at,
+                    json.dumps(task_memory.phases),
+                    json.dumps(task_memory.results),
+                    json.dumps(task_memory.tools_used)
+                ))
             
             self.logger.info(f"Memoria de tarea guardada: {task_memory.task_id}")
             
@@ -263,12 +385,11 @@ class MemoryManager:
     def get_task_memory(self, task_id: str) -> Optional[TaskMemory]:
         """Recupera la memoria de una tarea específica"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('SELECT * FROM task_memory WHERE task_id = ?', (task_id,))
-            row = cursor.fetchone()
-            conn.close()
+                cursor.execute('SELECT * FROM task_memory WHERE task_id = ?', (task_id,))
+                row = cursor.fetchone()
             
             if row:
                 return TaskMemory(
@@ -292,25 +413,24 @@ class MemoryManager:
     def get_recent_tasks(self, count: int = 10, status: Optional[str] = None) -> List[TaskMemory]:
         """Obtiene las tareas más recientes"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if status:
-                cursor.execute('''
-                    SELECT * FROM task_memory 
-                    WHERE status = ? 
-                    ORDER BY updated_at DESC 
-                    LIMIT ?
-                ''', (status, count))
-            else:
-                cursor.execute('''
-                    SELECT * FROM task_memory 
-                    ORDER BY updated_at DESC 
-                    LIMIT ?
-                ''', (count,))
-            
-            rows = cursor.fetchall()
-            conn.close()
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
+            
+                if status:
+                    cursor.execute('''
+                        SELECT * FROM task_memory 
+                        WHERE status = ? 
+                        ORDER BY updated_at DESC 
+                        LIMIT ?
+                    ''', (status, count))
+                else:
+                    cursor.execute('''
+                        SELECT * FROM task_memory 
+                        ORDER BY updated_at DESC 
+                        LIMIT ?
+                    ''', (count,))
+            
+                rows = cursor.fetchall()
             
             tasks = []
             for row in rows:
@@ -351,27 +471,24 @@ class MemoryManager:
         )
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO knowledge_base 
-                (id, content, category, source, confidence, created_at, accessed_count, last_accessed, tags)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                knowledge_item.id,
-                knowledge_item.content,
-                knowledge_item.category,
-                knowledge_item.source,
-                knowledge_item.confidence,
-                knowledge_item.created_at,
-                knowledge_item.accessed_count,
-                knowledge_item.last_accessed,
-                json.dumps(knowledge_item.tags)
-            ))
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
             
-            conn.commit()
-            conn.close()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO knowledge_base 
+                    (id, content, category, source, confidence, created_at, accessed_count, last_accessed, tags)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    knowledge_item.id,
+                    knowledge_item.content,
+                    knowledge_item.category,
+                    knowledge_item.source,
+                    knowledge_item.confidence,
+                    knowledge_item.created_at,
+                    knowledge_item.accessed_count,
+                    knowledge_item.last_accessed,
+                    json.dumps(knowledge_item.tags)
+                ))
             
             # Actualizar cache
             self._knowledge_cache[knowledge_id] = knowledge_item
@@ -386,49 +503,51 @@ class MemoryManager:
     
     def search_knowledge(self, query: str, category: Optional[str] = None, 
                         limit: int = 10, min_confidence: float = 0.5) -> List[KnowledgeItem]:
-        """Busca elementos de conocimiento relevantes"""
+        """
+        Busca elementos de conocimiento relevantes
+        
+        Con FTS5 los resultados se ordenan por BM25 y cada uno incluye un
+        fragmento resaltado; sin consulta se filtra por categoría/confianza.
+        Los contadores de acceso se actualizan en la misma transacción.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Búsqueda simple por contenido (se puede mejorar con FTS)
-            if category:
-                cursor.execute('''
-                    SELECT * FROM knowledge_base 
-                    WHERE category = ? AND confidence >= ? AND content LIKE ?
-                    ORDER BY confidence DESC, accessed_count DESC
-                    LIMIT ?
-                ''', (category, min_confidence, f'%{query}%', limit))
-            else:
-                cursor.execute('''
-                    SELECT * FROM knowledge_base 
-                    WHERE confidence >= ? AND content LIKE ?
-                    ORDER BY confidence DESC, accessed_count DESC
-                    LIMIT ?
-                ''', (min_confidence, f'%{query}%', limit))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            knowledge_items = []
-            for row in rows:
-                item = KnowledgeItem(
-                    id=row[0],
-                    content=row[1],
-                    category=row[2],
-                    source=row[3],
-                    confidence=row[4],
-                    created_at=row[5],
-                    accessed_count=row[6],
-                    last_accessed=row[7],
-                    tags=json.loads(row[8]) if row[8] else []
-                )
-                knowledge_items.append(item)
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
+                filters = ['kb.confidence >= ?']
+                params: List[Any] = [min_confidence]
+                if category:
+                    filters.append('kb.category = ?')
+                    params.append(category)
+                
+                match_query = self._build_fts_query(query)
+                if match_query and self._fts_enabled:
+                    cursor.execute(f'''
+                        SELECT {KNOWLEDGE_SELECT},
+                               snippet(knowledge_fts, 0, '[', ']', '…', 16)
+                        FROM knowledge_fts
+                        JOIN knowledge_base kb ON kb.fts_rowid = knowledge_fts.rowid
+                        WHERE knowledge_fts MATCH ? AND {' AND '.join(filters)}
+                        ORDER BY knowledge_fts.rank, kb.confidence DESC
+                        LIMIT ?
+                    ''', [match_query] + params + [limit])
+                else:
+                    if query:
+                        filters.append('kb.content LIKE ?')
+                        params.append(f'%{query}%')
+                    cursor.execute(f'''
+                        SELECT {KNOWLEDGE_SELECT}, NULL
+                        FROM knowledge_base kb
+                        WHERE {' AND '.join(filters)}
+                        ORDER BY kb.confidence DESC, kb.accessed_count DESC
+                        LIMIT ?
+                    ''', params + [limit])
+                
+                rows = cursor.fetchall()
                 
-                # Actualizar contador de acceso
-                self._update_access_count(item.id)
+                # Actualizar contadores de acceso en un único lote
+                self._update_access_counts(cursor, [row[0] for row in rows])
             
-            return knowledge_items
+            return [self._row_to_knowledge(row) for row in rows]
             
         except Exception as e:
             self.logger.error(f"Error al buscar conocimiento: {e}")
@@ -438,24 +557,47 @@ class MemoryManager:
         """Obtiene elementos de conocimiento por categoría"""
         return self.search_knowledge("", category=category, limit=limit, min_confidence=0.0)
     
+    @staticmethod
+    def _build_fts_query(query: str) -> str:
+        """Convierte texto libre en una consulta FTS5 (todas las palabras; prefijo en las largas)"""
+        return ' '.join(f'"{token}"*' if len(token) >= FTS_MIN_PREFIX_LENGTH else f'"{token}"'
+                        for token in FTS_TOKEN_PATTERN.findall(query or ''))
+    
+    @staticmethod
+    def _row_to_knowledge(row: Tuple) -> KnowledgeItem:
+        """Construye un KnowledgeItem desde una fila (columnas de KNOWLEDGE_COLUMNS + snippet)"""
+        return KnowledgeItem(
+            id=row[0],
+            content=row[1],
+            category=row[2],
+            source=row[3],
+            confidence=row[4],
+            created_at=row[5],
+            accessed_count=row[6],
+            last_accessed=row[7],
+            tags=json.loads(row[8]) if row[8] else [],
+            snippet=row[9] if len(row) > 9 else None
+        )
+    
     def _update_access_count(self, knowledge_id: str):
         """Actualiza el contador de acceso de un elemento de conocimiento"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE knowledge_base 
-                SET accessed_count = accessed_count + 1, last_accessed = ?
-                WHERE id = ?
-            ''', (time.time(), knowledge_id))
-            
-            conn.commit()
-            conn.close()
+            with self._pool.connection() as conn:
+                self._update_access_counts(conn.cursor(), [knowledge_id])
             
         except Exception as e:
             self.logger.error(f"Error al actualizar contador de acceso: {e}")
     
+    @staticmethod
+    def _update_access_counts(cursor: sqlite3.Cursor, knowledge_ids: Iterable[str]):
+        """Incrementa los contadores de acceso de varios elementos con una sola sentencia preparada"""
+        now = time.time()
+        cursor.executemany('''
+            UPDATE knowledge_base 
+            SET accessed_count = accessed_count + 1, last_accessed = ?
+            WHERE id = ?
+        ''', [(now, knowledge_id) for knowledge_id in knowledge_ids])
+    
     def _manage_cache_size(self):
         """Gestiona el tamaño del cache de conocimiento"""
         if len(self._knowledge_cache) > self._cache_max_size:
@@ -473,31 +615,29 @@ class MemoryManager:
     def get_memory_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas de la memoria"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
             
-            # Estadísticas de conversaciones
-            cursor.execute('SELECT COUNT(*) FROM conversation_history')
-            total_messages = cursor.fetchone()[0]
+                # Estadísticas de conversaciones
+                cursor.execute('SELECT COUNT(*) FROM conversation_history')
+                total_messages = cursor.fetchone()[0]
             
-            cursor.execute('SELECT COUNT(DISTINCT session_id) FROM conversation_history')
-            total_sessions = cursor.fetchone()[0]
+                cursor.execute('SELECT COUNT(DISTINCT session_id) FROM conversation_history')
+                total_sessions = cursor.fetchone()[0]
             
-            # Estadísticas de tareas
-            cursor.execute('SELECT COUNT(*) FROM task_memory')
-            total_tasks = cursor.fetchone()[0]
+                # Estadísticas de tareas
+                cursor.execute('SELECT COUNT(*) FROM task_memory')
+                total_tasks = cursor.fetchone()[0]
             
-            cursor.execute('SELECT status, COUNT(*) FROM task_memory GROUP BY status')
-            task_status_counts = dict(cursor.fetchall())
+                cursor.execute('SELECT status, COUNT(*) FROM task_memory GROUP BY status')
+                task_status_counts = dict(cursor.fetchall())
             
-            # Estadísticas de conocimiento
-            cursor.execute('SELECT COUNT(*) FROM knowledge_base')
-            total_knowledge = cursor.fetchone()[0]
+                # Estadísticas de conocimiento
+                cursor.execute('SELECT COUNT(*) FROM knowledge_base')
+                total_knowledge = cursor.fetchone()[0]
             
-            cursor.execute('SELECT category, COUNT(*) FROM knowledge_base GROUP BY category')
-            knowledge_categories = dict(cursor.fetchall())
-            
-            conn.close()
+                cursor.execute('SELECT category, COUNT(*) FROM knowledge_base GROUP BY category')
+                knowledge_categories = dict(cursor.fetchall())
             
             return {
                 "short_term_memory": {
@@ -511,7 +651,8 @@ class MemoryManager:
                     "total_tasks": total_tasks,
                     "task_status_counts": task_status_counts,
                     "total_knowledge": total_knowledge,
-                    "knowledge_categories": knowledge_categories
+                    "knowledge_categories": knowledge_categories,
+                    "full_text_search": self._fts_enabled
                 },
                 "cache": {
                     "knowledge_cache_size": len(self._knowledge_cache),
@@ -528,34 +669,35 @@ class MemoryManager:
         cutoff_time = time.time() - (days_old * 24 * 60 * 60)
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Limpiar conversaciones antiguas
-            cursor.execute('DELETE FROM conversation_history WHERE timestamp < ?', (cutoff_time,))
-            deleted_messages = cursor.rowcount
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
             
-            # Limpiar tareas completadas antiguas
-            cursor.execute('''
-                DELETE FROM task_memory 
-                WHERE status = 'completed' AND updated_at < ?
-            ''', (cutoff_time,))
-            deleted_tasks = cursor.rowcount
+                # Limpiar conversaciones antiguas
+                cursor.execute('DELETE FROM conversation_history WHERE timestamp < ?', (cutoff_time,))
+                deleted_messages = cursor.rowcount
             
-            # Limpiar conocimiento con baja confianza y poco acceso
-            cursor.execute('''
-                DELETE FROM knowledge_base 
-                WHERE confidence < 0.3 AND accessed_count < 2 AND created_at < ?
-            ''', (cutoff_time,))
-            deleted_knowledge = cursor.rowcount
+                # Limpiar tareas completadas antiguas
+                cursor.execute('''
+                    DELETE FROM task_memory 
+                    WHERE status = 'completed' AND updated_at < ?
+                ''', (cutoff_time,))
+                deleted_tasks = cursor.rowcount
             
-            conn.commit()
-            conn.close()
+                # Limpiar conocimiento con baja confianza y poco acceso
+                cursor.execute('''
+                    DELETE FROM knowledge_base 
+                    WHERE confidence < 0.3 AND accessed_count < 2 AND created_at < ?
+                ''', (cutoff_time,))
+                deleted_knowledge = cursor.rowcount
             
             self.logger.info(f"Limpieza completada: {deleted_messages} mensajes, {deleted_tasks} tareas, {deleted_knowledge} elementos de conocimiento eliminados")
             
         except Exception as e:
             self.logger.error(f"Error durante la limpieza: {e}")
+    
+    def close(self):
+        """Cierra las conexiones del pool de la base de datos"""
+        self._pool.close()
 
 # Ejemplo de uso
 if __name__ == "__main__":
@@ -10,6 +10,8 @@ from typing import List, Dict, Optional, Any
 from dataclasses import dataclass
 import time
 
+from src.services.http_pool import get_http_session
+
 @dataclass
 class OllamaModel:
     """Representa un modelo de Ollama disponible"""
@@ -27,11 +29,12 @@ class OllamaService:
         self.logger = logging.getLogger(__name__)
         self.available_models: List[OllamaModel] = []
         self.current_model: Optional[str] = None
+        self.session = get_http_session()  # Pool keep-alive compartido
         
     def is_available(self) -> bool:
         """Verifica si Ollama está disponible y funcionando"""
         try:
-            response = requests.get(f"{self.base_url}/api/version", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/version", timeout=5)
             return response.status_code == 200
         except requests.exceptions.RequestException as e:
             self.logger.warning(f"Ollama no está disponible: {e}")
@@ -40,7 +43,7 @@ class OllamaService:
     def detect_models(self) -> List[OllamaModel]:
         """Detecta automáticamente todos los modelos de Ollama instalados"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -67,7 +70,7 @@ class OllamaService:
     def get_model_info(self, model_name: str) -> Optional[Dict[str, Any]]:
         """Obtiene información detallada de un modelo específico"""
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/show",
                 json={"name": model_name},
                 timeout=10
@@ -87,7 +90,7 @@ class OllamaService:
                 return False
             
             # Cargar el modelo haciendo una solicitud simple
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/generate",
                 json={
                     "model": model_name,
@@ -126,7 +129,7 @@ class OllamaService:
             if options:
                 payload["options"] = options
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/generate",
                 json=payload,
                 timeout=120
@@ -175,7 +178,7 @@ class OllamaService:
             if options:
                 payload["options"] = options
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/chat",
                 json=payload,
                 timeout=120
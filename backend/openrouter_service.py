@@ -11,6 +11,8 @@ from typing import List, Dict, Optional, Any
 from dataclasses import dataclass
 import time
 
+from src.services.http_pool import get_http_session
+
 @dataclass
 class OpenRouterModel:
     """Representa un modelo disponible en OpenRouter"""
@@ -33,6 +35,7 @@ class OpenRouterService:
         self.available_models: List[OpenRouterModel] = []
         self.app_name = "Mitosis-Agent"
         self.site_url = "https://github.com/mitosis-agent"
+        self.session = get_http_session()  # Pool keep-alive compartido con Ollama
         
         if not self.api_key:
             self.logger.warning("No se encontró API key de OpenRouter. Algunas funciones no estarán disponibles.")
@@ -53,7 +56,7 @@ class OpenRouterService:
     def is_available(self) -> bool:
         """Verifica si OpenRouter está disponible"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/models",
                 headers=self._get_headers(),
                 timeout=10
@@ -66,7 +69,7 @@ class OpenRouterService:
     def fetch_models(self) -> List[OpenRouterModel]:
         """Obtiene la lista de modelos disponibles en OpenRouter"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/models",
                 headers=self._get_headers(),
                 timeout=15
@@ -115,7 +118,7 @@ class OpenRouterService:
                 **kwargs
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
                 headers=self._get_headers(),
                 json=payload,
@@ -173,7 +176,7 @@ class OpenRouterService:
                 **kwargs
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
                 headers=self._get_headers(),
                 json=payload,
@@ -359,6 +359,14 @@ try:
     # 🚀 NUEVA FUNCIÓN: Emitir browser_visual con verificación de clientes
     def emit_browser_visual_safe(task_id: str, data: dict) -> bool:
         """Emitir evento browser_visual solo si hay clientes listos"""
+        # Con el WebSocket Manager los screenshots van por el pipeline de frames: se
+        # descartan los repetidos, se reducen y se envían como binario a la room de la
+        # tarea; el último frame queda guardado para los clientes que se unan después
+        manager = getattr(app, 'websocket_manager', None)
+        if manager and manager.is_initialized:
+            manager.emit_to_task(task_id, 'browser_visual', data)
+            return True
+        
         if not has_ready_clients_for_task(task_id):
             logger.warning(f"⚠️ No ready clients for browser_visual in task {task_id} - skipping event")
             return False
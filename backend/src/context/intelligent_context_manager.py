@@ -8,6 +8,8 @@ import logging
 from datetime import datetime
 import time
 
+from .token_budget import TokenCounter, ContextBudgeter
+
 logger = logging.getLogger(__name__)
 
 class IntelligentContextManager:
@@ -24,6 +26,10 @@ class IntelligentContextManager:
         self.context_cache = {}
         self.context_performance = {}
         
+        # Conteo real de tokens y reparto del presupuesto por sección
+        self.token_counter = TokenCounter()
+        self.budgeter = ContextBudgeter(self.token_counter)
+        
         # Cargar estrategias de contexto especializadas
         self._initialize_strategies()
     
@@ -97,6 +103,9 @@ class IntelligentContextManager:
             # Enriquecer contexto con información adicional
             enriched_context = await self._enrich_context(context, query, context_type)
             
+            # Ajustar al presupuesto de tokens repartiendo por prioridad entre secciones
+            enriched_context, token_usage = self._apply_token_budget(enriched_context, context_type, max_tokens)
+            
             # Cachear contexto para futuros usos
             self.context_cache[cache_key] = {
                 'context': enriched_context,
@@ -107,9 +116,10 @@ class IntelligentContextManager:
             
             # Registrar rendimiento
             execution_time = time.time() - start_time
-            self._track_context_performance(context_type, execution_time, len(str(enriched_context)))
+            self._track_context_performance(context_type, execution_time, len(str(enriched_context)), token_usage)
             
-            logger.info(f"✅ Built {context_type} context in {execution_time:.2f}s")
+            logger.info(f"✅ Built {context_type} context in {execution_time:.2f}s "
+                        f"({token_usage['total_tokens']}/{max_tokens} tokens)")
             return enriched_context
             
         except Exception as e:
@@ -143,8 +153,23 @@ class IntelligentContextManager:
         except Exception as e:
             logger.error(f"Error getting basic memory context: {e}")
         
+        context, _ = self._apply_token_budget(context, 'default', max_tokens)
         return context
     
+    def _apply_token_budget(self, context: Dict[str, Any], context_type: str, max_tokens: int):
+        """Ajusta el contexto a max_tokens y anota el uso en system_info"""
+        fitted, token_usage = self.budgeter.fit(context, context_type, max_tokens)
+        if token_usage['trimmed_sections']:
+            logger.debug(f"✂️ Trimmed {token_usage['trimmed_sections']} to fit {context_type} context "
+                         f"in {max_tokens} tokens")
+        if isinstance(fitted.get('system_info'), dict):
+            fitted['system_info'] = dict(fitted['system_info'], token_usage={
+                'total_tokens': token_usage['total_tokens'],
+                'budget': max_tokens,
+                'trimmed_sections': token_usage['trimmed_sections']
+            })
+        return fitted, token_usage
+    
     async def _enrich_context(self, context: Dict[str, Any], query: str, context_type: str) -> Dict[str, Any]:
         """Enriquece el contexto con información adicional del sistema"""
         
@@ -194,14 +219,19 @@ class IntelligentContextManager:
         except:
             return False
     
-    def _track_context_performance(self, context_type: str, execution_time: float, context_size: int):
+    def _track_context_performance(self, context_type: str, execution_time: float, context_size: int,
+                                   token_usage: Optional[Dict[str, Any]] = None):
         """Rastrea el rendimiento de la construcción de contexto"""
         if context_type not in self.context_performance:
             self.context_performance[context_type] = {
                 'total_time': 0,
                 'count': 0,
                 'total_size': 0,
-                'success_count': 0
+                'success_count': 0,
+                'total_tokens': 0,
+                'max_tokens_seen': 0,
+                'tokens_by_category': {},
+                'trimmed_count': 0
             }
         
         perf = self.context_performance[context_type]
@@ -210,9 +240,22 @@ class IntelligentContextManager:
         perf['total_size'] += context_size
         perf['success_count'] += 1
         
+        if token_usage:
+            perf['total_tokens'] += token_usage['total_tokens']
+            perf['max_tokens_seen'] = max(perf['max_tokens_seen'], token_usage['total_tokens'])
+            perf['last_tokens'] = token_usage['total_tokens']
+            for category, tokens in token_usage['categories'].items():
+                perf['tokens_by_category'][category] = perf['tokens_by_category'].get(category, 0) + tokens
+            if token_usage['trimmed_sections']:
+                perf['trimmed_count'] += 1
+        
         # Calcular promedios
         perf['avg_time'] = perf['total_time'] / perf['count']
         perf['avg_size'] = perf['total_size'] / perf['count']
+        perf['avg_tokens'] = perf['total_tokens'] / perf['count']
+        perf['avg_tokens_by_category'] = {
+            category: tokens / perf['count'] for category, tokens in perf['tokens_by_category'].items()
+        }
         perf['success_rate'] = perf['success_count'] / perf['count']
     
     def get_performance_metrics(self) -> Dict[str, Any]:
@@ -221,7 +264,11 @@ class IntelligentContextManager:
             'strategies_loaded': len(self.context_strategies),
             'cache_size': len(self.context_cache),
             'performance_by_type': self.context_performance.copy(),
-            'total_contexts_built': sum(p.get('count', 0) for p in self.context_performance.values())
+            'total_contexts_built': sum(p.get('count', 0) for p in self.context_performance.values()),
+            'token_counter': self.token_counter.backend,
+            # Sin tiktoken los totales son estimaciones por palabras, no tokens del modelo
+            'token_counts_estimated': self.token_counter.is_estimate,
+            'total_context_tokens': sum(p.get('total_tokens', 0) for p in self.context_performance.values())
         }
     
     def clear_cache(self):
@@ -0,0 +1,253 @@
+"""
+Presupuesto de Tokens para el Contexto
+Cuenta los tokens reales de cada sección del contexto y los reparte por
+prioridad entre memoria, historial y conocimiento, recortando o compactando
+las secciones que no caben en max_tokens antes de que el prompt llegue al
+modelo.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+import math
+import re
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Categoría de cada sección conocida del contexto; el resto se consideran base
+SECTION_CATEGORIES = {
+    'memory_context': 'memory',
+    'similar_plans': 'memory',
+    'recent_actions': 'memory',
+    'error_patterns': 'memory',
+    'successful_recoveries': 'memory',
+    'lessons_learned': 'memory',
+    'conversation_history': 'history',
+    'execution_history': 'history',
+    'outcomes': 'history',
+    'relevant_knowledge': 'knowledge',
+    'success_patterns': 'knowledge',
+    'planning_templates': 'knowledge',
+    'available_tools': 'knowledge',
+    'available_resources': 'knowledge',
+    'available_fixes': 'knowledge',
+    'improvement_areas': 'knowledge',
+    'escalation_options': 'knowledge',
+}
+
+# Peso de cada categoría al repartir el presupuesto, por tipo de contexto
+CATEGORY_WEIGHTS = {
+    'chat': {'history': 0.6, 'memory': 0.25, 'knowledge': 0.15},
+    'task_planning': {'memory': 0.45, 'knowledge': 0.4, 'history': 0.15},
+    'task_execution': {'knowledge': 0.4, 'history': 0.35, 'memory': 0.25},
+    'reflection': {'memory': 0.5, 'history': 0.3, 'knowledge': 0.2},
+    'error_handling': {'memory': 0.5, 'knowledge': 0.35, 'history': 0.15},
+    'default': {'memory': 0.4, 'history': 0.3, 'knowledge': 0.3},
+}
+
+# Las secciones de historial conservan los elementos más recientes (al final)
+RECENT_LAST = {'conversation_history', 'execution_history'}
+
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_TRUNCATION_MARK = '…'
+
+
+class TokenCounter:
+    """
+    Cuenta tokens con tiktoken si está instalado o con una estimación por palabras
+
+    cl100k_base no es el tokenizador de los modelos de Ollama, pero se desvía
+    mucho menos que la estimación; `is_estimate` indica que no hay tokenizador.
+    """
+
+    def __init__(self, encoding_name: str = 'cl100k_base'):
+        self._encoding = None
+        if TIKTOKEN_AVAILABLE:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load tiktoken encoding {encoding_name}: {e}")
+        self.backend = 'tiktoken' if self._encoding is not None else 'heuristic'
+        self.is_estimate = self._encoding is None
+
+    def count(self, text: str) -> int:
+        """Tokens de un texto"""
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        # Los tokenizadores BPE parten las palabras largas en trozos de ~4 caracteres
+        return sum(max(1, math.ceil(len(piece) / 4)) for piece in _PIECE_PATTERN.findall(text))
+
+    def count_value(self, value: Any) -> int:
+        """Tokens de un valor tal como se serializa en el prompt"""
+        return self.count(serialize(value))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Recorta un texto a max_tokens, marcando el corte"""
+        if max_tokens <= 0:
+            return ''
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(tokens[:max(1, max_tokens - 1)]) + _TRUNCATION_MARK
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) + 1 <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low].rstrip() + _TRUNCATION_MARK
+
+
+def serialize(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    try:
+        return json.dumps(value, ensure_ascii=False, default=str, separators=(',', ':'))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class ContextBudgeter:
+    """
+    Ajusta un contexto a un presupuesto de tokens
+
+    Las secciones base (tipo, consulta, metadatos) se mantienen siempre; el
+    resto del presupuesto se reparte entre categorías según su peso y las
+    secciones que no caben se recortan elemento a elemento, compactando los
+    textos largos del último elemento en lugar de descartarlo.
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None, min_item_tokens: int = 24):
+        self.counter = counter or TokenCounter()
+        self.min_item_tokens = min_item_tokens
+
+    def fit(self, context: Dict[str, Any], context_type: str, max_tokens: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Ajusta el contexto a max_tokens
+
+        Returns:
+            Tupla (contexto ajustado, informe con tokens por sección y secciones recortadas)
+        """
+        # Cada sección se cuenta con su clave, como aparece en el prompt serializado
+        sections = {key: self.counter.count_value({key: value}) for key, value in context.items()}
+        budgeted = [key for key in context if key in SECTION_CATEGORIES and context[key]]
+        base_tokens = sum(tokens for key, tokens in sections.items() if key not in budgeted)
+
+        fitted = dict(context)
+        trimmed: List[str] = []
+        available = max(0, max_tokens - base_tokens)
+        allocation = self._allocate(budgeted, sections, context_type, available)
+
+        for key in budgeted:
+            if sections[key] <= allocation[key]:
+                continue
+            key_tokens = self.counter.count_value({key: None}) - self.counter.count_value(None)
+            fitted[key] = self._shrink(context[key], allocation[key] - key_tokens, recent_last=key in RECENT_LAST)
+            sections[key] = self.counter.count_value({key: fitted[key]})
+            trimmed.append(key)
+
+        by_category: Dict[str, int] = {'base': base_tokens}
+        for key in budgeted:
+            category = SECTION_CATEGORIES[key]
+            by_category[category] = by_category.get(category, 0) + sections[key]
+
+        report = {
+            'budget': max_tokens,
+            'total_tokens': sum(sections.values()),
+            'sections': sections,
+            'categories': by_category,
+            'trimmed_sections': trimmed,
+            'counter': self.counter.backend
+        }
+        if base_tokens > max_tokens:
+            logger.warning(f"⚠️ Base context for {context_type} uses {base_tokens} tokens (budget {max_tokens})")
+        return fitted, report
+
+    def _allocate(self, keys: List[str], sections: Dict[str, int], context_type: str, available: int) -> Dict[str, int]:
+        """Reparto proporcional al peso; lo que una sección no necesita pasa a las demás"""
+        weights = CATEGORY_WEIGHTS.get(context_type, CATEGORY_WEIGHTS['default'])
+        per_category: Dict[str, List[str]] = {}
+        for key in keys:
+            per_category.setdefault(SECTION_CATEGORIES[key], []).append(key)
+
+        def weight(key: str) -> float:
+            category = SECTION_CATEGORIES[key]
+            return weights.get(category, 0.1) / len(per_category[category])
+
+        allocation = {key: 0 for key in keys}
+        pending = list(keys)
+        remaining = available
+        while pending and remaining > 0:
+            total_weight = sum(weight(key) for key in pending)
+            satisfied = [key for key in pending if sections[key] <= int(remaining * weight(key) / total_weight)]
+            if not satisfied:
+                # Ninguna cabe entera: cada sección se queda con su parte proporcional
+                for key in pending:
+                    allocation[key] = int(remaining * weight(key) / total_weight)
+                break
+            for key in satisfied:
+                allocation[key] = sections[key]
+            pending = [key for key in pending if key not in satisfied]
+            remaining = available - sum(allocation.values())
+        return allocation
+
+    def _shrink(self, value: Any, budget: int, recent_last: bool = False) -> Any:
+        """Recorta una sección a budget tokens (medidos sobre su JSON)"""
+        if isinstance(value, str):
+            return self._compact(value, budget)
+        if isinstance(value, list):
+            items = list(reversed(value)) if recent_last else list(value)
+            kept = []
+            brackets = self.counter.count_value([])
+            used = brackets
+            for item in items:
+                # Dentro de la lista el elemento lleva comillas (si es texto) y separador
+                tokens = self.counter.count_value([item]) - brackets + 1
+                if used + tokens <= budget:
+                    kept.append(item)
+                    used += tokens
+                    continue
+                if budget - used >= self.min_item_tokens:
+                    kept.append(self._compact(item, budget - used - 1))
+                break
+            return list(reversed(kept)) if recent_last else kept
+        if isinstance(value, dict):
+            return self._compact(value, budget)
+        return value
+
+    def _compact(self, value: Any, budget: int) -> Any:
+        """Compacta un elemento recortando sus textos más largos hasta que quepa"""
+        if isinstance(value, str):
+            return self.counter.truncate(value, budget - self._quote_tokens(value))
+        if isinstance(value, dict):
+            compacted = dict(value)
+            strings = sorted((key for key, item in compacted.items() if isinstance(item, str)),
+                             key=lambda key: len(compacted[key]), reverse=True)
+            for key in strings:
+                excess = self.counter.count_value(compacted) - budget
+                if excess <= 0:
+                    break
+                current = self.counter.count(compacted[key])
+                compacted[key] = self.counter.truncate(compacted[key], max(0, current - excess))
+            if self.counter.count_value(compacted) > budget:
+                # Lo que sigue sin caber son estructuras anidadas: se conservan los campos simples
+                compacted = {key: item for key, item in compacted.items() if not isinstance(item, (list, dict))}
+            return compacted
+        if isinstance(value, list):
+            return self._shrink(value, budget)
+        return value
+
+    def _quote_tokens(self, text: str) -> int:
+        """Tokens que añaden las comillas (y escapes) de un texto al serializarlo en JSON"""
+        return max(0, self.counter.count_value([text]) - self.counter.count_value([]) - self.counter.count(text))
@@ -5,6 +5,7 @@ UPGRADE AI: Modificado para usar contexto de tareas y filtrado por task_id
 """
 
 import asyncio
+from dataclasses import asdict, is_dataclass
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
@@ -58,7 +59,13 @@ class AdvancedMemoryManager:
         # Servicios de soporte
         self.embedding_service = EmbeddingService(
             model_name=self.config.get('embedding_model', 'all-MiniLM-L6-v2'),
-            storage_path=self.config.get('embedding_storage', 'embeddings')
+            storage_path=self.config.get('embedding_storage', 'embeddings'),
+            batch_size=self.config.get('embedding_batch_size', 32),
+            batch_wait_ms=self.config.get('embedding_batch_wait_ms', 5.0),
+            cache_size=self.config.get('embedding_cache_size', 10000),
+            cache_disk_path=self.config.get('embedding_cache_disk_path'),
+            index_type=self.config.get('embedding_index_type', 'flat'),
+            index_params=self.config.get('embedding_index_params')
         )
         
         self.semantic_indexer = SemanticIndexer(self.embedding_service)
@@ -1270,6 +1277,7 @@ class AdvancedMemoryManager:
                         episode.actions = episode.actions[:3]
                     if len(episode.outcomes) > 3:
                         episode.outcomes = episode.outcomes[:3]
+                    self.episodic_memory.reindex_episode(episode.id)
                     
                     compressed_size = len(str(episode.description)) + len(str(episode.context))
                     compression_stats['space_saved'] += (original_size - compressed_size)
@@ -1328,7 +1336,10 @@ class AdvancedMemoryManager:
             # 5. Limpiar memoria de trabajo antigua
             # Use the existing cleanup method
             self.working_memory._cleanup_expired()
-            
+
+            # 6. Purgar vectores eliminados del índice semántico
+            compression_stats['index_rebuilt'] = await self.embedding_service.compact_index()
+
             compression_stats['completed_at'] = datetime.now().isoformat()
             compression_stats['total_space_saved_kb'] = compression_stats['space_saved'] / 1024
             
@@ -1355,6 +1366,9 @@ class AdvancedMemoryManager:
         """
         if hasattr(obj, 'isoformat'):
             return obj.isoformat()
+        elif is_dataclass(obj):
+            # Los registros de memoria usan __slots__ y no tienen __dict__
+            return asdict(obj)
         elif hasattr(obj, '__dict__'):
             return obj.__dict__
         elif hasattr(obj, '__str__'):
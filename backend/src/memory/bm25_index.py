@@ -0,0 +1,162 @@
+"""
+Índice invertido con puntuación BM25
+Búsqueda por palabras clave con poda top-k tipo max-score
+"""
+
+import heapq
+import math
+from collections import Counter
+from typing import Dict, List, Tuple, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BM25Index:
+    """Índice invertido con frecuencias de término y longitudes de documento"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Inicializa el índice
+
+        Args:
+            k1: Saturación de la frecuencia de término
+            b: Peso de la normalización por longitud
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}  # término -> {doc_id: tf}
+        self.doc_terms: Dict[str, Dict[str, int]] = {}  # doc_id -> {término: tf}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        # Cotas por término para la poda; solo pueden quedar sobreestimadas
+        self.max_tf: Dict[str, int] = {}
+        self.min_length: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, tokens: Iterable[str]):
+        """
+        Indexa un documento, sustituyendo la versión anterior si existe
+
+        Args:
+            doc_id: ID del documento
+            tokens: Términos del documento (con repeticiones)
+        """
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+
+        term_freqs = dict(Counter(tokens))
+        length = sum(term_freqs.values())
+        self.doc_terms[doc_id] = term_freqs
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+            if tf > self.max_tf.get(term, 0):
+                self.max_tf[term] = tf
+            if length < self.min_length.get(term, math.inf):
+                self.min_length[term] = length
+
+    def remove(self, doc_id: str):
+        """
+        Elimina un documento tocando solo sus propias listas
+
+        Args:
+            doc_id: ID del documento
+        """
+        term_freqs = self.doc_terms.pop(doc_id, None)
+        if term_freqs is None:
+            return
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in term_freqs:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+                self.max_tf.pop(term, None)
+                self.min_length.pop(term, None)
+
+    def document_frequency(self, term: str) -> int:
+        """Número de documentos que contienen el término"""
+        return len(self.postings.get(term, ()))
+
+    def search(self, query_terms: Iterable[str], top_k: int) -> List[Tuple[str, float]]:
+        """
+        Devuelve los top_k documentos por BM25
+
+        Procesa los términos de mayor a menor cota. Cuando la suma de cotas de
+        los términos restantes no alcanza el k-ésimo score parcial, ningún
+        documento nuevo puede entrar en el top-k: solo se actualizan los
+        candidatos existentes y se descartan los que ya no pueden alcanzarlo.
+
+        Args:
+            query_terms: Términos de la consulta
+            top_k: Número máximo de resultados
+
+        Returns:
+            Lista de tuplas (doc_id, score) ordenada por score
+        """
+        if not self.doc_lengths or top_k <= 0:
+            return []
+
+        avg_length = self.total_length / len(self.doc_lengths)
+        terms = [term for term in set(query_terms) if term in self.postings]
+        if not terms:
+            return []
+
+        idfs = {term: self._idf(term) for term in terms}
+        bounds = {term: self._upper_bound(term, idfs[term], avg_length) for term in terms}
+        terms.sort(key=lambda term: bounds[term], reverse=True)
+
+        remaining = sum(bounds.values())
+        scores: Dict[str, float] = {}
+
+        for term in terms:
+            remaining -= bounds[term]
+            posting = self.postings[term]
+            idf = idfs[term]
+            threshold = self._kth_score(scores, top_k)
+
+            if remaining + bounds[term] >= threshold or len(scores) < top_k:
+                # Fase esencial: el término aún puede introducir documentos nuevos
+                for doc_id, tf in posting.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + self._term_score(tf, idf, doc_id, avg_length)
+            else:
+                # Fase no esencial: solo se refinan los candidatos vivos
+                for doc_id in list(scores):
+                    if scores[doc_id] + remaining + bounds[term] < threshold:
+                        del scores[doc_id]
+                        continue
+                    tf = posting.get(doc_id)
+                    if tf:
+                        scores[doc_id] += self._term_score(tf, idf, doc_id, avg_length)
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def _idf(self, term: str) -> float:
+        """IDF de BM25 (variante siempre positiva)"""
+        n = len(self.doc_lengths)
+        df = len(self.postings[term])
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _term_score(self, tf: int, idf: float, doc_id: str, avg_length: float) -> float:
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def _upper_bound(self, term: str, idf: float, avg_length: float) -> float:
+        """Score máximo que el término puede aportar a cualquier documento"""
+        tf = self.max_tf[term]
+        norm = self.k1 * (1 - self.b + self.b * self.min_length[term] / avg_length)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    @staticmethod
+    def _kth_score(scores: Dict[str, float], top_k: int) -> float:
+        if len(scores) < top_k:
+            return 0.0
+        return heapq.nlargest(top_k, scores.values())[-1]
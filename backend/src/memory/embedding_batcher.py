@@ -0,0 +1,129 @@
+"""
+Cola de micro-batching para generación de embeddings
+Agrupa textos de llamadas concurrentes en un único model.encode
+"""
+
+import asyncio
+import weakref
+from typing import Callable, Dict, List, Any, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _LoopQueue:
+    """Textos pendientes de un event loop concreto"""
+
+    def __init__(self):
+        self.pending: List[Tuple[str, asyncio.Future]] = []
+        self.flush_handle: asyncio.TimerHandle = None
+
+
+class EmbeddingBatcher:
+    """Coalesce peticiones de embedding concurrentes en lotes"""
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        Inicializa la cola de micro-batching
+
+        Args:
+            encode_fn: Función bloqueante que codifica una lista de textos
+            max_batch_size: Número de textos que fuerza el envío inmediato del lote
+            max_wait_ms: Tiempo máximo que un texto espera a que se llene el lote
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        # Las futures pertenecen a un loop; Flask crea uno nuevo por asyncio.run
+        self._queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopQueue]" = weakref.WeakKeyDictionary()
+        self.stats = {
+            'batches': 0,
+            'texts': 0,
+            'unique_texts': 0,
+            'max_batch_size_seen': 0
+        }
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Encola un texto y espera su embedding
+
+        Args:
+            text: Texto a procesar
+
+        Returns:
+            Array numpy con el embedding
+        """
+        loop = asyncio.get_event_loop()
+        queue = self._queues.get(loop)
+        if queue is None:
+            queue = self._queues[loop] = _LoopQueue()
+
+        future = loop.create_future()
+        queue.pending.append((text, future))
+
+        if len(queue.pending) >= self.max_batch_size:
+            self._flush(loop, queue)
+        elif queue.flush_handle is None:
+            queue.flush_handle = loop.call_later(self.max_wait_ms / 1000.0, self._flush, loop, queue)
+
+        return await future
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas de la cola
+
+        Returns:
+            Diccionario con estadísticas
+        """
+        batches = self.stats['batches']
+        return {
+            **self.stats,
+            'avg_batch_size': self.stats['texts'] / batches if batches else 0.0,
+            'max_wait_ms': self.max_wait_ms,
+            'max_batch_size': self.max_batch_size
+        }
+
+    def _flush(self, loop: asyncio.AbstractEventLoop, queue: _LoopQueue):
+        """Envía el lote pendiente del loop al executor"""
+        if queue.flush_handle is not None:
+            queue.flush_handle.cancel()
+            queue.flush_handle = None
+
+        batch, queue.pending = queue.pending, []
+        if batch:
+            loop.create_task(self._run_batch(loop, batch))
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, batch: List[Tuple[str, asyncio.Future]]):
+        """
+        Codifica un lote y reparte cada vector a su llamador
+
+        Args:
+            loop: Event loop propietario de las futures
+            batch: Lista de tuplas (texto, future)
+        """
+        # Textos repetidos dentro del lote se codifican una sola vez
+        positions: Dict[str, int] = {}
+        for text, _ in batch:
+            positions.setdefault(text, len(positions))
+        unique_texts = list(positions)
+
+        try:
+            embeddings = await loop.run_in_executor(None, self.encode_fn, unique_texts)
+        except Exception as e:
+            logger.error(f"Error generando lote de {len(unique_texts)} embeddings: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats['batches'] += 1
+        self.stats['texts'] += len(batch)
+        self.stats['unique_texts'] += len(unique_texts)
+        self.stats['max_batch_size_seen'] = max(self.stats['max_batch_size_seen'], len(batch))
+
+        for text, future in batch:
+            if not future.done():
+                future.set_result(embeddings[positions[text]])
@@ -0,0 +1,234 @@
+"""
+Caché de embeddings por hash de contenido
+LRU en memoria con un nivel opcional en disco mapeado en memoria
+"""
+
+import hashlib
+import json
+import os
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 20  # sha1
+
+
+class _DiskTier:
+    """Buffer circular de vectores en ficheros mapeados en memoria"""
+
+    def __init__(self, path: str, model_name: str, capacity: int):
+        """
+        Inicializa el nivel en disco
+
+        Args:
+            path: Directorio de los ficheros del caché
+            model_name: Modelo al que pertenecen los vectores
+            capacity: Número máximo de vectores en disco
+        """
+        self.path = path
+        self.model_name = model_name
+        self.capacity = capacity
+        self.dimension: Optional[int] = None
+        self.keys = None
+        self.vectors = None
+        self.seq = None
+        self.slots: Dict[bytes, int] = {}
+        self.next_seq = 0
+
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(self.meta_path):
+            self._open()
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        """Devuelve una copia del vector almacenado o None"""
+        slot = self.slots.get(digest)
+        if slot is None:
+            return None
+        return np.array(self.vectors[slot])
+
+    def put(self, digest: bytes, vector: np.ndarray):
+        """Escribe un vector sobrescribiendo la entrada más antigua si está lleno"""
+        if self.vectors is None:
+            self._create(vector.shape[0])
+        if vector.shape[0] != self.dimension or digest in self.slots:
+            return
+
+        slot = self.next_seq % self.capacity
+        old_digest = bytes(self.keys[slot])
+        if self.slots.get(old_digest) == slot:
+            del self.slots[old_digest]
+
+        self.vectors[slot] = vector
+        self.keys[slot] = np.frombuffer(digest, dtype=np.uint8)
+        self.seq[slot] = self.next_seq + 1  # 0 marca hueco vacío
+        self.slots[digest] = slot
+        self.next_seq += 1
+
+    def flush(self):
+        """Sincroniza los mapas de memoria con el disco"""
+        for array in (self.keys, self.vectors, self.seq):
+            if array is not None:
+                array.flush()
+
+    def _create(self, dimension: int):
+        """Crea los ficheros del nivel en disco para una dimensión dada"""
+        self.dimension = dimension
+        with open(self.meta_path, 'w') as f:
+            json.dump({
+                'model_name': self.model_name,
+                'dimension': dimension,
+                'capacity': self.capacity
+            }, f)
+        self._map('w+')
+
+    def _open(self):
+        """Abre ficheros existentes y reconstruye el mapa digest -> slot"""
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta['model_name'] != self.model_name or meta['capacity'] != self.capacity:
+                logger.info(f"Caché de embeddings en disco incompatible en {self.path}, se recrea")
+                return
+            self.dimension = meta['dimension']
+            self._map('r+')
+
+            used = np.nonzero(self.seq)[0]
+            # Recorrer por antigüedad para que las entradas nuevas ganen
+            for slot in used[np.argsort(self.seq[used])]:
+                self.slots[bytes(self.keys[slot])] = int(slot)
+            self.next_seq = int(self.seq.max()) if len(used) else 0
+            logger.info(f"Caché de embeddings en disco cargado: {len(self.slots)} vectores")
+        except Exception as e:
+            logger.error(f"Error abriendo caché de embeddings en disco: {e}")
+            self.dimension = None
+            self.keys = self.vectors = self.seq = None
+            self.slots = {}
+
+    def _map(self, mode: str):
+        """Mapea en memoria los ficheros de claves, vectores y secuencias"""
+        self.keys = np.memmap(os.path.join(self.path, 'keys.bin'), dtype=np.uint8,
+                              mode=mode, shape=(self.capacity, DIGEST_SIZE))
+        self.vectors = np.memmap(os.path.join(self.path, 'vectors.bin'), dtype=np.float32,
+                                 mode=mode, shape=(self.capacity, self.dimension))
+        self.seq = np.memmap(os.path.join(self.path, 'seq.bin'), dtype=np.int64,
+                             mode=mode, shape=(self.capacity,))
+
+
+class EmbeddingCache:
+    """Caché LRU de embeddings indexado por modelo y hash del texto normalizado"""
+
+    def __init__(self, model_name: str, max_entries: int = 10000,
+                 disk_path: Optional[str] = None, disk_capacity: int = 100000):
+        """
+        Inicializa el caché
+
+        Args:
+            model_name: Nombre del modelo que genera los embeddings
+            max_entries: Entradas máximas en memoria
+            disk_path: Directorio del nivel en disco (None lo desactiva)
+            disk_capacity: Entradas máximas en disco
+        """
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.disk = _DiskTier(disk_path, model_name, disk_capacity) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, text: str) -> bytes:
+        """
+        Calcula la clave de un texto
+
+        Args:
+            text: Texto original
+
+        Returns:
+            Digest sha1 de modelo + texto normalizado
+        """
+        normalized = ' '.join(unicodedata.normalize('NFC', text).split())
+        return hashlib.sha1(f"{self.model_name}\0{normalized}".encode('utf-8')).digest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        Busca el embedding de un texto
+
+        Args:
+            text: Texto a buscar
+
+        Returns:
+            Embedding cacheado o None
+        """
+        key = self.make_key(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return vector
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self._store_in_memory(key, vector)
+                self.hits += 1
+                self.disk_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, vector: np.ndarray):
+        """
+        Almacena el embedding de un texto
+
+        Args:
+            text: Texto original
+            vector: Embedding generado
+        """
+        key = self.make_key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._store_in_memory(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, vector)
+            except Exception as e:
+                logger.error(f"Error escribiendo caché de embeddings en disco: {e}")
+
+    def flush(self):
+        """Persiste el nivel en disco"""
+        if self.disk is not None:
+            self.disk.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas del caché
+
+        Returns:
+            Diccionario con estadísticas
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_entries': len(self.memory),
+            'max_entries': self.max_entries,
+            'disk_entries': len(self.disk.slots) if self.disk is not None else 0
+        }
+
+    def _store_in_memory(self, key: bytes, vector: np.ndarray):
+        """Inserta en el LRU en memoria expulsando la entrada menos reciente"""
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.evictions += 1
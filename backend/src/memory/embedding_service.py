@@ -4,35 +4,83 @@ Implementa generación de embeddings y búsqueda por similitud
 """
 
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Set
 import asyncio
 from sentence_transformers import SentenceTransformer
 import faiss
 import pickle
+import struct
 import os
 from datetime import datetime
 import logging
 
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache
+from .vector_index_factory import (
+    IndexConfig, TRAINED_INDEX_TYPES, create_index, index_ids, index_kind, apply_search_params
+)
+
 logger = logging.getLogger(__name__)
 
 class EmbeddingService:
     """Servicio para generar embeddings y realizar búsqueda semántica"""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", storage_path: str = "embeddings"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", storage_path: str = "embeddings",
+                 compaction_interval: int = 1000, tombstone_ratio_threshold: float = 0.2,
+                 min_rebuild_size: int = 100, batch_size: int = 32, batch_wait_ms: float = 5.0,
+                 cache_size: int = 10000, cache_disk_path: Optional[str] = None,
+                 index_type: str = 'flat', index_params: Optional[Dict[str, Any]] = None):
         """
         Inicializa el servicio de embeddings
         
         Args:
             model_name: Nombre del modelo SentenceTransformer
             storage_path: Ruta para almacenar índices
+            compaction_interval: Entradas del WAL tras las que se reescribe el snapshot completo
+            tombstone_ratio_threshold: Proporción de vectores muertos que dispara la reconstrucción
+            min_rebuild_size: Tamaño mínimo del índice para considerar una reconstrucción
+            batch_size: Máximo de textos por lote de model.encode
+            batch_wait_ms: Espera máxima para agrupar textos de llamadas concurrentes
+            cache_size: Embeddings máximos en el caché LRU en memoria
+            cache_disk_path: Directorio del caché en disco mapeado en memoria (opcional)
+            index_type: Tipo de índice FAISS ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+            index_params: Parámetros adicionales de IndexConfig (nlist, nprobe, hnsw_m...)
         """
         self.model_name = model_name
         self.storage_path = storage_path
         self.model = None
         self.index = None
+        self.index_config = IndexConfig(index_type=index_type, **(index_params or {}))
         self.document_map = {}  # Mapeo de ID a documento
+        self.id_to_doc: Dict[int, str] = {}  # Mapeo inverso de ID FAISS a documento
+        self.tombstones: Set[int] = set()  # IDs FAISS de vectores eliminados o reemplazados
+        self.next_index_id = 0
+        self.compaction_interval = compaction_interval
+        self.wal_entries = 0
+        self.tombstone_ratio_threshold = tombstone_ratio_threshold
+        self.min_rebuild_size = min_rebuild_size
         self.is_initialized = False
         
+        # Estado de la reconstrucción en segundo plano
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._rebuild_log: Optional[List[Tuple[int, np.ndarray]]] = None
+        self._index_generation = 0
+        self.rebuilds_completed = 0
+        
+        # Cola de micro-batching compartida por todas las llamadas a embed_text
+        self.batcher = EmbeddingBatcher(
+            lambda texts: self.model.encode(texts),
+            max_batch_size=batch_size,
+            max_wait_ms=batch_wait_ms
+        )
+        
+        # Caché por hash de contenido: textos repetidos no vuelven al modelo
+        self.cache = EmbeddingCache(model_name, max_entries=cache_size, disk_path=cache_disk_path)
+        
+        self.index_path = os.path.join(storage_path, 'faiss_index.idx')
+        self.map_path = os.path.join(storage_path, 'document_map.pkl')
+        self.wal_path = os.path.join(storage_path, 'index_wal.log')
+        
         # Crear directorio de almacenamiento
         os.makedirs(storage_path, exist_ok=True)
         
@@ -70,14 +118,14 @@ class EmbeddingService:
             await self.initialize()
             
         try:
-            # Generar embedding en thread pool
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                None,
-                lambda: self.model.encode([text])
-            )
+            embedding = self.cache.get(text)
+            if embedding is not None:
+                return embedding
             
-            return embedding[0]
+            # Generar embedding agrupado con otras llamadas concurrentes
+            embedding = await self.batcher.embed(text)
+            self.cache.put(text, embedding)
+            return embedding
             
         except Exception as e:
             logger.error(f"Error generando embedding: {e}")
@@ -97,13 +145,21 @@ class EmbeddingService:
             await self.initialize()
             
         try:
-            loop = asyncio.get_event_loop()
-            embeddings = await loop.run_in_executor(
-                None,
-                lambda: self.model.encode(texts)
-            )
+            cached = [self.cache.get(text) for text in texts]
+            missing = [text for text, embedding in zip(texts, cached) if embedding is None]
             
-            return embeddings
+            if missing:
+                loop = asyncio.get_event_loop()
+                new_embeddings = iter(await loop.run_in_executor(
+                    None,
+                    lambda: self.model.encode(missing)
+                ))
+                for i, text in enumerate(texts):
+                    if cached[i] is None:
+                        cached[i] = next(new_embeddings)
+                        self.cache.put(text, cached[i])
+            
+            return np.vstack(cached) if cached else np.empty((0, 0), dtype='float32')
             
         except Exception as e:
             logger.error(f"Error generando embeddings batch: {e}")
@@ -127,25 +183,35 @@ class EmbeddingService:
             
             # Inicializar índice FAISS si no existe
             if self.index is None:
-                dimension = embedding.shape[0]
-                self.index = faiss.IndexFlatIP(dimension)  # Inner product para similitud coseno
+                self.index = self._create_index(embedding.shape[0])
                 
             # Normalizar embedding para similitud coseno
-            embedding_norm = embedding / np.linalg.norm(embedding)
+            embedding_norm = self._normalize(embedding)
+            
+            # Un documento re-indexado deja su vector anterior como tombstone
+            previous = self.document_map.get(doc_id)
+            if previous is not None:
+                self._tombstone(previous['index_id'])
             
-            # Añadir al índice
-            self.index.add(embedding_norm.reshape(1, -1))
+            # Añadir al índice con un ID estable
+            index_id = self.next_index_id
+            self.next_index_id += 1
+            self._add_vector(index_id, embedding_norm)
             
             # Guardar mapeo
-            self.document_map[doc_id] = {
+            doc_entry = {
                 'content': content,
                 'metadata': metadata or {},
-                'index_id': self.index.ntotal - 1,
+                'index_id': index_id,
                 'created_at': datetime.now().isoformat()
             }
+            self.document_map[doc_id] = doc_entry
+            self.id_to_doc[index_id] = doc_id
             
-            # Persistir índice
-            await self._save_index()
+            # Persistir de forma incremental
+            self._append_wal(('add', doc_id, doc_entry, embedding_norm))
+            await self._maybe_compact()
+            self._maybe_schedule_rebuild()
             
             logger.info(f"Documento {doc_id} añadido al índice semántico")
             
@@ -174,32 +240,23 @@ class EmbeddingService:
         try:
             # Generar embedding de consulta
             query_embedding = await self.embed_text(query)
-            query_embedding_norm = query_embedding / np.linalg.norm(query_embedding)
+            query_embedding_norm = self._normalize(query_embedding)
             
-            # Buscar similares
-            scores, indices = self.index.search(
-                query_embedding_norm.reshape(1, -1), 
-                min(top_k, self.index.ntotal)
-            )
+            # Buscar similares ampliando k mientras los tombstones ocupen huecos
+            live_hits = self._search_live(query_embedding_norm, top_k)
             
             # Procesar resultados
             results = []
-            for score, idx in zip(scores[0], indices[0]):
+            for score, doc_id in live_hits:
                 if score >= threshold:
-                    # Encontrar documento por índice
-                    doc_id = None
-                    for doc_id, doc_data in self.document_map.items():
-                        if doc_data['index_id'] == idx:
-                            break
-                    
-                    if doc_id:
-                        results.append({
-                            'document_id': doc_id,
-                            'content': doc_data['content'],
-                            'metadata': doc_data['metadata'],
-                            'similarity_score': float(score),
-                            'created_at': doc_data['created_at']
-                        })
+                    doc_data = self.document_map[doc_id]
+                    results.append({
+                        'document_id': doc_id,
+                        'content': doc_data['content'],
+                        'metadata': doc_data['metadata'],
+                        'similarity_score': float(score),
+                        'created_at': doc_data['created_at']
+                    })
             
             return results
             
@@ -215,16 +272,23 @@ class EmbeddingService:
             doc_id: ID del documento a eliminar
         """
         if doc_id in self.document_map:
-            del self.document_map[doc_id]
-            # Nota: FAISS no soporta eliminación directa, 
-            # sería necesario reconstruir el índice
-            await self._save_index()
+            doc_data = self.document_map.pop(doc_id)
+            # FAISS no soporta eliminación directa en todos los tipos de índice:
+            # el vector queda como tombstone hasta la siguiente reconstrucción
+            self._tombstone(doc_data['index_id'])
+            self._append_wal(('remove', doc_id))
+            await self._maybe_compact()
+            self._maybe_schedule_rebuild()
             logger.info(f"Documento {doc_id} eliminado del índice")
     
     async def clear_index(self):
         """Limpia completamente el índice"""
         self.index = None
         self.document_map = {}
+        self.id_to_doc = {}
+        self.tombstones = set()
+        self.next_index_id = 0
+        self._index_generation += 1
         await self._save_index()
         logger.info("Índice semántico limpiado")
     
@@ -237,27 +301,293 @@ class EmbeddingService:
         """
         total_docs = len(self.document_map)
         index_size = self.index.ntotal if self.index else 0
+        rebuild_in_progress = self._rebuild_task is not None and not self._rebuild_task.done()
         
         return {
             'total_documents': total_docs,
             'index_size': index_size,
             'model_name': self.model_name,
             'is_initialized': self.is_initialized,
-            'storage_path': self.storage_path
+            'storage_path': self.storage_path,
+            'pending_wal_entries': self.wal_entries,
+            'index_type': index_kind(self.index) if self.index is not None else None,
+            'configured_index_type': self.index_config.index_type,
+            'tombstones': len(self.tombstones),
+            'tombstone_ratio': self._tombstone_ratio(),
+            'rebuild_in_progress': rebuild_in_progress,
+            'rebuilds_completed': self.rebuilds_completed,
+            'batching': self.batcher.get_stats(),
+            'cache': self.cache.get_stats()
         }
     
+    def _create_index(self, dimension: int, training_vectors: Optional[np.ndarray] = None):
+        """
+        Crea un índice FAISS con IDs explícitos
+        
+        Args:
+            dimension: Dimensión de los embeddings
+            training_vectors: Vectores para entrenar índices IVF (opcional)
+            
+        Returns:
+            Índice FAISS vacío
+        """
+        # Los IDs explícitos permiten resolver hits en O(1); los tipos IVF empiezan
+        # como flat hasta que hay vectores suficientes para entrenarlos
+        return create_index(self.index_config, dimension, training_vectors)
+    
+    def _needs_training_upgrade(self) -> bool:
+        """Indica si el índice flat provisional ya puede sustituirse por el IVF configurado"""
+        return (self.index_config.requires_training
+                and index_kind(self.index) == 'flat'
+                and len(self.id_to_doc) >= self.index_config.train_threshold)
+    
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        """Normaliza un embedding a norma unitaria en float32"""
+        embedding = np.asarray(embedding, dtype='float32')
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+    
+    def _add_vector(self, index_id: int, embedding_norm: np.ndarray):
+        """Añade un vector al índice activo y, si hay una reconstrucción en curso, a su log"""
+        self.index.add_with_ids(embedding_norm.reshape(1, -1), np.array([index_id], dtype='int64'))
+        if self._rebuild_log is not None:
+            self._rebuild_log.append((index_id, embedding_norm))
+    
+    def _tombstone(self, index_id: int):
+        """Marca un ID FAISS como muerto para que la búsqueda lo ignore"""
+        self.id_to_doc.pop(index_id, None)
+        self.tombstones.add(index_id)
+    
+    def _tombstone_ratio(self) -> float:
+        """Proporción de vectores del índice que ya no pertenecen a ningún documento"""
+        if self.index is None or self.index.ntotal == 0:
+            return 0.0
+        return len(self.tombstones) / self.index.ntotal
+    
+    def _search_live(self, query_embedding_norm: np.ndarray, top_k: int) -> List[Tuple[float, str]]:
+        """
+        Busca los top_k vectores vivos, saltando tombstones
+        
+        Args:
+            query_embedding_norm: Embedding de consulta normalizado
+            top_k: Número de resultados vivos deseados
+            
+        Returns:
+            Lista de tuplas (score, doc_id) ordenada por score
+        """
+        ntotal = self.index.ntotal
+        k = min(top_k * 2 if self.tombstones else top_k, ntotal)
+        query = query_embedding_norm.reshape(1, -1)
+        
+        while True:
+            scores, indices = self.index.search(query, k)
+            hits = []
+            for score, idx in zip(scores[0], indices[0]):
+                doc_id = self.id_to_doc.get(int(idx))
+                if doc_id:
+                    hits.append((score, doc_id))
+                    if len(hits) == top_k:
+                        return hits
+            if k >= ntotal:
+                return hits
+            k = min(k * 4, ntotal)
+    
+    def _maybe_schedule_rebuild(self):
+        """Lanza la reconstrucción en segundo plano si hay demasiados tombstones o toca entrenar"""
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+        if self.index is None:
+            return
+        needs_compaction = (self.index.ntotal >= self.min_rebuild_size
+                            and self._tombstone_ratio() >= self.tombstone_ratio_threshold)
+        if not needs_compaction and not self._needs_training_upgrade():
+            return
+        self._rebuild_task = asyncio.ensure_future(self._rebuild_index())
+    
+    async def compact_index(self, force: bool = False) -> bool:
+        """
+        Reconstruye el índice sin tombstones y espera a que termine
+        
+        Args:
+            force: Reconstruir aunque no se supere el umbral de tombstones
+            
+        Returns:
+            True si se reconstruyó el índice
+        """
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return await self._rebuild_task
+        if self.index is None or not self.tombstones:
+            return False
+        if not force and self._tombstone_ratio() < self.tombstone_ratio_threshold:
+            return False
+        self._rebuild_task = asyncio.ensure_future(self._rebuild_index())
+        return await self._rebuild_task
+    
+    async def _rebuild_index(self) -> bool:
+        """
+        Reconstruye el índice solo con vectores vivos fuera del hot path
+        
+        Las inserciones concurrentes se registran en _rebuild_log y se aplican
+        sobre el nuevo índice justo antes del intercambio. Los índices IVF ya
+        entrenados se clonan y purgan con remove_ids, sin reconstruir vectores
+        (IVF-PQ solo guarda códigos aproximados).
+        
+        Returns:
+            True si el nuevo índice sustituyó al anterior
+        """
+        generation = self._index_generation
+        dimension = self.index.d
+        active_kind = index_kind(self.index)
+        
+        # Copias en el hilo del event loop: FAISS no admite lecturas
+        # concurrentes con add_with_ids sobre el mismo índice
+        if active_kind in TRAINED_INDEX_TYPES:
+            if active_kind != self.index_config.index_type:
+                logger.warning(f"Índice {active_kind} en disco no coincide con el configurado "
+                               f"({self.index_config.index_type}); se conserva el existente")
+            snapshot = faiss.clone_index(self.index)
+            dead_ids = np.fromiter(self.tombstones, dtype='int64', count=len(self.tombstones))
+            
+            def build():
+                if len(dead_ids):
+                    snapshot.remove_ids(dead_ids)
+                return snapshot
+        else:
+            live_ids = np.fromiter(self.id_to_doc.keys(), dtype='int64', count=len(self.id_to_doc))
+            vectors = self.index.reconstruct_batch(live_ids) if len(live_ids) else None
+            
+            def build():
+                new_index = self._create_index(dimension, vectors)
+                if vectors is not None:
+                    new_index.add_with_ids(vectors, live_ids)
+                return new_index
+        
+        self._rebuild_log = []
+        
+        try:
+            loop = asyncio.get_event_loop()
+            new_index = await loop.run_in_executor(None, build)
+            
+            if generation != self._index_generation:
+                logger.info("Reconstrucción del índice descartada: el índice fue limpiado")
+                return False
+            
+            # Aplicar inserciones ocurridas durante la reconstrucción
+            for index_id, embedding_norm in self._rebuild_log:
+                new_index.add_with_ids(embedding_norm.reshape(1, -1), np.array([index_id], dtype='int64'))
+            present = set(index_ids(new_index).tolist())
+            
+            # Intercambio atómico desde el punto de vista del event loop
+            removed = self.index.ntotal - new_index.ntotal
+            self.index = new_index
+            self.tombstones = {index_id for index_id in self.tombstones if index_id in present}
+            self.rebuilds_completed += 1
+            logger.info(f"Índice semántico reconstruido ({index_kind(new_index)}): "
+                        f"{removed} vectores muertos eliminados")
+        except Exception as e:
+            logger.error(f"Error reconstruyendo índice semántico: {e}")
+            return False
+        finally:
+            self._rebuild_log = None
+        
+        await self._save_index()
+        return True
+    
+    def _append_wal(self, record: Tuple):
+        """
+        Añade una operación al write-ahead log
+        
+        Args:
+            record: Tupla ('add', doc_id, doc_entry, embedding) o ('remove', doc_id)
+        """
+        try:
+            payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(self.wal_path, 'ab') as f:
+                f.write(struct.pack('<I', len(payload)))
+                f.write(payload)
+            self.wal_entries += 1
+        except Exception as e:
+            logger.error(f"Error escribiendo WAL: {e}")
+    
+    def _replay_wal(self):
+        """
+        Aplica sobre el snapshot las operaciones pendientes del WAL
+        
+        Es idempotente: una caída entre la escritura del índice, la del mapeo y
+        el truncado del WAL deja operaciones ya incluidas en el snapshot. Como
+        los IDs nunca se reutilizan, un ID ya presente en el índice tiene el
+        mismo vector y solo se corrige el mapeo, sin añadirlo dos veces.
+        """
+        if not os.path.exists(self.wal_path):
+            return
+            
+        stored = set(index_ids(self.index).tolist()) if self.index is not None and self.index.ntotal else set()
+        replayed = 0
+        with open(self.wal_path, 'rb') as f:
+            while True:
+                header = f.read(4)
+                if len(header) < 4:
+                    break
+                (length,) = struct.unpack('<I', header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    # Registro truncado por una caída durante la escritura
+                    logger.warning("WAL truncado, se ignora el último registro")
+                    break
+                    
+                record = pickle.loads(payload)
+                if record[0] == 'add':
+                    _, doc_id, doc_entry, embedding = record
+                    if self.index is None:
+                        self.index = self._create_index(embedding.shape[0])
+                    index_id = doc_entry['index_id']
+                    previous = self.document_map.get(doc_id)
+                    if previous is not None and previous['index_id'] != index_id:
+                        self._tombstone(previous['index_id'])
+                    if index_id not in stored:
+                        self._add_vector(index_id, embedding)
+                        stored.add(index_id)
+                    self.document_map[doc_id] = doc_entry
+                    self.id_to_doc[index_id] = doc_id
+                    self.tombstones.discard(index_id)
+                    self.next_index_id = max(self.next_index_id, index_id + 1)
+                elif record[0] == 'remove':
+                    doc_data = self.document_map.pop(record[1], None)
+                    if doc_data is not None:
+                        self._tombstone(doc_data['index_id'])
+                replayed += 1
+                
+        self.wal_entries = replayed
+        if replayed:
+            logger.info(f"WAL de embeddings reproducido: {replayed} operaciones")
+    
+    async def _maybe_compact(self):
+        """Reescribe el snapshot completo cuando el WAL supera el intervalo de compactación"""
+        if self.wal_entries >= self.compaction_interval:
+            await self._save_index()
+    
     async def _save_index(self):
-        """Guarda el índice en disco"""
+        """Guarda un snapshot completo del índice en disco y trunca el WAL"""
         try:
             if self.index is not None:
-                # Guardar índice FAISS
-                index_path = os.path.join(self.storage_path, 'faiss_index.idx')
-                faiss.write_index(self.index, index_path)
+                # Guardar índice FAISS de forma atómica
+                tmp_index_path = self.index_path + '.tmp'
+                faiss.write_index(self.index, tmp_index_path)
+                os.replace(tmp_index_path, self.index_path)
+            elif os.path.exists(self.index_path):
+                os.remove(self.index_path)
                 
             # Guardar mapeo de documentos
-            map_path = os.path.join(self.storage_path, 'document_map.pkl')
-            with open(map_path, 'wb') as f:
+            tmp_map_path = self.map_path + '.tmp'
+            with open(tmp_map_path, 'wb') as f:
                 pickle.dump(self.document_map, f)
+            os.replace(tmp_map_path, self.map_path)
+            
+            # El snapshot ya contiene todas las operaciones del WAL
+            open(self.wal_path, 'wb').close()
+            self.wal_entries = 0
+            
+            self.cache.flush()
                 
         except Exception as e:
             logger.error(f"Error guardando índice: {e}")
@@ -266,15 +596,48 @@ class EmbeddingService:
         """Carga el índice desde disco"""
         try:
             # Cargar índice FAISS
-            index_path = os.path.join(self.storage_path, 'faiss_index.idx')
-            if os.path.exists(index_path):
-                self.index = faiss.read_index(index_path)
+            if os.path.exists(self.index_path):
+                self.index = faiss.read_index(self.index_path)
+                if not isinstance(self.index, (faiss.IndexIDMap2, faiss.IndexIVF)):
+                    self.index = self._wrap_legacy_index(self.index)
+                apply_search_params(self.index, self.index_config)
                 
             # Cargar mapeo de documentos
-            map_path = os.path.join(self.storage_path, 'document_map.pkl')
-            if os.path.exists(map_path):
-                with open(map_path, 'rb') as f:
+            if os.path.exists(self.map_path):
+                with open(self.map_path, 'rb') as f:
                     self.document_map = pickle.load(f)
+            
+            # Reconstruir mapeo inverso y siguiente ID libre
+            self.id_to_doc = {
+                doc_data['index_id']: doc_id 
+                for doc_id, doc_data in self.document_map.items()
+            }
+            self.tombstones = set()
+            if self.index is not None and self.index.ntotal > 0:
+                stored_ids = index_ids(self.index)
+                self.next_index_id = int(stored_ids.max()) + 1
+                # Vectores presentes en el índice sin documento asociado
+                self.tombstones = set(stored_ids.tolist()) - self.id_to_doc.keys()
+            
+            self._replay_wal()
+            self._maybe_schedule_rebuild()
                     
         except Exception as e:
-            logger.error(f"Error cargando índice: {e}")
\ No newline at end of file
+            logger.error(f"Error cargando índice: {e}")
+    
+    def _wrap_legacy_index(self, legacy_index):
+        """
+        Convierte un índice plano antiguo (posición = ID) a IndexIDMap2
+        
+        Args:
+            legacy_index: Índice FAISS sin mapeo de IDs
+            
+        Returns:
+            Índice equivalente con IDs explícitos
+        """
+        wrapped = self._create_index(legacy_index.d)
+        if legacy_index.ntotal > 0:
+            vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+            wrapped.add_with_ids(vectors, np.arange(legacy_index.ntotal, dtype='int64'))
+        logger.info(f"Índice FAISS antiguo migrado a IndexIDMap2 ({legacy_index.ntotal} vectores)")
+        return wrapped
@@ -3,18 +3,28 @@ Almacén de memoria episódica
 Gestiona experiencias específicas y eventos temporales
 """
 
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Set
 from datetime import datetime, timedelta
+from collections import OrderedDict, defaultdict
+import heapq
+import itertools
 import json
 import logging
+import re
+import sys
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-@dataclass
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def _tokens(text: str) -> Set[str]:
+    """Tokens en minúsculas usados por los índices invertidos"""
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+@dataclass(slots=True)
 class Episode:
-    """Representa un episodio en memoria"""
+    """Representa un episodio en memoria (con __slots__, sin __dict__ por instancia)"""
     id: str
     title: str
     description: str
@@ -38,6 +48,9 @@ class Episode:
             self.tags = []
         if self.tools_used is None:
             self.tools_used = []
+        # Tags y herramientas se repiten entre episodios: compartir una sola copia
+        self.tags = [sys.intern(tag) if isinstance(tag, str) else tag for tag in self.tags]
+        self.tools_used = [sys.intern(tool) if isinstance(tool, str) else tool for tool in self.tools_used]
         if self.metadata is None:
             self.metadata = {}
         
@@ -112,7 +125,21 @@ class EpisodicMemoryStore:
         """
         self.max_episodes = max_episodes
         self.episodes: Dict[str, Episode] = {}
-        self.episode_order: List[str] = []  # Orden cronológico
+        self.episode_order: "OrderedDict[str, None]" = OrderedDict()  # Orden cronológico
+        
+        # Índices secundarios
+        self.task_index: Dict[str, Set[str]] = defaultdict(set)  # task_id -> episode_ids
+        self.tag_index: Dict[str, Set[str]] = defaultdict(set)  # tag -> episode_ids
+        self.outcome_index: Dict[bool, Set[str]] = {True: set(), False: set()}
+        self.token_index: Dict[str, Set[str]] = defaultdict(set)  # token de título/descripción/tags
+        self.context_token_index: Dict[str, Set[str]] = defaultdict(set)  # token del contexto serializado
+        self.context_key_index: Dict[str, Set[str]] = defaultdict(set)  # clave de contexto -> episode_ids
+        self.failure_pattern_index: Dict[str, Set[str]] = defaultdict(set)
+        self._indexed_terms: Dict[str, Dict[str, Any]] = {}  # episode_id -> claves indexadas
+        
+        # Heap (importancia, timestamp) con borrado perezoso para la expulsión
+        self._eviction_heap: List[Tuple[int, datetime, int, str]] = []
+        self._heap_counter = itertools.count()
         
     def store_episode(self, episode: Episode):
         """
@@ -122,6 +149,10 @@ class EpisodicMemoryStore:
             episode: Episodio a almacenar
         """
         try:
+            # Un episodio re-almacenado sustituye al anterior
+            if episode.id in self.episodes:
+                self._remove_episode(episode.id)
+            
             # Aplicar límite de capacidad
             if len(self.episodes) >= self.max_episodes:
                 # Eliminar el episodio más antiguo con menor importancia
@@ -131,7 +162,8 @@ class EpisodicMemoryStore:
             
             # Almacenar episodio
             self.episodes[episode.id] = episode
-            self.episode_order.append(episode.id)
+            self.episode_order[episode.id] = None
+            self._index_episode(episode)
             
             logger.debug(f"Episodio {episode.id} almacenado en memoria episódica")
             
@@ -161,8 +193,8 @@ class EpisodicMemoryStore:
             Lista de episodios recientes
         """
         try:
-            recent_ids = self.episode_order[-limit:]
-            return [self.episodes[ep_id] for ep_id in reversed(recent_ids) if ep_id in self.episodes]
+            recent_ids = itertools.islice(reversed(self.episode_order), limit)
+            return [self.episodes[ep_id] for ep_id in recent_ids if ep_id in self.episodes]
             
         except Exception as e:
             logger.error(f"Error obteniendo episodios recientes: {e}")
@@ -185,26 +217,27 @@ class EpisodicMemoryStore:
             results = []
             query_lower = query.lower()
             
-            for episode in self.episodes.values():
-                # UPGRADE AI: Filtrar por task_id si se proporciona
-                if task_id is not None:
-                    episode_task_id = episode.context.get('task_id') if hasattr(episode, 'context') else None
-                    if episode_task_id != task_id:
-                        continue
-                
+            # Candidatos desde el índice invertido (cada token de la consulta por prefijo)
+            candidates = self._match_tokens(_tokens(query), self.token_index)
+            
+            # UPGRADE AI: Filtrar por task_id si se proporciona
+            if task_id is not None:
+                candidates = candidates & self.task_index.get(task_id, set()) if candidates is not None \
+                    else set(self.task_index.get(task_id, set()))
+            
+            if candidates is None:
+                candidates = self.episodes.keys()
+            
+            for episode_id in candidates:
+                episode = self.episodes[episode_id]
                 # Buscar en título, descripción y tags
                 if (query_lower in episode.title.lower() or 
                     query_lower in episode.description.lower() or
                     any(query_lower in tag.lower() for tag in episode.tags)):
                     results.append(episode)
-                    
-                    if len(results) >= limit:
-                        break
             
             # Ordenar por importancia y fecha
-            results.sort(key=lambda x: (x.importance, x.timestamp), reverse=True)
-            
-            return results
+            return heapq.nlargest(limit, results, key=lambda x: (x.importance, x.timestamp))
             
         except Exception as e:
             logger.error(f"Error buscando episodios: {e}")
@@ -224,16 +257,22 @@ class EpisodicMemoryStore:
         try:
             scored_episodes = []
             
-            for episode in self.episodes.values():
+            # Sin claves comunes la similitud es 0: solo se evalúan episodios que comparten alguna
+            candidate_ids = set()
+            for key in context:
+                candidate_ids.update(self.context_key_index.get(key, ()))
+            
+            for episode_id in candidate_ids:
+                episode = self.episodes[episode_id]
                 similarity_score = self._calculate_context_similarity(context, episode.context)
                 
                 if similarity_score > 0.3:  # Umbral de similitud
                     scored_episodes.append((episode, similarity_score))
             
             # Ordenar por similitud
-            scored_episodes.sort(key=lambda x: x[1], reverse=True)
+            scored_episodes = heapq.nlargest(limit, scored_episodes, key=lambda x: x[1])
             
-            return [episode for episode, _ in scored_episodes[:limit]]
+            return [episode for episode, _ in scored_episodes]
             
         except Exception as e:
             logger.error(f"Error encontrando episodios similares: {e}")
@@ -251,20 +290,30 @@ class EpisodicMemoryStore:
             Lista de episodios exitosos
         """
         try:
-            successful_episodes = [ep for ep in self.episodes.values() if ep.success]
+            successful_ids = self.outcome_index[True]
             
             if context_keywords:
-                filtered_episodes = []
-                for episode in successful_episodes:
-                    context_str = json.dumps(episode.context).lower()
+                # Unión de candidatos por palabra clave, verificados sobre el contexto
+                candidate_ids = set()
+                for keyword in context_keywords:
+                    matched = self._match_tokens(_tokens(keyword), self.context_token_index)
+                    if matched is None:
+                        # Palabra clave sin tokens (solo puntuación): se verifican todos
+                        candidate_ids = set(successful_ids)
+                        break
+                    candidate_ids |= matched
+                
+                successful_episodes = []
+                for episode_id in candidate_ids & successful_ids:
+                    episode = self.episodes[episode_id]
+                    context_str = json.dumps(episode.context, default=str).lower()
                     if any(keyword.lower() in context_str for keyword in context_keywords):
-                        filtered_episodes.append(episode)
-                successful_episodes = filtered_episodes
+                        successful_episodes.append(episode)
+            else:
+                successful_episodes = (self.episodes[episode_id] for episode_id in successful_ids)
             
             # Ordenar por importancia y fecha
-            successful_episodes.sort(key=lambda x: (x.importance, x.timestamp), reverse=True)
-            
-            return successful_episodes[:limit]
+            return heapq.nlargest(limit, successful_episodes, key=lambda x: (x.importance, x.timestamp))
             
         except Exception as e:
             logger.error(f"Error obteniendo episodios exitosos: {e}")
@@ -281,39 +330,27 @@ class EpisodicMemoryStore:
             Lista de patrones de fallo
         """
         try:
-            failed_episodes = [ep for ep in self.episodes.values() if not ep.success]
-            
-            # Agrupar por patrones comunes
-            failure_patterns = {}
-            
-            for episode in failed_episodes:
-                # Extraer características del contexto
-                context_keys = set(episode.context.keys())
-                actions_taken = [action.get('type', 'unknown') for action in episode.actions]
-                
-                pattern_key = f"{sorted(context_keys)}_{sorted(actions_taken)}"
-                
-                if pattern_key not in failure_patterns:
-                    failure_patterns[pattern_key] = {
-                        'pattern': {
-                            'context_keys': list(context_keys),
-                            'actions': actions_taken
-                        },
-                        'episodes': [],
-                        'frequency': 0
-                    }
-                
-                failure_patterns[pattern_key]['episodes'].append(episode)
-                failure_patterns[pattern_key]['frequency'] += 1
-            
-            # Ordenar por frecuencia
-            sorted_patterns = sorted(
-                failure_patterns.values(),
-                key=lambda x: x['frequency'],
-                reverse=True
+            # Los episodios fallidos ya están agrupados por patrón al almacenarse
+            top_patterns = heapq.nlargest(
+                limit,
+                (episode_ids for episode_ids in self.failure_pattern_index.values() if episode_ids),
+                key=len
             )
             
-            return sorted_patterns[:limit]
+            sorted_patterns = []
+            for episode_ids in top_patterns:
+                episodes = [self.episodes[episode_id] for episode_id in episode_ids]
+                sample = episodes[0]
+                sorted_patterns.append({
+                    'pattern': {
+                        'context_keys': list(sample.context.keys()),
+                        'actions': [action.get('type', 'unknown') for action in sample.actions]
+                    },
+                    'episodes': episodes,
+                    'frequency': len(episodes)
+                })
+            
+            return sorted_patterns
             
         except Exception as e:
             logger.error(f"Error analizando patrones de fallo: {e}")
@@ -350,7 +387,7 @@ class EpisodicMemoryStore:
             Diccionario con estadísticas
         """
         total_episodes = len(self.episodes)
-        successful_episodes = sum(1 for ep in self.episodes.values() if ep.success)
+        successful_episodes = len(self.outcome_index[True])
         
         if total_episodes > 0:
             success_rate = successful_episodes / total_episodes
@@ -422,16 +459,22 @@ class EpisodicMemoryStore:
         Returns:
             ID del episodio menos importante
         """
-        if not self.episodes:
-            return None
-            
         # Encontrar el episodio con menor importancia y más antiguo
-        least_important = min(
-            self.episodes.items(),
-            key=lambda x: (x[1].importance, x[1].timestamp)
-        )
+        while self._eviction_heap:
+            importance, timestamp, _, episode_id = self._eviction_heap[0]
+            episode = self.episodes.get(episode_id)
+            if episode is None:
+                # Entrada obsoleta de un episodio ya eliminado
+                heapq.heappop(self._eviction_heap)
+                continue
+            if (episode.importance, episode.timestamp) != (importance, timestamp):
+                # La importancia cambió tras almacenarse: reinsertar con la clave actual
+                heapq.heapreplace(self._eviction_heap, (episode.importance, episode.timestamp,
+                                                        next(self._heap_counter), episode_id))
+                continue
+            return episode_id
         
-        return least_important[0]
+        return None
     
     def _remove_episode(self, episode_id: str):
         """
@@ -442,6 +485,142 @@ class EpisodicMemoryStore:
         """
         if episode_id in self.episodes:
             del self.episodes[episode_id]
+            self._unindex_episode(episode_id)
             
-        if episode_id in self.episode_order:
-            self.episode_order.remove(episode_id)
\ No newline at end of file
+        self.episode_order.pop(episode_id, None)
+    
+    def reindex_episode(self, episode_id: str):
+        """
+        Actualiza los índices tras modificar un episodio en sitio
+        
+        Args:
+            episode_id: ID del episodio modificado
+        """
+        episode = self.episodes.get(episode_id)
+        if episode is not None:
+            self._unindex_episode(episode_id)
+            self._index_episode(episode)
+    
+    def _index_episode(self, episode: Episode):
+        """
+        Registra un episodio en los índices secundarios
+        
+        Args:
+            episode: Episodio a indexar
+        """
+        context = episode.context or {}
+        tokens = _tokens(f"{episode.title} {episode.description} {' '.join(episode.tags)}")
+        context_tokens = _tokens(json.dumps(context, default=str))
+        task_id = context.get('task_id')
+        tags = {tag.lower() for tag in episode.tags}
+        failure_pattern = None if episode.success else self._failure_pattern_key(episode)
+        
+        if task_id is not None:
+            self.task_index[task_id].add(episode.id)
+        for tag in tags:
+            self.tag_index[tag].add(episode.id)
+        self.outcome_index[bool(episode.success)].add(episode.id)
+        self._add_postings(episode.id, tokens, self.token_index)
+        self._add_postings(episode.id, context_tokens, self.context_token_index)
+        for key in context:
+            self.context_key_index[key].add(episode.id)
+        if failure_pattern is not None:
+            self.failure_pattern_index[failure_pattern].add(episode.id)
+        
+        # Guardar lo indexado: el episodio puede mutar antes de eliminarse
+        self._indexed_terms[episode.id] = {
+            'task_id': task_id,
+            'tags': tags,
+            'success': bool(episode.success),
+            'tokens': tokens,
+            'context_tokens': context_tokens,
+            'context_keys': list(context),
+            'failure_pattern': failure_pattern
+        }
+        
+        heapq.heappush(self._eviction_heap, (episode.importance, episode.timestamp,
+                                             next(self._heap_counter), episode.id))
+    
+    def _unindex_episode(self, episode_id: str):
+        """
+        Retira un episodio de los índices secundarios
+        
+        La entrada del heap se descarta de forma perezosa en la siguiente expulsión.
+        
+        Args:
+            episode_id: ID del episodio
+        """
+        terms = self._indexed_terms.pop(episode_id, None)
+        if terms is None:
+            return
+        
+        if terms['task_id'] is not None:
+            self._discard(self.task_index, terms['task_id'], episode_id)
+        for tag in terms['tags']:
+            self._discard(self.tag_index, tag, episode_id)
+        self.outcome_index[terms['success']].discard(episode_id)
+        self._remove_postings(episode_id, terms['tokens'], self.token_index)
+        self._remove_postings(episode_id, terms['context_tokens'], self.context_token_index)
+        for key in terms['context_keys']:
+            self._discard(self.context_key_index, key, episode_id)
+        if terms['failure_pattern'] is not None:
+            self._discard(self.failure_pattern_index, terms['failure_pattern'], episode_id)
+    
+    @staticmethod
+    def _failure_pattern_key(episode: Episode) -> str:
+        """Clave de agrupación de fallos: claves de contexto y tipos de acción"""
+        actions_taken = [action.get('type', 'unknown') for action in episode.actions]
+        return f"{sorted(episode.context.keys())}_{sorted(actions_taken)}"
+    
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, episode_id: str):
+        """Elimina un ID de una entrada del índice, borrando la entrada si queda vacía"""
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(episode_id)
+            if not ids:
+                del index[key]
+    
+    @staticmethod
+    def _add_postings(episode_id: str, tokens: Set[str], index: Dict[str, Set[str]]):
+        """Añade tokens al índice invertido"""
+        for token in tokens:
+            index[token].add(episode_id)
+    
+    @classmethod
+    def _remove_postings(cls, episode_id: str, tokens: Set[str], index: Dict[str, Set[str]]):
+        """Retira tokens del índice invertido; los que quedan sin episodios desaparecen"""
+        for token in tokens:
+            cls._discard(index, token, episode_id)
+    
+    @staticmethod
+    def _match_tokens(query_tokens: Set[str], index: Dict[str, Set[str]]) -> Optional[Set[str]]:
+        """
+        Intersección de episodios que contienen cada token de la consulta dentro de una palabra
+        
+        La verificación posterior busca la consulta como subcadena, así que un token
+        puede caer a mitad de palabra ("rror" en "error") y no basta con buscarlo
+        como clave. Se recorren las claves del índice, que son el vocabulario
+        (mucho menor que el texto de todos los episodios).
+        
+        Args:
+            query_tokens: Tokens de la consulta
+            index: Índice invertido
+            
+        Returns:
+            Set de episode_ids candidatos, o None si la consulta no tiene tokens
+        """
+        if not query_tokens:
+            return None
+        
+        candidates = None
+        for query_token in query_tokens:
+            matched = set()
+            for word, episode_ids in index.items():
+                if query_token in word:
+                    matched |= episode_ids
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return set()
+        
+        return candidates
\ No newline at end of file
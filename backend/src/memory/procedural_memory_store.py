@@ -7,12 +7,17 @@ from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import json
 import logging
+import sys
 from dataclasses import dataclass
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+def _intern(value):
+    """Interna cadenas repetidas (categorías, herramientas, estrategias) para compartir memoria"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+@dataclass(slots=True)
 class Procedure:
     """Representa un procedimiento aprendido"""
     id: str
@@ -34,6 +39,7 @@ class Procedure:
             self.created_at = datetime.now()
         if self.metadata is None:
             self.metadata = {}
+        self.category = _intern(self.category)
         
         # Auto-generar ID si no se proporciona
         if not self.id:
@@ -47,7 +53,7 @@ class Procedure:
         if 'category' not in self.context_conditions:
             self.context_conditions['category'] = self.category
 
-@dataclass
+@dataclass(slots=True)
 class ToolStrategy:
     """Representa una estrategia de uso de herramientas"""
     id: str
@@ -63,6 +69,8 @@ class ToolStrategy:
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
+        self.tool_name = _intern(self.tool_name)
+        self.strategy_name = _intern(self.strategy_name)
 
 class ProceduralMemoryStore:
     """Almacén de memoria procedimental para habilidades y procedimientos"""
@@ -10,20 +10,31 @@ import re
 import logging
 from datetime import datetime
 
+from .bm25_index import BM25Index
+
 logger = logging.getLogger(__name__)
 
+STOP_WORDS = frozenset({
+    'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo',
+    'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las',
+    'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it', 'for',
+    'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at', 'this', 'but', 'his', 'by'
+})
+
 class SemanticIndexer:
     """Indexador semántico para búsqueda eficiente"""
     
-    def __init__(self, embedding_service=None):
+    def __init__(self, embedding_service=None, rrf_k: int = 60):
         """
         Inicializa el indexador semántico
         
         Args:
             embedding_service: Servicio de embeddings para búsqueda semántica
+            rrf_k: Constante de Reciprocal Rank Fusion para búsqueda híbrida
         """
         self.embedding_service = embedding_service
-        self.keyword_index: Dict[str, Set[str]] = defaultdict(set)  # palabra -> doc_ids
+        self.keyword_index = BM25Index()  # índice invertido término -> {doc_id: tf}
+        self.rrf_k = rrf_k
         self.document_metadata: Dict[str, Dict[str, Any]] = {}
         self.category_index: Dict[str, Set[str]] = defaultdict(set)  # categoría -> doc_ids
         self.temporal_index: Dict[str, List[str]] = defaultdict(list)  # fecha -> doc_ids
@@ -63,17 +74,15 @@ class SemanticIndexer:
                 'word_count': len(content.split())
             }
             
-            # Indexación por palabras clave
-            keywords = self._extract_keywords(content)
-            for keyword in keywords:
-                self.keyword_index[keyword].add(doc_id)
+            # Indexación por palabras clave (BM25)
+            self.keyword_index.add(doc_id, self._tokenize(content))
             
             # Indexación por categoría
             category = metadata.get('category', 'general')
             self.category_index[category].add(doc_id)
             
             # Indexación temporal
-            date_key = datetime.now().strftime('%Y-%m-%d')
+            date_key = self.document_metadata[doc_id]['indexed_at'].strftime('%Y-%m-%d')
             self.temporal_index[date_key].append(doc_id)
             
             # Indexación semántica si está disponible
@@ -177,7 +186,7 @@ class SemanticIndexer:
                 'id': result['document_id'],
                 'content': result['content'],
                 'metadata': result['metadata'],
-                'similarity': result['score']
+                'similarity': result.get('raw_scores', {}).get('semantic', result['score'])
             })
         
         return formatted_results
@@ -191,19 +200,17 @@ class SemanticIndexer:
         """
         try:
             # Eliminar de metadatos
-            if doc_id in self.document_metadata:
-                del self.document_metadata[doc_id]
+            metadata = self.document_metadata.pop(doc_id, None)
             
             # Eliminar de índice de palabras clave
-            for keyword_set in self.keyword_index.values():
-                keyword_set.discard(doc_id)
+            self.keyword_index.remove(doc_id)
             
-            # Eliminar de índice de categorías
-            for category_set in self.category_index.values():
-                category_set.discard(doc_id)
-            
-            # Eliminar de índice temporal
-            for doc_list in self.temporal_index.values():
+            if metadata is not None:
+                # Eliminar de índice de categorías
+                self.category_index[metadata.get('category', 'general')].discard(doc_id)
+                
+                # Eliminar de índice temporal
+                doc_list = self.temporal_index.get(metadata['indexed_at'].strftime('%Y-%m-%d'), [])
                 if doc_id in doc_list:
                     doc_list.remove(doc_id)
             
@@ -225,7 +232,7 @@ class SemanticIndexer:
         """
         try:
             total_docs = len(self.document_metadata)
-            total_keywords = len(self.keyword_index)
+            total_keywords = len(self.keyword_index.postings)
             
             # Distribución por categorías
             category_distribution = {
@@ -242,7 +249,7 @@ class SemanticIndexer:
             # Palabras clave más comunes
             keyword_frequency = {
                 keyword: len(doc_ids) 
-                for keyword, doc_ids in self.keyword_index.items()
+                for keyword, doc_ids in self.keyword_index.postings.items()
             }
             
             top_keywords = sorted(keyword_frequency.items(), key=lambda x: x[1], reverse=True)[:10]
@@ -277,29 +284,29 @@ class SemanticIndexer:
         Returns:
             Set de palabras clave
         """
+        return set(self._tokenize(text))
+    
+    def _tokenize(self, text: str) -> List[str]:
+        """
+        Tokeniza el texto conservando repeticiones para las frecuencias de término
+        
+        Args:
+            text: Texto a procesar
+            
+        Returns:
+            Lista de términos
+        """
         try:
             # Limpiar y tokenizar
             text = re.sub(r'[^\w\s]', ' ', text.lower())
             words = text.split()
             
             # Filtrar palabras vacías y muy cortas
-            stop_words = {
-                'el', 'la', 'de', 'que', 'y', 'a', 'en', 'un', 'es', 'se', 'no', 'te', 'lo',
-                'le', 'da', 'su', 'por', 'son', 'con', 'para', 'al', 'del', 'los', 'las',
-                'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it', 'for',
-                'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at', 'this', 'but', 'his', 'by'
-            }
-            
-            keywords = set()
-            for word in words:
-                if len(word) > 2 and word not in stop_words:
-                    keywords.add(word)
-            
-            return keywords
+            return [word for word in words if len(word) > 2 and word not in STOP_WORDS]
             
         except Exception as e:
             logger.error(f"Error extrayendo palabras clave: {e}")
-            return set()
+            return []
     
     async def _keyword_search(self, query: str, limit: int) -> List[Dict[str, Any]]:
         """
@@ -313,37 +320,22 @@ class SemanticIndexer:
             Lista de resultados
         """
         try:
-            query_keywords = self._extract_keywords(query)
-            
-            # Contar coincidencias por documento
-            doc_scores = defaultdict(float)
-            
-            for keyword in query_keywords:
-                if keyword in self.keyword_index:
-                    for doc_id in self.keyword_index[keyword]:
-                        doc_scores[doc_id] += 1.0
-            
-            # Normalizar scores
-            for doc_id in doc_scores:
-                doc_scores[doc_id] /= len(query_keywords)
+            # BM25 con poda top-k
+            ranked = self.keyword_index.search(self._tokenize(query), limit)
             
             # Crear resultados
             results = []
-            for doc_id, score in doc_scores.items():
-                if doc_id in self.document_metadata:
-                    metadata = self.document_metadata[doc_id]
-                    results.append({
-                        'document_id': doc_id,
-                        'content': metadata['content'],
-                        'metadata': metadata,
-                        'score': score,
-                        'search_type': 'keyword'
-                    })
+            for doc_id, score in ranked:
+                metadata = self.document_metadata[doc_id]
+                results.append({
+                    'document_id': doc_id,
+                    'content': metadata['content'],
+                    'metadata': metadata,
+                    'score': score,
+                    'search_type': 'keyword'
+                })
             
-            # Ordenar por score
-            results.sort(key=lambda x: x['score'], reverse=True)
-            
-            return results[:limit]
+            return results
             
         except Exception as e:
             logger.error(f"Error en búsqueda por palabras clave: {e}")
@@ -351,7 +343,13 @@ class SemanticIndexer:
     
     def _merge_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Fusiona resultados de diferentes tipos de búsqueda
+        Fusiona resultados de diferentes tipos de búsqueda con Reciprocal Rank Fusion
+        
+        Cada lista llega ordenada por su propio score (BM25 o coseno), que no son
+        comparables entre sí; RRF solo usa la posición: score = sum(1 / (rrf_k + rank)).
+        El score es siempre el de RRF, también con un solo tipo de búsqueda, para
+        que no cambie de escala según las búsquedas ejecutadas; los scores
+        originales quedan en `raw_scores` por tipo de búsqueda.
         
         Args:
             results: Lista de resultados
@@ -362,30 +360,24 @@ class SemanticIndexer:
         try:
             # Agrupar por documento
             doc_results = defaultdict(list)
+            ranks = defaultdict(int)
+            fused_scores = defaultdict(float)
+            raw_scores = defaultdict(dict)
             for result in results:
                 doc_id = result['document_id']
+                search_type = result['search_type']
+                ranks[search_type] += 1
+                fused_scores[doc_id] += 1.0 / (self.rrf_k + ranks[search_type])
+                raw_scores[doc_id][search_type] = result['score']
                 doc_results[doc_id].append(result)
             
             # Fusionar scores
             merged_results = []
             for doc_id, doc_result_list in doc_results.items():
-                # Combinar scores (promedio ponderado)
-                total_score = 0
-                total_weight = 0
-                
-                for result in doc_result_list:
-                    weight = 1.0
-                    if result['search_type'] == 'semantic':
-                        weight = 1.2  # Dar más peso a búsqueda semántica
-                    
-                    total_score += result['score'] * weight
-                    total_weight += weight
-                
-                final_score = total_score / total_weight if total_weight > 0 else 0
-                
                 # Usar el primer resultado como base
                 merged_result = doc_result_list[0].copy()
-                merged_result['score'] = final_score
+                merged_result['score'] = fused_scores[doc_id]
+                merged_result['raw_scores'] = raw_scores[doc_id]
                 merged_result['search_types'] = [r['search_type'] for r in doc_result_list]
                 
                 merged_results.append(merged_result)
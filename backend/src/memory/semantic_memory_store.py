@@ -5,14 +5,21 @@ Gestiona conocimiento general, hechos y relaciones conceptuales
 
 from typing import Dict, List, Any, Optional, Set, Tuple
 from datetime import datetime
+import heapq
+import itertools
 import json
 import logging
+import sys
 from dataclasses import dataclass
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+def _intern(value):
+    """Interna cadenas repetidas (categorías, sujetos, predicados) para compartir memoria"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+@dataclass(slots=True)
 class SemanticConcept:
     """Representa un concepto semántico"""
     id: str
@@ -33,12 +40,14 @@ class SemanticConcept:
             self.updated_at = datetime.now()
         if self.metadata is None:
             self.metadata = {}
+        self.name = _intern(self.name)
+        self.category = _intern(self.category)
         
         # Auto-generar ID si no se proporciona
         if not self.id:
             self.id = f"concept_{datetime.now().timestamp()}"
 
-@dataclass
+@dataclass(slots=True)
 class SemanticFact:
     """Representa un hecho semántico"""
     id: str
@@ -54,6 +63,10 @@ class SemanticFact:
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
+        self.subject = _intern(self.subject)
+        self.predicate = _intern(self.predicate)
+        self.object = _intern(self.object)
+        self.source = _intern(self.source)
 
 class SemanticMemoryStore:
     """Almacén de memoria semántica para conocimiento general"""
@@ -71,7 +84,17 @@ class SemanticMemoryStore:
         self.concepts: Dict[str, SemanticConcept] = {}
         self.facts: Dict[str, SemanticFact] = {}
         self.concept_index: Dict[str, Set[str]] = defaultdict(set)  # índice por categoría
-        self.fact_index: Dict[str, Set[str]] = defaultdict(set)  # índice por sujeto
+        self.reverse_relations: Dict[str, Dict[str, Set[str]]] = {}  # destino -> tipo -> orígenes
+        
+        # Índices de triples (claves en minúsculas): sujeto->predicado->objeto y rotaciones
+        self.spo_index: Dict[str, Dict[str, Set[str]]] = {}  # sujeto -> predicado -> fact_ids
+        self.pos_index: Dict[str, Dict[str, Set[str]]] = {}  # predicado -> objeto -> fact_ids
+        self.osp_index: Dict[str, Dict[str, Set[str]]] = {}  # objeto -> sujeto -> fact_ids
+        
+        # Heaps de confianza con borrado perezoso para la expulsión por capacidad
+        self._concept_heap: List[Tuple[float, int, str]] = []
+        self._fact_heap: List[Tuple[float, int, str]] = []
+        self._heap_counter = itertools.count()
         
     def store_concept(self, concept: SemanticConcept):
         """
@@ -81,21 +104,21 @@ class SemanticMemoryStore:
             concept: Concepto a almacenar
         """
         try:
-            # Aplicar límite de capacidad
-            if len(self.concepts) >= self.max_concepts:
-                self._remove_least_confident_concept()
-            
             # Actualizar si ya existe
             if concept.id in self.concepts:
                 existing_concept = self.concepts[concept.id]
                 concept.created_at = existing_concept.created_at
                 concept.updated_at = datetime.now()
+                self._unindex_concept(existing_concept)
+            elif len(self.concepts) >= self.max_concepts:
+                # Aplicar límite de capacidad
+                self._remove_least_confident_concept()
             
             # Almacenar concepto
             self.concepts[concept.id] = concept
             
             # Actualizar índices
-            self.concept_index[concept.category].add(concept.id)
+            self._index_concept(concept)
             
             logger.debug(f"Concepto {concept.id} almacenado en memoria semántica")
             
@@ -110,15 +133,17 @@ class SemanticMemoryStore:
             fact: Hecho a almacenar
         """
         try:
-            # Aplicar límite de capacidad
-            if len(self.facts) >= self.max_facts:
+            if fact.id in self.facts:
+                self._unindex_fact(self.facts[fact.id])
+            elif len(self.facts) >= self.max_facts:
+                # Aplicar límite de capacidad
                 self._remove_least_confident_fact()
             
             # Almacenar hecho
             self.facts[fact.id] = fact
             
             # Actualizar índices
-            self.fact_index[fact.subject].add(fact.id)
+            self._index_fact(fact)
             
             logger.debug(f"Hecho {fact.id} almacenado en memoria semántica")
             
@@ -204,12 +229,9 @@ class SemanticMemoryStore:
         """
         try:
             results = []
-            
-            # Filtrar por sujeto si se especifica
-            facts_to_search = self.facts.values()
-            if subject:
-                fact_ids = self.fact_index.get(subject, set())
-                facts_to_search = [self.facts[fid] for fid in fact_ids]
+            candidate_ids = self._match_fact_ids(subject, predicate, object)
+            facts_to_search = (self.facts.values() if candidate_ids is None
+                               else (self.facts[fid] for fid in candidate_ids))
             
             for fact in facts_to_search:
                 match = True
@@ -224,17 +246,68 @@ class SemanticMemoryStore:
                 
                 if match:
                     results.append(fact)
-                    
-                    if len(results) >= limit:
-                        break
             
             # Ordenar por confianza
-            results.sort(key=lambda x: x.confidence, reverse=True)
+            return heapq.nlargest(limit, results, key=lambda x: x.confidence)
+            
+        except Exception as e:
+            logger.error(f"Error buscando hechos: {e}")
+            return []
+    
+    def traverse(self, start: str, predicate: str = None, max_depth: int = 2,
+                 max_fanout: int = 10, max_results: int = 100) -> List[Dict[str, Any]]:
+        """
+        Recorre el grafo de hechos desde un sujeto siguiendo sujeto -> objeto
+        
+        Búsqueda en anchura acotada: en cada nodo solo se siguen los max_fanout
+        hechos de mayor confianza y nunca se revisita un nodo.
+        
+        Args:
+            start: Sujeto inicial
+            predicate: Predicado a seguir (opcional, exacto)
+            max_depth: Número máximo de saltos
+            max_fanout: Hechos seguidos por nodo
+            max_results: Caminos máximos devueltos
+            
+        Returns:
+            Lista de caminos con 'object', 'depth', 'facts' y 'confidence'
+        """
+        try:
+            results = []
+            start_key = start.lower()
+            predicate_key = predicate.lower() if predicate else None
+            visited = {start_key}
+            frontier = [(start_key, [], 1.0)]
+            
+            for depth in range(1, max_depth + 1):
+                next_frontier = []
+                for node, path, confidence in frontier:
+                    outgoing = self._outgoing_facts(node, predicate_key)
+                    for fact in heapq.nlargest(max_fanout, outgoing, key=lambda f: f.confidence):
+                        target = fact.object.lower()
+                        if target in visited:
+                            continue
+                        visited.add(target)
+                        
+                        fact_path = path + [fact.id]
+                        path_confidence = confidence * fact.confidence
+                        results.append({
+                            'object': fact.object,
+                            'depth': depth,
+                            'facts': fact_path,
+                            'confidence': path_confidence
+                        })
+                        if len(results) >= max_results:
+                            return results
+                        next_frontier.append((target, fact_path, path_confidence))
+                frontier = next_frontier
+                if not frontier:
+                    break
             
             return results
             
         except Exception as e:
-            logger.error(f"Error buscando hechos: {e}")
+            logger.error(f"Error recorriendo grafo semántico desde {start}: {e}")
             return []
     
     def get_related_concepts(self, concept_id: str, relation_type: str = None, limit: int = 10) -> List[SemanticConcept]:
@@ -264,11 +337,10 @@ class SemanticMemoryStore:
                             related_concepts.append(self.concepts[related_id])
             
             # Buscar en relaciones inversas
-            for other_concept in self.concepts.values():
-                for rel_type, related_ids in other_concept.relations.items():
-                    if concept_id in related_ids:
-                        if relation_type is None or rel_type == relation_type:
-                            related_concepts.append(other_concept)
+            for rel_type, source_ids in self.reverse_relations.get(concept_id, {}).items():
+                if relation_type is None or rel_type == relation_type:
+                    related_concepts.extend(self.concepts[source_id] for source_id in source_ids
+                                            if source_id in self.concepts)
             
             # Eliminar duplicados y ordenar por confianza
             unique_concepts = list({c.id: c for c in related_concepts}.values())
@@ -294,18 +366,19 @@ class SemanticMemoryStore:
             inferences = []
             query_lower = query.lower()
             
-            # Buscar hechos relacionados
-            related_facts = []
-            for fact in self.facts.values():
-                if (query_lower in fact.subject.lower() or 
-                    query_lower in fact.predicate.lower() or 
-                    query_lower in fact.object.lower()):
-                    related_facts.append(fact)
+            # Buscar hechos relacionados recorriendo solo las claves distintas de cada índice
+            related_ids = set()
+            for index in (self.spo_index, self.pos_index, self.osp_index):
+                for key, nested in index.items():
+                    if query_lower in key:
+                        for fact_ids in nested.values():
+                            related_ids.update(fact_ids)
+            related_facts = [self.facts[fid] for fid in related_ids]
             
-            # Inferencia simple: transitividad
+            # Inferencia simple: transitividad (un salto por el mismo predicado)
             for fact1 in related_facts:
-                for fact2 in related_facts:
-                    if fact1.object == fact2.subject and fact1.predicate == fact2.predicate:
+                for fact2 in self._outgoing_facts(fact1.object.lower(), fact1.predicate.lower()):
+                    if fact2.id != fact1.id:
                         # Inferir relación transitiva
                         inferences.append({
                             'type': 'transitive',
@@ -338,6 +411,7 @@ class SemanticMemoryStore:
                 concept = self.concepts[concept_id]
                 concept.confidence = max(0.0, min(1.0, concept.confidence + confidence_delta))
                 concept.updated_at = datetime.now()
+                self._push_heap(self._concept_heap, self.concepts, concept_id, concept.confidence)
                 
         except Exception as e:
             logger.error(f"Error actualizando confianza del concepto {concept_id}: {e}")
@@ -354,6 +428,7 @@ class SemanticMemoryStore:
             if fact_id in self.facts:
                 fact = self.facts[fact_id]
                 fact.confidence = max(0.0, min(1.0, fact.confidence + confidence_delta))
+                self._push_heap(self._fact_heap, self.facts, fact_id, fact.confidence)
                 
         except Exception as e:
             logger.error(f"Error actualizando confianza del hecho {fact_id}: {e}")
@@ -391,7 +466,10 @@ class SemanticMemoryStore:
                 'top_subjects': dict(sorted(facts_by_subject.items(), key=lambda x: x[1], reverse=True)[:10]),
                 'average_concept_confidence': avg_concept_confidence,
                 'average_fact_confidence': avg_fact_confidence,
-                'verified_facts': sum(1 for f in self.facts.values() if f.verified)
+                'verified_facts': sum(1 for f in self.facts.values() if f.verified),
+                'distinct_subjects': len(self.spo_index),
+                'distinct_predicates': len(self.pos_index),
+                'distinct_objects': len(self.osp_index)
             }
             
         except Exception as e:
@@ -400,26 +478,159 @@ class SemanticMemoryStore:
     
     def _remove_least_confident_concept(self):
         """Elimina el concepto con menor confianza"""
-        if not self.concepts:
+        concept_id = self._pop_least_confident(self._concept_heap, self.concepts)
+        if concept_id is None:
             return
-            
-        least_confident = min(self.concepts.items(), key=lambda x: x[1].confidence)
-        concept_id = least_confident[0]
-        concept = least_confident[1]
         
         # Eliminar del almacén e índices
-        del self.concepts[concept_id]
-        self.concept_index[concept.category].discard(concept_id)
+        concept = self.concepts.pop(concept_id)
+        self._unindex_concept(concept)
     
     def _remove_least_confident_fact(self):
         """Elimina el hecho con menor confianza"""
-        if not self.facts:
+        fact_id = self._pop_least_confident(self._fact_heap, self.facts)
+        if fact_id is None:
             return
-            
-        least_confident = min(self.facts.items(), key=lambda x: x[1].confidence)
-        fact_id = least_confident[0]
-        fact = least_confident[1]
         
         # Eliminar del almacén e índices
-        del self.facts[fact_id]
-        self.fact_index[fact.subject].discard(fact_id)
\ No newline at end of file
+        fact = self.facts.pop(fact_id)
+        self._unindex_fact(fact)
+    
+    def _pop_least_confident(self, heap: List[Tuple[float, int, str]], items: Dict[str, Any]) -> Optional[str]:
+        """
+        Extrae del heap el ID vivo con menor confianza
+        
+        Las entradas de elementos eliminados o cuya confianza cambió se descartan
+        (cada cambio de confianza empuja una entrada nueva).
+        
+        Args:
+            heap: Heap de (confianza, secuencia, id)
+            items: Almacén de conceptos o hechos
+            
+        Returns:
+            ID a eliminar o None
+        """
+        while heap:
+            confidence, _, item_id = heapq.heappop(heap)
+            item = items.get(item_id)
+            if item is not None and item.confidence == confidence:
+                return item_id
+        
+        # Heap vacío pero con elementos (confianza modificada directamente): reconstruir
+        if items:
+            item_id = min(items.items(), key=lambda x: x[1].confidence)[0]
+            heap[:] = [(item.confidence, next(self._heap_counter), iid)
+                       for iid, item in items.items() if iid != item_id]
+            heapq.heapify(heap)
+            return item_id
+        return None
+    
+    def _push_heap(self, heap: List[Tuple[float, int, str]], items: Dict[str, Any], item_id: str,
+                   confidence: float):
+        """
+        Añade la confianza vigente de un elemento al heap de expulsión
+        
+        Cada actualización deja obsoleta la entrada anterior; cuando las obsoletas
+        superan el doble de los elementos vivos el heap se reconstruye desde cero.
+        """
+        heapq.heappush(heap, (confidence, next(self._heap_counter), item_id))
+        if len(heap) > 3 * len(items) + 64:
+            heap[:] = [(item.confidence, next(self._heap_counter), iid) for iid, item in items.items()]
+            heapq.heapify(heap)
+    
+    def _index_concept(self, concept: SemanticConcept):
+        """Registra un concepto en los índices de categoría, relaciones inversas y expulsión"""
+        self.concept_index[concept.category].add(concept.id)
+        for rel_type, related_ids in concept.relations.items():
+            for related_id in related_ids:
+                self.reverse_relations.setdefault(related_id, {}).setdefault(rel_type, set()).add(concept.id)
+        self._push_heap(self._concept_heap, self.concepts, concept.id, concept.confidence)
+    
+    def _unindex_concept(self, concept: SemanticConcept):
+        """Retira un concepto de los índices (la entrada del heap caduca sola)"""
+        self.concept_index[concept.category].discard(concept.id)
+        for rel_type, related_ids in concept.relations.items():
+            for related_id in related_ids:
+                self._discard_nested(self.reverse_relations, related_id, rel_type, concept.id)
+    
+    def _index_fact(self, fact: SemanticFact):
+        """Registra un hecho en los índices SPO/POS/OSP y en el heap de expulsión"""
+        s, p, o = self._fact_keys(fact)
+        self.spo_index.setdefault(s, {}).setdefault(p, set()).add(fact.id)
+        self.pos_index.setdefault(p, {}).setdefault(o, set()).add(fact.id)
+        self.osp_index.setdefault(o, {}).setdefault(s, set()).add(fact.id)
+        self._push_heap(self._fact_heap, self.facts, fact.id, fact.confidence)
+    
+    def _unindex_fact(self, fact: SemanticFact):
+        """Retira un hecho de los índices SPO/POS/OSP"""
+        s, p, o = self._fact_keys(fact)
+        self._discard_nested(self.spo_index, s, p, fact.id)
+        self._discard_nested(self.pos_index, p, o, fact.id)
+        self._discard_nested(self.osp_index, o, s, fact.id)
+    
+    @staticmethod
+    def _fact_keys(fact: SemanticFact) -> Tuple[str, str, str]:
+        return (sys.intern(fact.subject.lower()), sys.intern(fact.predicate.lower()),
+                sys.intern(fact.object.lower()))
+    
+    @staticmethod
+    def _discard_nested(index: Dict[str, Dict[str, Set[str]]], outer: str, inner: str, item_id: str):
+        """Elimina un ID de index[outer][inner] borrando niveles vacíos"""
+        nested = index.get(outer)
+        if nested is None:
+            return
+        ids = nested.get(inner)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del nested[inner]
+        if not nested:
+            del index[outer]
+    
+    def _outgoing_facts(self, subject_key: str, predicate_key: str = None) -> List[SemanticFact]:
+        """Hechos cuyo sujeto es subject_key, opcionalmente con un predicado exacto"""
+        by_predicate = self.spo_index.get(subject_key, {})
+        if predicate_key is not None:
+            fact_ids = by_predicate.get(predicate_key, ())
+        else:
+            fact_ids = itertools.chain.from_iterable(by_predicate.values())
+        return [self.facts[fid] for fid in fact_ids]
+    
+    def _match_fact_ids(self, subject: str = None, predicate: str = None,
+                        object: str = None) -> Optional[Set[str]]:
+        """
+        Candidatos para search_facts desde los índices de triples
+        
+        El sujeto se busca exacto; predicado y objeto por subcadena sobre las
+        claves distintas del índice, nunca sobre todos los hechos.
+        
+        Returns:
+            Set de fact_ids candidatos o None si no hay filtros
+        """
+        predicate_keys = None
+        if predicate:
+            predicate_lower = predicate.lower()
+            predicate_keys = {key for key in self.pos_index if predicate_lower in key}
+        object_keys = None
+        if object:
+            object_lower = object.lower()
+            object_keys = {key for key in self.osp_index if object_lower in key}
+        
+        candidate_ids = set()
+        if subject:
+            for p, fact_ids in self.spo_index.get(subject.lower(), {}).items():
+                if predicate_keys is None or p in predicate_keys:
+                    candidate_ids.update(fact_ids)
+        elif predicate_keys is not None:
+            for p in predicate_keys:
+                for o, fact_ids in self.pos_index[p].items():
+                    if object_keys is None or o in object_keys:
+                        candidate_ids.update(fact_ids)
+        elif object_keys is not None:
+            for o in object_keys:
+                for fact_ids in self.osp_index[o].values():
+                    candidate_ids.update(fact_ids)
+        else:
+            return None
+        
+        return candidate_ids
@@ -0,0 +1,175 @@
+"""
+Fábrica de índices FAISS para el servicio de embeddings
+Soporta búsqueda exacta (flat) y aproximada (IVF-Flat, HNSW, IVF-PQ)
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+import logging
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+TRAINED_INDEX_TYPES = ('ivf_flat', 'ivf_pq')
+
+# FAISS recomienda ~39 puntos de entrenamiento por centroide
+TRAINING_POINTS_PER_CENTROID = 39
+
+
+@dataclass
+class IndexConfig:
+    """Parámetros del índice vectorial"""
+    index_type: str = 'flat'
+    nlist: int = 256            # Listas invertidas (IVF)
+    nprobe: int = 16            # Listas visitadas por consulta (IVF)
+    hnsw_m: int = 32            # Vecinos por nodo (HNSW)
+    ef_construction: int = 80   # Amplitud de construcción (HNSW)
+    ef_search: int = 64         # Amplitud de búsqueda (HNSW)
+    pq_m: int = 48              # Subcuantizadores (IVF-PQ)
+    pq_bits: int = 8            # Bits por subcuantizador (IVF-PQ)
+    min_train_vectors: Optional[int] = None  # Umbral de entrenamiento explícito
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Tipo de índice no soportado: {self.index_type}. Opciones: {INDEX_TYPES}")
+        if self.min_train_vectors is not None and self.min_train_vectors < self.min_trainable_vectors:
+            # Por debajo del mínimo cada inserción lanzaría una reconstrucción que falla al
+            # entrenar, y mientras tanto tampoco se compactarían los tombstones
+            logger.warning(f"min_train_vectors={self.min_train_vectors} no basta para entrenar "
+                           f"{self.index_type}; se usa {self.min_trainable_vectors}")
+            self.min_train_vectors = self.min_trainable_vectors
+        if self.index_type == 'ivf_pq':
+            # Solo se guardan códigos PQ: no hay vectores exactos con los que reordenar
+            # los candidatos, y nprobe no recupera lo que pierde la cuantización
+            logger.warning(f"IVF-PQ (pq_m={self.pq_m}) devuelve puntuaciones aproximadas: en "
+                           f"benchmarks/ann_index_benchmark.py su recall@10 queda muy por debajo de "
+                           f"flat, ivf_flat y hnsw; úsalo solo si la memoria importa más que la precisión")
+
+    @property
+    def requires_training(self) -> bool:
+        return self.index_type in TRAINED_INDEX_TYPES
+
+    @property
+    def min_trainable_vectors(self) -> int:
+        """Vectores mínimos con los que FAISS puede entrenar el índice"""
+        # Las listas IVF se ajustan a los vectores disponibles (create_index), pero
+        # cada subcuantizador PQ necesita al menos tantos puntos como centroides
+        return 2 ** self.pq_bits if self.index_type == 'ivf_pq' else 1
+
+    @property
+    def train_threshold(self) -> int:
+        """Vectores vivos necesarios antes de entrenar el índice aproximado"""
+        if self.min_train_vectors is not None:
+            return self.min_train_vectors
+        centroids = self.nlist
+        if self.index_type == 'ivf_pq':
+            centroids = max(centroids, 2 ** self.pq_bits)
+        return centroids * TRAINING_POINTS_PER_CENTROID
+
+
+def create_index(config: IndexConfig, dimension: int, training_vectors: Optional[np.ndarray] = None):
+    """
+    Crea un índice FAISS con IDs explícitos
+
+    Flat y HNSW se envuelven en IndexIDMap2; los IVF almacenan los IDs en sus
+    listas invertidas y se devuelven sin envolver, porque IndexIDMap2.remove_ids
+    desalinea el mapeo con índices que no desplazan posiciones al eliminar.
+
+    Los tipos que requieren entrenamiento se degradan a flat mientras no haya
+    suficientes vectores; EmbeddingService los reconstruye al alcanzar el umbral.
+
+    Args:
+        config: Configuración del índice
+        dimension: Dimensión de los embeddings
+        training_vectors: Vectores normalizados para entrenar IVF (opcional)
+
+    Returns:
+        Índice FAISS vacío, entrenado si corresponde
+    """
+    index_type = config.index_type
+    if config.requires_training and (training_vectors is None or len(training_vectors) < config.train_threshold):
+        index_type = 'flat'
+
+    # Inner product sobre vectores normalizados = similitud coseno
+    if index_type == 'flat':
+        base = faiss.IndexFlatIP(dimension)
+    elif index_type == 'hnsw':
+        base = faiss.IndexHNSWFlat(dimension, config.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = config.ef_construction
+    else:
+        nlist = max(1, min(config.nlist, len(training_vectors) // TRAINING_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == 'ivf_flat':
+            base = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            base = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension, config.pq_m),
+                                    config.pq_bits, faiss.METRIC_INNER_PRODUCT)
+        base.train(np.ascontiguousarray(training_vectors, dtype='float32'))
+        logger.info(f"Índice {index_type} entrenado con {len(training_vectors)} vectores (nlist={nlist})")
+        apply_search_params(base, config)
+        return base
+
+    index = faiss.IndexIDMap2(base)
+    apply_search_params(index, config)
+    return index
+
+
+def index_ids(index) -> np.ndarray:
+    """
+    Devuelve todos los IDs almacenados en un índice de esta fábrica
+
+    Args:
+        index: Índice FAISS
+
+    Returns:
+        Array int64 con los IDs
+    """
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map)
+    invlists = faiss.extract_index_ivf(index).invlists
+    chunks = []
+    for list_no in range(invlists.nlist):
+        size = invlists.list_size(list_no)
+        if size:
+            chunks.append(np.array(faiss.rev_swig_ptr(invlists.get_ids(list_no), size), dtype='int64'))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype='int64')
+
+
+def index_kind(index) -> str:
+    """
+    Identifica el tipo de un índice creado por esta fábrica
+
+    Args:
+        index: Índice FAISS
+
+    Returns:
+        Uno de INDEX_TYPES
+    """
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(base, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(base, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(base, faiss.IndexIVF):
+        return 'ivf_flat'
+    return 'flat'
+
+
+def apply_search_params(index, config: IndexConfig):
+    """Aplica nprobe / efSearch, que no siempre se restauran al leer de disco"""
+    kind = index_kind(index)
+    if kind in TRAINED_INDEX_TYPES:
+        faiss.extract_index_ivf(index).nprobe = config.nprobe
+    elif kind == 'hnsw':
+        faiss.downcast_index(index.index).hnsw.efSearch = config.ef_search
+
+
+def _pq_subquantizers(dimension: int, pq_m: int) -> int:
+    """Mayor número de subcuantizadores <= pq_m que divide la dimensión"""
+    for m in range(min(pq_m, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
@@ -6,7 +6,7 @@ Y distingue entre conversaciones casuales y tareas complejas
 
 from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional, Tuple
 import logging
 import time
 import uuid
@@ -194,6 +194,9 @@ PLAN_SCHEMA = {
                 "type": "object",
                 "required": ["title", "description", "tool"],
                 "properties": {
+                    "id": {
+                        "type": "string"
+                    },
                     "title": {
                         "type": "string",
                         "minLength": 5,
@@ -214,6 +217,9 @@ PLAN_SCHEMA = {
                     "priority": {
                         "type": "string",
                         "enum": ["alta", "media", "baja"]
+                    },
+                    "complexity": {
+                        "type": "string"
                     }
                 },
                 "additionalProperties": False
@@ -689,6 +695,13 @@ def get_ollama_queue_status():
         # Obtener estado actual de la cola
         status = asyncio.run(queue_manager.get_queue_status())
         
+        # Estadísticas del caché de respuestas LLM (segundos de GPU ahorrados)
+        llm_cache = get_llm_response_cache()
+        status['llm_cache'] = llm_cache.get_stats() if llm_cache else {'enabled': False}
+        
+        # Sesiones por tarea: coste de prompt eval con y sin reutilizar el prefijo
+        status['task_sessions'] = get_task_session_store().get_stats()
+        
         # Agregar información adicional
         status['endpoint_info'] = {
             'path': '/api/ollama-queue-status',
@@ -2380,7 +2393,19 @@ FORMATO: Genera directamente el contenido profesional completo solicitado en esp
 IMPORTANTE: Tu respuesta debe SER el contenido solicitado (informe/análisis/documento), no una descripción de lo que harás.
 """
         
-        result = ollama_service.generate_response(report_prompt, {'temperature': 0.6})
+        # 📡 Streaming: el informe aparece en el terminal mientras se genera
+        from src.websocket.websocket_manager import get_websocket_manager as get_global_websocket_manager
+        websocket_manager = get_global_websocket_manager() if task_id else None
+        if websocket_manager and websocket_manager.is_initialized:
+            forwarder = websocket_manager.create_report_stream(task_id, title or 'Informe final')
+            try:
+                result = ollama_service.generate_response_streaming(
+                    report_prompt, {'temperature': 0.6}, task_id=task_id, on_chunk=forwarder
+                )
+            finally:
+                forwarder.close()
+        else:
+            result = ollama_service.generate_response(report_prompt, {'temperature': 0.6})
         
         if result.get('error'):
             raise Exception(f"Error Ollama: {result['error']}")
@@ -2983,6 +3008,9 @@ Responde de manera específica y práctica.
 # Importar nuevo TaskManager para persistencia
 from ..services.task_manager import get_task_manager
 from src.services.ollama_queue_manager import get_ollama_queue_manager
+from src.services.llm_response_cache import get_llm_response_cache
+from src.services.ollama_task_sessions import get_task_session_store
+from src.services.streaming_json_parser import StreamingJSONParser, fit_string
 
 # Almacenamiento temporal para compartir conversaciones
 shared_conversations = {}
@@ -3047,13 +3075,16 @@ def save_task_data(task_id: str, task_data: dict) -> bool:
 def update_task_data(task_id: str, updates: dict) -> bool:
     """
     Actualizar datos de tarea usando TaskManager (con fallback a memoria legacy)
+    
+    TaskManager fusiona los campos y los escribe en lote; los cambios de estado
+    de la tarea o de un paso se escriben en el momento.
     """
     try:
         task_manager = get_task_manager()
         success = task_manager.update_task(task_id, updates)
         
         if success:
-            logger.debug(f"✅ Task {task_id} updated in persistent storage")
+            logger.debug(f"✅ Task {task_id} updated (persistent storage, write-behind)")
             # Actualizar memoria legacy por compatibilidad
             if task_id in active_task_plans:
                 active_task_plans[task_id].update(updates)
@@ -3168,7 +3199,7 @@ Respuesta JSON:"""
         response = ollama_service.generate_response(intent_prompt, {
             'temperature': 0.2,  # Más bajo para respuestas consistentes
             'response_format': 'json'
-        })
+        }, cache_ttl=86400)  # La misma frase se clasifica igual: cachear 24h
         
         if response.get('error'):
             logger.warning(f"⚠️ Error en clasificación LLM: {response['error']}, usando fallback")
@@ -4763,7 +4794,7 @@ Tu respuesta debe ser ÚNICAMENTE el título:
             'temperature': 0.3,  # Creativo pero controlado
             'max_tokens': 100,   # Título corto
             'top_p': 0.9
-        })
+        }, cache_ttl=86400)
         
         if response.get('error'):
             logger.warning(f"⚠️ Error generating title with LLM: {response['error']}")
@@ -5192,10 +5223,57 @@ def generate_intelligent_fallback_plan(message: str, task_id: str, category: str
             "estimated_total_time": "29-52 minutos"
         }
 
-def generate_unified_ai_plan(message: str, task_id: str, attempt_retries: bool = True) -> dict:
+def fit_plan_strings(plan_data: dict) -> dict:
+    """Recorta title/description de los pasos al maxLength de PLAN_SCHEMA (mensajes largos copiados por el modelo)"""
+    step_properties = PLAN_SCHEMA['properties']['steps']['items']['properties']
+    for step in plan_data.get('steps') or []:
+        if not isinstance(step, dict):
+            continue
+        for key, value in step.items():
+            max_length = step_properties.get(key, {}).get('maxLength')
+            if isinstance(value, str) and isinstance(max_length, int):
+                step[key] = fit_string(value, max_length)
+    return plan_data
+
+def plan_step_emitters(task_id: str) -> Tuple[Callable[[int, dict], None], Callable[[int, str], None]]:
+    """
+    Callbacks de generate_unified_ai_plan que publican el plan parcial en la sala de la tarea
+    
+    Returns:
+        (on_step, on_reset): 'plan_step_generated' por cada paso válido y
+        'plan_steps_reset' cuando el intento que los produjo se descarta
+    """
+    def on_step(index: int, step: dict) -> None:
+        emit_step_event(task_id, 'plan_step_generated', {
+            'task_id': task_id,
+            'step_index': index,
+            'step': step,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    def on_reset(attempt: int, reason: str) -> None:
+        emit_step_event(task_id, 'plan_steps_reset', {
+            'task_id': task_id,
+            'attempt': attempt,
+            'reason': reason,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    return on_step, on_reset
+
+def generate_unified_ai_plan(message: str, task_id: str, attempt_retries: bool = True,
+                             on_step: Optional[Callable[[int, dict], None]] = None,
+                             on_reset: Optional[Callable[[int, str], None]] = None) -> dict:
     """
     🚀 SISTEMA ROBUSTO DE GENERACIÓN DE PLANES CON MÚLTIPLES FALLBACKS
     Función UNIFICADA con robustecimiento completo y fallbacks inteligentes
+    
+    El plan se genera en streaming y se valida contra PLAN_SCHEMA mientras
+    llega: cada paso completo y válido se pasa a on_step(índice, paso) antes
+    de que termine el resto del plan, y una salida que ya no puede cumplir el
+    schema corta la generación. Si un intento se descarta después de haber
+    entregado pasos, on_reset(intento, motivo) avisa de que esos pasos ya no
+    valen y se pasa al siguiente intento.
     """
     logger.info(f"🧠 Generating robust unified AI-powered plan for task {task_id} - Message: {message[:50]}...")
     
@@ -5214,9 +5292,32 @@ def generate_unified_ai_plan(message: str, task_id: str, attempt_retries: bool =
         logger.warning("⚠️ Ollama service not healthy, using intelligent fallback")
         return generate_intelligent_fallback_plan(message, task_id, task_category)
     
+    def notify_step(index: int, step: dict, streamed: list) -> None:
+        streamed.append(step)
+        if on_step:
+            try:
+                on_step(index, step)
+            except Exception as e:
+                logger.error(f"❌ Error in on_step callback for task {task_id}: {e}")
+    
+    def reject_attempt(attempt: int, reason: str, result: dict, streamed: list) -> None:
+        """Descarta un plan inválido: sin caché y retirando los pasos ya entregados"""
+        logger.warning(f"⚠️ Plan attempt {attempt} rejected for task {task_id}: {reason}")
+        llm_cache = get_llm_response_cache()
+        if llm_cache and result.get('cache_key'):
+            llm_cache.invalidate(result['cache_key'])
+        if streamed and on_reset:
+            try:
+                on_reset(attempt, reason)
+            except Exception as e:
+                logger.error(f"❌ Error in on_reset callback for task {task_id}: {e}")
+    
     def generate_robust_plan_with_retries() -> dict:
         """🔄 Generar plan con múltiples estrategias de reintentos"""
         max_attempts = 3 if attempt_retries else 1
+        # Los ejemplos del prompt deben cumplir PLAN_SCHEMA aunque el mensaje sea largo
+        title_hint = fit_string(message, 60)
+        description_hint = fit_string(message, 200)
         
         for attempt in range(1, max_attempts + 1):
             try:
@@ -5242,8 +5343,8 @@ JSON de respuesta (SOLO JSON, sin explicaciones):
   "steps": [
     {{
       "id": "step-1",
-      "title": "Investigar información específica para {message}",
-      "description": "Buscar datos actualizados y específicos necesarios para completar: {message}",
+      "title": "Investigar información específica para {title_hint}",
+      "description": "Buscar datos actualizados y específicos necesarios para completar: {description_hint}",
       "tool": "web_search",
       "estimated_time": "8-10 minutos",
       "complexity": "media"
@@ -5251,7 +5352,7 @@ JSON de respuesta (SOLO JSON, sin explicaciones):
     {{
       "id": "step-2",
       "title": "Analizar datos recopilados",
-      "description": "Procesar y estructurar la información encontrada para su uso en: {message}",
+      "description": "Procesar y estructurar la información encontrada para su uso en: {description_hint}",
       "tool": "analysis", 
       "estimated_time": "10-12 minutos",
       "complexity": "alta"
@@ -5259,15 +5360,15 @@ JSON de respuesta (SOLO JSON, sin explicaciones):
     {{
       "id": "step-3",
       "title": "Desarrollar contenido base",
-      "description": "Crear la estructura y contenido preliminar requerido para: {message}",
+      "description": "Crear la estructura y contenido preliminar requerido para: {description_hint}",
       "tool": "creation",
       "estimated_time": "12-15 minutos", 
       "complexity": "alta"
     }},
     {{
       "id": "step-4",
-      "title": "{message}",
-      "description": "Completar y entregar exactamente lo solicitado: {message}",
+      "title": "{title_hint}",
+      "description": "Completar y entregar exactamente lo solicitado: {description_hint}",
       "tool": "processing",
       "estimated_time": "5-8 minutos",
       "complexity": "media"
@@ -5278,7 +5379,8 @@ JSON de respuesta (SOLO JSON, sin explicaciones):
   "estimated_total_time": "35-45 minutos"
 }}
 
-IMPORTANTE: Los pasos deben ser específicos para "{message}", no genéricos. Cada paso debe tener valor único."""
+IMPORTANTE: Los pasos deben ser específicos para "{message}", no genéricos. Cada paso debe tener valor único.
+Cada "title" debe tener como máximo 100 caracteres y cada "description" como máximo 300."""
 
                 elif attempt == 2:
                     # Prompt simplificado pero específico para JSON
@@ -5286,9 +5388,9 @@ IMPORTANTE: Los pasos deben ser específicos para "{message}", no genéricos. Ca
 
 {{
   "steps": [
-    {{"id": "step-1", "title": "Investigar datos para {message}", "description": "Búsqueda de información específica requerida para: {message}", "tool": "web_search", "estimated_time": "10 minutos", "complexity": "media"}},
-    {{"id": "step-2", "title": "Analizar información recopilada", "description": "Procesar datos encontrados para su uso en: {message}", "tool": "analysis", "estimated_time": "15 minutos", "complexity": "alta"}},
-    {{"id": "step-3", "title": "{message}", "description": "Ejecutar y completar exactamente lo solicitado: {message}", "tool": "creation", "estimated_time": "20 minutos", "complexity": "alta"}}
+    {{"id": "step-1", "title": "Investigar datos para {title_hint}", "description": "Búsqueda de información específica requerida para: {description_hint}", "tool": "web_search", "estimated_time": "10 minutos", "complexity": "media"}},
+    {{"id": "step-2", "title": "Analizar información recopilada", "description": "Procesar datos encontrados para su uso en: {description_hint}", "tool": "analysis", "estimated_time": "15 minutos", "complexity": "alta"}},
+    {{"id": "step-3", "title": "{title_hint}", "description": "Ejecutar y completar exactamente lo solicitado: {description_hint}", "tool": "creation", "estimated_time": "20 minutos", "complexity": "alta"}}
   ],
   "task_type": "{task_category}",
   "complexity": "alta",
@@ -5305,46 +5407,71 @@ IMPORTANTE: Los pasos deben ser específicos para "{message}", no genéricos. Ca
                     'max_tokens': 1500 if attempt == 1 else 800,
                 }
                 
-                result = ollama_service.generate_response(plan_prompt, ollama_params)
+                streamed_steps = []
+                plan_parser = StreamingJSONParser(
+                    schema=PLAN_SCHEMA,
+                    item_paths=['steps'],
+                    truncate_strings=True,
+                    on_item=lambda path, step: notify_step(path[-1], step, streamed_steps)
+                )
+                result = ollama_service.generate_response_streaming(
+                    plan_prompt, ollama_params, task_id=task_id, step_id='plan_generation',
+                    json_parser=plan_parser, cache_ttl=3600
+                )
+                
+                if result.get('error_type') in ('schema_violation', 'invalid_json'):
+                    # El modelo respondió, pero no un plan válido: otro intento con otro prompt
+                    reject_attempt(attempt, result['error'], result, streamed_steps)
+                    continue
                 
                 if result.get('error'):
                     logger.error(f"❌ Ollama error: {result['error']}")
                     return {'error': f'Plan generation failed: {result["error"]}', 'success': False}
                 
                 # Parsear respuesta JSON
-                response_text = result.get('response', '').strip()
+                response_text = result.get('raw_response', '').strip()
                 
                 try:
-                    # Múltiples estrategias de limpieza de respuesta
-                    cleaned_response = response_text
-                    
-                    # Estrategia 1: Limpiar bloques de código
-                    cleaned_response = cleaned_response.replace('```json', '').replace('```', '').strip()
-                    
-                    # Estrategia 2: Buscar JSON entre llaves {}
-                    import re
-                    json_match = re.search(r'\{.*\}', cleaned_response, re.DOTALL)
-                    if json_match:
-                        cleaned_response = json_match.group(0)
-                    
-                    # Estrategia 3: Remover texto antes del primer {
-                    first_brace = cleaned_response.find('{')
-                    if first_brace > 0:
-                        cleaned_response = cleaned_response[first_brace:]
+                    plan_data = result.get('parsed_json')
                     
-                    # Estrategia 4: Remover texto después del último }
-                    last_brace = cleaned_response.rfind('}')
-                    if last_brace > 0:
-                        cleaned_response = cleaned_response[:last_brace + 1]
-                    
-                    logger.debug(f"🧽 Cleaned response: {cleaned_response[:200]}...")
-                    
-                    plan_data = json.loads(cleaned_response)
+                    if plan_data is None:
+                        # Múltiples estrategias de limpieza de respuesta
+                        cleaned_response = response_text
+                        
+                        # Estrategia 1: Limpiar bloques de código
+                        cleaned_response = cleaned_response.replace('```json', '').replace('```', '').strip()
+                        
+                        # Estrategia 2: Buscar JSON entre llaves {}
+                        import re
+                        json_match = re.search(r'\{.*\}', cleaned_response, re.DOTALL)
+                        if json_match:
+                            cleaned_response = json_match.group(0)
+                        
+                        # Estrategia 3: Remover texto antes del primer {
+                        first_brace = cleaned_response.find('{')
+                        if first_brace > 0:
+                            cleaned_response = cleaned_response[first_brace:]
+                        
+                        # Estrategia 4: Remover texto después del último }
+                        last_brace = cleaned_response.rfind('}')
+                        if last_brace > 0:
+                            cleaned_response = cleaned_response[:last_brace + 1]
+                        
+                        logger.debug(f"🧽 Cleaned response: {cleaned_response[:200]}...")
+                        
+                        plan_data = json.loads(cleaned_response)
                     
                     # Validar estructura básica
                     if not plan_data.get('steps') or not isinstance(plan_data['steps'], list):
                         raise ValueError("Invalid plan structure")
                     
+                    # Validación completa: el JSON extraído a mano no pasó por el parser
+                    try:
+                        jsonschema.validate(fit_plan_strings(plan_data), PLAN_SCHEMA)
+                    except jsonschema.ValidationError as validation_error:
+                        reject_attempt(attempt, validation_error.message, result, streamed_steps)
+                        continue
+                    
                     # Agregar campos faltantes a los pasos
                     for step in plan_data['steps']:
                         step['completed'] = False
@@ -5388,6 +5515,9 @@ IMPORTANTE: Los pasos deben ser específicos para "{message}", no genéricos. Ca
                     logger.error(f"❌ JSON parse error: {parse_error}")
                     logger.error(f"❌ Response was: {response_text[:200]}...")
                     
+                    # No volver a servir desde caché un plan inservible
+                    reject_attempt(attempt, str(parse_error), result, streamed_steps)
+                    
                     # Plan de fallback simple
                     fallback_steps = [
                         {
@@ -7421,8 +7551,11 @@ Tarea ID: {task_id}
                 logger.error(f"❌ TOOL MAPPING ERROR: Tool '{mapped_tool}' not found in available tools: {available_tools}")
                 raise Exception(f"Tool '{mapped_tool}' not available. Available tools: {available_tools}")
             
-            # Execute the tool
-            tool_result = tool_manager.execute_tool(mapped_tool, tool_params, task_id=task_id)
+            # Execute the tool (LLM tools stream their output to the task room as it is generated)
+            tool_config = None
+            if mapped_tool in ('ollama_analysis', 'ollama_processing'):
+                tool_config = {'stream_progress': True, 'stream_section_title': title}
+            tool_result = tool_manager.execute_tool(mapped_tool, tool_params, config=tool_config, task_id=task_id)
             
             # Emit advanced progress
             emit_step_event(task_id, 'task_progress', {
@@ -7715,7 +7848,10 @@ def generate_task_plan(title: str, task_id: str) -> Dict:
         logger.info(f"🚀 Starting generate_task_plan (unified) for task {task_id}: {title}")
         
         # ✅ CRITICAL FIX: Use unified AI plan generation instead of duplicated code
-        plan_result = generate_unified_ai_plan(title, task_id, attempt_retries=False)  # No retries para backward compatibility
+        # Los pasos llegan a la sala de la tarea mientras el modelo los genera
+        on_step, on_reset = plan_step_emitters(task_id)
+        plan_result = generate_unified_ai_plan(title, task_id, attempt_retries=False,  # No retries para backward compatibility
+                                               on_step=on_step, on_reset=on_reset)
         
         if plan_result.get('plan_source') == 'fallback':
             logger.warning(f"⚠️ Unified plan generation returned fallback for task {task_id}")
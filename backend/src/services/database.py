@@ -3,7 +3,7 @@ Servicio de base de datos MongoDB
 Maneja todas las operaciones de persistencia
 """
 
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from bson import ObjectId
 from datetime import datetime, timedelta
 import os
@@ -145,6 +145,22 @@ class DatabaseService:
             print(f"Error updating task: {e}")
             return False
     
+    def bulk_update_tasks(self, updates: Dict[str, Dict]) -> bool:
+        """Actualizar varias tareas en un solo bulk_write (un $set por tarea)"""
+        if not updates:
+            return True
+        try:
+            operations = [
+                UpdateOne({"task_id": task_id}, {"$set": fields})
+                for task_id, fields in updates.items()
+            ]
+            self.db.tasks.bulk_write(operations, ordered=False)
+            return True
+            
+        except Exception as e:
+            print(f"Error bulk updating tasks: {e}")
+            return False
+    
     def get_all_tasks(self, limit: int = 100) -> List[Dict]:
         """Obtener todas las tareas"""
         try:
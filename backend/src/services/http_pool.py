@@ -0,0 +1,246 @@
+"""
+🔌 POOL HTTP COMPARTIDO PARA LOS PROVEEDORES DE MODELOS
+=======================================================
+
+Un único pool de conexiones keep-alive para Ollama y OpenRouter:
+
+- `get_http_session()`: `requests.Session` de proceso con un HTTPAdapter
+  dimensionado, para las llamadas síncronas (OllamaService, ModelManager,
+  OpenRouterService).
+- `get_async_http_pool()`: cliente `httpx.AsyncClient` que vive en un event
+  loop dedicado. Flask ejecuta cada llamada con `asyncio.run`, así que un
+  cliente por loop no reutilizaría conexiones; aquí cualquier loop envía la
+  corrutina al loop del pool y la espera sin ocupar un hilo por request.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))  # Hosts distintos en caché
+POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '32'))          # Conexiones por host
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_pool: Optional['AsyncHTTPPool'] = None
+_async_pool_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    🌐 OBTENER LA SESIÓN HTTP COMPARTIDA
+
+    Returns:
+        requests.Session con conexiones keep-alive reutilizables entre hilos
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+                logger.info(f"🔌 Sesión HTTP compartida creada (pool_maxsize={POOL_MAXSIZE})")
+
+    return _session
+
+
+class AsyncHTTPResponse:
+    """Respuesta ya leída del cliente asíncrono (independiente del loop del pool)"""
+
+    def __init__(self, status_code: int, content: bytes, text: str):
+        self.status_code = status_code
+        self.content = content
+        self.text = text
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class AsyncHTTPPool:
+    """
+    🔌 CLIENTE HTTP ASÍNCRONO EN UN EVENT LOOP DEDICADO
+
+    Mantiene un `httpx.AsyncClient` con keep-alive en un hilo propio y
+    permite usarlo desde cualquier otro event loop.
+    """
+
+    def __init__(self, max_connections: int = POOL_MAXSIZE, max_keepalive: int = POOL_MAXSIZE // 2):
+        """
+        Args:
+            max_connections: Conexiones simultáneas máximas
+            max_keepalive: Conexiones ociosas mantenidas abiertas
+        """
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='http_pool_loop', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self._client = asyncio.run_coroutine_threadsafe(self._create_client(limits), self._loop).result()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(self._ready.set)
+        self._loop.run_forever()
+
+    @staticmethod
+    async def _create_client(limits):
+        return httpx.AsyncClient(limits=limits)
+
+    async def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> AsyncHTTPResponse:
+        """
+        Ejecuta un request en el loop del pool y lo espera desde el loop actual
+
+        Args:
+            method: Método HTTP
+            url: URL completa
+            timeout: Timeout total en segundos
+            **kwargs: Argumentos de httpx (json, headers, params...)
+
+        Returns:
+            AsyncHTTPResponse con el cuerpo completo
+
+        Raises:
+            httpx.TimeoutException, httpx.HTTPError
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._request(method, url, timeout, kwargs), self._loop
+        )
+        return await asyncio.wrap_future(future)
+
+    async def post(self, url: str, **kwargs) -> AsyncHTTPResponse:
+        return await self.request('POST', url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> AsyncHTTPResponse:
+        return await self.request('GET', url, **kwargs)
+
+    async def _request(self, method: str, url: str, timeout: Optional[float],
+                       kwargs: Dict[str, Any]) -> AsyncHTTPResponse:
+        response = await self._client.request(method, url, timeout=timeout, **kwargs)
+        return AsyncHTTPResponse(response.status_code, response.content, response.text)
+
+    async def stream_lines(self, method: str, url: str, timeout: Optional[float] = None,
+                           **kwargs) -> AsyncIterator[str]:
+        """
+        Ejecuta un request en streaming y entrega sus líneas al loop actual
+
+        La lectura ocurre en el loop del pool; cada línea cruza al loop del
+        llamador con `call_soon_threadsafe`. Si el llamador deja de iterar,
+        la lectura se cancela y la conexión vuelve al pool.
+
+        Args:
+            method: Método HTTP
+            url: URL completa
+            timeout: Timeout entre lecturas en segundos
+            **kwargs: Argumentos de httpx (json, headers, params...)
+
+        Yields:
+            Líneas no vacías del cuerpo
+
+        Raises:
+            httpx.HTTPStatusError: Si la respuesta no es 2xx (con el cuerpo ya leído)
+            httpx.TimeoutException, httpx.HTTPError
+        """
+        loop = asyncio.get_running_loop()
+        lines: asyncio.Queue = asyncio.Queue()
+
+        def _put(item) -> None:
+            try:
+                loop.call_soon_threadsafe(lines.put_nowait, item)
+            except RuntimeError:
+                pass  # El loop del llamador ya terminó
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(method, url, timeout, kwargs, _put), self._loop
+        )
+        try:
+            while True:
+                kind, value = await lines.get()
+                if kind == 'line':
+                    yield value
+                elif kind == 'error':
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    async def _stream(self, method: str, url: str, timeout: Optional[float],
+                      kwargs: Dict[str, Any], put) -> None:
+        try:
+            async with self._client.stream(method, url, timeout=timeout, **kwargs) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        put(('line', line))
+            put(('end', None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            put(('error', e))
+
+    def close(self) -> None:
+        """Cierra el cliente y detiene el loop del pool"""
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+
+def get_async_http_pool() -> Optional[AsyncHTTPPool]:
+    """
+    🌐 OBTENER EL POOL HTTP ASÍNCRONO COMPARTIDO
+
+    Returns:
+        AsyncHTTPPool o None si httpx no está instalado
+    """
+    global _async_pool
+
+    if not HTTPX_AVAILABLE:
+        return None
+
+    if _async_pool is None:
+        with _async_pool_lock:
+            if _async_pool is None:
+                _async_pool = AsyncHTTPPool()
+                logger.info(f"🔌 Pool HTTP asíncrono creado (max_connections={POOL_MAXSIZE})")
+
+    return _async_pool
+
+
+def close_http_pools() -> None:
+    """🛑 Cierra la sesión y el pool asíncrono compartidos"""
+    global _session, _async_pool
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+    with _async_pool_lock:
+        if _async_pool is not None:
+            _async_pool.close()
+            _async_pool = None
@@ -0,0 +1,268 @@
+"""
+💾 CACHÉ DE RESPUESTAS LLM
+==========================
+
+Caché opcional (opt-in) para prompts que se repiten de forma exacta o casi
+exacta: clasificación de intención, títulos de tarea y planes JSON de baja
+temperatura.
+
+- Clave: sha1 de (modelo, prompt normalizado, opciones canónicas)
+- Memoria: LRU con TTL por entrada
+- Persistencia: tabla SQLite en modo WAL, compartida entre reinicios y workers
+- Estadísticas: aciertos, fallos y segundos de GPU ahorrados (duración real
+  de la generación original, `total_duration` de Ollama si está disponible)
+
+Se activa con LLM_CACHE_ENABLED=true; los llamadores indican además el TTL
+de cada request, así que nada se cachea sin pedirlo explícitamente.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.getenv('LLM_CACHE_DB_PATH', 'llm_response_cache.db')
+
+
+class LLMResponseCache:
+    """
+    💾 CACHÉ LRU + TTL CON RESPALDO EN SQLITE
+
+    Guarda respuestas completas (dict) junto a los segundos de generación que
+    costaron, para contabilizar el tiempo de GPU ahorrado en cada acierto.
+    """
+
+    def __init__(self, max_entries: int = 1000, db_path: Optional[str] = DEFAULT_DB_PATH,
+                 default_ttl: int = 3600):
+        """
+        Args:
+            max_entries: Entradas máximas en memoria
+            db_path: Fichero SQLite de respaldo (None desactiva la persistencia)
+            default_ttl: TTL en segundos cuando el llamador no indica uno
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any], float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_gpu_seconds = 0.0
+
+        if db_path:
+            self._init_database()
+
+    def _init_database(self) -> None:
+        """Abre la conexión persistente y crea la tabla si no existe"""
+        try:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    generation_seconds REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_response_cache(expires_at)')
+            self._conn.execute('DELETE FROM llm_response_cache WHERE expires_at < ?', (time.time(),))
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Error inicializando caché LLM en {self.db_path}: {e}")
+            self._conn = None
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Calcula la clave de un request
+
+        Args:
+            model: Modelo que genera la respuesta
+            prompt: Prompt completo enviado
+            options: Opciones de generación
+
+        Returns:
+            Digest hex de modelo + prompt normalizado + opciones canónicas
+        """
+        normalized = ' '.join(unicodedata.normalize('NFC', prompt).split())
+        canonical_options = json.dumps(options or {}, sort_keys=True, default=str)
+        payload = f"{model}\0{normalized}\0{canonical_options}"
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta vigente
+
+        Args:
+            key: Clave de make_key
+
+        Returns:
+            Copia de la respuesta cacheada o None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, response, generation_seconds = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._record_hit(generation_seconds)
+                    return dict(response)
+                del self._memory[key]
+                self.expirations += 1
+
+            row = self._load(key, now)
+            if row is not None:
+                response, generation_seconds, expires_at = row
+                self._store_in_memory(key, expires_at, response, generation_seconds)
+                self.disk_hits += 1
+                self._record_hit(generation_seconds)
+                return dict(response)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model: str, response: Dict[str, Any], generation_seconds: float,
+            ttl: Optional[int] = None) -> None:
+        """
+        Almacena una respuesta exitosa
+
+        Args:
+            key: Clave de make_key
+            model: Modelo que la generó
+            response: Respuesta completa
+            generation_seconds: Segundos que costó generarla
+            ttl: Vigencia en segundos (por defecto default_ttl)
+        """
+        now = time.time()
+        expires_at = now + (ttl or self.default_ttl)
+        with self._lock:
+            self._store_in_memory(key, expires_at, response, generation_seconds)
+            if self._conn is not None:
+                try:
+                    self._conn.execute('''
+                        INSERT OR REPLACE INTO llm_response_cache
+                        (cache_key, model, response, generation_seconds, created_at, expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (key, model, json.dumps(response, default=str), generation_seconds, now, expires_at))
+                    self._conn.commit()
+                except Exception as e:
+                    logger.error(f"❌ Error persistiendo respuesta LLM cacheada: {e}")
+
+    def invalidate(self, key: str) -> None:
+        """Elimina una entrada (p. ej. si la respuesta resultó inservible)"""
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is not None:
+                try:
+                    self._conn.execute('DELETE FROM llm_response_cache WHERE cache_key = ?', (key,))
+                    self._conn.commit()
+                except Exception as e:
+                    logger.error(f"❌ Error invalidando respuesta LLM cacheada: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene estadísticas del caché
+
+        Returns:
+            Diccionario con aciertos, fallos y segundos de GPU ahorrados
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'memory_entries': len(self._memory),
+            'max_entries': self.max_entries,
+            'persistent': self._conn is not None,
+            'saved_gpu_seconds': round(self.saved_gpu_seconds, 2)
+        }
+
+    def _record_hit(self, generation_seconds: float) -> None:
+        self.hits += 1
+        self.saved_gpu_seconds += generation_seconds
+
+    def _store_in_memory(self, key: str, expires_at: float, response: Dict[str, Any],
+                         generation_seconds: float) -> None:
+        """Inserta en el LRU expulsando la entrada menos reciente; requiere self._lock"""
+        self._memory[key] = (expires_at, dict(response), generation_seconds)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, key: str, now: float) -> Optional[Tuple[Dict[str, Any], float, float]]:
+        """Lee una entrada vigente de SQLite; requiere self._lock"""
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute(
+                'SELECT response, generation_seconds, expires_at FROM llm_response_cache WHERE cache_key = ?',
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] <= now:
+                self._conn.execute('DELETE FROM llm_response_cache WHERE cache_key = ?', (key,))
+                self._conn.commit()
+                self.expirations += 1
+                return None
+            return json.loads(row[0]), row[1], row[2]
+        except Exception as e:
+            logger.error(f"❌ Error leyendo caché LLM persistente: {e}")
+            return None
+
+
+# 🌐 INSTANCIA GLOBAL DEL CACHÉ
+_global_llm_cache: Optional[LLMResponseCache] = None
+_global_llm_cache_lock = threading.Lock()
+
+
+def is_llm_cache_enabled() -> bool:
+    """El caché es opt-in: LLM_CACHE_ENABLED=true lo activa"""
+    return os.getenv('LLM_CACHE_ENABLED', 'false').lower() == 'true'
+
+
+def get_llm_response_cache() -> Optional[LLMResponseCache]:
+    """
+    🌐 OBTENER EL CACHÉ GLOBAL DE RESPUESTAS LLM
+
+    Returns:
+        LLMResponseCache o None si el caché está desactivado
+    """
+    global _global_llm_cache
+
+    if not is_llm_cache_enabled():
+        return None
+
+    if _global_llm_cache is None:
+        with _global_llm_cache_lock:
+            if _global_llm_cache is None:
+                _global_llm_cache = LLMResponseCache(
+                    max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1000')),
+                    default_ttl=int(os.getenv('LLM_CACHE_TTL', '3600'))
+                )
+                logger.info("💾 Caché de respuestas LLM activado")
+
+    return _global_llm_cache
@@ -0,0 +1,359 @@
+"""
+🎯 DESPACHADOR DE SLOTS DE EJECUCIÓN PARA OLLAMA
+================================================
+
+Reparte los slots de ejecución estrictamente por prioridad usando un heap,
+en lugar de depender del orden FIFO en que un semáforo despierta a sus
+waiters.
+
+- Envejecimiento lineal: cada `aging_seconds` de espera equivalen a subir un
+  nivel de prioridad, así que un request LOW nunca espera indefinidamente.
+  Como el crédito crece igual para todos, la clave del heap es estática:
+  `created - priority * aging_seconds`.
+- Reparto justo por tarea: una tarea no ocupa más de `max_slots_per_task`
+  slots mientras otras tareas esperan (si nadie más espera, se le concede).
+- Lotes por modelo: mientras haya requests del último modelo despachado,
+  se adelantan a los de otro modelo de igual o menor prioridad que lleven
+  menos de `model_batch_window` segundos esperando. Así Ollama no descarga y recarga
+  pesos (p. ej. 32b de planificación frente a 8b de pasos) en cada request,
+  y ningún request espera por ello más que esa ventana.
+- Métricas: espera medida por clase de prioridad (p50/p95).
+
+Los requests llegan desde varios hilos de Flask, cada uno con su propio event
+loop (`asyncio.run`), por eso el estado se protege con un `threading.Lock` y
+cada slot se entrega con `call_soon_threadsafe` al loop del waiter.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiter:
+    """Request esperando un slot"""
+
+    __slots__ = ('future', 'loop', 'priority', 'task_id', 'model', 'enqueued_at', 'info', 'cancelled',
+                 'granted', 'key')
+
+    def __init__(self, future: asyncio.Future, priority, task_id: str, info: Dict[str, Any]):
+        self.future = future
+        self.loop = future.get_loop()
+        self.priority = priority
+        self.task_id = task_id
+        self.model = info.get('model', '')
+        self.enqueued_at = time.monotonic()
+        self.info = info
+        self.cancelled = False
+        self.granted = False
+        self.key = None  # Clave vigente en el heap (las anteriores quedan obsoletas)
+
+
+class PriorityDispatcher:
+    """
+    🎯 DESPACHADOR DE SLOTS POR PRIORIDAD
+
+    Sustituye al semáforo del gestor de cola: `acquire` espera un slot y
+    `release` lo devuelve y despacha al siguiente waiter del heap.
+    """
+
+    def __init__(self,
+                 max_slots: int,
+                 aging_seconds: float = 30.0,
+                 max_slots_per_task: Optional[int] = None,
+                 wait_samples: int = 1000,
+                 model_batch_window: float = 0.0):
+        """
+        Args:
+            max_slots: Slots de ejecución simultáneos
+            aging_seconds: Segundos de espera que equivalen a un nivel de prioridad
+            max_slots_per_task: Slots máximos por tarea cuando otras esperan
+                                (por defecto la mitad de los slots, mínimo 1)
+            wait_samples: Muestras de espera conservadas por prioridad
+            model_batch_window: Segundos que un request de otro modelo puede ser
+                                adelantado por los del modelo cargado (0 desactiva)
+        """
+        self.max_slots = max_slots
+        self.aging_seconds = aging_seconds
+        self._fixed_slots_per_task = max_slots_per_task
+        self.max_slots_per_task = max_slots_per_task or max(1, max_slots // 2)
+
+        self._lock = threading.Lock()
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._waiting = 0
+        self._in_flight = 0
+        self._task_slots: Dict[str, int] = defaultdict(int)
+        self._granted_pending = set()  # Concedidos aún no entregados a su loop
+        self._waiters_by_request: Dict[str, _Waiter] = {}
+        self._wait_times: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=wait_samples))
+        self.fair_share_deferrals = 0
+        
+        # Lotes por modelo: heap por modelo con las mismas entradas que el principal
+        self.model_batch_window = model_batch_window
+        self._model_heaps: Dict[str, List[tuple]] = {}
+        self._model_waiting: Dict[str, int] = defaultdict(int)
+        self._loaded_model: Optional[str] = None
+        self.batched_grants = 0
+
+    @property
+    def waiting(self) -> int:
+        """Requests esperando un slot"""
+        return self._waiting
+
+    @property
+    def in_flight(self) -> int:
+        """Slots ocupados"""
+        return self._in_flight
+
+    @property
+    def loaded_model(self) -> Optional[str]:
+        """Modelo del último request despachado"""
+        return self._loaded_model
+
+    async def acquire(self, priority, task_id: str = "", info: Optional[Dict[str, Any]] = None) -> float:
+        """
+        Espera un slot de ejecución
+
+        Args:
+            priority: RequestPriority del request
+            task_id: Tarea propietaria (para el reparto justo)
+            info: Datos del request para get_pending
+
+        Returns:
+            Segundos esperados en cola
+        """
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, task_id, info or {})
+        with self._lock:
+            self._push_locked(waiter, priority)
+            self._waiting += 1
+            self._model_waiting[waiter.model] += 1
+            request_id = waiter.info.get('request_id')
+            if request_id:
+                self._waiters_by_request[request_id] = waiter
+            grants = self._dispatch_locked()
+        self._deliver(grants)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            release_slot = False
+            with self._lock:
+                if waiter in self._granted_pending:
+                    pass  # _resolve verá el futuro cancelado y devolverá el slot
+                elif waiter.future.done() and not waiter.future.cancelled():
+                    release_slot = True  # Cancelado justo después de recibir el slot
+                elif not waiter.cancelled:
+                    # Seguía en el heap: se descarta de forma perezosa
+                    waiter.cancelled = True
+                    self._waiting -= 1
+                    self._discount_model_locked(waiter.model)
+                    self._waiters_by_request.pop(waiter.info.get('request_id'), None)
+            if release_slot:
+                self.release(task_id)
+            raise
+
+        wait_seconds = time.monotonic() - waiter.enqueued_at
+        self._wait_times[priority.name].append(wait_seconds)
+        return wait_seconds
+
+    def raise_priority(self, request_id: str, priority) -> bool:
+        """
+        Sube la prioridad de un request que sigue esperando
+
+        Args:
+            request_id: ID indicado en info['request_id'] al llamar a acquire
+            priority: Nueva prioridad (solo se aplica si es mayor)
+
+        Returns:
+            True si el request seguía en cola y se promovió
+        """
+        with self._lock:
+            waiter = self._waiters_by_request.get(request_id)
+            if waiter is None or waiter.cancelled or waiter.priority.value >= priority.value:
+                return False
+            self._push_locked(waiter, priority)
+            return True
+
+    def release(self, task_id: str = "") -> None:
+        """
+        Devuelve un slot y despacha a los siguientes waiters
+
+        Args:
+            task_id: Tarea que ocupaba el slot
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self._task_slots[task_id] -= 1
+            if self._task_slots[task_id] <= 0:
+                del self._task_slots[task_id]
+            grants = self._dispatch_locked()
+        self._deliver(grants)
+
+    def set_max_slots(self, max_slots: int) -> None:
+        """
+        Ajusta los slots disponibles (p. ej. al abrirse o cerrarse el circuito de un host)
+
+        Los requests en curso no se interrumpen; si sobran, simplemente no se
+        conceden slots nuevos hasta que baje la ocupación.
+
+        Args:
+            max_slots: Nuevos slots simultáneos (mínimo 1)
+        """
+        with self._lock:
+            self.max_slots = max(1, max_slots)
+            if not self._fixed_slots_per_task:
+                self.max_slots_per_task = max(1, self.max_slots // 2)
+            grants = self._dispatch_locked()
+        self._deliver(grants)
+
+    def get_pending(self) -> List[Dict[str, Any]]:
+        """Waiters en orden de despacho (sin contar el reparto justo)"""
+        with self._lock:
+            entries = sorted(entry for entry in self._heap if self._is_live(entry))
+        now = time.monotonic()
+        return [
+            dict(waiter.info,
+                 priority=waiter.priority.name,
+                 effective_priority=round(waiter.priority.value + (now - waiter.enqueued_at) / self.aging_seconds, 2))
+            for _, _, waiter in entries
+        ]
+
+    def get_wait_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Espera medida por clase de prioridad
+
+        Returns:
+            {prioridad: {'samples', 'p50', 'p95'}} en segundos
+        """
+        return {name: {'samples': len(samples),
+                       'p50': round(_percentile(samples, 50), 3),
+                       'p95': round(_percentile(samples, 95), 3)}
+                for name, samples in list(self._wait_times.items())}
+
+    def _push_locked(self, waiter: _Waiter, priority) -> None:
+        """Inserta (o reinserta con nueva prioridad) un waiter en el heap; requiere self._lock"""
+        waiter.priority = priority
+        waiter.key = waiter.enqueued_at - priority.value * self.aging_seconds
+        entry = (waiter.key, next(self._counter), waiter)
+        heapq.heappush(self._heap, entry)
+        if self.model_batch_window:
+            heapq.heappush(self._model_heaps.setdefault(waiter.model, []), entry)
+
+    def _dispatch_locked(self) -> List[_Waiter]:
+        """Asigna slots libres a los mejores waiters; requiere self._lock"""
+        grants = []
+        deferred = []
+        while self._in_flight < self.max_slots and self._heap:
+            entry = heapq.heappop(self._heap)
+            waiter = entry[2]
+            if not self._is_live(entry):
+                continue
+            if self._over_task_quota(waiter):
+                # La tarea ya tiene su cuota: se cede el slot a otras tareas si las hay
+                deferred.append(entry)
+                continue
+            same_model = self._batch_candidate_locked(waiter)
+            if same_model is not None:
+                # El request de otro modelo sigue en cola; entra el del modelo cargado
+                heapq.heappush(self._heap, entry)
+                self.batched_grants += 1
+                waiter = same_model
+            grants.append(self._grant_locked(waiter))
+
+        if deferred:
+            if self._in_flight < self.max_slots and not self._heap:
+                # Nadie más espera: el reparto justo no debe dejar slots ociosos
+                while deferred and self._in_flight < self.max_slots:
+                    grants.append(self._grant_locked(deferred.pop(0)[2]))
+            else:
+                self.fair_share_deferrals += len(deferred)
+            for entry in deferred:
+                heapq.heappush(self._heap, entry)
+        return grants
+
+    def _is_live(self, entry: tuple) -> bool:
+        """Entrada vigente: ni cancelada, ni concedida, ni sustituida por un cambio de prioridad"""
+        waiter = entry[2]
+        return not waiter.cancelled and not waiter.granted and entry[0] == waiter.key
+
+    def _over_task_quota(self, waiter: _Waiter) -> bool:
+        return bool(waiter.task_id) and self._task_slots.get(waiter.task_id, 0) >= self.max_slots_per_task
+
+    def _batch_candidate_locked(self, waiter: _Waiter) -> Optional[_Waiter]:
+        """
+        Mejor waiter del modelo cargado que puede adelantar a `waiter`; requiere self._lock
+
+        Solo se adelanta a requests de otro modelo que aún no agotaron la
+        ventana de lote y cuya prioridad no supera la del candidato,
+        respetando la cuota por tarea del candidato.
+        """
+        loaded = self._loaded_model
+        if (not self.model_batch_window or loaded is None or waiter.model == loaded or
+                time.monotonic() - waiter.enqueued_at >= self.model_batch_window):
+            return None
+        heap = self._model_heaps.get(loaded)
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        candidate = heap[0][2]
+        if candidate.priority.value < waiter.priority.value or self._over_task_quota(candidate):
+            # Un request LOW del modelo cargado no adelanta a uno CRITICAL de otro modelo
+            return None
+        return heapq.heappop(heap)[2]
+
+    def _discount_model_locked(self, model: str) -> None:
+        """Descuenta un waiter del modelo y libera su heap si queda vacío; requiere self._lock"""
+        self._model_waiting[model] -= 1
+        if self._model_waiting[model] <= 0:
+            del self._model_waiting[model]
+            self._model_heaps.pop(model, None)
+
+    def _grant_locked(self, waiter: _Waiter) -> _Waiter:
+        self._waiters_by_request.pop(waiter.info.get('request_id'), None)
+        waiter.granted = True
+        self._discount_model_locked(waiter.model)
+        if waiter.model:
+            self._loaded_model = waiter.model
+        self._waiting -= 1
+        self._in_flight += 1
+        self._task_slots[waiter.task_id] += 1
+        self._granted_pending.add(waiter)
+        return waiter
+
+    def _deliver(self, grants: List[_Waiter]) -> None:
+        """Despierta a los waiters concedidos en sus propios event loops"""
+        for waiter in grants:
+            try:
+                waiter.loop.call_soon_threadsafe(self._resolve, waiter)
+            except RuntimeError:
+                # El loop del waiter ya se cerró: el slot vuelve al pool
+                with self._lock:
+                    self._granted_pending.discard(waiter)
+                self.release(waiter.task_id)
+
+    def _resolve(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._granted_pending.discard(waiter)
+        if waiter.future.done():
+            # Cancelado entre la concesión y la entrega
+            self.release(waiter.task_id)
+        else:
+            waiter.future.set_result(None)
+
+
+def _percentile(samples, percentile: float) -> float:
+    """Percentil por rango más cercano"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(percentile / 100 * len(ordered)) - 1)
+    return ordered[rank]
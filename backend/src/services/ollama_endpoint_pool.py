@@ -0,0 +1,301 @@
+"""
+⚖️ BALANCEADOR DE ENDPOINTS DE OLLAMA
+====================================
+
+Reparte los requests entre varios hosts de Ollama, cada uno con su propio
+límite de concurrencia, para que el throughput escale con el número de GPUs.
+
+- Enrutado: menor ocupación relativa (outstanding / capacidad), prefiriendo
+  los hosts que ya tienen el modelo cargado (afinidad de modelo) y, a
+  igualdad, el de menor latencia media.
+- Salud pasiva: los timeouts, errores de conexión y HTTP 5xx cuentan como
+  fallos; tras `failure_threshold` fallos seguidos el circuito se abre y el
+  host deja de recibir tráfico durante un enfriamiento que crece con cada
+  reapertura. Al expirar, el siguiente request se usa como prueba
+  (half-open) y decide si el circuito se cierra o vuelve a abrirse.
+
+Configuración: OLLAMA_ENDPOINTS="http://gpu1:11434=2,http://gpu2:11434=4"
+(URL=concurrencia máxima; sin "=N" se usa 2).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_ENDPOINT_CONCURRENCY = 2
+
+
+class OllamaEndpoint:
+    """Host de Ollama con su capacidad, carga actual y estado de circuito"""
+
+    def __init__(self, url: str, max_concurrent: int = DEFAULT_ENDPOINT_CONCURRENCY):
+        self.url = url.rstrip('/')
+        self.max_concurrent = max(1, max_concurrent)
+        self.outstanding = 0
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.probe_in_flight = False
+        self.requests = 0
+        self.failures = 0
+        self.circuit_opens = 0
+        self.ewma_latency: Optional[float] = None
+        self.recent_models: "OrderedDict[str, float]" = OrderedDict()  # modelo -> último uso
+
+    def capacity(self) -> int:
+        """Requests simultáneos que el host acepta en su estado actual"""
+        if self.state == CLOSED:
+            return self.max_concurrent
+        if self.state == HALF_OPEN:
+            return 1
+        return 0
+
+    def has_room(self) -> bool:
+        if self.state == HALF_OPEN:
+            return not self.probe_in_flight
+        return self.state == CLOSED and self.outstanding < self.max_concurrent
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'state': self.state,
+            'outstanding': self.outstanding,
+            'max_concurrent': self.max_concurrent,
+            'requests': self.requests,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'circuit_opens': self.circuit_opens,
+            'retry_in_seconds': round(max(0.0, self.opened_at + self.cooldown - now), 1) if self.state == OPEN else 0.0,
+            'avg_latency_seconds': round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            'loaded_models': list(self.recent_models)
+        }
+
+
+class OllamaEndpointPool:
+    """
+    ⚖️ POOL DE ENDPOINTS CON AFINIDAD DE MODELO Y CIRCUIT BREAKER
+
+    `acquire` elige un host para un modelo y `release` informa del resultado,
+    que alimenta la salud pasiva del host.
+    """
+
+    def __init__(self,
+                 endpoints: List[OllamaEndpoint],
+                 failure_threshold: int = 3,
+                 base_cooldown: float = 15.0,
+                 max_cooldown: float = 300.0,
+                 model_affinity_seconds: float = 300.0,
+                 latency_alpha: float = 0.2):
+        """
+        Args:
+            endpoints: Hosts de Ollama
+            failure_threshold: Fallos consecutivos que abren el circuito
+            base_cooldown: Segundos del primer enfriamiento (se duplica en cada reapertura)
+            max_cooldown: Enfriamiento máximo
+            model_affinity_seconds: Tiempo que un modelo se considera cargado tras usarse
+                                    (keep_alive por defecto de Ollama: 5 minutos)
+            latency_alpha: Peso de la última muestra en la latencia media
+        """
+        if not endpoints:
+            raise ValueError("Se necesita al menos un endpoint de Ollama")
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.model_affinity_seconds = model_affinity_seconds
+        self.latency_alpha = latency_alpha
+
+        self._lock = threading.Lock()
+        self._capacity_listeners: List[Callable[[int], None]] = []
+        self.affinity_hits = 0
+        self.rejected_requests = 0
+
+    @classmethod
+    def from_config(cls, config: str, **kwargs) -> 'OllamaEndpointPool':
+        """
+        Crea el pool a partir de "url=N,url=N"
+
+        Args:
+            config: Lista de endpoints separada por comas
+            **kwargs: Parámetros de OllamaEndpointPool
+        """
+        endpoints = []
+        for item in config.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            url, _, limit = item.rpartition('=') if '=' in item else (item, '', '')
+            endpoints.append(OllamaEndpoint(url.strip(), int(limit) if limit.strip() else DEFAULT_ENDPOINT_CONCURRENCY))
+        return cls(endpoints, **kwargs)
+
+    def add_capacity_listener(self, listener: Callable[[int], None]) -> None:
+        """Registra un callback que recibe la capacidad total cada vez que cambia"""
+        self._capacity_listeners.append(listener)
+        listener(self.total_capacity())
+
+    def total_capacity(self) -> int:
+        """Suma de la capacidad de los hosts que pueden recibir tráfico"""
+        with self._lock:
+            self._refresh_locked(time.monotonic())
+            return sum(endpoint.capacity() for endpoint in self.endpoints)
+
+    def acquire(self, model: str) -> Optional[OllamaEndpoint]:
+        """
+        Reserva un host para un request
+
+        Args:
+            model: Modelo que se va a usar
+
+        Returns:
+            OllamaEndpoint reservado o None si todos los circuitos están abiertos
+        """
+        now = time.monotonic()
+        with self._lock:
+            changed = self._refresh_locked(now)
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.has_room()]
+            if not candidates:
+                # Sin hueco libre: se sobrecarga el host sano menos ocupado antes que rechazar
+                candidates = [endpoint for endpoint in self.endpoints if endpoint.state == CLOSED]
+            if not candidates:
+                self.rejected_requests += 1
+                endpoint = None
+            else:
+                endpoint = min(candidates, key=lambda e: self._route_key(e, model, now))
+                if self._has_model(endpoint, model, now):
+                    self.affinity_hits += 1
+                endpoint.outstanding += 1
+                endpoint.requests += 1
+                if endpoint.state == HALF_OPEN:
+                    endpoint.probe_in_flight = True
+                endpoint.recent_models[model] = now
+                endpoint.recent_models.move_to_end(model)
+        if changed:
+            self._notify_capacity()
+        return endpoint
+
+    def release(self, endpoint: OllamaEndpoint, success: Optional[bool], latency: Optional[float] = None) -> None:
+        """
+        Libera la reserva e informa del resultado
+
+        Args:
+            endpoint: Host devuelto por acquire
+            success: False si hubo timeout, error de conexión o HTTP 5xx;
+                     None si el request no llegó a concluir (p. ej. cancelado)
+            latency: Segundos que tardó el request
+        """
+        now = time.monotonic()
+        with self._lock:
+            endpoint.outstanding -= 1
+            previous_state = endpoint.state
+            if endpoint.state == HALF_OPEN:
+                endpoint.probe_in_flight = False
+
+            if success is None:
+                pass  # Sin veredicto sobre la salud del host
+            elif success:
+                endpoint.consecutive_failures = 0
+                if latency is not None:
+                    endpoint.ewma_latency = latency if endpoint.ewma_latency is None else (
+                        self.latency_alpha * latency + (1 - self.latency_alpha) * endpoint.ewma_latency
+                    )
+                if endpoint.state == HALF_OPEN:
+                    endpoint.state = CLOSED
+                    endpoint.cooldown = 0.0
+                    logger.info(f"✅ Circuito cerrado para {endpoint.url}: el request de prueba tuvo éxito")
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.state == HALF_OPEN or (endpoint.state == CLOSED and
+                                                   endpoint.consecutive_failures >= self.failure_threshold):
+                    self._open_locked(endpoint, now)
+            changed = endpoint.state != previous_state
+        if changed:
+            self._notify_capacity()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado de cada host y métricas de enrutado"""
+        now = time.monotonic()
+        with self._lock:
+            self._refresh_locked(now)
+            return {
+                'endpoints': [endpoint.to_dict(now) for endpoint in self.endpoints],
+                'total_capacity': sum(endpoint.capacity() for endpoint in self.endpoints),
+                'affinity_hits': self.affinity_hits,
+                'rejected_requests': self.rejected_requests
+            }
+
+    def _route_key(self, endpoint: OllamaEndpoint, model: str, now: float):
+        """Prueba half-open pendiente, afinidad, ocupación relativa y latencia media"""
+        return (
+            0 if endpoint.state == HALF_OPEN else 1,  # Sin su request de prueba el host no se recupera
+            0 if self._has_model(endpoint, model, now) else 1,
+            endpoint.outstanding / endpoint.max_concurrent,
+            endpoint.ewma_latency if endpoint.ewma_latency is not None else 0.0
+        )
+
+    def _has_model(self, endpoint: OllamaEndpoint, model: str, now: float) -> bool:
+        last_used = endpoint.recent_models.get(model)
+        return last_used is not None and now - last_used <= self.model_affinity_seconds
+
+    def _open_locked(self, endpoint: OllamaEndpoint, now: float) -> None:
+        """Abre el circuito con enfriamiento exponencial; requiere self._lock"""
+        endpoint.cooldown = min(self.max_cooldown, endpoint.cooldown * 2 if endpoint.cooldown else self.base_cooldown)
+        endpoint.state = OPEN
+        endpoint.opened_at = now
+        endpoint.circuit_opens += 1
+        endpoint.recent_models.clear()  # Un host caído pierde los modelos cargados
+        logger.warning(f"🔴 Circuito abierto para {endpoint.url} tras {endpoint.consecutive_failures} fallos "
+                       f"(reintento en {endpoint.cooldown:.0f}s)")
+
+    def _refresh_locked(self, now: float) -> bool:
+        """Pasa a half-open los circuitos cuyo enfriamiento expiró; requiere self._lock"""
+        changed = False
+        for endpoint in self.endpoints:
+            if endpoint.state == OPEN and now - endpoint.opened_at >= endpoint.cooldown:
+                endpoint.state = HALF_OPEN
+                endpoint.probe_in_flight = False
+                changed = True
+                logger.info(f"🟡 Circuito half-open para {endpoint.url}: se enviará un request de prueba")
+        return changed
+
+    def _notify_capacity(self) -> None:
+        capacity = self.total_capacity()
+        for listener in self._capacity_listeners:
+            try:
+                listener(capacity)
+            except Exception as e:
+                logger.error(f"❌ Error notificando capacidad del pool de endpoints: {e}")
+
+
+def create_endpoint_pool_from_env() -> Optional[OllamaEndpointPool]:
+    """
+    Crea el pool desde OLLAMA_ENDPOINTS
+
+    Returns:
+        OllamaEndpointPool o None si no hay varios endpoints configurados
+        (en ese caso cada OllamaService usa su propio base_url)
+    """
+    config = os.getenv('OLLAMA_ENDPOINTS', '').strip()
+    if not config:
+        return None
+    try:
+        pool = OllamaEndpointPool.from_config(
+            config,
+            failure_threshold=int(os.getenv('OLLAMA_ENDPOINT_FAILURE_THRESHOLD', '3')),
+            base_cooldown=float(os.getenv('OLLAMA_ENDPOINT_COOLDOWN', '15'))
+        )
+        logger.info(f"⚖️ Pool de endpoints Ollama: {[endpoint.url for endpoint in pool.endpoints]}")
+        return pool
+    except Exception as e:
+        logger.error(f"❌ OLLAMA_ENDPOINTS inválido ({config}): {e}")
+        return None
@@ -8,9 +8,14 @@ estabilidad del sistema cuando múltiples tareas están activas simultáneamente
 
 CARACTERÍSTICAS:
 - ✅ Límite configurable de llamadas concurrentes (por defecto: 2)
-- ✅ Cola FIFO para requests en espera
+- ✅ Cola por prioridad (heap) con envejecimiento anti-inanición
 - ✅ Timeout personalizado por request
 - ✅ Priorización de tareas por importancia
+- ✅ Reparto justo de slots entre tareas
+- ✅ Deduplicación single-flight de requests idénticos en curso
+- ✅ Modo streaming que entrega chunks sin soltar el slot
+- ✅ Balanceo entre varios hosts de Ollama con circuit breaker (OLLAMA_ENDPOINTS)
+- ✅ Lotes por modelo para evitar recargas de pesos (swap) en Ollama
 - ✅ Logs detallados para debugging
 - ✅ Métricas de rendimiento y estadísticas de cola
 - ✅ Recuperación automática ante fallos de Ollama
@@ -24,9 +29,10 @@ llamar a Ollama al mismo tiempo, causando:
 - Degradación del rendimiento
 
 SOLUCIÓN:
-Este gestor controla el acceso a Ollama usando un semáforo asyncio,
-garantizando que solo un número limitado de requests se procesen
-simultáneamente, mientras mantiene una cola para los demás.
+Este gestor controla el acceso a Ollama con un despachador de slots
+(PriorityDispatcher) que entrega cada slot libre al request de mayor
+prioridad efectiva, garantizando que solo un número limitado de requests
+se procesen simultáneamente.
 
 Creado por: Sistema de reintentos de 5 pasos
 Fecha: 2025-01-03
@@ -35,17 +41,25 @@ Versión: 1.0.0
 
 import asyncio
 import logging
+import os
 import time
 import uuid
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List, Optional, Any, Callable, Awaitable
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, Awaitable
 from dataclasses import dataclass, field
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 import threading
 
+from .ollama_dispatcher import PriorityDispatcher
+from .ollama_endpoint_pool import OllamaEndpoint, OllamaEndpointPool, create_endpoint_pool_from_env
+from .llm_response_cache import LLMResponseCache
+
 logger = logging.getLogger(__name__)
 
+# Por debajo de este load_duration el modelo ya estaba en memoria
+MODEL_LOAD_THRESHOLD_SECONDS = 0.5
+
 class RequestPriority(Enum):
     """
     🔴 NIVELES DE PRIORIDAD PARA REQUESTS DE OLLAMA
@@ -88,6 +102,8 @@ class OllamaRequest:
     # Estado interno
     retry_count: int = 0
     last_error: Optional[str] = None
+    endpoint: Optional[str] = None  # Host asignado por el pool de endpoints (None: base_url del servicio)
+    context: Optional[List[int]] = None  # Tokens de la sesión de la tarea: el prompt es solo el turno nuevo
     
     def __post_init__(self):
         """Validaciones y configuración post-inicialización"""
@@ -139,6 +155,15 @@ class QueueStats:
     ollama_errors: int = 0
     timeout_errors: int = 0
     
+    deduplicated_requests: int = 0  # Requests servidos por un request idéntico en curso
+    
+    streamed_requests: int = 0  # Requests atendidos en modo streaming
+    average_time_to_first_chunk: float = 0.0
+    
+    model_swaps: int = 0           # Cambios de modelo entre requests consecutivos de un mismo host
+    model_loads: int = 0           # Respuestas que incluyeron una carga de pesos
+    model_load_seconds: float = 0.0  # Tiempo perdido cargando modelos (load_duration de Ollama)
+    
     uptime_start: datetime = field(default_factory=datetime.now)
     
     @property
@@ -157,8 +182,8 @@ class OllamaQueueManager:
     """
     🚦 GESTOR PRINCIPAL DE COLA PARA OLLAMA
     
-    Maneja todas las llamadas a Ollama usando un semáforo para controlar
-    la concurrencia y una cola prioritaria para organizar los requests.
+    Maneja todas las llamadas a Ollama usando un despachador por prioridad
+    que controla la concurrencia y el orden de ejecución de los requests.
     
     CONFIGURACIÓN:
     - max_concurrent_requests: Máximo número de requests simultáneos (defecto: 2)
@@ -169,7 +194,11 @@ class OllamaQueueManager:
     def __init__(self, 
                  max_concurrent_requests: int = 2,
                  max_queue_size: int = 50,
-                 cleanup_interval: int = 300):
+                 cleanup_interval: int = 300,
+                 aging_seconds: float = 30.0,
+                 max_slots_per_task: Optional[int] = None,
+                 endpoint_pool: Optional[OllamaEndpointPool] = None,
+                 model_batch_window: float = 10.0):
         """
         Inicializar el gestor de cola de Ollama
         
@@ -177,17 +206,33 @@ class OllamaQueueManager:
             max_concurrent_requests: Máximo requests concurrentes a Ollama
             max_queue_size: Tamaño máximo de la cola de espera
             cleanup_interval: Intervalo de limpieza en segundos
+            aging_seconds: Espera que equivale a subir un nivel de prioridad
+            max_slots_per_task: Slots máximos por tarea mientras otras esperan
+            endpoint_pool: Hosts de Ollama entre los que repartir; si se indica,
+                           la concurrencia es la suma de sus capacidades sanas
+            model_batch_window: Segundos que un request puede ceder el turno a otros
+                                del modelo ya cargado (0 desactiva los lotes por modelo)
         """
         self.max_concurrent_requests = max_concurrent_requests
         self.max_queue_size = max_queue_size
         self.cleanup_interval = cleanup_interval
         
-        # Semáforo para controlar concurrencia
-        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        # Despachador por prioridad: sustituye al semáforo FIFO
+        self._dispatcher = PriorityDispatcher(
+            max_slots=max_concurrent_requests,
+            aging_seconds=aging_seconds,
+            max_slots_per_task=max_slots_per_task,
+            model_batch_window=model_batch_window
+        )
+        
+        # Pool de hosts: su capacidad sana marca los slots del despachador
+        self._endpoint_pool = endpoint_pool
+        if endpoint_pool is not None:
+            endpoint_pool.add_capacity_listener(self._on_endpoint_capacity)
         
-        # Cola prioritaria - organizamos por prioridad
-        self._queue: List[OllamaRequest] = []
-        self._queue_lock = asyncio.Lock()
+        # Single-flight: clave (modelo, prompt, opciones) -> request líder y su futuro
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self._in_flight_lock = threading.Lock()
         
         # Estado interno
         self._processing_requests: Dict[str, OllamaRequest] = {}
@@ -196,6 +241,8 @@ class OllamaQueueManager:
         
         # Estadísticas
         self.stats = QueueStats()
+        self._first_chunk_samples = 0
+        self._last_model_by_endpoint: Dict[str, str] = {}
         
         # Control de threading para operaciones de limpieza
         self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ollama_queue")
@@ -206,6 +253,8 @@ class OllamaQueueManager:
         logger.info(f"   - Max requests concurrentes: {max_concurrent_requests}")
         logger.info(f"   - Tamaño máximo de cola: {max_queue_size}")
         logger.info(f"   - Intervalo de limpieza: {cleanup_interval}s")
+        if endpoint_pool is not None:
+            logger.info(f"   - Endpoints: {len(endpoint_pool.endpoints)} (capacidad {self.max_concurrent_requests})")
     
     async def start(self) -> None:
         """
@@ -262,108 +311,376 @@ class OllamaQueueManager:
         if self._shutdown:
             raise RuntimeError("OllamaQueueManager está cerrado")
         
-        # Verificar tamaño de cola
-        async with self._queue_lock:
-            if len(self._queue) >= self.max_queue_size:
-                self.stats.requests_failed += 1
-                raise RuntimeError(f"Cola de Ollama llena (max: {self.max_queue_size})")
-            
-            # Insertar en posición correcta según prioridad
-            inserted = False
-            for i, queued_request in enumerate(self._queue):
-                if ollama_request.priority.value > queued_request.priority.value:
-                    self._queue.insert(i, ollama_request)
-                    inserted = True
-                    break
-            
-            if not inserted:
-                self._queue.append(ollama_request)
+        if ollama_request.context:
+            # Con sesión el prompt es solo el delta: dos requests iguales no comparten estado previo
+            return await self._execute_request(ollama_request, execution_callback)
+        
+        # Single-flight: si un request idéntico ya está en cola o en ejecución,
+        # se espera su resultado en lugar de ocupar otro slot
+        flight_key = LLMResponseCache.make_key(ollama_request.model, ollama_request.prompt, ollama_request.options)
+        with self._in_flight_lock:
+            flight = self._in_flight.get(flight_key)
+            if flight is None:
+                flight = {'leader': ollama_request, 'future': Future(), 'followers': 0}
+                self._in_flight[flight_key] = flight
+                is_leader = True
+            else:
+                flight['followers'] += 1
+                is_leader = False
+        
+        if not is_leader:
+            return await self._follow_flight(flight, ollama_request)
+        
+        try:
+            result = await self._execute_request(ollama_request, execution_callback)
+            flight['future'].set_result(result)
+            return result
+        except BaseException as e:
+            flight['future'].set_exception(e if isinstance(e, Exception) else RuntimeError("Request líder cancelado"))
+            raise
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.pop(flight_key, None)
+    
+    async def _follow_flight(self, flight: Dict[str, Any], ollama_request: OllamaRequest) -> Dict[str, Any]:
+        """
+        Espera el resultado del request líder idéntico (desde cualquier event loop)
+        
+        Args:
+            flight: Entrada single-flight del líder
+            ollama_request: Request duplicado
             
-            self.stats.requests_queued += 1
-            self.stats.current_queue_size = len(self._queue)
-            self.stats.max_queue_size_reached = max(self.stats.max_queue_size_reached, self.stats.current_queue_size)
+        Returns:
+            Copia del resultado del líder
+        """
+        leader = flight['leader']
+        self.stats.deduplicated_requests += 1
+        logger.info(f"🔗 Request {ollama_request.request_id} (tarea: {ollama_request.task_id}) adjunto al request idéntico en curso {leader.request_id}")
         
-        logger.info(f"📥 Request encolado: {ollama_request.request_id} (tarea: {ollama_request.task_id}, prioridad: {ollama_request.priority.name})")
-        logger.info(f"📊 Cola actual: {len(self._queue)} requests, {len(self._processing_requests)} procesando")
+        # Un duplicado más urgente no debe esperar a la prioridad del líder
+        if self._dispatcher.raise_priority(leader.request_id, ollama_request.priority):
+            logger.info(f"⬆️ Request {leader.request_id} promovido a {ollama_request.priority.name}")
+        
+        # Futuro propio: cancelar al seguidor no debe cancelar al líder
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        
+        def _copy_result(source: Future) -> None:
+            if waiter.done():
+                return
+            if source.exception() is not None:
+                waiter.set_exception(source.exception())
+            else:
+                waiter.set_result(source.result())
+        
+        def _notify(source: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(_copy_result, source)
+            except RuntimeError:
+                pass  # El loop del seguidor ya terminó
         
+        flight['future'].add_done_callback(_notify)
         try:
-            # Esperar a que el semáforo permita procesar
-            async with self._semaphore:
-                # Obtener el request de la cola
-                async with self._queue_lock:
-                    if ollama_request in self._queue:
-                        self._queue.remove(ollama_request)
-                        self.stats.current_queue_size = len(self._queue)
-                        self._processing_requests[ollama_request.request_id] = ollama_request
-                        self.stats.requests_processing += 1
-                        ollama_request.started_at = datetime.now()
+            result = await waiter
+        except Exception as e:
+            error_msg = f"Error en request líder {leader.request_id}: {str(e)}"
+            return {'error': error_msg, 'error_type': 'queue_error'}
+        
+        result = dict(result)
+        result['deduplicated_from'] = leader.request_id
+        return result
+    
+    async def _execute_request(self, 
+                               ollama_request: OllamaRequest,
+                               execution_callback: Callable[[OllamaRequest], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Espera un slot del despachador y ejecuta el request con timeout"""
+        self._register_queued(ollama_request)
+        try:
+            wait_time = await self._acquire_slot(ollama_request)
+        except Exception as e:
+            return self._queue_error(ollama_request, e)
+        
+        endpoint = None
+        endpoint_ok = None
+        try:
+            self._start_processing(ollama_request, wait_time)
+            if self._endpoint_pool is not None:
+                endpoint = self._assign_endpoint(ollama_request)
+                if endpoint is None:
+                    return self._no_endpoint_error(ollama_request)
+            self._track_model_swap(ollama_request)
+            
+            # Ejecutar la llamada real a Ollama con timeout
+            try:
+                result = await asyncio.wait_for(
+                    execution_callback(ollama_request),
+                    timeout=ollama_request.timeout
+                )
+                
+                endpoint_ok = not self._is_endpoint_failure(result)
+                self._record_model_load(result)
+                self._mark_completed(ollama_request, wait_time)
+                return result
                 
-                wait_time = (ollama_request.started_at - ollama_request.created_at).total_seconds()
-                logger.info(f"🔄 Procesando request {ollama_request.request_id} (esperó {wait_time:.1f}s en cola)")
+            except asyncio.TimeoutError:
+                endpoint_ok = False
+                return self._mark_timeout(ollama_request)
                 
-                # Ejecutar la llamada real a Ollama con timeout
+            except Exception as e:
+                endpoint_ok = False
+                return self._mark_failed(ollama_request, e)
+        
+        finally:
+            self._finish_processing(ollama_request, endpoint, endpoint_ok)
+    
+    async def stream_request(self,
+                             ollama_request: OllamaRequest,
+                             stream_callback: Callable[[OllamaRequest], AsyncIterator[Dict[str, Any]]]
+                             ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        📡 EJECUTAR UN REQUEST EN STREAMING DENTRO DE LA COLA
+        
+        Igual que enqueue_request pero entrega los chunks a medida que llegan.
+        El slot se mantiene ocupado hasta el último chunk (o hasta que el
+        consumidor deja de iterar). No se deduplica: cada consumidor necesita
+        su propio stream.
+        
+        Args:
+            ollama_request: Request a procesar
+            stream_callback: Función que devuelve un iterador async de chunks de Ollama
+            
+        Yields:
+            Chunks de Ollama; ante un fallo, un chunk final con 'error' y 'done'
+            
+        Raises:
+            RuntimeError: Si la cola está llena o el gestor está cerrado
+        """
+        if self._shutdown:
+            raise RuntimeError("OllamaQueueManager está cerrado")
+        
+        self._register_queued(ollama_request)
+        try:
+            wait_time = await self._acquire_slot(ollama_request)
+        except Exception as e:
+            yield dict(self._queue_error(ollama_request, e), done=True)
+            return
+        
+        endpoint = None
+        endpoint_ok = None
+        chunks = None
+        try:
+            self._start_processing(ollama_request, wait_time)
+            if self._endpoint_pool is not None:
+                endpoint = self._assign_endpoint(ollama_request)
+                if endpoint is None:
+                    yield dict(self._no_endpoint_error(ollama_request), done=True)
+                    return
+            self._track_model_swap(ollama_request)
+            
+            chunks = stream_callback(ollama_request)
+            self.stats.streamed_requests += 1
+            deadline = time.monotonic() + ollama_request.timeout
+            first_chunk = True
+            
+            while True:
                 try:
-                    result = await asyncio.wait_for(
-                        execution_callback(ollama_request),
-                        timeout=ollama_request.timeout
-                    )
-                    
-                    # Marcar como completado exitosamente
-                    ollama_request.completed_at = datetime.now()
-                    processing_time = ollama_request.processing_time_seconds
-                    
-                    self._completed_requests[ollama_request.request_id] = ollama_request
-                    self.stats.requests_completed += 1
-                    
-                    # Actualizar estadísticas
-                    self._update_average_times(wait_time, processing_time)
-                    
-                    logger.info(f"✅ Request {ollama_request.request_id} completado exitosamente (procesado en {processing_time:.1f}s)")
-                    
-                    return result
-                    
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - time.monotonic())
+                except StopAsyncIteration:
+                    break
                 except asyncio.TimeoutError:
-                    self.stats.timeout_errors += 1
-                    self.stats.requests_failed += 1
-                    error_msg = f"Timeout después de {ollama_request.timeout}s para modelo {ollama_request.model}"
-                    logger.error(f"⏱️ {error_msg} - Request: {ollama_request.request_id}")
-                    
-                    ollama_request.last_error = error_msg
-                    ollama_request.completed_at = datetime.now()
-                    self._failed_requests[ollama_request.request_id] = ollama_request
-                    
-                    return {'error': error_msg, 'error_type': 'timeout'}
-                    
+                    endpoint_ok = False
+                    yield dict(self._mark_timeout(ollama_request), done=True)
+                    return
                 except Exception as e:
-                    self.stats.ollama_errors += 1
-                    self.stats.requests_failed += 1
-                    error_msg = str(e)
-                    logger.error(f"❌ Error en request {ollama_request.request_id}: {error_msg}")
-                    
-                    ollama_request.last_error = error_msg
-                    ollama_request.completed_at = datetime.now()
-                    self._failed_requests[ollama_request.request_id] = ollama_request
-                    
-                    return {'error': error_msg, 'error_type': 'ollama_error'}
-                    
-                finally:
-                    # Limpiar del tracking de procesamiento
-                    if ollama_request.request_id in self._processing_requests:
-                        del self._processing_requests[ollama_request.request_id]
-                        self.stats.requests_processing -= 1
-        
-        except Exception as e:
-            # Error en el manejo de cola o semáforo
-            async with self._queue_lock:
-                if ollama_request in self._queue:
-                    self._queue.remove(ollama_request)
-                    self.stats.current_queue_size = len(self._queue)
+                    endpoint_ok = False
+                    yield dict(self._mark_failed(ollama_request, e), done=True)
+                    return
+                
+                if chunk.get('error'):
+                    endpoint_ok = not self._is_endpoint_failure(chunk)
+                elif chunk.get('done'):
+                    self._record_model_load(chunk)
+                if first_chunk and not chunk.get('error'):
+                    first_chunk = False
+                    self._record_first_chunk((datetime.now() - ollama_request.started_at).total_seconds())
+                yield chunk
             
+            if endpoint_ok is None:
+                endpoint_ok = True
+            self._mark_completed(ollama_request, wait_time)
+        
+        finally:
+            if chunks is not None:
+                await chunks.aclose()
+            self._finish_processing(ollama_request, endpoint, endpoint_ok)
+    
+    def _register_queued(self, ollama_request: OllamaRequest) -> None:
+        """
+        Contabiliza el request como encolado
+        
+        Raises:
+            RuntimeError: Si la cola está llena
+        """
+        # Verificar tamaño de cola
+        if self._dispatcher.waiting >= self.max_queue_size:
             self.stats.requests_failed += 1
-            error_msg = f"Error en gestor de cola: {str(e)}"
-            logger.error(f"❌ {error_msg} - Request: {ollama_request.request_id}")
-            
-            return {'error': error_msg, 'error_type': 'queue_error'}
+            raise RuntimeError(f"Cola de Ollama llena (max: {self.max_queue_size})")
+        
+        self.stats.requests_queued += 1
+        self.stats.current_queue_size = self._dispatcher.waiting + 1
+        self.stats.max_queue_size_reached = max(self.stats.max_queue_size_reached, self.stats.current_queue_size)
+        
+        logger.info(f"📥 Request encolado: {ollama_request.request_id} (tarea: {ollama_request.task_id}, prioridad: {ollama_request.priority.name})")
+        logger.info(f"📊 Cola actual: {self._dispatcher.waiting + 1} requests, {len(self._processing_requests)} procesando")
+    
+    async def _acquire_slot(self, ollama_request: OllamaRequest) -> float:
+        """
+        Espera a que el despachador asigne un slot al request
+        
+        Returns:
+            Segundos esperados en cola
+        """
+        # Esperar a que el despachador asigne un slot por prioridad
+        return await self._dispatcher.acquire(
+            ollama_request.priority,
+            ollama_request.task_id,
+            info={
+                'request_id': ollama_request.request_id,
+                'task_id': ollama_request.task_id,
+                'model': ollama_request.model,
+                'created_at': ollama_request.created_at,
+                'timeout': ollama_request.timeout
+            }
+        )
+    
+    def _queue_error(self, ollama_request: OllamaRequest, error: Exception) -> Dict[str, Any]:
+        """Error en el manejo de cola o despachador (el request no llegó a tener slot)"""
+        self.stats.current_queue_size = self._dispatcher.waiting
+        self.stats.requests_failed += 1
+        error_msg = f"Error en gestor de cola: {str(error)}"
+        logger.error(f"❌ {error_msg} - Request: {ollama_request.request_id}")
+        
+        return {'error': error_msg, 'error_type': 'queue_error'}
+    
+    def _start_processing(self, ollama_request: OllamaRequest, wait_time: float) -> None:
+        self.stats.current_queue_size = self._dispatcher.waiting
+        self._processing_requests[ollama_request.request_id] = ollama_request
+        self.stats.requests_processing += 1
+        ollama_request.started_at = datetime.now()
+        
+        logger.info(f"🔄 Procesando request {ollama_request.request_id} (esperó {wait_time:.1f}s en cola)")
+    
+    def _mark_completed(self, ollama_request: OllamaRequest, wait_time: float) -> None:
+        # Marcar como completado exitosamente
+        ollama_request.completed_at = datetime.now()
+        processing_time = ollama_request.processing_time_seconds
+        
+        self._completed_requests[ollama_request.request_id] = ollama_request
+        self.stats.requests_completed += 1
+        
+        # Actualizar estadísticas
+        self._update_average_times(wait_time, processing_time)
+        
+        logger.info(f"✅ Request {ollama_request.request_id} completado exitosamente (procesado en {processing_time:.1f}s)")
+    
+    def _mark_timeout(self, ollama_request: OllamaRequest) -> Dict[str, Any]:
+        self.stats.timeout_errors += 1
+        self.stats.requests_failed += 1
+        error_msg = f"Timeout después de {ollama_request.timeout}s para modelo {ollama_request.model}"
+        logger.error(f"⏱️ {error_msg} - Request: {ollama_request.request_id}")
+        
+        ollama_request.last_error = error_msg
+        ollama_request.completed_at = datetime.now()
+        self._failed_requests[ollama_request.request_id] = ollama_request
+        
+        return {'error': error_msg, 'error_type': 'timeout'}
+    
+    def _mark_failed(self, ollama_request: OllamaRequest, error: Exception) -> Dict[str, Any]:
+        self.stats.ollama_errors += 1
+        self.stats.requests_failed += 1
+        error_msg = str(error)
+        logger.error(f"❌ Error en request {ollama_request.request_id}: {error_msg}")
+        
+        ollama_request.last_error = error_msg
+        ollama_request.completed_at = datetime.now()
+        self._failed_requests[ollama_request.request_id] = ollama_request
+        
+        return {'error': error_msg, 'error_type': 'ollama_error'}
+    
+    def _track_model_swap(self, ollama_request: OllamaRequest) -> None:
+        """Cuenta un swap cuando el host recibe un modelo distinto al del request anterior"""
+        host = ollama_request.endpoint or ''
+        previous = self._last_model_by_endpoint.get(host)
+        if previous is not None and previous != ollama_request.model:
+            self.stats.model_swaps += 1
+            logger.info(f"🔀 Cambio de modelo en {host or 'endpoint por defecto'}: {previous} → {ollama_request.model}")
+        self._last_model_by_endpoint[host] = ollama_request.model
+    
+    def _record_model_load(self, result: Dict[str, Any]) -> None:
+        """Acumula el tiempo de carga de pesos que Ollama informa en load_duration (ns)"""
+        load_duration = result.get('load_duration')
+        if not isinstance(load_duration, (int, float)):
+            return
+        seconds = load_duration / 1e9
+        if seconds >= MODEL_LOAD_THRESHOLD_SECONDS:
+            self.stats.model_loads += 1
+            self.stats.model_load_seconds += seconds
+    
+    def _assign_endpoint(self, ollama_request: OllamaRequest) -> Optional[OllamaEndpoint]:
+        """Reserva un host del pool para el request y lo anota en request.endpoint"""
+        endpoint = self._endpoint_pool.acquire(ollama_request.model)
+        if endpoint is not None:
+            ollama_request.endpoint = endpoint.url
+            logger.info(f"⚖️ Request {ollama_request.request_id} enrutado a {endpoint.url} ({endpoint.outstanding}/{endpoint.max_concurrent})")
+        return endpoint
+    
+    def _no_endpoint_error(self, ollama_request: OllamaRequest) -> Dict[str, Any]:
+        """Todos los circuitos abiertos: se falla rápido en lugar de esperar un timeout"""
+        self.stats.requests_failed += 1
+        error_msg = "No hay endpoints de Ollama disponibles (circuitos abiertos)"
+        logger.error(f"🔴 {error_msg} - Request: {ollama_request.request_id}")
+        
+        ollama_request.last_error = error_msg
+        ollama_request.completed_at = datetime.now()
+        self._failed_requests[ollama_request.request_id] = ollama_request
+        
+        return {'error': error_msg, 'error_type': 'no_healthy_endpoint'}
+    
+    @staticmethod
+    def _is_endpoint_failure(result: Dict[str, Any]) -> bool:
+        """Timeouts, errores de conexión y HTTP 5xx cuentan contra la salud del host"""
+        error_type = result.get('error_type')
+        if error_type in ('timeout', 'connection_error'):
+            return True
+        return error_type == 'http_error' and result.get('status_code', 0) >= 500
+    
+    def _on_endpoint_capacity(self, capacity: int) -> None:
+        """Ajusta los slots del despachador a la capacidad sana del pool"""
+        if capacity != self.max_concurrent_requests:
+            logger.info(f"⚖️ Capacidad de Ollama: {self.max_concurrent_requests} → {capacity} slots")
+        self.max_concurrent_requests = max(1, capacity)
+        self._dispatcher.set_max_slots(self.max_concurrent_requests)
+    
+    def _finish_processing(self, ollama_request: OllamaRequest,
+                           endpoint: Optional[OllamaEndpoint] = None,
+                           endpoint_ok: Optional[bool] = None) -> None:
+        if endpoint is not None:
+            latency = (datetime.now() - ollama_request.started_at).total_seconds()
+            self._endpoint_pool.release(endpoint, endpoint_ok, latency)
+        
+        # Limpiar del tracking de procesamiento y liberar el slot
+        if ollama_request.request_id in self._processing_requests:
+            del self._processing_requests[ollama_request.request_id]
+            self.stats.requests_processing -= 1
+        self._dispatcher.release(ollama_request.task_id)
+    
+    def _record_first_chunk(self, seconds: float) -> None:
+        """Promedio móvil del tiempo hasta el primer chunk de los requests en streaming"""
+        self._first_chunk_samples += 1
+        count = self._first_chunk_samples
+        self.stats.average_time_to_first_chunk = (
+            (self.stats.average_time_to_first_chunk * (count - 1) + seconds) / count
+        )
     
     def _update_average_times(self, wait_time: float, processing_time: Optional[float]) -> None:
         """Actualizar promedios de tiempo de manera eficiente"""
@@ -390,24 +707,26 @@ class OllamaQueueManager:
         Returns:
             Diccionario con estadísticas y estado actual
         """
-        async with self._queue_lock:
-            queue_requests = [
-                {
-                    'request_id': req.request_id,
-                    'task_id': req.task_id,
-                    'priority': req.priority.name,
-                    'model': req.model,
-                    'age_seconds': req.age_seconds,
-                    'timeout': req.timeout
-                }
-                for req in self._queue
-            ]
+        now = datetime.now()
+        queue_requests = [
+            {
+                'request_id': info['request_id'],
+                'task_id': info['task_id'],
+                'priority': info['priority'],
+                'effective_priority': info['effective_priority'],
+                'model': info['model'],
+                'age_seconds': (now - info['created_at']).total_seconds(),
+                'timeout': info['timeout']
+            }
+            for info in self._dispatcher.get_pending()
+        ]
         
         processing_requests = [
             {
                 'request_id': req.request_id,
                 'task_id': req.task_id,
                 'model': req.model,
+                'endpoint': req.endpoint,
                 'started_at': req.started_at.isoformat() if req.started_at else None,
                 'age_seconds': req.age_seconds
             }
@@ -434,8 +753,20 @@ class OllamaQueueManager:
                 'throughput_per_minute': round(self.stats.throughput_per_minute, 2),
                 'uptime_seconds': round(self.stats.uptime_seconds, 2),
                 'ollama_errors': self.stats.ollama_errors,
-                'timeout_errors': self.stats.timeout_errors
+                'timeout_errors': self.stats.timeout_errors,
+                'wait_time_by_priority': self._dispatcher.get_wait_stats(),
+                'deduplicated_requests': self.stats.deduplicated_requests,
+                'streamed_requests': self.stats.streamed_requests,
+                'model_swaps': self.stats.model_swaps,
+                'model_loads': self.stats.model_loads,
+                'model_load_seconds': round(self.stats.model_load_seconds, 2),
+                'model_batched_grants': self._dispatcher.batched_grants,
+                'loaded_model': self._dispatcher.loaded_model,
+                'average_time_to_first_chunk': round(self.stats.average_time_to_first_chunk, 2),
+                'in_flight_unique_requests': len(self._in_flight),
+                'fair_share_deferrals': self._dispatcher.fair_share_deferrals
             },
+            'endpoints': self._endpoint_pool.get_status() if self._endpoint_pool is not None else None,
             'health': {
                 'is_running': not self._shutdown,
                 'queue_full': len(queue_requests) >= self.max_queue_size,
@@ -506,7 +837,9 @@ def get_ollama_queue_manager() -> OllamaQueueManager:
         _global_queue_manager = OllamaQueueManager(
             max_concurrent_requests=2,  # Máximo 2 requests concurrentes por defecto
             max_queue_size=20,          # Cola máxima de 20 requests
-            cleanup_interval=300        # Limpieza cada 5 minutos
+            cleanup_interval=300,       # Limpieza cada 5 minutos
+            endpoint_pool=create_endpoint_pool_from_env(),  # Varios hosts: capacidad = suma de sus límites
+            model_batch_window=float(os.getenv('OLLAMA_MODEL_BATCH_WINDOW', '10'))
         )
         logger.info("🌐 Nueva instancia global de OllamaQueueManager creada")
     
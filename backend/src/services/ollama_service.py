@@ -15,10 +15,16 @@ import time
 import os
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any
-import requests
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable
 from requests.exceptions import RequestException, Timeout
 
+from .http_pool import get_http_session, get_async_http_pool, HTTPX_AVAILABLE
+from .llm_response_cache import get_llm_response_cache
+from .ollama_task_sessions import get_task_session_store
+from .streaming_json_parser import StreamingJSONParser, StreamingJSONError, SchemaViolation
+if HTTPX_AVAILABLE:
+    import httpx
+
 # 🚦 IMPORTACIÓN DEL GESTOR DE COLA
 from .ollama_queue_manager import (
     OllamaQueueManager, 
@@ -27,6 +33,9 @@ from .ollama_queue_manager import (
     get_ollama_queue_manager
 )
 
+# Tiempo que Ollama mantiene el modelo en memoria tras cada request (por modelo: "keep_alive" en su configuración)
+DEFAULT_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+
 class OllamaService:
     def __init__(self, base_url: str = None):
         self.base_url = base_url or os.getenv('OLLAMA_BASE_URL', 'https://bef4a4bb93d1.ngrok-free.app')
@@ -35,6 +44,9 @@ class OllamaService:
         self.conversation_history = []
         self.request_timeout = 90  # Base timeout, será sobrescrito por configuración por modelo
         
+        # 🔌 Pool HTTP compartido (keep-alive) con ModelManager y OpenRouterService
+        self.session = get_http_session()
+        
         # 🆕 PROBLEMA 3: Configuración de parámetros por modelo
         self.model_configs = self._load_model_configs()
         
@@ -75,7 +87,8 @@ class OllamaService:
                                  options: Dict[str, Any],
                                  priority: RequestPriority = RequestPriority.NORMAL,
                                  task_id: str = "",
-                                 step_id: str = "") -> Dict[str, Any]:
+                                 step_id: str = "",
+                                 context_tokens: Optional[List[int]] = None) -> Dict[str, Any]:
         """
         🚦 EJECUTAR LLAMADA A OLLAMA A TRAVÉS DE LA COLA
         
@@ -89,6 +102,7 @@ class OllamaService:
             priority: Prioridad del request
             task_id: ID de la tarea (para tracking)
             step_id: ID del paso (para tracking)
+            context_tokens: Contexto de la sesión de la tarea (el prompt es solo el turno nuevo)
             
         Returns:
             Resultado de Ollama o error
@@ -96,7 +110,7 @@ class OllamaService:
         queue_manager = self._get_queue_manager()
         if not queue_manager:
             self.logger.warning("⚠️ Gestor de cola no disponible, ejecutando llamada directa")
-            return await self._execute_direct_call(prompt, model, options)
+            return await self._execute_direct_call(prompt, model, options, context_tokens=context_tokens)
         
         # Crear request para la cola
         ollama_request = OllamaRequest(
@@ -106,14 +120,16 @@ class OllamaService:
             model=model,
             options=options,
             priority=priority,
-            timeout=self._get_model_config(model).get("request_timeout", 180)
+            timeout=self._get_model_config(model).get("request_timeout", 180),
+            context=context_tokens
         )
         
         self.logger.info(f"🚦 Encolando request para modelo {model} (tarea: {task_id}, prioridad: {priority.name})")
         
         # Función callback que ejecuta la llamada real
         async def execution_callback(request: OllamaRequest) -> Dict[str, Any]:
-            return await self._execute_direct_call(request.prompt, request.model, request.options)
+            return await self._execute_direct_call(request.prompt, request.model, request.options,
+                                                   base_url=request.endpoint, context_tokens=request.context)
         
         # Ejecutar a través de la cola
         try:
@@ -134,93 +150,237 @@ class OllamaService:
     async def _execute_direct_call(self, 
                                   prompt: str, 
                                   model: str, 
-                                  options: Dict[str, Any]) -> Dict[str, Any]:
+                                  options: Dict[str, Any],
+                                  base_url: Optional[str] = None,
+                                  context_tokens: Optional[List[int]] = None) -> Dict[str, Any]:
         """
         🔧 EJECUTAR LLAMADA DIRECTA A OLLAMA (SIN COLA)
         
         Versión async de _call_ollama_api para uso dentro del sistema de cola.
         Mantiene la misma lógica pero adaptada para async/await.
         """
+        async_pool = get_async_http_pool()
+        if async_pool is None:
+            try:
+                # Sin cliente asíncrono: llamada síncrona en el thread pool
+                loop = asyncio.get_event_loop()
+                return await loop.run_in_executor(
+                    None, 
+                    self._call_ollama_api_sync, 
+                    prompt, 
+                    model, 
+                    options,
+                    base_url,
+                    context_tokens
+                )
+            except Exception as e:
+                self.logger.error(f"❌ Error en llamada directa a Ollama: {str(e)}")
+                return {'error': str(e), 'error_type': 'direct_call_error'}
+        
+        payload, request_timeout = self._build_generate_payload(prompt, model, options,
+                                                                context_tokens=context_tokens)
         try:
-            # Usar la lógica existente pero adaptada para async
-            loop = asyncio.get_event_loop()
-            
-            # Ejecutar la llamada en un thread pool para no bloquear
-            result = await loop.run_in_executor(
-                None, 
-                self._call_ollama_api_sync, 
-                prompt, 
-                model, 
-                options
+            response = await async_pool.post(
+                f"{base_url or self.base_url}/api/generate",
+                json=payload,
+                timeout=min(request_timeout, 180)  # Máximo 3 minutos para evitar cuelgues
             )
+            return self._handle_generate_response(response, model)
             
-            return result
-            
+        except httpx.TimeoutException:
+            return self._timeout_error(model, request_timeout)
+        except httpx.HTTPError as e:
+            return self._connection_error(model, e)
         except Exception as e:
             self.logger.error(f"❌ Error en llamada directa a Ollama: {str(e)}")
             return {'error': str(e), 'error_type': 'direct_call_error'}
     
-    def _call_ollama_api_sync(self, prompt: str, model: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    async def _stream_with_queue(self,
+                                 prompt: str,
+                                 model: str,
+                                 options: Dict[str, Any],
+                                 priority: RequestPriority = RequestPriority.NORMAL,
+                                 task_id: str = "",
+                                 step_id: str = "",
+                                 context_tokens: Optional[List[int]] = None) -> AsyncIterator[Dict[str, Any]]:
         """
-        🔧 VERSIÓN SINCRÓNICA DE LA LLAMADA A OLLAMA
+        📡 STREAMING A TRAVÉS DE LA COLA
         
-        Esta es la implementación original adaptada para ser llamada desde async
+        Como _execute_with_queue, pero entrega los chunks de Ollama a medida
+        que llegan mientras el request ocupa su slot de la cola.
+        
+        Yields:
+            Chunks de /api/generate; ante un fallo, un chunk con 'error' y 'done'
+        """
+        queue_manager = self._get_queue_manager()
+        if not queue_manager:
+            self.logger.warning("⚠️ Gestor de cola no disponible, ejecutando streaming directo")
+            async for chunk in self._stream_direct_call(prompt, model, options, context_tokens=context_tokens):
+                yield chunk
+            return
+        
+        ollama_request = OllamaRequest(
+            task_id=task_id,
+            step_id=step_id,
+            prompt=prompt,
+            model=model,
+            options=options,
+            priority=priority,
+            timeout=self._get_model_config(model).get("request_timeout", 180),
+            context=context_tokens
+        )
+        
+        self.logger.info(f"📡 Encolando request en streaming para modelo {model} (tarea: {task_id}, prioridad: {priority.name})")
+        
+        def stream_callback(request: OllamaRequest) -> AsyncIterator[Dict[str, Any]]:
+            return self._stream_direct_call(request.prompt, request.model, request.options,
+                                            base_url=request.endpoint, context_tokens=request.context)
+        
+        try:
+            async for chunk in queue_manager.stream_request(ollama_request, stream_callback):
+                yield chunk
+        except RuntimeError as e:
+            self.logger.error(f"❌ Error en cola de Ollama: {str(e)}")
+            yield {'error': str(e), 'error_type': 'queue_system_error', 'done': True}
+    
+    async def _stream_direct_call(self,
+                                  prompt: str,
+                                  model: str,
+                                  options: Dict[str, Any],
+                                  base_url: Optional[str] = None,
+                                  context_tokens: Optional[List[int]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        🔧 STREAMING DIRECTO DE /api/generate (SIN COLA)
+        
+        Sin httpx no hay cliente asíncrono con streaming: la respuesta
+        completa se entrega como un único chunk final.
         """
+        async_pool = get_async_http_pool()
+        if async_pool is None:
+            result = await self._execute_direct_call(prompt, model, options, base_url=base_url,
+                                                     context_tokens=context_tokens)
+            yield dict(result, done=True)
+            return
+        
+        payload, request_timeout = self._build_generate_payload(prompt, model, options, stream=True,
+                                                                context_tokens=context_tokens)
         try:
-            model_config = self._get_model_config(model)
-            request_timeout = model_config.get("request_timeout", self.request_timeout)
-            
-            # Detectar si es una solicitud JSON y ajustar parámetros específicamente
-            is_json_request = any(keyword in prompt.lower() for keyword in ['json', '"steps"', 'genera un plan', 'plan de acción'])
-            
-            final_options = options.copy()
-            if is_json_request:
-                # Para solicitudes JSON, usar parámetros más estrictos
-                final_options['temperature'] = min(final_options.get('temperature', 0.7) * 0.5, 0.1)
-                final_options['top_p'] = min(final_options.get('top_p', 0.9) * 0.8, 0.7)
+            async for line in async_pool.stream_lines(
+                'POST',
+                f"{base_url or self.base_url}/api/generate",
+                json=payload,
+                timeout=min(request_timeout, 180)  # Entre chunks; el total lo limita la cola
+            ):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
                 
-                # Agregar stops específicos para JSON si no están
-                current_stops = final_options.get('stop', [])
-                json_stops = ['```', '---', '}```', '}\n```']
-                final_options['stop'] = list(set(current_stops + json_stops))
-            
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": final_options
-            }
+        except httpx.HTTPStatusError as e:
+            self.logger.error(f"❌ Ollama API returned error for model {model}: HTTP {e.response.status_code}")
+            yield {'error': f"HTTP {e.response.status_code}: {e.response.text}", 'error_type': 'http_error',
+                   'status_code': e.response.status_code, 'done': True}
+        except httpx.TimeoutException:
+            yield dict(self._timeout_error(model, request_timeout), done=True)
+        except httpx.HTTPError as e:
+            yield dict(self._connection_error(model, e), done=True)
+    
+    def _build_generate_payload(self, prompt: str, model: str, options: Dict[str, Any], stream: bool = False,
+                                context_tokens: Optional[List[int]] = None):
+        """
+        Construye el payload de /api/generate y el timeout del modelo
+        
+        Con `context_tokens` Ollama continúa desde ese estado y solo evalúa
+        el prompt nuevo en lugar de todo el prefijo de la conversación.
+        
+        Returns:
+            Tupla (payload, request_timeout)
+        """
+        model_config = self._get_model_config(model)
+        request_timeout = model_config.get("request_timeout", self.request_timeout)
+        
+        # Detectar si es una solicitud JSON y ajustar parámetros específicamente
+        is_json_request = any(keyword in prompt.lower() for keyword in ['json', '"steps"', 'genera un plan', 'plan de acción'])
+        
+        final_options = options.copy()
+        if is_json_request:
+            # Para solicitudes JSON, usar parámetros más estrictos
+            final_options['temperature'] = min(final_options.get('temperature', 0.7) * 0.5, 0.1)
+            final_options['top_p'] = min(final_options.get('top_p', 0.9) * 0.8, 0.7)
             
-            # Logging detallado para debug
-            self.logger.debug(f"🤖 Ollama Request - Model: {model}")
-            self.logger.debug(f"⚙️ Options: temp={final_options.get('temperature')}, timeout={request_timeout}s")
-            if is_json_request:
-                self.logger.debug(f"📋 JSON mode detected, using strict parameters")
+            # Agregar stops específicos para JSON si no están
+            current_stops = final_options.get('stop', [])
+            json_stops = ['```', '---', '}```', '}\n```']
+            final_options['stop'] = list(set(current_stops + json_stops))
+        
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": final_options,
+            # Mantener el modelo cargado entre pasos evita recargar pesos en cada request
+            "keep_alive": model_config.get("keep_alive", DEFAULT_KEEP_ALIVE)
+        }
+        if context_tokens:
+            payload["context"] = context_tokens
+        
+        # Logging detallado para debug
+        self.logger.debug(f"🤖 Ollama Request - Model: {model}")
+        self.logger.debug(f"⚙️ Options: temp={final_options.get('temperature')}, timeout={request_timeout}s")
+        if is_json_request:
+            self.logger.debug(f"📋 JSON mode detected, using strict parameters")
+        
+        return payload, request_timeout
+    
+    def _handle_generate_response(self, response, model: str) -> Dict[str, Any]:
+        """Convierte la respuesta HTTP de /api/generate en el resultado de la cola"""
+        if response.status_code == 200:
+            return response.json()
+        self.logger.error(f"❌ Ollama API returned error for model {model}: HTTP {response.status_code}")
+        return {
+            'error': f"HTTP {response.status_code}: {response.text}",
+            'error_type': 'http_error',
+            'status_code': response.status_code
+        }
+    
+    def _timeout_error(self, model: str, request_timeout: int) -> Dict[str, Any]:
+        self.logger.error(f"⏱️ Ollama API request timed out after {request_timeout} seconds for model {model}.")
+        return {
+            'error': f"Timeout después de {request_timeout} segundos para el modelo {model}. El modelo puede necesitar más tiempo para respuestas complejas.",
+            'error_type': 'timeout'
+        }
+    
+    def _connection_error(self, model: str, error: Exception) -> Dict[str, Any]:
+        self.logger.error(f"🔌 Connection error to Ollama API for model {model}: {str(error)}")
+        return {
+            'error': f"Error de conexión: {str(error)}",
+            'error_type': 'connection_error'
+        }
+    
+    def _call_ollama_api_sync(self, prompt: str, model: str, options: Dict[str, Any],
+                              base_url: Optional[str] = None,
+                              context_tokens: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        🔧 VERSIÓN SINCRÓNICA DE LA LLAMADA A OLLAMA
+        
+        Esta es la implementación original adaptada para ser llamada desde async
+        """
+        request_timeout = self.request_timeout
+        try:
+            payload, request_timeout = self._build_generate_payload(prompt, model, options,
+                                                                    context_tokens=context_tokens)
             
-            response = requests.post(
-                f"{self.base_url}/api/generate",
+            response = self.session.post(
+                f"{base_url or self.base_url}/api/generate",
                 json=payload,
                 timeout=min(request_timeout, 180)  # Máximo 3 minutos para evitar cuelgues
             )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                self.logger.error(f"❌ Ollama API returned error for model {model}: HTTP {response.status_code}")
-                return {
-                    'error': f"HTTP {response.status_code}: {response.text}"
-                }
+            return self._handle_generate_response(response, model)
                 
         except Timeout:
-            self.logger.error(f"⏱️ Ollama API request timed out after {request_timeout} seconds for model {model}.")
-            return {
-                'error': f"Timeout después de {request_timeout} segundos para el modelo {model}. El modelo puede necesitar más tiempo para respuestas complejas."
-            }
+            return self._timeout_error(model, request_timeout)
         except RequestException as e:
-            self.logger.error(f"🔌 Connection error to Ollama API for model {model}: {str(e)}")
-            return {
-                'error': f"Error de conexión: {str(e)}"
-            }
+            return self._connection_error(model, e)
         except Exception as e:
             self.logger.error(f"💥 Unexpected error in Ollama API call for model {model}: {str(e)}")
             return {
@@ -304,7 +464,8 @@ class OllamaService:
                     "repeat_penalty": 1.1,# Penaliza repetición de tokens
                     "stop": ["```", "---", "<|eot_id|>", "<|end_of_text|>"]  # Tokens de parada específicos
                 },
-                "request_timeout": 180    # 3 minutos para Llama3.1:8b
+                "request_timeout": 180,   # 3 minutos para Llama3.1:8b
+                "keep_alive": "30m"       # Modelo de pasos: se usa continuamente
             },
             "qwen3:32b": {
                 "options": {
@@ -314,7 +475,8 @@ class OllamaService:
                     "repeat_penalty": 1.05,# Penalización ligera
                     "stop": ["```json", "</tool_code>", "<|im_end|>", "<|endoftext|>"]  # Tokens específicos Qwen
                 },
-                "request_timeout": 480    # 8 minutos para Qwen3:32b (modelo grande)
+                "request_timeout": 480,   # 8 minutos para Qwen3:32b (modelo grande)
+                "keep_alive": "10m"       # Modelo de planificación: libera VRAM antes
             },
             "deepseek-r1:32b": {
                 "options": {
@@ -372,7 +534,7 @@ class OllamaService:
     def is_healthy(self) -> bool:
         """Verificar si Ollama está disponible"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             return response.status_code == 200
         except:
             return False
@@ -380,7 +542,7 @@ class OllamaService:
     def check_connection(self) -> Dict[str, Any]:
         """Verificar conexión con Ollama y retornar información detallada"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 models = [model['name'] for model in data.get('models', [])]
@@ -408,7 +570,7 @@ class OllamaService:
     def get_available_models(self) -> List[str]:
         """Obtener lista de modelos disponibles desde Ollama"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 models = [model['name'] for model in data.get('models', [])]
@@ -522,7 +684,8 @@ class OllamaService:
                 'error': str(e)
             }
 
-    def generate_response(self, prompt: str, context: Dict = None, use_tools: bool = True, task_id: str = "", step_id: str = "") -> Dict[str, Any]:
+    def generate_response(self, prompt: str, context: Dict = None, use_tools: bool = True, task_id: str = "", step_id: str = "",
+                          cache_ttl: Optional[int] = None, reuse_prefix: bool = False) -> Dict[str, Any]:
         """
         🔄 GENERAR RESPUESTA CON COLA Y PRIORIZACIÓN INTELIGENTE
         
@@ -535,6 +698,10 @@ class OllamaService:
             use_tools: Si debe considerar el uso de herramientas
             task_id: ID de la tarea (para tracking y priorización)
             step_id: ID del paso (para tracking)
+            cache_ttl: Si se indica (y LLM_CACHE_ENABLED=true), reutiliza respuestas
+                       idénticas durante ese número de segundos sin pasar por la cola
+            reuse_prefix: Continúa la sesión Ollama de task_id enviando solo el turno
+                          nuevo (ignorado si se usa cache_ttl)
         
         Returns:
             Dict con respuesta, tool_calls, y metadatos incluyendo info de cola
@@ -557,25 +724,48 @@ class OllamaService:
             # 🔍 DETERMINAR PRIORIDAD AUTOMÁTICAMENTE
             priority = self._determine_request_priority(prompt, context, task_id, step_id)
             
-            # Determinar si usar cola o llamada directa
-            if self.use_queue:
+            # 💾 Caché opt-in: un acierto no ocupa slot de cola ni GPU
+            model = self.get_current_model()
+            options = self._get_model_config(model).get("options", {})
+            
+            # 🧵 Sesión de la tarea: una respuesta cacheable no debe depender de la conversación previa
+            send_prompt, context_tokens, prefix_hash = self._session_prompt(
+                prompt, full_prompt, system_prompt, model, options, task_id,
+                reuse_prefix and self.use_queue and not cache_ttl
+            )
+            cache = get_llm_response_cache() if cache_ttl else None
+            cache_key = cache.make_key(model, full_prompt, options) if cache else None
+            response = cache.get(cache_key) if cache else None
+            from_cache = response is not None
+            
+            if from_cache:
+                self.logger.info(f"💾 Respuesta LLM servida desde caché (tarea: {task_id or 'unknown_task'})")
+            elif self.use_queue:
                 # Usar cola con prioridad determinada automáticamente
+                started = time.time()
                 response = asyncio.run(self._execute_with_queue(
-                    prompt=full_prompt,
-                    model=self.get_current_model(),
-                    options=self._get_model_config(self.get_current_model()).get("options", {}),
+                    prompt=send_prompt,
+                    model=model,
+                    options=options,
                     priority=priority,
                     task_id=task_id or "unknown_task",
-                    step_id=step_id or "unknown_step"
+                    step_id=step_id or "unknown_step",
+                    context_tokens=context_tokens
                 ))
+                self._record_session(task_id, model, prefix_hash, response, context_tokens is not None)
                 
                 self.logger.info(f"🚦 Request procesado a través de cola (prioridad: {priority.name})")
                 
             else:
                 # Llamada directa tradicional (sin cola)
+                started = time.time()
                 response = self._call_ollama_api(full_prompt)
                 self.logger.warning("⚠️ Request procesado SIN cola - riesgo de problemas de concurrencia")
             
+            if cache and not from_cache and not response.get('error'):
+                cacheable = {key: value for key, value in response.items() if key != 'context'}
+                cache.put(cache_key, model, cacheable, self._generation_seconds(response, started), ttl=cache_ttl)
+            
             if response.get('error'):
                 return {
                     'response': f"❌ Error al generar respuesta: {response['error']}",
@@ -597,8 +787,11 @@ class OllamaService:
                 'raw_response': response.get('response', ''),
                 'model': self.get_current_model(),
                 'timestamp': time.time(),
-                'used_queue': self.use_queue,
-                'priority': priority.name if self.use_queue else 'none'
+                'used_queue': self.use_queue and not from_cache,
+                'priority': priority.name if self.use_queue else 'none',
+                'from_cache': from_cache,
+                'cache_key': cache_key,
+                **self._prompt_eval_metadata(response, context_tokens)
             }
             
         except Exception as e:
@@ -612,6 +805,255 @@ class OllamaService:
                 'used_queue': self.use_queue
             }
     
+    def generate_response_streaming(self, prompt: str, context: Dict = None, use_tools: bool = True,
+                                    task_id: str = "", step_id: str = "",
+                                    on_chunk: Optional[Callable[[str], None]] = None,
+                                    reuse_prefix: bool = False,
+                                    json_parser: Optional[StreamingJSONParser] = None,
+                                    cache_ttl: Optional[int] = None) -> Dict[str, Any]:
+        """
+        📡 GENERAR RESPUESTA EN STREAMING A TRAVÉS DE LA COLA
+        
+        Mismo contrato que generate_response, pero el texto se entrega a
+        `on_chunk` a medida que Ollama lo genera, de modo que la UI recibe
+        los primeros tokens en segundos en lugar de esperar la respuesta
+        completa. El request conserva su slot de cola durante todo el stream.
+        
+        Args:
+            prompt: Mensaje del usuario
+            context: Contexto adicional (historial, herramientas, etc.)
+            use_tools: Si debe considerar el uso de herramientas
+            task_id: ID de la tarea (para tracking y priorización)
+            step_id: ID del paso (para tracking)
+            on_chunk: Callback con cada fragmento de texto generado
+            reuse_prefix: Continúa la sesión Ollama de task_id enviando solo el turno nuevo
+            json_parser: Parser incremental que recibe cada fragmento; si detecta que la
+                         salida ya no cumple su schema se corta la generación y se libera
+                         el slot (error_type 'schema_violation' o 'invalid_json')
+            cache_ttl: Como en generate_response; un acierto se reproduce completo por
+                       on_chunk y json_parser
+        
+        Returns:
+            Dict con respuesta, tool_calls y metadatos (incluye time_to_first_chunk
+            y, con json_parser, 'parsed_json')
+        """
+        if not self.is_healthy():
+            return {
+                'response': "⚠️ Ollama no está disponible en este momento. Verifica la configuración del endpoint de Ollama.",
+                'tool_calls': [],
+                'raw_response': "",
+                'model': self.get_current_model(),
+                'timestamp': time.time(),
+                'error': 'Ollama no disponible'
+            }
+        
+        try:
+            system_prompt = self._build_system_prompt(use_tools, conversation_mode=False)
+            full_prompt = self._build_full_prompt(prompt, context, system_prompt)
+            priority = self._determine_request_priority(prompt, context, task_id, step_id)
+            model = self.get_current_model()
+            options = self._get_model_config(model).get("options", {})
+            send_prompt, context_tokens, prefix_hash = self._session_prompt(
+                prompt, full_prompt, system_prompt, model, options, task_id, reuse_prefix and not cache_ttl
+            )
+            
+            cache = get_llm_response_cache() if cache_ttl else None
+            cache_key = cache.make_key(model, full_prompt, options) if cache else None
+            response = cache.get(cache_key) if cache else None
+            from_cache = response is not None
+            
+            if from_cache:
+                self.logger.info(f"💾 Respuesta LLM servida desde caché (tarea: {task_id or 'unknown_task'})")
+                response = self._replay_cached(response, on_chunk, json_parser)
+            else:
+                started = time.time()
+                response = asyncio.run(self._collect_stream(
+                    send_prompt, model, options, priority,
+                    task_id or "unknown_task", step_id or "unknown_step", on_chunk,
+                    context_tokens=context_tokens, json_parser=json_parser
+                ))
+                self._record_session(task_id, model, prefix_hash, response, context_tokens is not None)
+                if cache and not response.get('error'):
+                    cacheable = {key: value for key, value in response.items()
+                                 if key not in ('context', 'time_to_first_chunk')}
+                    cache.put(cache_key, model, cacheable, self._generation_seconds(response, started), ttl=cache_ttl)
+            
+            if response.get('error'):
+                return {
+                    'response': f"❌ Error al generar respuesta: {response['error']}",
+                    'tool_calls': [],
+                    'raw_response': response.get('response', ''),
+                    'model': model,
+                    'timestamp': time.time(),
+                    'error': response['error'],
+                    'error_type': response.get('error_type'),
+                    'used_queue': self.use_queue,
+                    'priority': priority.name if self.use_queue else 'none',
+                    'streamed': True,
+                    'cache_key': cache_key
+                }
+            
+            parsed_response = self._parse_response(response.get('response', ''))
+            result = {
+                'response': parsed_response['text'],
+                'tool_calls': parsed_response['tool_calls'],
+                'raw_response': response.get('response', ''),
+                'model': model,
+                'timestamp': time.time(),
+                'used_queue': self.use_queue and not from_cache,
+                'priority': priority.name if self.use_queue else 'none',
+                'streamed': True,
+                'time_to_first_chunk': response.get('time_to_first_chunk'),
+                'from_cache': from_cache,
+                'cache_key': cache_key,
+                **self._prompt_eval_metadata(response, context_tokens)
+            }
+            if json_parser is not None:
+                result['parsed_json'] = json_parser.result
+            return result
+            
+        except Exception as e:
+            return {
+                'response': f"❌ Error interno: {str(e)}",
+                'tool_calls': [],
+                'raw_response': "",
+                'model': self.get_current_model(),
+                'timestamp': time.time(),
+                'error': str(e),
+                'used_queue': self.use_queue,
+                'streamed': True
+            }
+    
+    async def _collect_stream(self, prompt: str, model: str, options: Dict[str, Any],
+                              priority: RequestPriority, task_id: str, step_id: str,
+                              on_chunk: Optional[Callable[[str], None]],
+                              context_tokens: Optional[List[int]] = None,
+                              json_parser: Optional[StreamingJSONParser] = None) -> Dict[str, Any]:
+        """
+        Consume el stream, reenvía cada fragmento a on_chunk y reconstruye
+        la respuesta completa con los metadatos del chunk final. Con json_parser,
+        el stream se cierra en cuanto el documento JSON está completo o deja de
+        cumplir el schema.
+        """
+        if self.use_queue:
+            chunks = self._stream_with_queue(prompt, model, options, priority, task_id, step_id, context_tokens)
+        else:
+            chunks = self._stream_direct_call(prompt, model, options, context_tokens=context_tokens)
+        
+        started = time.time()
+        first_chunk_at = None
+        parts: List[str] = []
+        result: Dict[str, Any] = {}
+        try:
+            async for chunk in chunks:
+                if chunk.get('error'):
+                    result = {'error': chunk['error'], 'error_type': chunk.get('error_type')}
+                    break
+                delta = chunk.get('response', '')
+                if delta:
+                    if first_chunk_at is None:
+                        first_chunk_at = time.time()
+                    parts.append(delta)
+                    if on_chunk:
+                        try:
+                            on_chunk(delta)
+                        except Exception as e:
+                            self.logger.warning(f"⚠️ Error reenviando chunk de streaming: {str(e)}")
+                    if json_parser is not None:
+                        try:
+                            json_parser.feed(delta)
+                        except StreamingJSONError as e:
+                            error_type = 'schema_violation' if isinstance(e, SchemaViolation) else 'invalid_json'
+                            self.logger.warning(f"✂️ Generación cortada tras {len(''.join(parts))} caracteres: {str(e)}")
+                            result = {'error': str(e), 'error_type': error_type}
+                            break
+                if chunk.get('done'):
+                    result = {key: value for key, value in chunk.items() if key != 'response'}
+                elif json_parser is not None and json_parser.done:
+                    # Documento completo: lo que siga (cierre de bloque, explicaciones) no se necesita
+                    break
+        finally:
+            await chunks.aclose()
+        
+        result['response'] = ''.join(parts)
+        result['time_to_first_chunk'] = round(first_chunk_at - started, 3) if first_chunk_at else None
+        return result
+    
+    def _replay_cached(self, response: Dict[str, Any], on_chunk: Optional[Callable[[str], None]],
+                       json_parser: Optional[StreamingJSONParser]) -> Dict[str, Any]:
+        """Entrega una respuesta cacheada como un único fragmento"""
+        text = response.get('response', '')
+        if on_chunk and text:
+            try:
+                on_chunk(text)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Error reenviando chunk de streaming: {str(e)}")
+        if json_parser is not None:
+            try:
+                json_parser.feed(text)
+            except StreamingJSONError as e:
+                error_type = 'schema_violation' if isinstance(e, SchemaViolation) else 'invalid_json'
+                return {'error': str(e), 'error_type': error_type, 'response': text}
+        return dict(response, time_to_first_chunk=0.0)
+    
+    def _session_prompt(self, prompt: str, full_prompt: str, system_prompt: str, model: str,
+                        options: Dict[str, Any], task_id: str, reuse_prefix: bool):
+        """
+        🧵 PROMPT A ENVIAR SEGÚN LA SESIÓN DE LA TAREA
+        
+        Si la tarea ya tiene sesión con el mismo modelo y system prompt, Ollama
+        conserva en su `context` el system prompt y los turnos anteriores, así
+        que basta con el turno nuevo (el historial de `previous_messages` ya
+        está en la sesión y no se repite). La sesión solo se continúa si su
+        contexto cabe en la ventana del modelo junto al turno y la respuesta.
+        
+        Returns:
+            Tupla (prompt, context_tokens o None, prefix_hash o None si no hay sesión)
+        """
+        if not reuse_prefix or not task_id:
+            return full_prompt, None, None
+        
+        store = get_task_session_store()
+        prefix_hash = store.prefix_hash(system_prompt)
+        turn = f"Usuario: {prompt}\nAsistente: "
+        # ~3 caracteres por token: estimación por lo alto sin el tokenizer del modelo
+        limit = store.context_limit(options, turn_tokens=len(turn) // 3 + 1)
+        session = store.lookup(task_id, model, prefix_hash, max_context_tokens=limit)
+        if session is None:
+            return full_prompt, None, prefix_hash
+        
+        self.logger.debug(f"🧵 Reutilizando contexto de la tarea {task_id} ({len(session.context)} tokens, turno {session.turns + 1})")
+        return turn, session.context, prefix_hash
+    
+    def _record_session(self, task_id: str, model: str, prefix_hash: Optional[str],
+                        response: Dict[str, Any], reused: bool) -> None:
+        """Guarda el contexto devuelto por Ollama; ante un error la sesión se descarta"""
+        if prefix_hash is None:
+            return
+        store = get_task_session_store()
+        if response.get('error'):
+            store.end_task(task_id)
+            return
+        store.record(task_id, model, prefix_hash, response, reused)
+    
+    @staticmethod
+    def _prompt_eval_metadata(response: Dict[str, Any], context_tokens: Optional[List[int]]) -> Dict[str, Any]:
+        """Coste de evaluación del prompt informado por Ollama"""
+        prompt_eval_duration = response.get('prompt_eval_duration')
+        return {
+            'prefix_reused': context_tokens is not None,
+            'prompt_eval_count': response.get('prompt_eval_count'),
+            'prompt_eval_seconds': round(prompt_eval_duration / 1e9, 4) if prompt_eval_duration else None
+        }
+    
+    @staticmethod
+    def _generation_seconds(response: Dict[str, Any], started: float) -> float:
+        """Segundos de GPU de una generación: total_duration de Ollama (ns) o tiempo de pared"""
+        total_duration = response.get('total_duration')
+        if isinstance(total_duration, (int, float)) and total_duration > 0:
+            return total_duration / 1e9
+        return time.time() - started
+    
     def _determine_request_priority(self, prompt: str, context: Dict, task_id: str, step_id: str) -> RequestPriority:
         """
         🔍 DETERMINAR PRIORIDAD DE REQUEST AUTOMÁTICAMENTE
@@ -701,39 +1143,21 @@ class OllamaService:
         tool_calls = []
         clean_text = response_text
         
-        # Estrategia 1: Buscar bloques JSON clásicos con ``` 
-        json_pattern_1 = r'```json\s*(\{.*?\})\s*```'
-        matches_1 = re.findall(json_pattern_1, response_text, re.DOTALL)
-        
-        for match in matches_1:
-            try:
-                data = json.loads(match)
-                if 'tool_call' in data:
-                    tool_calls.append(data['tool_call'])
-                    # Remover el bloque JSON del texto
-                    clean_text = clean_text.replace(f'```json\n{match}\n```', '')
-                    logger.debug(f"✅ JSON parsing strategy 1 successful: {match[:50]}...")
-            except json.JSONDecodeError as e:
-                logger.debug(f"⚠️ JSON parsing strategy 1 failed for match: {str(e)}")
-                continue
-        
-        # Estrategia 2: Buscar JSON sin marcadores de bloque
-        if not tool_calls:
-            json_pattern_2 = r'\{[^{}]*"tool_call"[^{}]*\{[^{}]*\}[^{}]*\}'
-            matches_2 = re.findall(json_pattern_2, response_text)
-            
-            for match in matches_2:
-                try:
-                    data = json.loads(match)
-                    if 'tool_call' in data:
-                        tool_calls.append(data['tool_call'])
-                        clean_text = clean_text.replace(match, '')
-                        logger.debug(f"✅ JSON parsing strategy 2 successful: {match[:50]}...")
-                except json.JSONDecodeError as e:
-                    logger.debug(f"⚠️ JSON parsing strategy 2 failed: {str(e)}")
-                    continue
+        # Estrategia 1: Una sola pasada del parser incremental sobre todos los
+        # documentos JSON del texto (con o sin bloques ```), sin regex por candidato
+        parser = StreamingJSONParser(multiple=True)
+        parser.feed(response_text)
+        tool_spans = []
+        for document, span in zip(parser.documents, parser.spans):
+            if isinstance(document, dict) and 'tool_call' in document:
+                tool_calls.append(document['tool_call'])
+                tool_spans.append(span)
+        if tool_spans:
+            for start, end in reversed(tool_spans):
+                clean_text = clean_text[:start] + clean_text[end:]
+            logger.debug(f"✅ JSON parsing strategy 1 successful: {len(tool_calls)} tool calls")
         
-        # Estrategia 3: Buscar cualquier JSON válido y verificar si contiene tool_call
+        # Estrategia 2: JSON con comillas simples y otros formatos que el parser no acepta
         if not tool_calls:
             json_pattern_3 = r'\{[^}]*\}'
             potential_jsons = re.findall(json_pattern_3, response_text)
@@ -747,13 +1171,13 @@ class OllamaService:
                     if isinstance(data, dict) and 'tool_call' in data:
                         tool_calls.append(data['tool_call'])
                         clean_text = clean_text.replace(potential_json, '')
-                        logger.debug(f"✅ JSON parsing strategy 3 successful: {potential_json[:50]}...")
+                        logger.debug(f"✅ JSON parsing strategy 2 successful: {potential_json[:50]}...")
                         break
                 except (json.JSONDecodeError, ValueError) as e:
-                    logger.debug(f"⚠️ JSON parsing strategy 3 failed for '{potential_json[:30]}...': {str(e)}")
+                    logger.debug(f"⚠️ JSON parsing strategy 2 failed for '{potential_json[:30]}...': {str(e)}")
                     continue
         
-        # Estrategia 4: Extracción por regex específico de tool_call
+        # Estrategia 3: Extracción por regex específico de tool_call
         if not tool_calls:
             try:
                 tool_pattern = r'"tool_call"\s*:\s*\{[^}]*"tool"\s*:\s*"([^"]+)"[^}]*"parameters"\s*:\s*\{[^}]*\}'
@@ -773,14 +1197,14 @@ class OllamaService:
                             }
                             tool_calls.append(tool_call)
                             clean_text = clean_text.replace(tool_match.group(), '')
-                            logger.debug(f"✅ JSON parsing strategy 4 successful for tool: {tool_call['tool']}")
+                            logger.debug(f"✅ JSON parsing strategy 3 successful for tool: {tool_call['tool']}")
                             
                     except (json.JSONDecodeError, AttributeError) as e:
-                        logger.debug(f"⚠️ JSON parsing strategy 4 failed for tool extraction: {str(e)}")
+                        logger.debug(f"⚠️ JSON parsing strategy 3 failed for tool extraction: {str(e)}")
                         continue
                         
             except Exception as e:
-                logger.debug(f"⚠️ JSON parsing strategy 4 overall failed: {str(e)}")
+                logger.debug(f"⚠️ JSON parsing strategy 3 overall failed: {str(e)}")
         
         # Limpiar texto final
         clean_text = re.sub(r'```\w*\n?', '', clean_text)  # Remover marcadores de código
@@ -924,7 +1348,7 @@ Herramientas disponibles:
                 }
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/api/generate",
                 json=payload,
                 timeout=self.request_timeout,
@@ -0,0 +1,229 @@
+"""
+🧵 SESIONES POR TAREA PARA REUTILIZAR EL PREFIJO DEL PROMPT
+===========================================================
+
+En una tarea de varios pasos cada llamada reenviaba el system prompt completo
+y la conversación previa, así que Ollama volvía a tokenizar y evaluar el
+mismo prefijo en cada paso. Una sesión guarda el array `context` que Ollama
+devuelve al terminar una generación; el siguiente paso envía solo el turno
+nuevo junto a ese `context` y el servidor continúa desde el estado ya
+evaluado.
+
+- Clave: (task_id, modelo, hash del system prompt); si cambia cualquiera, se
+  empieza una sesión nueva con el prompt completo.
+- Límite: la ventana es `options.num_ctx` del modelo (por defecto la de
+  Ollama, OLLAMA_DEFAULT_NUM_CTX) menos lo reservado para `num_predict` y el
+  turno nuevo; si el contexto acumulado no cabe, la sesión se reinicia antes
+  de que Ollama trunque el principio (y con él el system prompt).
+- Opt-in: la reutilización cambia lo que ve el modelo, así que solo se activa
+  si el llamador la pide (`reuse_prefix`) u OLLAMA_PREFIX_REUSE=true.
+- Memoria: LRU con TTL; cada contexto es una lista de enteros por token.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ventana de Ollama cuando el modelo no fija num_ctx (2048 hasta 0.5, 4096 después)
+DEFAULT_NUM_CTX = int(os.getenv('OLLAMA_DEFAULT_NUM_CTX', '2048'))
+# Tokens reservados para la respuesta si num_predict no está acotado
+DEFAULT_PREDICT_RESERVE = 512
+
+
+@dataclass
+class OllamaTaskSession:
+    """Estado de conversación de una tarea en Ollama"""
+    task_id: str
+    model: str
+    prefix_hash: str
+    context: List[int] = field(default_factory=list)
+    turns: int = 0
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+
+
+class TaskSessionStore:
+    """
+    🧵 ALMACÉN DE SESIONES POR TAREA
+
+    `lookup` devuelve la sesión reutilizable (o None para enviar el prompt
+    completo) y `record` guarda el `context` devuelto por Ollama junto con
+    el coste de evaluación del prompt, para comparar ambos modos.
+    """
+
+    def __init__(self, max_sessions: int = 64, ttl: int = 1800, max_context_tokens: Optional[int] = None):
+        """
+        Args:
+            max_sessions: Sesiones máximas en memoria
+            ttl: Segundos sin uso tras los que una sesión caduca
+            max_context_tokens: Tope adicional de tokens de contexto (None: solo la ventana del modelo)
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_context_tokens = max_context_tokens
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[Tuple[str, str, str], OllamaTaskSession]" = OrderedDict()
+
+        self.resets = 0
+        self.evictions = 0
+        self._eval = {
+            'reused': {'turns': 0, 'prompt_eval_count': 0, 'prompt_eval_seconds': 0.0},
+            'full': {'turns': 0, 'prompt_eval_count': 0, 'prompt_eval_seconds': 0.0}
+        }
+
+    @staticmethod
+    def prefix_hash(system_prompt: str) -> str:
+        return hashlib.sha1(system_prompt.encode('utf-8')).hexdigest()
+
+    def context_limit(self, options: Dict[str, Any], turn_tokens: int = 0) -> int:
+        """
+        Tokens de contexto que caben junto al turno nuevo y la respuesta
+
+        Args:
+            options: Opciones del modelo (num_ctx, num_predict)
+            turn_tokens: Tokens estimados del turno nuevo
+
+        Returns:
+            num_ctx menos la reserva de num_predict y del turno, acotado por max_context_tokens
+        """
+        num_ctx = options.get('num_ctx') or DEFAULT_NUM_CTX
+        num_predict = options.get('num_predict')
+        reserve = num_predict if isinstance(num_predict, int) and num_predict > 0 else DEFAULT_PREDICT_RESERVE
+        limit = int(num_ctx) - reserve - turn_tokens
+        if self.max_context_tokens is not None:
+            limit = min(limit, self.max_context_tokens)
+        return limit
+
+    def lookup(self, task_id: str, model: str, prefix_hash: str,
+               max_context_tokens: Optional[int] = None) -> Optional[OllamaTaskSession]:
+        """
+        Busca una sesión vigente para continuar la conversación
+
+        Args:
+            max_context_tokens: Contexto máximo reutilizable (ver `context_limit`)
+
+        Returns:
+            La sesión o None si hay que enviar el prompt completo
+        """
+        if max_context_tokens is None:
+            max_context_tokens = self.context_limit({})
+        key = (task_id, model, prefix_hash)
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return None
+            if now - session.last_used > self.ttl:
+                del self._sessions[key]
+                return None
+            if len(session.context) >= max_context_tokens:
+                # Ollama truncaría el principio del contexto (y con él el system prompt)
+                del self._sessions[key]
+                self.resets += 1
+                logger.info(f"🧵 Sesión de la tarea {task_id} reiniciada: {len(session.context)} tokens de contexto")
+                return None
+            self._sessions.move_to_end(key)
+            return session
+
+    def record(self, task_id: str, model: str, prefix_hash: str, response: Dict[str, Any], reused: bool) -> None:
+        """
+        Guarda el contexto devuelto por Ollama y el coste de evaluar el prompt
+
+        Args:
+            task_id: Tarea propietaria
+            model: Modelo usado
+            prefix_hash: Hash del system prompt
+            response: Respuesta de /api/generate (context, prompt_eval_count, prompt_eval_duration)
+            reused: Si el request continuó una sesión existente
+        """
+        context = response.get('context')
+        stats = self._eval['reused' if reused else 'full']
+        stats['turns'] += 1
+        stats['prompt_eval_count'] += response.get('prompt_eval_count') or 0
+        stats['prompt_eval_seconds'] += (response.get('prompt_eval_duration') or 0) / 1e9
+        if not isinstance(context, list) or not context:
+            return
+
+        key = (task_id, model, prefix_hash)
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = OllamaTaskSession(task_id=task_id, model=model, prefix_hash=prefix_hash)
+                self._sessions[key] = session
+            session.context = context
+            session.turns += 1
+            session.last_used = now
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def end_task(self, task_id: str) -> None:
+        """Descarta las sesiones de una tarea terminada"""
+        with self._lock:
+            for key in [key for key in self._sessions if key[0] == task_id]:
+                del self._sessions[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Sesiones activas y coste medio de evaluación del prompt por modo
+
+        Returns:
+            Diccionario con tokens y segundos de prompt eval por turno, con y sin reutilización
+        """
+        per_mode = {}
+        for mode, stats in self._eval.items():
+            turns = stats['turns']
+            per_mode[mode] = {
+                'turns': turns,
+                'avg_prompt_eval_tokens': round(stats['prompt_eval_count'] / turns, 1) if turns else 0.0,
+                'avg_prompt_eval_seconds': round(stats['prompt_eval_seconds'] / turns, 3) if turns else 0.0
+            }
+        return {
+            'active_sessions': len(self._sessions),
+            'max_sessions': self.max_sessions,
+            'resets': self.resets,
+            'evictions': self.evictions,
+            'prompt_eval': per_mode
+        }
+
+
+# 🌐 INSTANCIA GLOBAL DE SESIONES
+_global_session_store: Optional[TaskSessionStore] = None
+_global_session_store_lock = threading.Lock()
+
+
+def is_prefix_reuse_enabled() -> bool:
+    """OLLAMA_PREFIX_REUSE=true hace que las herramientas continúen la sesión de la tarea por defecto"""
+    return os.getenv('OLLAMA_PREFIX_REUSE', 'false').lower() == 'true'
+
+
+def get_task_session_store() -> TaskSessionStore:
+    """
+    🌐 OBTENER EL ALMACÉN GLOBAL DE SESIONES POR TAREA
+
+    Returns:
+        TaskSessionStore compartido por todas las instancias de OllamaService
+    """
+    global _global_session_store
+
+    if _global_session_store is None:
+        with _global_session_store_lock:
+            if _global_session_store is None:
+                _global_session_store = TaskSessionStore(
+                    max_sessions=int(os.getenv('OLLAMA_SESSION_MAX', '64')),
+                    ttl=int(os.getenv('OLLAMA_SESSION_TTL', '1800')),
+                    max_context_tokens=int(os.environ['OLLAMA_SESSION_MAX_CONTEXT'])
+                    if os.getenv('OLLAMA_SESSION_MAX_CONTEXT') else None
+                )
+
+    return _global_session_store
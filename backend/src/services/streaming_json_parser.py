@@ -0,0 +1,388 @@
+"""
+🧩 PARSER JSON INCREMENTAL PARA RESPUESTAS DE LLM
+=================================================
+
+Consume el texto a medida que llega del stream y entrega cada elemento en
+cuanto está completo (p. ej. cada paso de un plan o cada tool_call), sin
+esperar a la respuesta entera ni probar expresiones regulares sobre ella.
+
+Si se indica un JSON Schema, cada valor se valida al cerrarse y el parser
+lanza SchemaViolation en cuanto la salida ya no puede cumplirlo, para que el
+llamador corte la generación. Palabras clave comprobadas: type, enum,
+properties, additionalProperties, required, items, minItems, maxItems,
+minLength, maxLength y pattern. Con truncate_strings=True una cadena que
+supera maxLength se recorta en lugar de invalidar el documento.
+"""
+
+import json
+import re
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# kind: 'item' (elemento de un array vigilado) o 'capture' (valor de una clave vigilada)
+StreamEvent = namedtuple('StreamEvent', ['kind', 'path', 'value'])
+
+_WHITESPACE = ' \t\r\n'
+_LITERAL_START = '-0123456789tfn'
+_TYPES = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+}
+
+
+def fit_string(value: str, max_length: int) -> str:
+    """Recorta una cadena a max_length caracteres, marcando el corte"""
+    if len(value) <= max_length:
+        return value
+    return value[:max(0, max_length - 1)].rstrip() + '…'
+
+
+class StreamingJSONError(ValueError):
+    """La salida no es JSON válido"""
+
+
+class SchemaViolation(StreamingJSONError):
+    """La salida ya no puede cumplir el schema"""
+
+    def __init__(self, path: Tuple, message: str):
+        self.path = path
+        location = '.'.join(str(part) for part in path) or '<raíz>'
+        super().__init__(f"{location}: {message}")
+
+
+class _Frame:
+    """Objeto o array abierto"""
+    __slots__ = ('kind', 'value', 'schema', 'path', 'key', 'expect', 'start')
+
+    def __init__(self, kind: str, schema: Optional[Dict], path: Tuple, start: int):
+        self.kind = kind
+        self.value = {} if kind == 'object' else []
+        self.schema = schema
+        self.path = path
+        self.key = None
+        self.expect = 'key_or_end' if kind == 'object' else 'value_or_end'
+        self.start = start
+
+
+class StreamingJSONParser:
+    """
+    Parser JSON incremental con validación temprana contra un schema
+
+    Uso:
+        parser = StreamingJSONParser(schema=PLAN_SCHEMA, item_paths=['steps'],
+                                     on_item=lambda path, step: ...)
+        for chunk in stream:
+            parser.feed(chunk)      # puede lanzar SchemaViolation
+            if parser.done:
+                break
+        plan = parser.close()
+    """
+
+    def __init__(self,
+                 schema: Optional[Dict[str, Any]] = None,
+                 item_paths: Iterable = (),
+                 capture_keys: Iterable[str] = (),
+                 multiple: bool = False,
+                 on_item: Optional[Callable[[Tuple, Any], None]] = None,
+                 on_capture: Optional[Callable[[Tuple, Any], None]] = None,
+                 truncate_strings: bool = False):
+        """
+        Args:
+            schema: JSON Schema del documento raíz (None: sin validación)
+            item_paths: Rutas de arrays cuyos elementos se emiten al completarse ('steps', 'data.items')
+            capture_keys: Claves cuyo valor se emite al completarse, a cualquier profundidad ('tool_call')
+            multiple: Si True, busca varios documentos entre texto libre y descarta los
+                      fragmentos que no son JSON en lugar de fallar
+            on_item: Callback (ruta, valor) para cada elemento de item_paths
+            on_capture: Callback (ruta, valor) para cada clave de capture_keys
+            truncate_strings: Recortar a maxLength las cadenas demasiado largas en vez de fallar
+        """
+        self.schema = schema
+        self.item_paths = {tuple(p.split('.')) if isinstance(p, str) else tuple(p) for p in item_paths}
+        self.capture_keys = set(capture_keys)
+        self.multiple = multiple
+        self.on_item = on_item
+        self.on_capture = on_capture
+        self.truncate_strings = truncate_strings
+
+        self.documents: List[Any] = []
+        self.spans: List[Tuple[int, int]] = []  # (inicio, fin) de cada documento en el texto recibido
+        self.done = False
+
+        self._stack: List[_Frame] = []
+        self._token: Optional[List[str]] = None
+        self._token_kind: Optional[str] = None  # 'key', 'string' o 'literal'
+        self._escape = False
+        self._pos = 0
+        self._events: List[StreamEvent] = []
+
+    @property
+    def result(self) -> Any:
+        """Primer documento completo o None"""
+        return self.documents[0] if self.documents else None
+
+    def feed(self, chunk: str) -> List[StreamEvent]:
+        """
+        Consume un fragmento de texto
+
+        Returns:
+            Eventos de los elementos completados en este fragmento
+
+        Raises:
+            SchemaViolation: Si la salida ya no puede cumplir el schema
+            StreamingJSONError: Si la salida no es JSON válido (solo con multiple=False)
+        """
+        self._events = []
+        for ch in chunk:
+            if self.done:
+                break
+            try:
+                self._consume(ch)
+            except SchemaViolation:
+                raise
+            except StreamingJSONError:
+                if not self.multiple:
+                    raise
+                self._reset()
+            self._pos += 1
+        return self._events
+
+    def close(self) -> Any:
+        """
+        Termina el stream
+
+        Returns:
+            Primer documento completo (None en modo multiple si no hubo ninguno)
+
+        Raises:
+            StreamingJSONError: Si el documento quedó incompleto (solo con multiple=False)
+        """
+        if not self.documents and not self.multiple:
+            raise StreamingJSONError("JSON incompleto" if self._stack else "No se encontró JSON en la respuesta")
+        return self.result
+
+    # ---- Lexer ----
+
+    def _consume(self, ch: str) -> None:
+        kind = self._token_kind
+        if kind in ('string', 'key'):
+            if self._escape:
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._finish_string()
+                return
+            self._token.append(ch)
+            return
+
+        if kind == 'literal':
+            if ch not in _WHITESPACE and ch not in ',]}':
+                self._token.append(ch)
+                return
+            self._finish_literal()
+
+        if not self._stack:
+            if ch == '{' or (ch == '[' and self._root_accepts_array()):
+                self._open('object' if ch == '{' else 'array', self.schema, ())
+            return
+
+        if ch in _WHITESPACE:
+            return
+
+        frame = self._stack[-1]
+        expect = frame.expect
+        if frame.kind == 'object':
+            if expect in ('key_or_end', 'key') and ch == '"':
+                self._start_token('key')
+            elif expect == 'key_or_end' and ch == '}':
+                self._close()
+            elif expect == 'colon' and ch == ':':
+                frame.expect = 'value'
+            elif expect == 'value':
+                self._start_value(ch)
+            elif expect == 'comma_or_end' and ch == ',':
+                frame.expect = 'key'
+            elif expect == 'comma_or_end' and ch == '}':
+                self._close()
+            else:
+                raise StreamingJSONError(f"Carácter inesperado {ch!r} en posición {self._pos}")
+        else:
+            if expect == 'value_or_end' and ch == ']':
+                self._close()
+            elif expect in ('value_or_end', 'value'):
+                self._start_value(ch)
+            elif expect == 'comma_or_end' and ch == ',':
+                frame.expect = 'value'
+            elif expect == 'comma_or_end' and ch == ']':
+                self._close()
+            else:
+                raise StreamingJSONError(f"Carácter inesperado {ch!r} en posición {self._pos}")
+
+    def _start_token(self, kind: str) -> None:
+        self._token = []
+        self._token_kind = kind
+        self._escape = False
+
+    def _start_value(self, ch: str) -> None:
+        if ch == '"':
+            self._start_token('string')
+        elif ch in '{[':
+            path, schema = self._child()
+            self._open('object' if ch == '{' else 'array', schema, path)
+        elif ch in _LITERAL_START:
+            self._start_token('literal')
+            self._token.append(ch)
+        else:
+            raise StreamingJSONError(f"Carácter inesperado {ch!r} en posición {self._pos}")
+
+    def _finish_string(self) -> None:
+        raw = ''.join(self._token)
+        kind = self._token_kind
+        self._token = None
+        self._token_kind = None
+        try:
+            value = json.loads(f'"{raw}"', strict=False)
+        except json.JSONDecodeError as e:
+            raise StreamingJSONError(f"Cadena inválida: {e}")
+
+        frame = self._stack[-1]
+        if kind == 'key':
+            self._check_key(frame, value)
+            frame.key = value
+            frame.expect = 'colon'
+        else:
+            self._add_scalar(value)
+
+    def _finish_literal(self) -> None:
+        raw = ''.join(self._token)
+        self._token = None
+        self._token_kind = None
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            raise StreamingJSONError(f"Literal inválido {raw!r}")
+        self._add_scalar(value)
+
+    # ---- Estructura ----
+
+    def _child(self) -> Tuple[Tuple, Optional[Dict]]:
+        """Ruta y schema del siguiente valor del contenedor actual"""
+        frame = self._stack[-1]
+        schema = frame.schema or {}
+        if frame.kind == 'object':
+            child_schema = schema.get('properties', {}).get(frame.key)
+            if child_schema is None and isinstance(schema.get('additionalProperties'), dict):
+                child_schema = schema['additionalProperties']
+            return frame.path + (frame.key,), child_schema
+        items = schema.get('items')
+        if isinstance(schema.get('maxItems'), int) and len(frame.value) >= schema['maxItems']:
+            raise SchemaViolation(frame.path, f"más de {schema['maxItems']} elementos")
+        return frame.path + (len(frame.value),), items if isinstance(items, dict) else None
+
+    def _open(self, kind: str, schema: Optional[Dict], path: Tuple) -> None:
+        self._check_type(schema, [] if kind == 'array' else {}, path)
+        self._stack.append(_Frame(kind, schema, path, self._pos))
+
+    def _close(self) -> None:
+        frame = self._stack.pop()
+        self._check_complete(frame)
+        if self._stack:
+            self._attach(frame.value, frame.path)
+            return
+
+        self.documents.append(frame.value)
+        self.spans.append((frame.start, self._pos + 1))
+        self._emit(frame.path, frame.value)
+        if not self.multiple:
+            self.done = True
+
+    def _add_scalar(self, value: Any) -> None:
+        path, schema = self._child()
+        self._check_type(schema, value, path)
+        if schema and 'enum' in schema and value not in schema['enum']:
+            raise SchemaViolation(path, f"{value!r} no está entre los valores permitidos")
+        if schema and isinstance(value, str):
+            if self.truncate_strings and isinstance(schema.get('maxLength'), int):
+                value = fit_string(value, schema['maxLength'])
+            self._check_string(schema, value, path)
+        self._attach(value, path)
+
+    def _attach(self, value: Any, path: Tuple) -> None:
+        parent = self._stack[-1]
+        if parent.kind == 'object':
+            parent.value[parent.key] = value
+        else:
+            parent.value.append(value)
+        parent.expect = 'comma_or_end'
+        self._emit(path, value)
+
+    def _emit(self, path: Tuple, value: Any) -> None:
+        if path and isinstance(path[-1], int) and path[:-1] in self.item_paths:
+            self._events.append(StreamEvent('item', path, value))
+            if self.on_item:
+                self.on_item(path, value)
+        if path and path[-1] in self.capture_keys:
+            self._events.append(StreamEvent('capture', path, value))
+            if self.on_capture:
+                self.on_capture(path, value)
+
+    def _reset(self) -> None:
+        """Descarta el documento en curso y vuelve a buscar el siguiente '{'"""
+        self._stack = []
+        self._token = None
+        self._token_kind = None
+        self._escape = False
+
+    def _root_accepts_array(self) -> bool:
+        return bool(self.schema) and self._allows(self.schema, 'array')
+
+    # ---- Schema ----
+
+    @staticmethod
+    def _allows(schema: Dict[str, Any], type_name: str) -> bool:
+        expected = schema.get('type')
+        if expected is None:
+            return True
+        return type_name in (expected if isinstance(expected, list) else [expected])
+
+    @staticmethod
+    def _check_type(schema: Optional[Dict], value: Any, path: Tuple) -> None:
+        if not schema or 'type' not in schema:
+            return
+        expected = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        if not any(_TYPES.get(name, lambda v: True)(value) for name in expected):
+            raise SchemaViolation(path, f"se esperaba {'/'.join(expected)}")
+
+    @staticmethod
+    def _check_string(schema: Dict[str, Any], value: str, path: Tuple) -> None:
+        if isinstance(schema.get('minLength'), int) and len(value) < schema['minLength']:
+            raise SchemaViolation(path, f"menos de {schema['minLength']} caracteres")
+        if isinstance(schema.get('maxLength'), int) and len(value) > schema['maxLength']:
+            raise SchemaViolation(path, f"más de {schema['maxLength']} caracteres")
+        # Como en JSON Schema, el patrón no está anclado
+        if isinstance(schema.get('pattern'), str) and not re.search(schema['pattern'], value):
+            raise SchemaViolation(path, f"no cumple el patrón {schema['pattern']!r}")
+
+    @staticmethod
+    def _check_key(frame: _Frame, key: str) -> None:
+        schema = frame.schema
+        if schema and schema.get('additionalProperties') is False and key not in schema.get('properties', {}):
+            raise SchemaViolation(frame.path + (key,), "propiedad no permitida")
+
+    @staticmethod
+    def _check_complete(frame: _Frame) -> None:
+        schema = frame.schema
+        if not schema:
+            return
+        if frame.kind == 'object':
+            missing = [key for key in schema.get('required', []) if key not in frame.value]
+            if missing:
+                raise SchemaViolation(frame.path, f"faltan propiedades requeridas {missing}")
+        elif isinstance(schema.get('minItems'), int) and len(frame.value) < schema['minItems']:
+            raise SchemaViolation(frame.path, f"menos de {schema['minItems']} elementos")
@@ -4,9 +4,19 @@ Mejora implementada según UPGRADE.md Sección 5: Persistencia del Estado de Tar
 
 Centraliza la gestión de tareas migrando del almacenamiento en memoria a MongoDB
 para garantizar resiliencia y capacidad de recuperación.
+
+Las actualizaciones se escriben en diferido (write-behind): los campos
+modificados de cada tarea se acumulan y fusionan en memoria y se persisten
+todos juntos con un solo bulk_write cada `flush_interval` segundos. Los
+cambios de estado de la tarea, los cambios de estado de un paso, las lecturas
+que van directo a MongoDB y la salida del proceso fuerzan la escritura.
 """
 
+import atexit
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import json
@@ -18,10 +28,45 @@ logger = logging.getLogger(__name__)
 class TaskManager:
     """Gestor centralizado de tareas con persistencia en MongoDB"""
     
-    def __init__(self, db_service: DatabaseService = None):
+    # Campos que se escriben en el momento: un fallo tras cambiarlos no puede perderlos
+    DURABLE_FIELDS = {'status', 'completed_at', 'final_result', 'error'}
+    # Estados finales: la tarea ya no cambia de paso y su marca de pasos sobra
+    FINAL_STATUSES = {'completed', 'failed', 'cancelled'}
+    
+    def __init__(self, db_service: DatabaseService = None, write_behind: bool = None,
+                 flush_interval: float = None):
+        """
+        Args:
+            db_service: Servicio de MongoDB (por defecto uno nuevo)
+            write_behind: Escribir en diferido (por defecto TASK_WRITE_BEHIND, activado)
+            flush_interval: Segundos entre escrituras en lote (por defecto TASK_FLUSH_INTERVAL, 0.5)
+        """
         self.db_service = db_service or DatabaseService()
         self.active_cache = {}  # Caché de corta duración para reducir latencia
-        logger.info("✅ TaskManager initialized with MongoDB persistence")
+        
+        if write_behind is None:
+            write_behind = os.getenv('TASK_WRITE_BEHIND', 'true').lower() not in ('0', 'false', 'no')
+        if flush_interval is None:
+            flush_interval = float(os.getenv('TASK_FLUSH_INTERVAL', '0.5'))
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._dirty: Dict[str, Dict[str, Any]] = {}  # task_id -> campos pendientes de escribir
+        self._step_marks: Dict[str, tuple] = {}  # task_id -> estados de los pasos ya vistos
+        self._dirty_lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # Una escritura a la vez mantiene el orden
+        self._flusher: Optional[threading.Thread] = None
+        self.write_stats = {
+            'updates': 0,
+            'fields_merged': 0,
+            'flushes': 0,
+            'tasks_written': 0,
+            'failed_flushes': 0
+        }
+        if write_behind:
+            atexit.register(self.flush_all)
+        
+        logger.info(f"✅ TaskManager initialized with MongoDB persistence "
+                    f"(write-behind: {'every %ss' % flush_interval if write_behind else 'off'})")
     
     def create_task(self, task_id: str, task_data: Dict[str, Any]) -> bool:
         """
@@ -68,6 +113,7 @@ class TaskManager:
             if result:
                 # Actualizar caché
                 self.active_cache[task_id] = task_document
+                self._is_durability_point(task_id, {'plan': task_document['plan']})
                 logger.info(f"✅ Task {task_id} created and persisted to MongoDB")
                 return True
             else:
@@ -98,6 +144,9 @@ class TaskManager:
             task_data = self.db_service.get_task(task_id)
             
             if task_data:
+                # Los campos aún no escritos son más recientes que los de MongoDB
+                with self._dirty_lock:
+                    task_data.update(self._dirty.get(task_id, {}))
                 # Actualizar caché
                 self.active_cache[task_id] = task_data
                 logger.debug(f"📥 Task {task_id} retrieved from MongoDB and cached")
@@ -125,6 +174,9 @@ class TaskManager:
             # Agregar timestamp de actualización
             updates['updated_at'] = datetime.now()
             
+            if self.write_behind:
+                return self._update_task_deferred(task_id, updates)
+            
             # Actualizar en MongoDB
             success = self.db_service.update_task(task_id, updates)
             
@@ -143,6 +195,121 @@ class TaskManager:
             logger.error(f"❌ Error updating task {task_id}: {str(e)}")
             return False
     
+    def _update_task_deferred(self, task_id: str, updates: Dict[str, Any]) -> bool:
+        """
+        Aplicar la actualización al caché y dejar los campos pendientes de escribir
+        
+        Solo se aceptan tareas que existen (en caché, con cambios pendientes o
+        en MongoDB), como con la escritura inmediata: para una tarea
+        desconocida devuelve False y el llamador usa su fallback.
+        
+        Returns:
+            bool: True si se aceptó (o se escribió, en un punto de durabilidad)
+        """
+        with self._dirty_lock:
+            known = task_id in self._dirty
+        # get_task deja la tarea en caché: las siguientes actualizaciones no consultan MongoDB
+        if not known and task_id not in self.active_cache and self.get_task(task_id) is None:
+            logger.warning(f"⚠️ Update for unknown task {task_id} not deferred")
+            return False
+        
+        if task_id in self.active_cache:
+            self.active_cache[task_id].update(updates)
+        
+        with self._dirty_lock:
+            pending = self._dirty.setdefault(task_id, {})
+            self.write_stats['updates'] += 1
+            self.write_stats['fields_merged'] += len(pending.keys() & updates.keys())
+            pending.update(updates)
+        
+        if self._is_durability_point(task_id, updates):
+            return self.flush_task(task_id)
+        
+        self._ensure_flusher()
+        logger.debug(f"📝 Task {task_id} update deferred ({len(updates)} fields)")
+        return True
+    
+    def _is_durability_point(self, task_id: str, updates: Dict[str, Any]) -> bool:
+        """Cambio de estado de la tarea o de alguno de sus pasos (límite de paso)"""
+        if updates.get('status') in self.FINAL_STATUSES:
+            with self._dirty_lock:
+                self._step_marks.pop(task_id, None)
+            return True
+        if self.DURABLE_FIELDS & updates.keys():
+            return True
+        plan = updates.get('plan')
+        if not isinstance(plan, list):
+            return False
+        mark = tuple(step.get('status') for step in plan if isinstance(step, dict))
+        with self._dirty_lock:
+            previous = self._step_marks.get(task_id)
+            self._step_marks[task_id] = mark
+        return previous is not None and previous != mark
+    
+    def flush_task(self, task_id: str) -> bool:
+        """
+        Escribir ya los campos pendientes de una tarea
+        
+        Returns:
+            bool: True si no quedó nada pendiente
+        """
+        with self._flush_lock:
+            with self._dirty_lock:
+                fields = self._dirty.pop(task_id, None)
+            return self._write_batch({task_id: fields}) if fields else True
+    
+    def flush_all(self) -> bool:
+        """
+        Escribir los campos pendientes de todas las tareas en un solo bulk_write
+        
+        Returns:
+            bool: True si no quedó nada pendiente
+        """
+        with self._flush_lock:
+            with self._dirty_lock:
+                batch, self._dirty = self._dirty, {}
+            return self._write_batch(batch) if batch else True
+    
+    def _write_batch(self, batch: Dict[str, Dict[str, Any]]) -> bool:
+        """Persistir un lote (con _flush_lock tomado); si falla, los campos vuelven a quedar pendientes"""
+        try:
+            success = self.db_service.bulk_update_tasks(batch)
+        except Exception as e:
+            logger.error(f"❌ Error writing task batch: {str(e)}")
+            success = False
+        
+        if success:
+            self.write_stats['flushes'] += 1
+            self.write_stats['tasks_written'] += len(batch)
+            logger.debug(f"💾 Flushed {len(batch)} task(s) to MongoDB")
+            return True
+        
+        with self._dirty_lock:
+            for task_id, fields in batch.items():
+                # Lo que llegó mientras tanto es más reciente
+                self._dirty[task_id] = {**fields, **self._dirty.get(task_id, {})}
+        self.write_stats['failed_flushes'] += 1
+        logger.error(f"❌ Failed to flush {len(batch)} task(s) to MongoDB, will retry")
+        return False
+    
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._dirty_lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name='task_write_behind', daemon=True)
+                self._flusher.start()
+    
+    def _flush_loop(self):
+        """Escritura periódica; tras un fallo se espera el doble (hasta 30s)"""
+        delay = self.flush_interval
+        while True:
+            time.sleep(delay)
+            if not self._dirty:
+                delay = self.flush_interval
+                continue
+            delay = self.flush_interval if self.flush_all() else min(delay * 2, 30.0)
+    
     def update_task_step_status(self, task_id: str, step_id: str, new_status: str, 
                               result_summary: str = None, error: str = None) -> bool:
         """
@@ -214,6 +381,7 @@ class TaskManager:
             Lista de tareas
         """
         try:
+            self.flush_all()
             tasks = self.db_service.get_all_tasks(limit)
             
             if not include_completed:
@@ -261,6 +429,11 @@ class TaskManager:
             bool: True si se eliminó exitosamente
         """
         try:
+            # Lo pendiente de una tarea eliminada ya no se escribe
+            with self._dirty_lock:
+                self._dirty.pop(task_id, None)
+                self._step_marks.pop(task_id, None)
+            
             # Eliminar de MongoDB
             success = self.db_service.delete_task(task_id)
             
@@ -290,6 +463,7 @@ class TaskManager:
             Lista de tareas ordenadas por fecha de creación
         """
         try:
+            self.flush_all()
             tasks = self.db_service.get_all_tasks(limit)
             
             # Agregar información de resumen para el historial
@@ -314,6 +488,7 @@ class TaskManager:
             Dict con estadísticas de limpieza
         """
         try:
+            self.flush_all()
             result = self.db_service.cleanup_old_data(days_old)
             
             # Limpiar caché de tareas eliminadas
@@ -406,6 +581,11 @@ class TaskManager:
             return {
                 'database_stats': db_stats,
                 'cache_stats': cache_stats,
+                'write_behind_stats': {
+                    **self.write_stats,
+                    'enabled': self.write_behind,
+                    'pending_tasks': len(self._dirty)
+                },
                 'recovery_capable': self.db_service.is_connected()
             }
             
@@ -11,9 +11,30 @@ from typing import Dict, Any, List
 
 from .base_tool import BaseTool, ParameterDefinition, ToolExecutionResult, register_tool
 from ..services.ollama_service import OllamaService
+from ..services.ollama_task_sessions import is_prefix_reuse_enabled
 
 logger = logging.getLogger(__name__)
 
+
+def create_stream_forwarder(task_id: str, config: Dict[str, Any]):
+    """
+    Crea el reenviador de chunks hacia el WebSocket de la tarea
+    
+    Returns:
+        ReportStreamForwarder o None si no hay tarea o WebSocket activo
+    """
+    if not task_id:
+        return None
+    try:
+        from ..websocket.websocket_manager import get_websocket_manager
+        websocket_manager = get_websocket_manager()
+        if not websocket_manager or not websocket_manager.is_initialized:
+            return None
+        return websocket_manager.create_report_stream(task_id, config.get('stream_section_title') or 'Análisis')
+    except Exception as e:
+        logger.warning(f"⚠️ Streaming a WebSocket no disponible: {e}")
+        return None
+
 @register_tool
 class OllamaAnalysisTool(BaseTool):
     """
@@ -69,13 +90,33 @@ class OllamaAnalysisTool(BaseTool):
             # Generar respuesta usando Ollama
             logger.info(f"🧠 Iniciando análisis con Ollama - Prompt: {prompt[:100]}...")
             
-            response = ollama_service.generate_response(
-                prompt=prompt,
-                context=context,
-                use_tools=False,
-                task_id=self.current_task_id or "analysis",
-                step_id="analysis_step"
-            )
+            task_id = config.get('task_id')
+            # Continuar la sesión Ollama de la tarea es opt-in (config o OLLAMA_PREFIX_REUSE)
+            reuse_prefix = bool(task_id) and config.get('reuse_prefix', is_prefix_reuse_enabled())
+            forwarder = create_stream_forwarder(task_id, config) if config.get('stream_progress') else None
+            if forwarder:
+                # Streaming: el análisis llega al terminal mientras se genera
+                try:
+                    response = ollama_service.generate_response_streaming(
+                        prompt=prompt,
+                        context=context,
+                        use_tools=False,
+                        task_id=task_id,
+                        step_id="analysis_step",
+                        on_chunk=forwarder,
+                        reuse_prefix=reuse_prefix
+                    )
+                finally:
+                    forwarder.close()
+            else:
+                response = ollama_service.generate_response(
+                    prompt=prompt,
+                    context=context,
+                    use_tools=False,
+                    task_id=task_id or "analysis",
+                    step_id="analysis_step",
+                    reuse_prefix=reuse_prefix
+                )
             
             if response and 'response' in response:
                 analysis_content = response['response']
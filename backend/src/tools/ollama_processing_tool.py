@@ -10,6 +10,8 @@ from typing import Dict, Any, List
 
 from .base_tool import BaseTool, ParameterDefinition, ToolExecutionResult, register_tool
 from ..services.ollama_service import OllamaService
+from ..services.ollama_task_sessions import is_prefix_reuse_enabled
+from .ollama_analysis_tool import create_stream_forwarder
 
 logger = logging.getLogger(__name__)
 
@@ -59,7 +61,7 @@ class OllamaProcessingTool(BaseTool):
             ollama_service = OllamaService()
             
             # Configurar parámetros de generación para procesamiento final
-            generation_params = {
+            context = {
                 'max_tokens': max_tokens,
                 'temperature': 0.8,
                 'system_prompt': "Eres un asistente experto en generar contenido final completo y detallado. Tu tarea es crear el resultado final exacto que se solicita basándote en toda la información recopilada previamente. Sé específico, detallado y útil."
@@ -68,10 +70,33 @@ class OllamaProcessingTool(BaseTool):
             # Generar respuesta final usando Ollama
             logger.info(f"🔄 Iniciando procesamiento final con Ollama - Prompt: {prompt[:100]}...")
             
-            response = ollama_service.generate_response(
-                prompt=prompt,
-                **generation_params
-            )
+            task_id = config.get('task_id')
+            # Continuar la sesión Ollama de la tarea es opt-in (config o OLLAMA_PREFIX_REUSE)
+            reuse_prefix = bool(task_id) and config.get('reuse_prefix', is_prefix_reuse_enabled())
+            forwarder = create_stream_forwarder(task_id, config) if config.get('stream_progress') else None
+            if forwarder:
+                # Streaming: el resultado llega al terminal mientras se genera
+                try:
+                    response = ollama_service.generate_response_streaming(
+                        prompt=prompt,
+                        context=context,
+                        use_tools=False,
+                        task_id=task_id,
+                        step_id="processing_step",
+                        on_chunk=forwarder,
+                        reuse_prefix=reuse_prefix
+                    )
+                finally:
+                    forwarder.close()
+            else:
+                response = ollama_service.generate_response(
+                    prompt=prompt,
+                    context=context,
+                    use_tools=False,
+                    task_id=task_id or "processing",
+                    step_id="processing_step",
+                    reuse_prefix=reuse_prefix
+                )
             
             if response and 'response' in response:
                 processed_content = response['response']
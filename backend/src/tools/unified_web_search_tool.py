@@ -1589,6 +1589,7 @@ if __name__ == "__main__":
         try:
             # 🔧 PASO 1: Crear archivos de comunicación IPC para progreso en tiempo real
             progress_file = f"/tmp/websocket_progress_{self.task_id}_{int(time.time())}.json"
+            backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
             
             # 🔧 PASO 2: Script Playwright mejorado con comunicación IPC
             script_content = f'''
@@ -1598,16 +1599,49 @@ import sys
 import time
 from playwright.async_api import async_playwright
 from urllib.parse import quote_plus
+import os
 import traceback
 from datetime import datetime
 
+# Con un bus entre procesos (WEBSOCKET_BUS=unix/redis) el progreso se publica
+# directamente y el archivo IPC queda solo como latido para el proceso padre
+bus_manager = None
+if os.getenv("WEBSOCKET_BUS", "inprocess") in ("unix", "redis"):
+    try:
+        sys.path.insert(0, "{backend_dir}")
+        from src.websocket.websocket_manager import WebSocketManager
+        bus_manager = WebSocketManager()
+    except Exception:
+        bus_manager = None
+
+def publish_progress(message):
+    if bus_manager is None:
+        return False
+    try:
+        timestamp = datetime.now().isoformat()
+        bus_manager.emit_to_task("{self.task_id}", "task_progress", {{
+            "step_id": "web-search",
+            "activity": message,
+            "progress_percentage": 50,
+            "timestamp": timestamp
+        }})
+        bus_manager.emit_to_task("{self.task_id}", "log_message", {{
+            "level": "info",
+            "message": message,
+            "timestamp": timestamp
+        }})
+        return True
+    except Exception:
+        return False
+
 def emit_progress(message, progress_file):
-    """Emitir progreso a archivo IPC"""
+    """Emitir progreso por el bus y/o a archivo IPC"""
     try:
         progress_data = {{
             "timestamp": datetime.now().isoformat(),
             "message": message,
-            "task_id": "{self.task_id}"
+            "task_id": "{self.task_id}",
+            "published": publish_progress(message)
         }}
         with open(progress_file, "w") as f:
             json.dump(progress_data, f)
@@ -1749,6 +1783,7 @@ except Exception as e:
                 # 🔧 PASO 5: Monitoreo en tiempo real del progreso
                 start_time = time.time()
                 last_progress_time = start_time
+                last_progress_stamp = None
                 
                 while process.poll() is None:
                     # Verificar timeout
@@ -1766,8 +1801,11 @@ except Exception as e:
                             with open(progress_file, 'r') as f:
                                 progress_data = json.load(f)
                                 message = progress_data.get('message', '')
-                                if message:
-                                    self._emit_progress_eventlet(message)
+                                if message and progress_data.get('timestamp') != last_progress_stamp:
+                                    last_progress_stamp = progress_data.get('timestamp')
+                                    # Ya publicado por el bus desde el subproceso
+                                    if not progress_data.get('published'):
+                                        self._emit_progress_eventlet(message)
                                     last_progress_time = time.time()
                     except (json.JSONDecodeError, FileNotFoundError):
                         pass
@@ -2168,8 +2206,10 @@ except Exception as e:
                         f.flush()
                     print(f"⚠️ No ready clients for browser_visual in task {self.task_id}")
             
-            # Fallback a método anterior si el seguro no está disponible
-            app_available = hasattr(current_app, 'socketio') and current_app.socketio
+            # Fallback a método anterior si el seguro no está disponible; con el WebSocket
+            # Manager se usa el PASO 4, que envía los screenshots como frames binarios
+            manager_ready = bool(getattr(self, 'websocket_manager', None) and self.websocket_manager.is_initialized)
+            app_available = hasattr(current_app, 'socketio') and current_app.socketio and not manager_ready
             
             with open('/tmp/websocket_comprehensive.log', 'a') as f:
                 f.write(f"BROWSER_VISUAL_STEP_3_FALLBACK: app_available={app_available}\n")
@@ -2700,6 +2740,11 @@ except Exception as e:
                 websocket_manager = get_websocket_manager()
                 
                 if websocket_manager and websocket_manager.is_initialized:
+                    # Un frame igual al último enviado no aporta nada: se evita que el cliente lo descargue
+                    if websocket_manager.frames.is_repeat(self.task_id, screenshot_url):
+                        logger.debug(f"📸 Screenshot repetido omitido: {screenshot_url}")
+                        return
+
                     # Enviar browser activity con screenshot
                     websocket_manager.send_browser_activity(
                         self.task_id,
@@ -0,0 +1,437 @@
+"""
+Task event bus
+Lets task events published in one process reach the workers that hold the
+client connections. Every WebSocketManager delivers its own events locally
+and publishes them on the bus; managers that are not serving sockets (tool
+subprocesses, tools that build their own instance, other gunicorn workers)
+only publish, and every serving worker delivers what it receives to its
+rooms.
+
+Backends (WEBSOCKET_BUS):
+- inprocess: subscribers of the same process (default, single worker)
+- unix: a hub on a Unix socket (WEBSOCKET_BUS_PATH); the first process to
+  take the lock file becomes the hub and relays lines to the others, and a
+  new hub is elected if it goes away
+- redis: PUBLISH/SUBSCRIBE on WEBSOCKET_BUS_URL, for Redis or any local
+  server that speaks its protocol; needs the redis package
+"""
+
+import base64
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    fcntl = None
+    FCNTL_AVAILABLE = False
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BusCallback = Callable[[Dict[str, Any]], None]
+
+DEFAULT_SOCKET_PATH = '/tmp/mitosis_ws_bus.sock'
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+DEFAULT_CHANNEL = 'mitosis:task_events'
+
+
+def _json_default(value: Any) -> Any:
+    # Raw screenshots travel as data URLs; the receiving worker's frame pipeline decodes them
+    if isinstance(value, (bytes, bytearray)):
+        return 'data:image/png;base64,' + base64.b64encode(bytes(value)).decode('ascii')
+    return str(value)
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    return json.dumps(message, default=_json_default, separators=(',', ':'))
+
+
+class EventBus:
+    """
+    Base bus: `publish` delivers to the subscribers of this process and sends
+    the message to the other processes; messages from other processes are
+    delivered to the local subscribers.
+    """
+
+    cross_process = False
+
+    def __init__(self):
+        self.bus_id = uuid.uuid4().hex
+        self._subscribers: List[BusCallback] = []
+        self._subscribers_lock = threading.Lock()
+        self.stats = {'published': 0, 'received': 0, 'delivery_errors': 0, 'send_errors': 0}
+
+    def subscribe(self, callback: BusCallback):
+        with self._subscribers_lock:
+            first = not self._subscribers
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        if first:
+            self._on_first_subscriber()
+
+    def unsubscribe(self, callback: BusCallback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, message: Dict[str, Any]) -> bool:
+        """
+        Publish a message
+
+        Returns:
+            True if some subscriber (local or, as far as known, remote) can get it
+        """
+        message = dict(message, bus_origin=self.bus_id)
+        self.stats['published'] += 1
+        delivered = self._deliver(message)
+        return self._send(message) or delivered
+
+    def _deliver(self, message: Dict[str, Any]) -> bool:
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(message)
+            except Exception as e:
+                self.stats['delivery_errors'] += 1
+                logger.error(f"❌ Event bus subscriber failed: {e}")
+        return bool(subscribers)
+
+    def _receive(self, message: Dict[str, Any]):
+        """Message from another process"""
+        if message.get('bus_origin') == self.bus_id:
+            return
+        self.stats['received'] += 1
+        self._deliver(message)
+
+    def _send(self, message: Dict[str, Any]) -> bool:
+        return False
+
+    def _on_first_subscriber(self):
+        pass
+
+    def close(self):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': self.__class__.__name__, 'subscribers': len(self._subscribers), **self.stats}
+
+
+class InProcessBus(EventBus):
+    """Bus between the WebSocketManager instances of one process"""
+
+
+class UnixSocketBus(EventBus):
+    """
+    Bus over a Unix socket hub
+
+    Messages are newline-delimited JSON. The process holding the lock file
+    accepts connections and relays each line to every other connection that
+    subscribed; the rest connect as clients and reconnect (possibly becoming
+    the hub) when the connection drops. Messages published while
+    disconnected are kept in a bounded queue.
+    """
+
+    cross_process = True
+
+    def __init__(self, path: str = DEFAULT_SOCKET_PATH, max_pending: int = 1000, send_timeout: float = 1.0):
+        super().__init__()
+        self.path = path
+        self.send_timeout = send_timeout
+        self._pending: Deque[str] = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._lock_file = None
+        self._server: Optional[socket.socket] = None
+        self._conn: Optional[socket.socket] = None
+        self._peers: Dict[socket.socket, bool] = {}  # hub: connection -> subscribed
+        self._connect()
+
+    @property
+    def is_hub(self) -> bool:
+        return self._server is not None
+
+    def _connect(self):
+        """Become the hub if nobody holds the lock, otherwise connect to it"""
+        if self._try_become_hub():
+            return
+        for attempt in range(10):
+            try:
+                conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                conn.connect(self.path)
+            except OSError:
+                # The hub may still be binding, or may have just died
+                if self._try_become_hub():
+                    return
+                time.sleep(0.05 * (attempt + 1))
+                continue
+            with self._lock:
+                self._conn = conn
+                if self._subscribers:
+                    self._write(conn, encode_message({'_bus': 'subscribe'}))
+                while self._pending:
+                    self._write(conn, self._pending.popleft())
+            threading.Thread(target=self._read_loop, args=(conn, None), daemon=True).start()
+            return
+        logger.warning(f"⚠️ Event bus hub at {self.path} not reachable; messages are queued")
+
+    def _try_become_hub(self) -> bool:
+        if not FCNTL_AVAILABLE:
+            return False
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Holding the lock means any socket file left behind is stale
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(64)
+        with self._lock:
+            self._lock_file = lock_file
+            self._server = server
+            pending = list(self._pending)
+            self._pending.clear()
+        threading.Thread(target=self._accept_loop, args=(server,), daemon=True).start()
+        logger.info(f"📡 Event bus hub listening on {self.path}")
+        for line in pending:
+            self._relay(line, None)
+        return True
+
+    def _accept_loop(self, server: socket.socket):
+        while not self._closed:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            conn.settimeout(None)
+            with self._lock:
+                self._peers[conn] = False
+            threading.Thread(target=self._read_loop, args=(conn, conn), daemon=True).start()
+
+    def _read_loop(self, conn: socket.socket, peer: Optional[socket.socket]):
+        """Read lines from a connection; peer is set on the hub side"""
+        buffer = b''
+        while not self._closed:
+            try:
+                chunk = conn.recv(65536)
+            except OSError:
+                chunk = b''
+            if not chunk:
+                break
+            buffer += chunk
+            while b'\n' in buffer:
+                raw, buffer = buffer.split(b'\n', 1)
+                self._handle_line(raw.decode('utf-8'), peer)
+        self._drop(conn, peer)
+
+    def _handle_line(self, line: str, peer: Optional[socket.socket]):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            logger.warning("⚠️ Event bus dropped a malformed line")
+            return
+        if message.get('_bus') == 'subscribe':
+            if peer is not None:
+                with self._lock:
+                    self._peers[peer] = True
+            return
+        if peer is not None:
+            self._relay(line, peer)
+        self._receive(message)
+
+    def _relay(self, line: str, source: Optional[socket.socket]):
+        """Hub: forward a line to every subscribed connection but its source"""
+        with self._lock:
+            targets = [conn for conn, subscribed in self._peers.items() if subscribed and conn is not source]
+        for conn in targets:
+            try:
+                conn.settimeout(self.send_timeout)
+                conn.sendall((line + '\n').encode('utf-8'))
+            except OSError:
+                self.stats['send_errors'] += 1
+                self._drop(conn, conn)
+
+    def _write(self, conn: socket.socket, line: str):
+        conn.sendall((line + '\n').encode('utf-8'))
+
+    def _send(self, message: Dict[str, Any]) -> bool:
+        line = encode_message(message)
+        if self.is_hub:
+            self._relay(line, None)
+            return any(self._peers.values())
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                self._pending.append(line)
+                return False
+            try:
+                self._write(conn, line)
+                return True
+            except OSError:
+                self.stats['send_errors'] += 1
+                self._pending.append(line)
+        self._drop(conn, None)
+        return False
+
+    def _drop(self, conn: socket.socket, peer: Optional[socket.socket]):
+        try:
+            conn.close()
+        except OSError:
+            pass
+        with self._lock:
+            if peer is not None:
+                self._peers.pop(peer, None)
+                return
+            if self._conn is not conn:
+                return
+            self._conn = None
+        if not self._closed:
+            threading.Thread(target=self._reconnect, daemon=True).start()
+
+    def _reconnect(self):
+        delay = 0.2
+        while not self._closed and self._conn is None and not self.is_hub:
+            time.sleep(delay)
+            self._connect()
+            delay = min(delay * 2, 5.0)
+
+    def _on_first_subscriber(self):
+        with self._lock:
+            conn = self._conn
+            if conn is not None:
+                try:
+                    self._write(conn, encode_message({'_bus': 'subscribe'}))
+                except OSError:
+                    pass
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            connections = list(self._peers) + ([self._conn] if self._conn else [])
+            self._peers.clear()
+            self._conn = None
+        for conn in connections:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        if self._server is not None:
+            self._server.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats.update({
+            'path': self.path,
+            'role': 'hub' if self.is_hub else ('client' if self._conn else 'disconnected'),
+            'peers': len(self._peers),
+            'pending': len(self._pending)
+        })
+        return stats
+
+
+class RedisBus(EventBus):
+    """Bus over Redis PUBLISH/SUBSCRIBE (any server that speaks the protocol)"""
+
+    cross_process = True
+
+    def __init__(self, url: str = DEFAULT_REDIS_URL, channel: str = DEFAULT_CHANNEL):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self._client = redis.Redis.from_url(url)
+        self._closed = False
+
+    def _send(self, message: Dict[str, Any]) -> bool:
+        try:
+            return self._client.publish(self.channel, encode_message(message)) > 0
+        except redis.RedisError as e:
+            self.stats['send_errors'] += 1
+            logger.error(f"❌ Event bus publish to {self.url} failed: {e}")
+            return False
+
+    def _on_first_subscriber(self):
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        delay = 0.5
+        while not self._closed:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                delay = 0.5
+                for item in pubsub.listen():
+                    if self._closed:
+                        break
+                    if item.get('type') == 'message':
+                        try:
+                            self._receive(json.loads(item['data']))
+                        except ValueError:
+                            logger.warning("⚠️ Event bus dropped a malformed message")
+            except redis.RedisError as e:
+                logger.error(f"❌ Event bus subscription to {self.url} lost: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 10.0)
+
+    def close(self):
+        self._closed = True
+        self._client.close()
+
+
+def create_event_bus(kind: Optional[str] = None) -> EventBus:
+    """
+    Build the bus selected by WEBSOCKET_BUS (inprocess, unix or redis)
+
+    Falls back to the in-process bus when the backend cannot be used.
+    """
+    kind = (kind or os.getenv('WEBSOCKET_BUS', 'inprocess')).lower()
+    try:
+        if kind == 'unix':
+            return UnixSocketBus(os.getenv('WEBSOCKET_BUS_PATH', DEFAULT_SOCKET_PATH))
+        if kind == 'redis':
+            if REDIS_AVAILABLE:
+                return RedisBus(os.getenv('WEBSOCKET_BUS_URL', DEFAULT_REDIS_URL),
+                                os.getenv('WEBSOCKET_BUS_CHANNEL', DEFAULT_CHANNEL))
+            logger.warning("⚠️ WEBSOCKET_BUS=redis but the redis package is not installed; using in-process bus")
+    except Exception as e:
+        logger.error(f"❌ Could not start {kind} event bus, using in-process bus: {e}")
+    return InProcessBus()
+
+
+# Global event bus instance
+_global_event_bus: Optional[EventBus] = None
+_global_event_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> EventBus:
+    """Get the event bus shared by every WebSocketManager of this process"""
+    global _global_event_bus
+
+    if _global_event_bus is None:
+        with _global_event_bus_lock:
+            if _global_event_bus is None:
+                _global_event_bus = create_event_bus()
+
+    return _global_event_bus
@@ -0,0 +1,335 @@
+"""
+Browser frame pipeline
+Screenshots used to travel as base64 data URLs inside the JSON of every
+browser_visual event, including frames identical to the previous one. Here
+each frame is perceptually hashed (dHash) and dropped when it is nearly the
+same as the last frame sent for the task; kept frames are downsized and
+re-encoded as JPEG and leave as a binary Socket.IO attachment. A changed
+frame that arrives before the task's minimum interval is held back and the
+latest one is sent when the interval expires, so the final state of a burst
+is never lost. Sessions can ask for a lower frame rate and are skipped until
+their interval elapses.
+
+Pillow is optional: without it frames are deduplicated by exact content and
+sent unchanged, still as binary.
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Payload fields that may carry the screenshot (data URL, bytes or a screenshots file URL)
+SCREENSHOT_FIELDS = ('screenshot', 'screenshot_url', 'screenshot_data')
+SCREENSHOTS_URL_PREFIX = '/api/files/screenshots/'
+SCREENSHOTS_DIR = '/tmp/screenshots'
+
+
+def dhash(image: 'Image.Image', size: int = 16) -> int:
+    """Difference hash: one bit per horizontal brightness gradient of a size x size thumbnail"""
+    pixels = list(image.convert('L').resize((size + 1, size)).getdata())
+    value = 0
+    for row in range(size):
+        for column in range(size):
+            left = pixels[row * (size + 1) + column]
+            right = pixels[row * (size + 1) + column + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def _decode_data_url(value: str) -> Optional[Tuple[bytes, str]]:
+    header, _, encoded = value.partition(',')
+    if not header.startswith('data:image') or ';base64' not in header:
+        return None
+    try:
+        return base64.b64decode(encoded), header[5:].split(';')[0]
+    except (ValueError, TypeError):
+        return None
+
+
+def _load_reference(value: str) -> Optional[Tuple[bytes, str]]:
+    """Bytes of a screenshot served from /api/files/screenshots/<task>/<file>"""
+    if not value.startswith(SCREENSHOTS_URL_PREFIX):
+        return None
+    # An absolute part ('//etc/hostname') or a symlink could leave the directory
+    root = os.path.realpath(SCREENSHOTS_DIR)
+    path = os.path.realpath(os.path.join(root, value[len(SCREENSHOTS_URL_PREFIX):].lstrip('/')))
+    if path == root or os.path.commonpath([root, path]) != root:
+        return None
+    try:
+        with open(path, 'rb') as screenshot_file:
+            data = screenshot_file.read()
+    except OSError:
+        return None
+    return (data, 'image/png') if data else None
+
+
+class FramePipeline:
+    """
+    Deduplicates, downsizes and rate-limits screenshot frames per task
+
+    `prepare` turns a browser_visual payload into the message to emit (or
+    decides to drop it); `sessions_to_skip` applies the per-session rates.
+    """
+
+    def __init__(self, max_width: int = 1024, max_aspect: Optional[float] = None, quality: int = 60,
+                 min_interval: float = 0.2, hash_threshold: int = 12, max_tasks: int = 64):
+        """
+        Args:
+            max_width: Width frames are downsized to
+            max_aspect: Max height/width ratio full-page captures are cropped to
+                        (None keeps the whole page and only downsizes it)
+            quality: JPEG quality of re-encoded frames
+            min_interval: Seconds between frames of a task (navigation changes bypass it)
+            hash_threshold: Max dHash distance (of 256 bits) to consider two frames the same
+            max_tasks: Tasks whose last frame is kept for late joiners
+        """
+        self.max_width = max_width
+        self.max_aspect = max_aspect
+        self.quality = quality
+        self.min_interval = min_interval
+        self.hash_threshold = hash_threshold
+        self.max_tasks = max_tasks
+
+        self._lock = threading.Lock()
+        self._last: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # task_id -> last frame sent
+        self._pending: Dict[str, Dict[str, Any]] = {}  # task_id -> latest rate-limited frame
+        self._session_intervals: Dict[str, float] = {}
+        self._session_last: Dict[str, float] = {}
+        self._frame_ids = 0
+        self.stats = {
+            'frames_in': 0,
+            'frames_sent': 0,
+            'duplicates': 0,
+            'rate_limited': 0,
+            'trailing_sent': 0,
+            'bytes_in': 0,
+            'bytes_out': 0
+        }
+
+    @staticmethod
+    def extract(payload: Dict[str, Any]) -> Optional[Tuple[bytes, str]]:
+        """Screenshot bytes and mime type carried by a payload, if any"""
+        for field in SCREENSHOT_FIELDS:
+            value = payload.get(field)
+            if isinstance(value, (bytes, bytearray)):
+                return bytes(value), 'image/png'
+            if isinstance(value, str):
+                frame = _decode_data_url(value) if value.startswith('data:') else _load_reference(value)
+                if frame:
+                    return frame
+        return None
+
+    def prepare(self, task_id: str, event: str, payload: Dict[str, Any],
+                trailing: bool = False) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Decide what to do with a payload that may carry a screenshot
+
+        Args:
+            trailing: The payload is a held-back frame being retried (see `take_pending`)
+
+        Returns:
+            ('passthrough', None) when there is no frame, ('drop', None) for a
+            duplicate frame or one that replaces an already held-back frame,
+            ('defer', {'delay': seconds}) when a rate-limited frame is held back
+            and the caller must call `take_pending` after the delay, or
+            ('send', message) with the binary frame and the rest of the payload
+        """
+        frame = self.extract(payload)
+        if frame is None:
+            return 'passthrough', None
+        raw, mime = frame
+        url = payload.get('url')
+        # Final captures always go through; other frames only on a new URL or visible change
+        force = bool(payload.get('final_capture'))
+
+        image, cropped, phash, digest = self._analyze(task_id, raw)
+        now = time.monotonic()
+
+        with self._lock:
+            if not trailing:
+                self.stats['frames_in'] += 1
+                self.stats['bytes_in'] += len(raw)
+            last = self._last.get(task_id)
+            if last is not None and not force and last['url'] == url:
+                if self._same_frame(last, phash, digest):
+                    # Back to what clients already show: a held-back frame is stale now
+                    self._pending.pop(task_id, None)
+                    self.stats['duplicates'] += 1
+                    return 'drop', None
+                delay = last['sent_at'] + self.min_interval - now
+                if delay > 0:
+                    if not trailing:
+                        self.stats['rate_limited'] += 1
+                    scheduled = task_id in self._pending
+                    self._pending[task_id] = {'event': event, 'payload': payload}
+                    return ('drop', None) if scheduled else ('defer', {'delay': delay})
+            self._pending.pop(task_id, None)
+            if trailing:
+                self.stats['trailing_sent'] += 1
+            self._frame_ids += 1
+            frame_id = self._frame_ids
+
+        if image is not None:
+            encoded, mime, width, height = self._downsize(image, raw, mime, cropped)
+        else:
+            encoded, width, height = raw, None, None
+
+        message = {key: value for key, value in payload.items() if key not in SCREENSHOT_FIELDS}
+        message.update({
+            'task_id': task_id,
+            'event': event,
+            'frame_id': frame_id,
+            'image': encoded,
+            'mime': mime,
+            'width': width,
+            'height': height
+        })
+        with self._lock:
+            self.stats['frames_sent'] += 1
+            self.stats['bytes_out'] += len(encoded)
+            self._last[task_id] = {'phash': phash, 'digest': digest, 'url': url, 'sent_at': now, 'message': message}
+            self._last.move_to_end(task_id)
+            while len(self._last) > self.max_tasks:
+                self._last.popitem(last=False)
+        return 'send', message
+
+    def take_pending(self, task_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Latest held-back frame of a task as (event, payload), to retry with
+        `prepare(..., trailing=True)`; None if a newer frame made it obsolete
+        """
+        with self._lock:
+            pending = self._pending.pop(task_id, None)
+        return (pending['event'], pending['payload']) if pending else None
+
+    def is_repeat(self, task_id: str, value: str, url: Optional[str] = None) -> bool:
+        """
+        Whether a screenshot reference shows the same frame as the last one sent
+
+        Read-only: neither the last frame nor the stats change, so the frame
+        can still be sent (and recorded) through `prepare` afterwards.
+        """
+        frame = self.extract({'screenshot_url': value})
+        if frame is None:
+            return False
+        with self._lock:
+            last = self._last.get(task_id)
+        if last is None or (url is not None and last['url'] != url):
+            return False
+        _, _, phash, digest = self._analyze(task_id, frame[0])
+        return self._same_frame(last, phash, digest)
+
+    def _analyze(self, task_id: str, raw: bytes) -> Tuple[Optional['Image.Image'], bool, Optional[int], str]:
+        """Decoded (and cropped) image, its dHash and the content digest of a frame"""
+        image, cropped = None, False
+        if PIL_AVAILABLE:
+            try:
+                image, cropped = self._crop(Image.open(io.BytesIO(raw)))
+            except Exception as e:
+                logger.debug(f"Frame for task {task_id} is not a decodable image: {e}")
+                image = None
+        phash = dhash(image) if image is not None else None
+        return image, cropped, phash, hashlib.sha1(raw).hexdigest()
+
+    def _same_frame(self, last: Dict[str, Any], phash: Optional[int], digest: str) -> bool:
+        if phash is not None and last['phash'] is not None:
+            return bin(phash ^ last['phash']).count('1') <= self.hash_threshold
+        return digest == last['digest']
+
+    def _crop(self, image: 'Image.Image') -> Tuple['Image.Image', bool]:
+        """With max_aspect set, full-page captures keep only their top part, which is also what gets hashed"""
+        width, height = image.size
+        cropped = self.max_aspect is not None and height > width * self.max_aspect
+        if cropped:
+            image = image.crop((0, 0, width, int(width * self.max_aspect)))
+        image.load()
+        return image, cropped
+
+    def _downsize(self, image: 'Image.Image', raw: bytes, mime: str, cropped: bool) -> Tuple[bytes, str, int, int]:
+        width, height = image.size
+        resized = width > self.max_width
+        if resized:
+            height = max(1, round(height * self.max_width / width))
+            width = self.max_width
+            image = image.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, 'JPEG', quality=self.quality, optimize=True)
+        encoded = buffer.getvalue()
+        if len(encoded) >= len(raw) and not resized and not cropped:
+            # Small frames can grow when re-encoded; the original is sent instead
+            return raw, mime, width, height
+        return encoded, 'image/jpeg', width, height
+
+    def last_frame(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Last frame sent for a task, for clients that join later"""
+        with self._lock:
+            last = self._last.get(task_id)
+            return last['message'] if last else None
+
+    def set_session_rate(self, session_id: str, fps: Optional[float]) -> float:
+        """
+        Cap the frames a session receives (None or 0 removes the cap)
+
+        Returns:
+            Effective minimum interval in seconds
+        """
+        with self._lock:
+            if not fps or fps <= 0:
+                self._session_intervals.pop(session_id, None)
+                return self.min_interval
+            interval = max(self.min_interval, 1.0 / fps)
+            self._session_intervals[session_id] = interval
+            return interval
+
+    def sessions_to_skip(self, session_ids: Iterable[str]) -> List[str]:
+        """Sessions whose requested interval has not elapsed; the rest are marked as served"""
+        now = time.monotonic()
+        skipped = []
+        with self._lock:
+            for session_id in session_ids:
+                interval = self._session_intervals.get(session_id)
+                if interval is None:
+                    continue
+                if now - self._session_last.get(session_id, 0.0) < interval:
+                    skipped.append(session_id)
+                else:
+                    self._session_last[session_id] = now
+        return skipped
+
+    def forget_session(self, session_id: str):
+        with self._lock:
+            self._session_intervals.pop(session_id, None)
+            self._session_last.pop(session_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['pil_available'] = PIL_AVAILABLE
+        stats['bytes_saved_ratio'] = round(1 - stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else 0.0
+        return stats
+
+
+def frame_pipeline_from_env() -> FramePipeline:
+    """Frame pipeline configured with BROWSER_FRAME_* environment variables"""
+    max_aspect = os.getenv('BROWSER_FRAME_MAX_ASPECT')
+    return FramePipeline(
+        max_width=int(os.getenv('BROWSER_FRAME_MAX_WIDTH', '1024')),
+        max_aspect=float(max_aspect) if max_aspect else None,
+        quality=int(os.getenv('BROWSER_FRAME_QUALITY', '60')),
+        min_interval=float(os.getenv('BROWSER_FRAME_MIN_INTERVAL', '0.2')),
+        hash_threshold=int(os.getenv('BROWSER_FRAME_HASH_THRESHOLD', '12'))
+    )
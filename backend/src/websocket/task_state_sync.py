@@ -0,0 +1,241 @@
+"""
+Delta-encoded task state sync
+Every event sent to a task room gets a per-task sequence number. Events on
+the same channel (event name, update type and step) usually repeat most of
+the previous payload, so they travel as JSON-patch operations against it;
+the client keeps the last payload per channel and rebuilds the full one.
+Reconnecting clients resume from their last seq, or get a compacted
+snapshot when the missed range is no longer buffered or is larger than the
+snapshot itself. Seqs only mean something to the process that assigned
+them: the registry has an epoch, and a client resuming with a seq from
+another epoch (it reconnected to a different worker) gets a snapshot.
+"""
+
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Channels whose events are a stream (each one matters) rather than a state (latest wins)
+STREAM_TYPES = {
+    'log_message', 'browser_activity', 'data_collection_update', 'report_progress',
+    'tool_execution_detail', 'terminal_activity', 'browser_visual', 'agent_activity',
+    'plan_step_generated'
+}
+
+
+def _escape(key: Any) -> str:
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token: str) -> str:
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def json_diff(old: Any, new: Any, path: str = '') -> List[Dict[str, Any]]:
+    """
+    JSON-patch (RFC 6902 add/remove/replace) operations that turn old into new
+
+    Dicts are compared key by key and lists index by index; anything else
+    that changed is replaced whole.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{'op': 'remove', 'path': f"{path}/{_escape(key)}"} for key in old if key not in new]
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key in old:
+                ops.extend(json_diff(old[key], value, child))
+            else:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        ops = []
+        for index in range(common):
+            ops.extend(json_diff(old[index], new[index], f"{path}/{index}"))
+        for index in range(common, len(new)):
+            ops.append({'op': 'add', 'path': f"{path}/{index}", 'value': new[index]})
+        # Removing from the end keeps the remaining indexes valid
+        for index in range(len(old) - 1, len(new) - 1, -1):
+            ops.append({'op': 'remove', 'path': f"{path}/{index}"})
+        return ops
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply_patch(document: Any, ops: List[Dict[str, Any]]) -> Any:
+    """Apply json_diff operations to a copy of document"""
+    document = json.loads(json.dumps(document))
+    for op in ops:
+        if op['path'] == '':
+            document = op.get('value')
+            continue
+        tokens = [_unescape(token) for token in op['path'].split('/')[1:]]
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            index = len(parent) if last == '-' else int(last)
+            if op['op'] == 'add':
+                parent.insert(index, op['value'])
+            elif op['op'] == 'remove':
+                del parent[index]
+            else:
+                parent[index] = op['value']
+        elif op['op'] == 'remove':
+            del parent[last]
+        else:
+            parent[last] = op['value']
+    return document
+
+
+def channel_for(event: str, payload: Dict[str, Any]) -> str:
+    """Channel of an event: name, update type for task_update, and step when present"""
+    inner = payload
+    channel = event
+    if event == 'task_update':
+        channel = f"task_update:{payload.get('type', '')}"
+        inner = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+    step_id = inner.get('step_id')
+    return f"{channel}:{step_id}" if step_id else channel
+
+
+def is_stream_channel(channel: str) -> bool:
+    return any(part in STREAM_TYPES for part in channel.split(':')[:2])
+
+
+class TaskSyncLog:
+    """
+    Sequence numbers, channel state and resume buffer of one task
+
+    The ring buffer holds the wire item and the full payload of the last
+    `max_entries` events; `channels` holds the latest full payload per
+    channel, which is what a snapshot is compacted from.
+    """
+
+    def __init__(self, task_id: str, max_entries: int = 200, snapshot_tail: int = 20):
+        self.task_id = task_id
+        self.seq = 0
+        self.snapshot_tail = snapshot_tail
+        self.channels: Dict[str, Tuple[int, str, Dict[str, Any]]] = {}  # channel -> (seq, event, payload)
+        self.entries: Deque[Tuple[Dict[str, Any], Dict[str, Any]]] = deque(maxlen=max_entries)
+        self.full_bytes = 0
+        self.wire_bytes = 0
+
+    def encode(self, event: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Assign the next seq to an event and build its wire item
+
+        Returns:
+            {'event', 'seq', 'channel', 'data'} or {'event', 'seq', 'channel', 'patch'}
+        """
+        # Normalized as it will be serialized, so the next diff matches what the client holds
+        full_json = json.dumps(payload, default=str)
+        payload = json.loads(full_json)
+        channel = channel_for(event, payload)
+        self.seq += 1
+        item = {'event': event, 'seq': self.seq, 'channel': channel, 'data': payload}
+
+        previous = self.channels.get(channel)
+        if previous is not None:
+            ops = json_diff(previous[2], payload)
+            ops_json = json.dumps(ops)
+            if len(ops_json) < len(full_json):
+                item = {'event': event, 'seq': self.seq, 'channel': channel, 'patch': ops}
+                wire_json = ops_json
+            else:
+                wire_json = full_json
+        else:
+            wire_json = full_json
+
+        self.full_bytes += len(full_json)
+        self.wire_bytes += len(wire_json)
+        self.channels[channel] = (self.seq, event, payload)
+        self.entries.append((item, payload))
+        return item
+
+    def since(self, last_seq: int) -> Optional[List[Dict[str, Any]]]:
+        """Wire items after last_seq, or None if part of that range is no longer buffered"""
+        if last_seq >= self.seq:
+            return []
+        if not self.entries or self.entries[0][0]['seq'] > last_seq + 1:
+            return None
+        return [item for item, _ in self.entries if item['seq'] > last_seq]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        Compacted history as full items in seq order
+
+        Every channel contributes its latest payload (the base of its next
+        patch); stream channels also keep the last `snapshot_tail` events.
+        """
+        items = {seq: {'event': event, 'seq': seq, 'channel': channel, 'data': payload}
+                 for channel, (seq, event, payload) in self.channels.items()}
+        stream = [(item, payload) for item, payload in self.entries if is_stream_channel(item['channel'])]
+        for item, payload in stream[-self.snapshot_tail:]:
+            items[item['seq']] = {'event': item['event'], 'seq': item['seq'], 'channel': item['channel'], 'data': payload}
+        return [items[seq] for seq in sorted(items)]
+
+    def history(self, event: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Full payloads still buffered, optionally for one event name"""
+        return [payload for item, payload in self.entries if event is None or item['event'] == event]
+
+
+class TaskSyncRegistry:
+    """Sync logs of every task, created on first use"""
+
+    def __init__(self, max_entries: int = 200, snapshot_tail: int = 20):
+        self.max_entries = max_entries
+        self.snapshot_tail = snapshot_tail
+        self.epoch = uuid.uuid4().hex[:12]
+        self._logs: Dict[str, TaskSyncLog] = {}
+        self._lock = threading.Lock()
+
+    def get(self, task_id: str) -> TaskSyncLog:
+        with self._lock:
+            log = self._logs.get(task_id)
+            if log is None:
+                log = TaskSyncLog(task_id, self.max_entries, self.snapshot_tail)
+                self._logs[task_id] = log
+            return log
+
+    def find(self, task_id: str) -> Optional[TaskSyncLog]:
+        return self._logs.get(task_id)
+
+    def resume(self, task_id: str, last_seq: Optional[int],
+               epoch: Optional[str] = None) -> Tuple[str, int, List[Dict[str, Any]]]:
+        """
+        Items a client needs to catch up with a task
+
+        Args:
+            epoch: Epoch the client's last_seq belongs to, if it knows it
+
+        Returns:
+            (mode, seq, items) with mode 'delta', 'snapshot' or 'none'
+        """
+        log = self.find(task_id)
+        if log is None:
+            return 'none', 0, []
+        if epoch and epoch != self.epoch:
+            last_seq = None
+        if last_seq is not None and last_seq <= log.seq:
+            missed = log.since(last_seq)
+            snapshot = log.snapshot()
+            # Resuming only pays off while the missed range is smaller than the snapshot
+            if missed is not None and len(missed) <= len(snapshot):
+                return ('delta' if missed else 'none'), log.seq, missed
+            return 'snapshot', log.seq, snapshot
+        return 'snapshot', log.seq, log.snapshot()
+
+    def get_stats(self) -> Dict[str, Any]:
+        full_bytes = sum(log.full_bytes for log in self._logs.values())
+        wire_bytes = sum(log.wire_bytes for log in self._logs.values())
+        return {
+            'tasks': len(self._logs),
+            'full_bytes': full_bytes,
+            'wire_bytes': wire_bytes,
+            'bytes_saved_ratio': round(1 - wire_bytes / full_bytes, 3) if full_bytes else 0.0
+        }
@@ -7,12 +7,18 @@ import asyncio
 import json
 import logging
 import threading
+import time
+import uuid
 from typing import Dict, List, Callable, Any, Optional
 from datetime import datetime
 from flask import Flask, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from enum import Enum
 
+from .event_bus import EventBus, get_event_bus
+from .frame_pipeline import frame_pipeline_from_env
+from .task_state_sync import TaskSyncRegistry, channel_for, is_stream_channel
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,10 +41,132 @@ class UpdateType(Enum):
     REPORT_PROGRESS = "report_progress"  # Para actualizaciones incrementales del informe
     LOG_MESSAGE = "log_message"  # Para mensajes de log genéricos
 
+class ReportStreamForwarder:
+    """
+    Coalesces streamed LLM text into periodic report_progress updates.
+    
+    Tokens arrive every few milliseconds; sending one WebSocket event per token
+    would flood the room and the stored message history. Deltas are buffered
+    and flushed when `flush_interval` seconds have passed or the buffer grows
+    past `max_buffer_chars`. Intermediate flushes carry only the delta (the
+    frontend appends it); the final flush carries the full text.
+    """
+    
+    def __init__(self, manager: 'WebSocketManager', task_id: str, section_title: str,
+                 flush_interval: float = 0.25, max_buffer_chars: int = 512):
+        self.manager = manager
+        self.task_id = task_id
+        self.section_title = section_title
+        self.flush_interval = flush_interval
+        self.max_buffer_chars = max_buffer_chars
+        self.flush_count = 0
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._parts: List[str] = []
+        self._last_flush = time.monotonic()
+        self._closed = False
+    
+    def __call__(self, delta: str):
+        """Buffer a text delta, flushing if the window elapsed or the buffer is full"""
+        if self._closed or not delta:
+            return
+        self._buffer.append(delta)
+        self._parts.append(delta)
+        self._buffered_chars += len(delta)
+        if (self._buffered_chars >= self.max_buffer_chars or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+    
+    def flush(self, final: bool = False):
+        """Send the buffered delta (and the full text when final)"""
+        if not self._buffer and not final:
+            return
+        delta = ''.join(self._buffer)
+        self._buffer.clear()
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        self.flush_count += 1
+        self.manager.send_report_progress(
+            self.task_id,
+            self.section_title,
+            delta,
+            full_report_so_far=self.text if final else ""
+        )
+    
+    def close(self):
+        """Flush the remainder with the complete text; later deltas are ignored"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._parts:
+            self.flush(final=True)
+    
+    @property
+    def text(self) -> str:
+        """Full text received so far"""
+        return ''.join(self._parts)
+
+class TaskOutbox:
+    """
+    Pending outbound events for one task room.
+    
+    Events queued within the flush window leave as a single `task_batch`
+    emit. Identical payloads on state channels are dropped (a repeated
+    stream event, such as the same log line twice, is a separate event and
+    is kept) and progress events keep only the latest value per coalescing
+    key, in the position of the first one.
+    """
+    
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.coalesce_index: Dict[str, int] = {}
+        self.fingerprints: set = set()
+        self.scheduled = False
+        self.urgent = False
+    
+    def add(self, event: str, data: Dict[str, Any], coalesce_key: Optional[str] = None) -> str:
+        """Queue an event; returns 'queued', 'coalesced' or 'deduplicated'"""
+        if not is_stream_channel(channel_for(event, data)):
+            fingerprint = self._fingerprint(event, data)
+            if fingerprint in self.fingerprints:
+                return 'deduplicated'
+            self.fingerprints.add(fingerprint)
+        if coalesce_key is not None and coalesce_key in self.coalesce_index:
+            self.events[self.coalesce_index[coalesce_key]] = {'event': event, 'data': data}
+            return 'coalesced'
+        if coalesce_key is not None:
+            self.coalesce_index[coalesce_key] = len(self.events)
+        self.events.append({'event': event, 'data': data})
+        return 'queued'
+    
+    def drain(self) -> List[Dict[str, Any]]:
+        """Take every pending event and reset the outbox"""
+        events = self.events
+        self.events = []
+        self.coalesce_index.clear()
+        self.fingerprints.clear()
+        self.scheduled = False
+        self.urgent = False
+        return events
+    
+    @staticmethod
+    def _fingerprint(event: str, data: Dict[str, Any]) -> str:
+        # Timestamps differ on every call, so they are not part of the identity
+        stable = {key: value for key, value in data.items() if key not in ('timestamp', 'server_timestamp')}
+        if isinstance(stable.get('data'), dict):
+            stable['data'] = {key: value for key, value in stable['data'].items() if key != 'timestamp'}
+        return event + json.dumps(stable, sort_keys=True, default=str)
+
 class WebSocketManager:
     """Manages WebSocket connections and real-time updates"""
     
-    def __init__(self, app: Flask = None):
+    # Progress updates supersede each other, only the latest per window is sent
+    COALESCED_EVENTS = {'task_progress', 'progress_update'}
+    # Terminal events flush the outbox right away instead of waiting for the window
+    URGENT_EVENTS = {'task_completed', 'task_failed', 'step_failed', 'error'}
+    
+    def __init__(self, app: Flask = None, flush_window: float = 0.05,
+                 max_resume_entries: int = 200, snapshot_tail: int = 20):
         self.app = app
         self.socketio = None
         self.active_connections: Dict[str, List[str]] = {}  # task_id -> [session_ids]
@@ -46,6 +174,25 @@ class WebSocketManager:
         self.update_queue = asyncio.Queue()
         self.is_initialized = False
         
+        # Outbound pipeline: one outbox per task, flushed once per window to the room
+        self.flush_window = flush_window
+        self.sync = TaskSyncRegistry(max_entries=max_resume_entries, snapshot_tail=snapshot_tail)
+        self.frames = frame_pipeline_from_env()
+        self._outboxes: Dict[str, TaskOutbox] = {}
+        self._outbox_lock = threading.RLock()
+        self.pipeline_stats = {
+            'queued': 0,
+            'coalesced': 0,
+            'deduplicated': 0,
+            'batches': 0,
+            'emits': 0
+        }
+        
+        # Cross-process fan-out: every instance publishes what it sends, and
+        # initialized instances deliver what other instances/processes publish
+        self.origin = uuid.uuid4().hex
+        self.bus: Optional[EventBus] = None
+        
     def initialize(self, app: Flask):
         """Initialize WebSocket with Flask app"""
         self.app = app
@@ -70,6 +217,9 @@ class WebSocketManager:
         
         self.setup_event_handlers()
         self.is_initialized = True
+        bus = self._get_bus()
+        if bus is not None:
+            bus.subscribe(self._on_bus_message)
         logger.info("WebSocket Manager initialized")
         
     def setup_event_handlers(self):
@@ -84,6 +234,7 @@ class WebSocketManager:
         def handle_disconnect():
             logger.info(f"WebSocket client disconnected: {request.sid}")
             self.handle_client_disconnect(request.sid)
+            self.frames.forget_session(request.sid)
             
         @self.socketio.on('join_task')
         def handle_join_task(data):
@@ -95,29 +246,36 @@ class WebSocketManager:
                 emit('error', {'message': 'task_id is required'})
                 return
                 
-            # Join room for this task
-            join_room(task_id)
-            
-            # Track connection
+            # Track connection (a resync re-joins with the same session)
             if task_id not in self.active_connections:
                 self.active_connections[task_id] = []
-            self.active_connections[task_id].append(session_id)
+            if session_id not in self.active_connections[task_id]:
+                self.active_connections[task_id].append(session_id)
             self.session_tasks[session_id] = task_id
             
-            logger.info(f"🔌 Client {session_id} joined task {task_id}")
-            logger.info(f"📊 Total active connections for task {task_id}: {len(self.active_connections[task_id])}")
+            logger.info(f"🔌 Client {session_id} joined task {task_id} "
+                        f"({len(self.active_connections[task_id])} active connections)")
             
-            # 🚀 CRITICAL FIX: Send stored messages to the newly connected client
-            try:
-                self.send_stored_messages_to_client(session_id, task_id)
-                logger.info(f"📦 Sent stored messages to newly connected client {session_id}")
-            except Exception as e:
-                logger.error(f"❌ Error sending stored messages to client {session_id}: {e}")
+            # Join room and catch the client up from its last seq (or with a snapshot)
+            # atomically, so no live batch arrives before the catch-up
+            sync_mode, seq = 'none', 0
+            with self._outbox_lock:
+                join_room(task_id)
+                try:
+                    sync_mode, seq = self.send_task_sync(session_id, task_id, data.get('last_seq'),
+                                                         data.get('epoch'))
+                    last_frame = self.frames.last_frame(task_id)
+                    if last_frame:
+                        self.socketio.emit('browser_frame', last_frame, room=session_id)
+                except Exception as e:
+                    logger.error(f"❌ Error syncing task {task_id} to client {session_id}: {e}")
             
             emit('joined_task', {
                 'task_id': task_id, 
                 'status': 'joined',
-                'stored_messages_sent': True,
+                'sync_mode': sync_mode,
+                'seq': seq,
+                'epoch': self.sync.epoch,
                 'active_connections': len(self.active_connections[task_id])
             })
             
@@ -133,6 +291,17 @@ class WebSocketManager:
                 logger.info(f"Client {session_id} left task {task_id}")
                 emit('left_task', {'task_id': task_id, 'status': 'left'})
                 
+        @self.socketio.on('set_frame_rate')
+        def handle_set_frame_rate(data):
+            """Client caps the browser frames it receives (fps, 0 for no cap)"""
+            try:
+                fps = float(data.get('fps') or 0)
+            except (TypeError, ValueError):
+                emit('error', {'message': 'fps must be a number'})
+                return
+            interval = self.frames.set_session_rate(request.sid, fps)
+            emit('frame_rate_set', {'fps': fps, 'min_interval': interval})
+            
         @self.socketio.on('request_status')
         def handle_status_request(data):
             """Client requests current status of a task"""
@@ -157,90 +326,181 @@ class WebSocketManager:
                     del self.active_connections[task_id]
                     
     def send_update(self, task_id: str, update_type: UpdateType, data: Dict[str, Any]):
-        """Send update to all clients listening to a task - ENHANCED VERSION WITH MESSAGE PERSISTENCE"""
-        if not self.is_initialized or not self.socketio:
+        """Queue an update for all clients listening to a task; flushed updates are kept for late joiners"""
+        if not self._dispatch('update', task_id, update_type.value, data):
             logger.warning("WebSocket not initialized, cannot send update")
+    
+    def _dispatch(self, op: str, task_id: str, name: str, data: Dict[str, Any]) -> bool:
+        """
+        Deliver an event to the rooms of this process (if serving sockets) and
+        publish it for the other instances and processes
+        
+        Returns:
+            True if the event was delivered locally or handed to the bus
+        """
+        delivered = False
+        if self.is_initialized and self.socketio:
+            self._deliver(op, task_id, name, data)
+            delivered = True
+        
+        bus = self._get_bus()
+        if bus is None:
+            return delivered
+        try:
+            published = bus.publish({'origin': self.origin, 'op': op, 'task_id': task_id, 'name': name, 'data': data})
+        except Exception as e:
+            logger.error(f"❌ Error publishing {name} for task {task_id} on the event bus: {e}")
+            published = False
+        return delivered or published
+    
+    def _deliver(self, op: str, task_id: str, name: str, data: Dict[str, Any]):
+        """Queue an event for the task room of this process"""
+        if op == 'update':
+            update_data = {
+                'task_id': task_id,
+                'type': name,
+                'timestamp': datetime.now().isoformat(),
+                'data': data
+            }
+            logger.debug(f"📡 Queued {name} update for task {task_id}")
+            self._enqueue(task_id, 'task_update', update_data, name, data)
+        elif op == 'emit':
+            self._enqueue(task_id, name, data, name, data)
+            logger.debug(f"Queued {name} for task {task_id}")
+        else:
+            # The room already reaches every tracked session; the event goes out once
+            # under its own name (no per-session copies or generic aliases)
+            enhanced_data = {
+                **data,
+                'task_id': task_id,
+                'event': name,
+                'server_timestamp': datetime.now().isoformat()
+            }
+            if name == 'browser_visual' and self.send_browser_frame(task_id, name, enhanced_data):
+                return
+            self._enqueue(task_id, name, enhanced_data, name, data)
+            logger.debug(f"🚀 Queued {name} for task {task_id}")
+    
+    def _get_bus(self) -> Optional[EventBus]:
+        if self.bus is None:
+            try:
+                self.bus = get_event_bus()
+            except Exception as e:
+                logger.error(f"❌ Event bus unavailable: {e}")
+        return self.bus
+    
+    def _on_bus_message(self, message: Dict[str, Any]):
+        """Deliver an event published by another instance or process"""
+        if message.get('origin') == self.origin or not self.is_initialized or not self.socketio:
             return
-        
-        # 🔧 CRITICAL FIX: Store messages even if no active connections
-        # This ensures messages are available when clients connect later
-        if not hasattr(self, 'stored_messages'):
-            self.stored_messages = {}
-        if task_id not in self.stored_messages:
-            self.stored_messages[task_id] = []
-        
-        update_data = {
-            'task_id': task_id,
-            'type': update_type.value,
-            'timestamp': datetime.now().isoformat(),
-            'data': data
-        }
-        
-        # Store message for late-joining clients (keep last 50 messages per task)
-        self.stored_messages[task_id].append(update_data)
-        if len(self.stored_messages[task_id]) > 50:
-            self.stored_messages[task_id] = self.stored_messages[task_id][-50:]
-        
-        # 🚀 ENHANCED LOGGING for debugging
-        logger.info(f"📡 Storing and attempting to send {update_type.value} update for task {task_id}")
-        logger.info(f"🔌 Active connections for task {task_id}: {len(self.active_connections.get(task_id, []))}")
-        logger.info(f"📦 Message data preview: {str(data)[:100]}...")
-        
         try:
-            # Send to all clients in the task room (even if no active connections tracked)
-            self.socketio.emit('task_update', update_data, room=task_id)
-            
-            # 🔧 ADDITIONAL EMIT STRATEGIES for maximum compatibility
-            # Strategy 1: Emit to individual sessions if room fails
-            if task_id in self.active_connections:
-                for session_id in self.active_connections[task_id]:
-                    self.socketio.emit('task_update', update_data, room=session_id)
-                    logger.info(f"📡 Sent to individual session: {session_id}")
-            
-            # Strategy 2: ELIMINADA - Causa principal de contaminación entre tareas
-            # UPGRADE AI: Las emisiones globales han sido eliminadas para prevenir
-            # la contaminación de contenido entre tareas y el problema de "PENSANDO" 
-            # en todas las tareas simultáneamente
-            # Referencia: UpgradeAI.md Sección 4.2, Mejora 1
-            
-            # Todas las actualizaciones ahora se envían ÚNICAMENTE a la room específica de la tarea
-            
-            # Strategy 3: Store in session storage for retrieval
-            if not hasattr(self, 'session_messages'):
-                self.session_messages = {}
-            for session_id in self.active_connections.get(task_id, []):
-                if session_id not in self.session_messages:
-                    self.session_messages[session_id] = []
-                self.session_messages[session_id].append(update_data)
-                # Keep last 20 messages per session
-                if len(self.session_messages[session_id]) > 20:
-                    self.session_messages[session_id] = self.session_messages[session_id][-20:]
+            self._deliver(message['op'], message['task_id'], message['name'], message.get('data') or {})
+        except (KeyError, TypeError) as e:
+            logger.warning(f"⚠️ Ignoring malformed event bus message: {e}")
+    
+    def _enqueue(self, task_id: str, event: str, payload: Dict[str, Any], kind: str, data: Dict[str, Any]):
+        """Add an event to the task outbox and make sure a flush is pending"""
+        # Only numeric progress supersedes itself; activity messages on the same channel are kept
+        coalesce_key = f"{event}:{kind}" if kind in self.COALESCED_EVENTS and 'progress' in data else None
+        urgent = kind in self.URGENT_EVENTS
+        with self._outbox_lock:
+            outbox = self._outboxes.setdefault(task_id, TaskOutbox())
+            self.pipeline_stats[outbox.add(event, payload, coalesce_key)] += 1
+            schedule = not urgent and not outbox.scheduled
+            outbox.scheduled = outbox.scheduled or schedule
+        
+        if urgent:
+            self.flush_task(task_id)
+        elif schedule:
+            self._schedule_flush(task_id)
+    
+    def _schedule_flush(self, task_id: str):
+        """Flush the task outbox once the window has elapsed"""
+        try:
+            self.socketio.start_background_task(self._flush_after_window, task_id)
+        except Exception as e:
+            logger.error(f"❌ Could not schedule WebSocket flush for task {task_id}: {e}")
+            self.flush_task(task_id)
+    
+    def _flush_after_window(self, task_id: str):
+        self.socketio.sleep(self.flush_window)
+        self.flush_task(task_id)
+    
+    def flush_task(self, task_id: str):
+        """Send the pending events of a task to its room as a single emit"""
+        with self._outbox_lock:
+            outbox = self._outboxes.pop(task_id, None)
+            if outbox is None or not outbox.events:
+                return
+            events = outbox.drain()
             
-            logger.info(f"✅ Successfully processed {update_type.value} update for task {task_id}")
+            # Seqs are assigned at flush, after coalescing, in the order clients receive them
+            log = self.sync.get(task_id)
+            items = [log.encode(item['event'], item['data']) for item in events]
             
-        except Exception as e:
-            logger.error(f"❌ Error sending WebSocket update for task {task_id}: {e}")
-            # Even if sending fails, we still have the message stored
+            # Emitting under the lock keeps batches of the same task in order
+            try:
+                self._emit_batch(task_id, items, room=task_id)
+            except Exception as e:
+                logger.error(f"❌ Error sending WebSocket batch for task {task_id}: {e}")
+    
+    def flush_all(self):
+        """Flush every task outbox (shutdown or tests)"""
+        for task_id in list(self._outboxes):
+            self.flush_task(task_id)
+    
+    def _emit_batch(self, task_id: str, items: List[Dict[str, Any]], room: str, snapshot: bool = False):
+        """One emit per room: a task_batch the client unpacks in order"""
+        batch = {'task_id': task_id, 'epoch': self.sync.epoch, 'events': items}
+        if snapshot:
+            batch['snapshot'] = True
+        self.socketio.emit('task_batch', batch, room=room)
+        self.pipeline_stats['batches'] += 1
+        self.pipeline_stats['emits'] += 1
+    
+    def get_pipeline_stats(self) -> Dict[str, Any]:
+        """Counters of the outbound pipeline: logical events vs socket emits"""
+        stats = dict(self.pipeline_stats)
+        logical = stats['queued'] + stats['coalesced'] + stats['deduplicated']
+        stats['logical_events'] = logical
+        stats['emits_saved'] = max(0, logical - stats['emits'])
+        stats['pending_tasks'] = len(self._outboxes)
+        stats['sync'] = self.sync.get_stats()
+        stats['frames'] = self.frames.get_stats()
+        if self.bus is not None:
+            stats['bus'] = self.bus.get_stats()
+        return stats
     
     def get_stored_messages(self, task_id: str) -> List[Dict[str, Any]]:
-        """Get stored messages for a task (for late-joining clients)"""
-        if not hasattr(self, 'stored_messages'):
-            self.stored_messages = {}
-        return self.stored_messages.get(task_id, [])
+        """Get buffered task_update messages for a task"""
+        log = self.sync.find(task_id)
+        return log.history('task_update') if log else []
     
-    def send_stored_messages_to_client(self, session_id: str, task_id: str):
-        """Send all stored messages for a task to a specific client"""
+    def send_task_sync(self, session_id: str, task_id: str, last_seq: Optional[int] = None,
+                       epoch: Optional[str] = None):
+        """
+        Catch a client up with a task: the events after last_seq, or a compacted
+        snapshot when that range is no longer buffered or is bigger than the snapshot
+        
+        Returns:
+            Tuple (mode, seq) with mode 'delta', 'snapshot' or 'none'
+        """
         if not self.is_initialized or not self.socketio:
-            return
+            return 'none', 0
         
-        stored_messages = self.get_stored_messages(task_id)
-        if stored_messages:
-            logger.info(f"📦 Sending {len(stored_messages)} stored messages to client {session_id} for task {task_id}")
-            for message in stored_messages:
-                try:
-                    self.socketio.emit('task_update', message, room=session_id)
-                except Exception as e:
-                    logger.error(f"❌ Error sending stored message to {session_id}: {e}")
+        try:
+            last_seq = int(last_seq) if last_seq is not None else None
+        except (TypeError, ValueError):
+            last_seq = None
+        
+        # Under the outbox lock no batch can slip between the catch-up and live events
+        with self._outbox_lock:
+            mode, seq, items = self.sync.resume(task_id, last_seq, epoch)
+            if items:
+                logger.info(f"📦 Sync {mode} to client {session_id} for task {task_id}: "
+                            f"{len(items)} events up to seq {seq}")
+                self._emit_batch(task_id, items, room=session_id, snapshot=mode == 'snapshot')
+        return mode, seq
             
     def send_task_started(self, task_id: str, task_title: str, execution_plan: Dict[str, Any]):
         """Send task started notification"""
@@ -324,19 +584,8 @@ class WebSocketManager:
 
     def emit_update(self, task_id: str, update_type: UpdateType, data: Dict[str, Any]):
         """Emit update to all clients in task room"""
-        if not self.is_initialized or not self.socketio:
+        if not self._dispatch('emit', task_id, update_type.value, data):
             logger.warning("WebSocket not initialized, cannot emit update")
-            return
-            
-        try:
-            self.socketio.emit(
-                update_type.value,
-                data,
-                room=task_id
-            )
-            logger.info(f"Emitted {update_type.value} to task {task_id}")
-        except Exception as e:
-            logger.error(f"Error emitting update: {e}")
 
     def emit_activity(self, task_id: str, activity: str, tool: str = None):
         """Emit real-time activity to terminal"""
@@ -351,64 +600,64 @@ class WebSocketManager:
         )
 
     def emit_to_task(self, task_id: str, event: str, data: Dict[str, Any]):
-        """Emit event to all clients connected to a specific task - ENHANCED VERSION"""
-        if not self.is_initialized or not self.socketio:
+        """Emit event to all clients connected to a specific task"""
+        if not self._dispatch('event', task_id, event, data):
             logger.warning("WebSocket not initialized, cannot emit event")
-            return
-            
+    
+    def send_browser_frame(self, task_id: str, event: str, payload: Dict[str, Any]) -> bool:
+        """
+        Send a payload carrying a screenshot through the frame pipeline
+        
+        The frame leaves as a binary browser_frame emit (the client dispatches
+        it as `event`), skipping sessions that asked for a lower frame rate.
+        
+        Returns:
+            True if the payload was handled (sent, held back or dropped as a repeat),
+            False if it carries no frame and should be sent as a regular event
+        """
+        if not self.is_initialized or not self.socketio:
+            return False
+        
+        return self._send_frame(task_id, event, payload)
+    
+    def _send_frame(self, task_id: str, event: str, payload: Dict[str, Any], trailing: bool = False) -> bool:
+        action, message = self.frames.prepare(task_id, event, payload, trailing)
+        if action == 'passthrough':
+            return False
+        if action == 'defer':
+            self._schedule_trailing_frame(task_id, message['delay'])
+        elif action == 'send':
+            skip = self.frames.sessions_to_skip(self.active_connections.get(task_id, []))
+            try:
+                if skip:
+                    self.socketio.emit('browser_frame', message, room=task_id, skip_sid=skip)
+                else:
+                    self.socketio.emit('browser_frame', message, room=task_id)
+                self.pipeline_stats['emits'] += 1
+            except Exception as e:
+                logger.error(f"❌ Error sending browser frame for task {task_id}: {e}")
+        return True
+    
+    def _schedule_trailing_frame(self, task_id: str, delay: float):
+        """Send the latest held-back frame of a task once its interval has elapsed"""
         try:
-            logger.info(f"🚀 Attempting to emit {event} to task {task_id}")
-            logger.info(f"🔌 Active connections for task {task_id}: {len(self.active_connections.get(task_id, []))}")
-            
-            # Enhanced data with more information
-            enhanced_data = {
-                **data,
-                'task_id': task_id,
-                'event': event,
-                'server_timestamp': datetime.now().isoformat()
-            }
-            
-            # CRITICAL FIX: Store the event for later retrieval even if no connections
-            if not hasattr(self, 'stored_events'):
-                self.stored_events = {}
-            if task_id not in self.stored_events:
-                self.stored_events[task_id] = []
-            
-            # Store last 10 events per task for late-joining clients
-            self.stored_events[task_id].append(enhanced_data)
-            if len(self.stored_events[task_id]) > 10:
-                self.stored_events[task_id] = self.stored_events[task_id][-10:]
-            
-            # Emit to task room regardless of active connections
-            self.socketio.emit(event, enhanced_data, room=task_id)
-            logger.info(f"✅ Emitted {event} to task room {task_id}")
-            
-            # Also emit to individual sessions if room doesn't work
-            if task_id in self.active_connections:
-                for session_id in self.active_connections[task_id]:
-                    self.socketio.emit(event, enhanced_data, room=session_id)
-                    logger.info(f"✅ Emitted {event} to session {session_id}")
-            else:
-                logger.warning(f"⚠️ No active connections found for task {task_id} - Event stored for later retrieval")
-            
-            # Also emit generic events that frontend might be listening for
-            generic_events = ['task_update', 'progress_update', 'agent_activity']
-            for generic_event in generic_events:
-                self.socketio.emit(generic_event, enhanced_data, room=task_id)
-                if task_id in self.active_connections:
-                    for session_id in self.active_connections[task_id]:
-                        self.socketio.emit(generic_event, enhanced_data, room=session_id)
-                        
+            self.socketio.start_background_task(self._send_trailing_frame, task_id, delay)
         except Exception as e:
-            logger.error(f"❌ Error emitting to task {task_id}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"❌ Could not schedule trailing frame for task {task_id}: {e}")
+            self.frames.take_pending(task_id)  # Otherwise later frames would wait for it forever
+    
+    def _send_trailing_frame(self, task_id: str, delay: float):
+        self.socketio.sleep(delay)
+        pending = self.frames.take_pending(task_id)
+        if pending:
+            self._send_frame(task_id, *pending, trailing=True)
     
     def get_stored_events(self, task_id: str) -> List[Dict[str, Any]]:
-        """Get stored events for a task (for late-joining clients)"""
-        if not hasattr(self, 'stored_events'):
-            self.stored_events = {}
-        return self.stored_events.get(task_id, [])
+        """Get buffered events sent through emit_to_task/emit_update for a task"""
+        log = self.sync.find(task_id)
+        if not log:
+            return []
+        return [payload for item, payload in log.entries if item['event'] != 'task_update']
     
     def send_orchestration_progress(self, task_id: str, step_id: str, progress: float, 
                                    current_step: str, total_steps: int):
@@ -612,12 +861,16 @@ class WebSocketManager:
         if not section_title or not isinstance(section_title, str):
             section_title = "Report Section"
             
-        if not content_delta or not isinstance(content_delta, str):
-            content_delta = "Content generated"
-            
         full_report_so_far = str(full_report_so_far) if full_report_so_far else ""
         
-        self.send_update(task_id, UpdateType.REPORT_PROGRESS, {
+        if not content_delta or not isinstance(content_delta, str):
+            # The final flush of a stream may carry only the full text
+            content_delta = "" if full_report_so_far else "Content generated"
+        
+        # Sent as a top-level report_progress event: the terminal view reads
+        # section_title/content_delta directly from the payload, which a
+        # task_update wrapper would nest under `data`
+        self.emit_to_task(task_id, UpdateType.REPORT_PROGRESS.value, {
             'section_title': str(section_title),
             'content_delta': str(content_delta),
             'full_report_so_far': full_report_so_far,
@@ -626,6 +879,11 @@ class WebSocketManager:
             'type': 'report_progress'  # ✅ Añadir campo type explícito para el frontend
         })
 
+    def create_report_stream(self, task_id: str, section_title: str, flush_interval: float = 0.25,
+                             max_buffer_chars: int = 512) -> ReportStreamForwarder:
+        """Create a coalescing forwarder that streams LLM output as report_progress updates"""
+        return ReportStreamForwarder(self, task_id, section_title, flush_interval, max_buffer_chars)
+
 # Global WebSocket manager instance
 websocket_manager = WebSocketManager()
 
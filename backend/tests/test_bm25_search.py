@@ -0,0 +1,99 @@
+"""
+Tests de la búsqueda por palabras clave: puntuación BM25, poda top-k y
+fusión híbrida con Reciprocal Rank Fusion
+"""
+
+import asyncio
+import math
+import random
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('sentence_transformers')
+
+from src.memory.bm25_index import BM25Index
+from src.memory.semantic_indexer import SemanticIndexer
+
+
+def exhaustive_scores(index, query_terms):
+    """BM25 de todos los documentos, sin poda"""
+    n = len(index)
+    avg_length = index.total_length / n
+    scores = {}
+    for doc_id, term_freqs in index.doc_terms.items():
+        score = 0.0
+        for term in set(query_terms):
+            tf = term_freqs.get(term)
+            if not tf:
+                continue
+            df = index.document_frequency(term)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = index.k1 * (1 - index.b + index.b * index.doc_lengths[doc_id] / avg_length)
+            score += idf * tf * (index.k1 + 1) / (tf + norm)
+        if score:
+            scores[doc_id] = score
+    return scores
+
+
+def test_bm25_score_matches_formula():
+    index = BM25Index()
+    index.add('a', ['python', 'async', 'python'])
+    index.add('b', ['rust', 'async'])
+    index.add('c', ['go'])
+    expected = exhaustive_scores(index, ['python', 'async'])
+    results = index.search(['python', 'async'], top_k=3)
+    assert [doc_id for doc_id, _ in results] == ['a', 'b']
+    for doc_id, score in results:
+        assert score == pytest.approx(expected[doc_id])
+
+
+def test_pruned_search_matches_exhaustive_ranking():
+    rng = random.Random(7)
+    vocabulary = [f"t{i}" for i in range(40)]
+    index = BM25Index()
+    for doc in range(300):
+        index.add(f"d{doc}", rng.choices(vocabulary, weights=range(40, 0, -1), k=rng.randint(3, 30)))
+    for _ in range(20):
+        query = rng.sample(vocabulary, 4)
+        expected = sorted(exhaustive_scores(index, query).values(), reverse=True)[:10]
+        assert [score for _, score in index.search(query, top_k=10)] == pytest.approx(expected)
+
+
+def test_removed_and_replaced_documents_update_statistics():
+    index = BM25Index()
+    index.add('a', ['python', 'async'])
+    index.add('b', ['python'])
+    index.add('a', ['rust'])
+    assert index.document_frequency('python') == 1
+    assert index.document_frequency('async') == 0
+    index.remove('b')
+    assert 'python' not in index.postings
+    assert index.total_length == 1
+    assert index.search(['python'], top_k=5) == []
+
+
+def test_rrf_fuses_ranks_of_both_searches():
+    indexer = SemanticIndexer(rrf_k=60)
+    keyword = [{'document_id': doc_id, 'score': score, 'search_type': 'keyword', 'metadata': {}}
+               for doc_id, score in [('a', 12.0), ('b', 3.0)]]
+    semantic = [{'document_id': doc_id, 'score': score, 'search_type': 'semantic', 'metadata': {}}
+                for doc_id, score in [('b', 0.9), ('c', 0.8)]]
+    merged = {result['document_id']: result for result in indexer._merge_results(keyword + semantic)}
+
+    assert merged['a']['score'] == pytest.approx(1 / 61)
+    assert merged['b']['score'] == pytest.approx(1 / 62 + 1 / 61)
+    assert merged['c']['score'] == pytest.approx(1 / 62)
+    assert merged['b']['raw_scores'] == {'keyword': 3.0, 'semantic': 0.9}
+    assert merged['b']['search_types'] == ['keyword', 'semantic']
+
+
+def test_keyword_search_ranks_by_bm25():
+    async def scenario():
+        indexer = SemanticIndexer()
+        await indexer.add_document('a', 'Python async programming with asyncio in Python')
+        await indexer.add_document('b', 'Rust ownership and async runtimes')
+        results = await indexer.search('python async', search_type='keyword')
+        return [result['document_id'] for result in results]
+
+    assert asyncio.run(scenario()) == ['a', 'b']
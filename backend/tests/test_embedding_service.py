@@ -0,0 +1,197 @@
+"""
+Tests de la persistencia incremental del EmbeddingService: snapshot más
+write-ahead log, con un modelo determinista en lugar de SentenceTransformer
+"""
+
+import asyncio
+import hashlib
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('sentence_transformers')
+
+import faiss
+
+from src.memory.embedding_service import EmbeddingService
+
+DIMENSION = 16
+
+
+class FakeModel:
+    """Vector pseudoaleatorio fijo por texto: el mismo texto siempre da similitud 1"""
+
+    def encode(self, texts):
+        return np.vstack([
+            np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest()[:8], 16)).random(DIMENSION)
+            for text in texts
+        ]).astype('float32')
+
+
+@pytest.fixture
+def storage():
+    directory = tempfile.mkdtemp(prefix='embeddings')
+    yield directory
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+async def open_service(storage, **kwargs):
+    service = EmbeddingService(storage_path=storage, cache_size=100, **kwargs)
+    service.model = FakeModel()
+    service.is_initialized = True
+    await service._load_index()
+    return service
+
+
+async def found(service, text):
+    return [hit['document_id'] for hit in await service.search_similar(text, top_k=1, threshold=0.99)]
+
+
+def test_wal_is_replayed_on_load(storage):
+    async def scenario():
+        service = await open_service(storage)
+        await service.add_document('a', 'alpha')
+        await service.add_document('b', 'beta')
+        await service.remove_document('a')
+
+        reloaded = await open_service(storage)
+        assert set(reloaded.document_map) == {'b'}
+        assert reloaded.wal_entries == 3
+        assert await found(reloaded, 'beta') == ['b']
+        assert await found(reloaded, 'alpha') == []
+
+    asyncio.run(scenario())
+
+
+def test_wal_replay_after_partial_snapshot_does_not_duplicate_vectors(storage):
+    async def scenario():
+        service = await open_service(storage)
+        await service.add_document('a', 'alpha')
+        await service._save_index()
+        await service.add_document('b', 'beta')
+        # Caída tras escribir el índice del snapshot, antes del mapeo y del truncado del WAL
+        faiss.write_index(service.index, service.index_path)
+
+        reloaded = await open_service(storage)
+        assert reloaded.index.ntotal == 2
+        assert set(reloaded.document_map) == {'a', 'b'}
+        assert reloaded.tombstones == set()
+        assert reloaded.next_index_id == 2
+        assert await found(reloaded, 'beta') == ['b']
+
+    asyncio.run(scenario())
+
+
+def test_truncated_wal_record_is_ignored(storage):
+    async def scenario():
+        service = await open_service(storage)
+        await service.add_document('a', 'alpha')
+        with open(service.wal_path, 'ab') as wal:
+            wal.write(b'\xff\x00\x00\x00partial')
+
+        reloaded = await open_service(storage)
+        assert set(reloaded.document_map) == {'a'}
+        assert reloaded.wal_entries == 1
+
+    asyncio.run(scenario())
+
+
+def test_compaction_writes_snapshot_and_truncates_wal(storage):
+    async def scenario():
+        service = await open_service(storage, compaction_interval=2)
+        await service.add_document('a', 'alpha')
+        await service.add_document('b', 'beta')
+        assert service.wal_entries == 0
+
+        reloaded = await open_service(storage)
+        assert set(reloaded.document_map) == {'a', 'b'}
+        assert reloaded.wal_entries == 0
+
+    asyncio.run(scenario())
+
+
+def test_replaced_and_removed_documents_are_filtered_from_search(storage):
+    async def scenario():
+        service = await open_service(storage)
+        await service.add_document('a', 'alpha')
+        await service.add_document('b', 'beta')
+        await service.add_document('a', 'gamma')
+        await service.remove_document('b')
+
+        assert service.index.ntotal == 3 and len(service.tombstones) == 2
+        assert await found(service, 'alpha') == []
+        assert await found(service, 'beta') == []
+        assert await found(service, 'gamma') == ['a']
+        # Aunque los vectores muertos sean los más cercanos se devuelve el vivo
+        hits = await service.search_similar('beta', top_k=1, threshold=-1.0)
+        assert [hit['document_id'] for hit in hits] == ['a']
+
+    asyncio.run(scenario())
+
+
+def test_compaction_drops_dead_vectors(storage):
+    async def scenario():
+        service = await open_service(storage)
+        for index in range(5):
+            await service.add_document(f"d{index}", f"text {index}")
+        await service.remove_document('d1')
+        await service.remove_document('d3')
+
+        assert await service.compact_index(force=True)
+        assert service.index.ntotal == 3 and service.tombstones == set()
+        assert await found(service, 'text 4') == ['d4']
+
+        reloaded = await open_service(storage)
+        assert reloaded.index.ntotal == 3 and reloaded.tombstones == set()
+
+    asyncio.run(scenario())
+
+
+def test_rebuild_runs_in_background_past_tombstone_ratio(storage):
+    async def scenario():
+        service = await open_service(storage, min_rebuild_size=4, tombstone_ratio_threshold=0.3)
+        for index in range(5):
+            await service.add_document(f"d{index}", f"text {index}")
+        await service.remove_document('d0')
+        assert service._rebuild_task is None
+        await service.remove_document('d1')
+        # Lo insertado mientras se reconstruye (vía _rebuild_log) no se pierde en el intercambio
+        await service.add_document('late', 'late text')
+        assert await service._rebuild_task
+
+        assert service.rebuilds_completed == 1
+        assert service.index.ntotal == 4 and service.tombstones == set()
+        assert await found(service, 'late text') == ['late']
+
+    asyncio.run(scenario())
+
+
+def test_trained_ivf_index_is_purged_with_remove_ids(storage):
+    async def scenario():
+        service = await open_service(storage, index_type='ivf_flat', index_params={'nlist': 2})
+        for index in range(service.index_config.train_threshold):
+            await service.add_document(f"d{index}", f"text {index}")
+        await service._rebuild_task
+        assert (await service.get_stats())['index_type'] == 'ivf_flat'
+
+        await service.remove_document('d0')
+        assert await service.compact_index(force=True)
+        assert service.index.ntotal == service.index_config.train_threshold - 1
+        assert service.tombstones == set()
+
+    asyncio.run(scenario())
+
+
+def test_pq_training_threshold_is_clamped_to_its_centroids(storage):
+    async def scenario():
+        service = await open_service(storage, index_type='ivf_pq', index_params={'min_train_vectors': 10})
+        assert service.index_config.train_threshold == 256
+        for index in range(20):
+            await service.add_document(f"d{index}", f"text {index}")
+        # Con 10 se lanzaría una reconstrucción condenada a fallar en cada inserción
+        assert service._rebuild_task is None
+
+    asyncio.run(scenario())
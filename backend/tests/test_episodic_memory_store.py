@@ -0,0 +1,41 @@
+"""
+Tests de la búsqueda indexada de la memoria episódica
+"""
+
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('sentence_transformers')
+
+from src.memory.episodic_memory_store import Episode, EpisodicMemoryStore
+
+
+def episode(episode_id, title, context=None, success=True):
+    return Episode(id=episode_id, title=title, description='', context=context or {}, actions=[],
+                   outcomes=[], timestamp=datetime.now(), success=success)
+
+
+def test_search_matches_tokens_inside_words():
+    store = EpisodicMemoryStore()
+    store.store_episode(episode('e1', 'Error de conexión'))
+    store.store_episode(episode('e2', 'Informe terminado'))
+    assert [found.id for found in store.search_episodes('rror')] == ['e1']
+    assert store.search_episodes('rror inexistente') == []
+
+
+def test_removed_episode_leaves_no_tokens_behind():
+    store = EpisodicMemoryStore()
+    store.store_episode(episode('e1', 'Descarga fallida', {'url': 'example.com'}))
+    store._remove_episode('e1')
+    assert store.search_episodes('descarga') == []
+    assert not store.token_index and not store.context_token_index
+
+
+def test_successful_episodes_filtered_by_context_keyword():
+    store = EpisodicMemoryStore()
+    store.store_episode(episode('e1', 'Scraping', {'site': 'wikipedia.org'}))
+    store.store_episode(episode('e2', 'Scraping', {'site': 'example.com'}))
+    store.store_episode(episode('e3', 'Scraping', {'site': 'wikipedia.org'}, success=False))
+    assert [found.id for found in store.get_successful_episodes(['wikipedia'])] == ['e1']
@@ -0,0 +1,83 @@
+"""
+Tests del bus de eventos entre procesos: entrega local, origen propio y hub
+sobre socket Unix
+"""
+
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from src.websocket.event_bus import FCNTL_AVAILABLE, InProcessBus, UnixSocketBus, create_event_bus, encode_message
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_inprocess_bus_delivers_to_subscribers():
+    bus = InProcessBus()
+    received = []
+    bus.subscribe(received.append)
+    assert bus.publish({'op': 'event', 'task_id': 't1'})
+    assert received[0]['task_id'] == 't1'
+    assert received[0]['bus_origin'] == bus.bus_id
+
+
+def test_failing_subscriber_does_not_block_others():
+    bus = InProcessBus()
+    received = []
+    bus.subscribe(lambda message: 1 / 0)
+    bus.subscribe(received.append)
+    bus.publish({'op': 'event'})
+    assert len(received) == 1
+    assert bus.get_stats()['delivery_errors'] == 1
+
+
+def test_receive_ignores_own_messages():
+    bus = InProcessBus()
+    received = []
+    bus.subscribe(received.append)
+    bus._receive({'op': 'event', 'bus_origin': bus.bus_id})
+    bus._receive({'op': 'event', 'bus_origin': 'other'})
+    assert [message['bus_origin'] for message in received] == ['other']
+
+
+def test_encode_message_turns_bytes_into_data_urls():
+    assert '"data:image/png;base64,AQI="' in encode_message({'screenshot': b'\x01\x02'})
+
+
+def test_unknown_backend_falls_back_to_inprocess():
+    assert isinstance(create_event_bus('nope'), InProcessBus)
+
+
+@pytest.mark.skipif(not FCNTL_AVAILABLE, reason="el hub necesita fcntl")
+def test_unix_bus_relays_between_hub_and_client():
+    directory = tempfile.mkdtemp(prefix='bus')
+    path = directory + '/bus.sock'
+    hub = UnixSocketBus(path)
+    client = UnixSocketBus(path)
+    try:
+        assert hub.is_hub and not client.is_hub
+        hub_received, client_received = [], []
+        hub.subscribe(hub_received.append)
+        client.subscribe(client_received.append)
+        assert wait_for(lambda: any(hub._peers.values()))
+
+        client.publish({'op': 'event', 'task_id': 'from-client'})
+        hub.publish({'op': 'event', 'task_id': 'from-hub'})
+
+        # Cada lado recibe lo propio al momento y lo ajeno cuando lo lee del socket
+        expected = ['from-client', 'from-hub']
+        assert wait_for(lambda: sorted(m['task_id'] for m in hub_received) == expected)
+        assert wait_for(lambda: sorted(m['task_id'] for m in client_received) == expected)
+    finally:
+        client.close()
+        hub.close()
+        shutil.rmtree(directory, ignore_errors=True)
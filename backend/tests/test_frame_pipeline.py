@@ -0,0 +1,83 @@
+"""
+Tests del pipeline de frames del navegador: duplicados, límite de ritmo con
+envío del último frame retenido y configuración por entorno
+"""
+
+import time
+
+import pytest
+
+from src.websocket.frame_pipeline import PIL_AVAILABLE, FramePipeline, frame_pipeline_from_env
+
+
+def frame(content: bytes, **extra):
+    return dict({'screenshot': content, 'url': 'https://example.com'}, **extra)
+
+
+def test_duplicate_frames_are_dropped():
+    pipeline = FramePipeline(min_interval=0)
+    assert pipeline.prepare('t1', 'browser_visual', frame(b'a'))[0] == 'send'
+    assert pipeline.prepare('t1', 'browser_visual', frame(b'a')) == ('drop', None)
+    assert pipeline.get_stats()['duplicates'] == 1
+
+
+def test_payload_without_frame_passes_through():
+    assert FramePipeline().prepare('t1', 'browser_visual', {'url': 'x'}) == ('passthrough', None)
+
+
+def test_rate_limited_frame_is_sent_when_interval_expires():
+    pipeline = FramePipeline(min_interval=0.05)
+    pipeline.prepare('t1', 'browser_visual', frame(b'a'))
+
+    action, message = pipeline.prepare('t1', 'browser_visual', frame(b'b'))
+    assert action == 'defer' and 0 < message['delay'] <= 0.05
+    # Ya hay un envío programado: el frame nuevo sustituye al retenido
+    assert pipeline.prepare('t1', 'browser_visual', frame(b'c')) == ('drop', None)
+
+    time.sleep(0.06)
+    event, payload = pipeline.take_pending('t1')
+    action, message = pipeline.prepare('t1', event, payload, trailing=True)
+    assert action == 'send' and message['image'] == b'c'
+    assert pipeline.take_pending('t1') is None
+    stats = pipeline.get_stats()
+    assert (stats['frames_in'], stats['frames_sent'], stats['trailing_sent']) == (3, 2, 1)
+
+
+def test_early_trailing_retry_is_deferred_again():
+    pipeline = FramePipeline(min_interval=10)
+    pipeline.prepare('t1', 'browser_visual', frame(b'a'))
+    pipeline.prepare('t1', 'browser_visual', frame(b'b'))
+    event, payload = pipeline.take_pending('t1')
+    assert pipeline.prepare('t1', event, payload, trailing=True)[0] == 'defer'
+
+
+def test_held_back_frame_is_discarded_when_screen_returns_to_last_sent():
+    pipeline = FramePipeline(min_interval=10)
+    pipeline.prepare('t1', 'browser_visual', frame(b'a'))
+    assert pipeline.prepare('t1', 'browser_visual', frame(b'b'))[0] == 'defer'
+    assert pipeline.prepare('t1', 'browser_visual', frame(b'a')) == ('drop', None)
+    assert pipeline.take_pending('t1') is None
+
+
+def test_new_url_bypasses_interval_and_drops_held_back_frame():
+    pipeline = FramePipeline(min_interval=10)
+    pipeline.prepare('t1', 'browser_visual', frame(b'a'))
+    pipeline.prepare('t1', 'browser_visual', frame(b'b'))
+    assert pipeline.prepare('t1', 'browser_visual', frame(b'c', url='https://other.com'))[0] == 'send'
+    assert pipeline.take_pending('t1') is None
+
+
+def test_cropping_is_opt_in(monkeypatch):
+    assert frame_pipeline_from_env().max_aspect is None
+    monkeypatch.setenv('BROWSER_FRAME_MAX_ASPECT', '1.6')
+    assert frame_pipeline_from_env().max_aspect == 1.6
+
+
+@pytest.mark.skipif(not PIL_AVAILABLE, reason="el recorte necesita Pillow")
+def test_full_page_capture_is_only_downsized_by_default():
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 2000), 'white').save(buffer, 'PNG')
+    _, message = FramePipeline(max_width=200).prepare('t1', 'browser_visual', frame(buffer.getvalue()))
+    assert (message['width'], message['height']) == (200, 1000)
@@ -0,0 +1,64 @@
+"""
+Tests del caché compartido de respuestas LLM en la clasificación de intenciones
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import intention_classifier
+from intention_classifier import IntentionClassifier
+from src.services.llm_response_cache import LLMResponseCache
+
+
+class FakeModelManager:
+    def __init__(self, confidence):
+        self.confidence = confidence
+        self.calls = 0
+
+    def select_best_model(self, **kwargs):
+        return SimpleNamespace(id='classifier')
+
+    def generate_response(self, prompt, **kwargs):
+        self.calls += 1
+        return json.dumps({'intention_type': 'casual_conversation', 'confidence': self.confidence,
+                           'reasoning': 'saludo', 'suggested_action': 'responder'})
+
+
+@pytest.fixture
+def llm_cache(monkeypatch):
+    cache = LLMResponseCache(db_path=None)
+    monkeypatch.setattr(intention_classifier, 'get_llm_response_cache', lambda: cache)
+    return cache
+
+
+def classify(model_manager):
+    # Un clasificador nuevo por llamada: sin su caché local solo queda el compartido
+    return IntentionClassifier(model_manager, None).classify_intention('Hola')
+
+
+def test_confident_response_is_shared(llm_cache):
+    model_manager = FakeModelManager(0.9)
+    classify(model_manager)
+    assert classify(model_manager).confidence == 0.9
+    assert model_manager.calls == 1
+
+
+def test_response_below_threshold_is_not_shared(llm_cache):
+    model_manager = FakeModelManager(0.6)
+    assert classify(model_manager).confidence == 0.6
+    classify(model_manager)
+    assert model_manager.calls == 2
+    assert llm_cache.get_stats()['hits'] == 0
+
+
+def test_cached_response_below_threshold_is_discarded(llm_cache):
+    model_manager = FakeModelManager(0.6)
+    lenient = IntentionClassifier(model_manager, None)
+    lenient.confidence_threshold = 0.5
+    lenient.classify_intention('Hola')  # Con umbral 0.5 la respuesta de 0.6 se comparte
+
+    strict_manager = FakeModelManager(0.95)
+    assert classify(strict_manager).confidence == 0.95
+    assert strict_manager.calls == 1
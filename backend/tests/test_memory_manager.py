@@ -0,0 +1,38 @@
+"""
+Tests de la búsqueda full-text de la base de conocimiento (FTS5)
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from memory_manager import MemoryManager
+
+
+@pytest.fixture
+def manager():
+    directory = tempfile.mkdtemp(prefix='memory')
+    memory = MemoryManager(db_path=os.path.join(directory, 'memory.db'))
+    yield memory
+    memory.close()
+
+
+def test_fts_query_only_uses_prefixes_for_long_tokens():
+    assert MemoryManager._build_fts_query('C++ de python') == '"C" "de" "python"*'
+
+
+def test_fts_query_of_empty_text():
+    assert MemoryManager._build_fts_query('') == ''
+
+
+def test_short_token_does_not_match_as_prefix(manager):
+    manager.add_knowledge('Plantillas en C++ modernas', 'lenguajes', 'test')
+    manager.add_knowledge('Compiladores de Cython', 'lenguajes', 'test')
+    results = manager.search_knowledge('C++')
+    assert [item.content for item in results] == ['Plantillas en C++ modernas']
+
+
+def test_long_token_matches_as_prefix(manager):
+    manager.add_knowledge('Programación asíncrona en Python', 'lenguajes', 'test')
+    assert len(manager.search_knowledge('progra')) == 1
@@ -0,0 +1,154 @@
+"""
+Tests del despachador de slots de Ollama: orden por prioridad y lotes por
+modelo
+"""
+
+import asyncio
+
+from src.services.ollama_dispatcher import PriorityDispatcher
+from src.services.ollama_queue_manager import RequestPriority
+
+
+async def grant_order(dispatcher, requests):
+    """Ocupa el único slot, encola `requests` y devuelve el orden en que reciben slot"""
+    order = []
+    await dispatcher.acquire(RequestPriority.NORMAL, 'busy', {'model': 'loaded'})
+
+    async def worker(name, priority, model):
+        await dispatcher.acquire(priority, name, {'model': model})
+        order.append(name)
+        dispatcher.release(name)
+
+    tasks = [asyncio.create_task(worker(*request)) for request in requests]
+    await asyncio.sleep(0)
+    dispatcher.release('busy')
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_same_model_of_equal_priority_jumps_within_window():
+    dispatcher = PriorityDispatcher(1, model_batch_window=60)
+    order = asyncio.run(grant_order(dispatcher, [
+        ('other', RequestPriority.NORMAL, 'other'),
+        ('same', RequestPriority.NORMAL, 'loaded'),
+    ]))
+    assert order == ['same', 'other']
+    assert dispatcher.batched_grants == 1
+
+
+def test_lower_priority_of_loaded_model_does_not_jump():
+    dispatcher = PriorityDispatcher(1, model_batch_window=60)
+    order = asyncio.run(grant_order(dispatcher, [
+        ('critical', RequestPriority.CRITICAL, 'other'),
+        ('low', RequestPriority.LOW, 'loaded'),
+    ]))
+    assert order == ['critical', 'low']
+    assert dispatcher.batched_grants == 0
+
+
+def test_no_batching_without_window():
+    dispatcher = PriorityDispatcher(1)
+    order = asyncio.run(grant_order(dispatcher, [
+        ('other', RequestPriority.NORMAL, 'other'),
+        ('same', RequestPriority.NORMAL, 'loaded'),
+    ]))
+    assert order == ['other', 'same']
+
+
+def test_waiters_are_served_by_priority():
+    dispatcher = PriorityDispatcher(1)
+    order = asyncio.run(grant_order(dispatcher, [
+        ('low', RequestPriority.LOW, 'loaded'),
+        ('normal', RequestPriority.NORMAL, 'loaded'),
+        ('critical', RequestPriority.CRITICAL, 'loaded'),
+        ('high', RequestPriority.HIGH, 'loaded'),
+    ]))
+    assert order == ['critical', 'high', 'normal', 'low']
+    assert set(dispatcher.get_wait_stats()) == {'LOW', 'NORMAL', 'HIGH', 'CRITICAL'}
+
+
+def test_aging_lets_an_old_low_request_overtake_a_new_normal_one():
+    async def scenario():
+        dispatcher = PriorityDispatcher(1, aging_seconds=0.01)
+        order = []
+        await dispatcher.acquire(RequestPriority.NORMAL, 'busy')
+
+        async def worker(name, priority):
+            await dispatcher.acquire(priority, name)
+            order.append(name)
+            dispatcher.release(name)
+
+        low = asyncio.create_task(worker('low', RequestPriority.LOW))
+        await asyncio.sleep(0.05)  # Cinco niveles de envejecimiento
+        normal = asyncio.create_task(worker('normal', RequestPriority.NORMAL))
+        await asyncio.sleep(0)
+        dispatcher.release('busy')
+        await asyncio.gather(low, normal)
+        return order
+
+    assert asyncio.run(scenario()) == ['low', 'normal']
+
+
+def test_raise_priority_moves_a_waiter_ahead():
+    async def scenario():
+        dispatcher = PriorityDispatcher(1)
+        order = []
+        await dispatcher.acquire(RequestPriority.NORMAL, 'busy')
+
+        async def worker(name, priority):
+            await dispatcher.acquire(priority, name, {'request_id': name})
+            order.append(name)
+            dispatcher.release(name)
+
+        tasks = [asyncio.create_task(worker('first', RequestPriority.NORMAL)),
+                 asyncio.create_task(worker('second', RequestPriority.LOW))]
+        await asyncio.sleep(0)
+        assert dispatcher.raise_priority('second', RequestPriority.HIGH)
+        assert not dispatcher.raise_priority('first', RequestPriority.LOW)
+        dispatcher.release('busy')
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ['second', 'first']
+
+
+def test_task_over_its_share_yields_to_other_tasks():
+    async def scenario():
+        dispatcher = PriorityDispatcher(2, max_slots_per_task=1)
+        order = []
+        await dispatcher.acquire(RequestPriority.NORMAL, 'a')
+        await dispatcher.acquire(RequestPriority.NORMAL, 'busy')
+
+        async def worker(name, task_id, priority):
+            await dispatcher.acquire(priority, task_id)
+            order.append(name)
+
+        tasks = [asyncio.create_task(worker('a-high', 'a', RequestPriority.HIGH)),
+                 asyncio.create_task(worker('b-low', 'b', RequestPriority.LOW))]
+        await asyncio.sleep(0)
+        dispatcher.release('busy')
+        await asyncio.sleep(0.01)  # El slot se entrega con call_soon_threadsafe
+        assert order == ['b-low']
+        dispatcher.release('a')
+        await asyncio.gather(*tasks)
+        return order, dispatcher.fair_share_deferrals
+
+    order, deferrals = asyncio.run(scenario())
+    assert order == ['b-low', 'a-high'] and deferrals == 1
+
+
+def test_cancelled_waiter_is_skipped():
+    async def scenario():
+        dispatcher = PriorityDispatcher(1)
+        await dispatcher.acquire(RequestPriority.NORMAL, 'busy')
+        cancelled = asyncio.create_task(dispatcher.acquire(RequestPriority.HIGH, 'x'))
+        waiting = asyncio.create_task(dispatcher.acquire(RequestPriority.LOW, 'y'))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert dispatcher.waiting == 1
+        dispatcher.release('busy')
+        await waiting
+        return dispatcher.in_flight, dispatcher.waiting
+
+    assert asyncio.run(scenario()) == (1, 0)
@@ -0,0 +1,107 @@
+"""
+Tests del balanceador de endpoints de Ollama: circuit breaker, enrutado por
+afinidad de modelo y capacidad notificada
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import ollama_endpoint_pool
+from src.services.ollama_endpoint_pool import CLOSED, HALF_OPEN, OPEN, OllamaEndpoint, OllamaEndpointPool
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(ollama_endpoint_pool, 'time', SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def make_pool(*limits, **kwargs):
+    endpoints = [OllamaEndpoint(f"http://gpu{index}:11434", limit) for index, limit in enumerate(limits)]
+    return OllamaEndpointPool(endpoints, **kwargs)
+
+
+def fail(pool, endpoint, times):
+    """Requests fallidos en un host concreto (reservado a mano, sin pasar por el enrutado)"""
+    for _ in range(times):
+        endpoint.outstanding += 1
+        pool.release(endpoint, False)
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    pool = make_pool(2, failure_threshold=3, base_cooldown=10)
+    endpoint = pool.endpoints[0]
+    fail(pool, endpoint, 2)
+    assert endpoint.state == CLOSED
+    pool.release(pool.acquire('m'), True)
+    fail(pool, endpoint, 2)
+    assert endpoint.state == CLOSED  # El éxito reinició la cuenta
+    fail(pool, endpoint, 1)
+    assert endpoint.state == OPEN and endpoint.cooldown == 10
+    assert pool.acquire('m') is None and pool.rejected_requests == 1
+
+
+def test_half_open_probe_closes_or_reopens_with_longer_cooldown(clock):
+    pool = make_pool(2, failure_threshold=1, base_cooldown=10, max_cooldown=25)
+    endpoint = pool.endpoints[0]
+    fail(pool, endpoint, 1)
+
+    clock.value += 10
+    probe = pool.acquire('m')
+    assert probe is endpoint and endpoint.state == HALF_OPEN
+    assert pool.acquire('m') is None  # Solo un request de prueba a la vez
+    pool.release(probe, False)
+    assert endpoint.state == OPEN and endpoint.cooldown == 20
+
+    clock.value += 20
+    pool.release(pool.acquire('m'), False)
+    assert endpoint.cooldown == 25  # Limitado por max_cooldown
+
+    clock.value += 25
+    pool.release(pool.acquire('m'), True)
+    assert endpoint.state == CLOSED and endpoint.cooldown == 0.0
+
+
+def test_probe_without_verdict_frees_the_half_open_slot(clock):
+    pool = make_pool(2, failure_threshold=1, base_cooldown=10)
+    endpoint = pool.endpoints[0]
+    fail(pool, endpoint, 1)
+    clock.value += 10
+    pool.release(pool.acquire('m'), None)
+    assert endpoint.state == HALF_OPEN
+    assert pool.acquire('m') is endpoint
+
+
+def test_capacity_listeners_follow_circuit_state(clock):
+    pool = make_pool(2, 4, failure_threshold=1, base_cooldown=10)
+    capacities = []
+    pool.add_capacity_listener(capacities.append)
+    fail(pool, pool.endpoints[1], 1)
+    clock.value += 10
+    pool.release(pool.acquire('m'), True)
+    assert capacities == [6, 2, 3, 6]
+
+
+def test_routing_prefers_loaded_model_then_least_loaded(clock):
+    pool = make_pool(2, 2)
+    first = pool.acquire('llama')
+    second = pool.acquire('qwen')
+    assert first is not second
+    # Con un request en cada host, la afinidad decide
+    assert pool.acquire('qwen') is second
+    assert pool.affinity_hits == 1
+
+
+def test_saturated_pool_overloads_a_healthy_host_instead_of_rejecting(clock):
+    pool = make_pool(1)
+    pool.acquire('m')
+    endpoint = pool.acquire('m')
+    assert endpoint is not None and endpoint.outstanding == 2
+
+
+def test_from_config_parses_limits():
+    pool = OllamaEndpointPool.from_config("http://gpu1:11434=3, http://gpu2:11434/")
+    assert [(endpoint.url, endpoint.max_concurrent) for endpoint in pool.endpoints] == [
+        ('http://gpu1:11434', 3), ('http://gpu2:11434', 2)]
@@ -0,0 +1,116 @@
+"""
+Tests de la deduplicación single-flight de requests idénticos en el gestor
+de cola de Ollama
+"""
+
+import asyncio
+
+from src.services.ollama_queue_manager import OllamaQueueManager, OllamaRequest, RequestPriority
+
+
+def make_request(prompt='hola', priority=RequestPriority.NORMAL, **kwargs):
+    return OllamaRequest(prompt=prompt, model='llama3:8b', priority=priority, **kwargs)
+
+
+class GatedCallback:
+    """Callback de ejecución que cuenta llamadas y no termina hasta abrir la puerta"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = asyncio.Event()
+
+    async def __call__(self, request):
+        self.calls.append(request.request_id)
+        await self.gate.wait()
+        return {'response': f"respuesta a {request.prompt}"}
+
+
+def test_identical_requests_share_one_execution():
+    async def scenario():
+        manager = OllamaQueueManager(max_concurrent_requests=2, model_batch_window=0)
+        callback = GatedCallback()
+        leader = make_request()
+        pending = [asyncio.create_task(manager.enqueue_request(leader, callback)),
+                   asyncio.create_task(manager.enqueue_request(make_request(), callback))]
+        await asyncio.sleep(0.01)
+        callback.gate.set()
+        results = await asyncio.gather(*pending)
+        return manager, callback, leader, results
+
+    manager, callback, leader, (first, second) = asyncio.run(scenario())
+    assert len(callback.calls) == 1
+    assert first == {'response': 'respuesta a hola'}
+    assert second == dict(first, deduplicated_from=leader.request_id)
+    assert manager.stats.deduplicated_requests == 1
+    assert manager._in_flight == {}
+
+
+def test_different_options_or_sessions_are_not_deduplicated():
+    async def scenario():
+        manager = OllamaQueueManager(max_concurrent_requests=4, model_batch_window=0)
+        callback = GatedCallback()
+        pending = [asyncio.create_task(manager.enqueue_request(request, callback)) for request in (
+            make_request(options={'temperature': 0.1}),
+            make_request(options={'temperature': 0.9}),
+            make_request(context=[1, 2, 3]),
+            make_request(context=[1, 2, 3]),
+        )]
+        await asyncio.sleep(0.01)
+        callback.gate.set()
+        await asyncio.gather(*pending)
+        return callback
+
+    assert len(asyncio.run(scenario()).calls) == 4
+
+
+def test_more_urgent_duplicate_promotes_the_leader():
+    async def scenario():
+        manager = OllamaQueueManager(max_concurrent_requests=1, model_batch_window=0)
+        blocker = GatedCallback()
+        callback = GatedCallback()
+        leader = make_request(priority=RequestPriority.LOW)
+        pending = [asyncio.create_task(manager.enqueue_request(make_request('ocupado'), blocker)),
+                   asyncio.create_task(manager.enqueue_request(leader, callback))]
+        await asyncio.sleep(0.01)
+        pending.append(asyncio.create_task(manager.enqueue_request(make_request(priority=RequestPriority.CRITICAL),
+                                                                   callback)))
+        await asyncio.sleep(0.01)
+        queued = manager._dispatcher.get_pending()
+        blocker.gate.set()
+        callback.gate.set()
+        await asyncio.gather(*pending)
+        return leader, queued
+
+    leader, queued = asyncio.run(scenario())
+    assert [(item['request_id'], item['priority']) for item in queued] == [(leader.request_id, 'CRITICAL')]
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    async def scenario():
+        manager = OllamaQueueManager(max_concurrent_requests=1, model_batch_window=0)
+        callback = GatedCallback()
+        leader = asyncio.create_task(manager.enqueue_request(make_request(), callback))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(manager.enqueue_request(make_request(), callback))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        await asyncio.sleep(0.01)
+        callback.gate.set()
+        return await leader, follower.cancelled()
+
+    result, follower_cancelled = asyncio.run(scenario())
+    assert result == {'response': 'respuesta a hola'} and follower_cancelled
+
+
+def test_follower_gets_an_error_when_the_leader_is_cancelled():
+    async def scenario():
+        manager = OllamaQueueManager(max_concurrent_requests=1, model_batch_window=0)
+        callback = GatedCallback()
+        leader = asyncio.create_task(manager.enqueue_request(make_request(), callback))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(manager.enqueue_request(make_request(), callback))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario())['error_type'] == 'queue_error'
@@ -0,0 +1,25 @@
+"""
+Tests de los registros compactos de la memoria procedimental
+"""
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('sentence_transformers')
+
+from src.memory.procedural_memory_store import Procedure, ToolStrategy
+
+
+def test_repeated_strings_are_shared():
+    first = ToolStrategy(id='s1', tool_name=''.join(['web', '_search']), strategy_name='basic',
+                         parameters={}, context_pattern='')
+    second = ToolStrategy(id='s2', tool_name=''.join(['web_', 'search']), strategy_name='basic',
+                          parameters={}, context_pattern='')
+    assert first.tool_name is second.tool_name
+
+
+def test_non_string_fields_are_kept_as_given():
+    strategy = ToolStrategy(id='s1', tool_name=None, strategy_name=None, parameters={}, context_pattern='')
+    procedure = Procedure(id='p1', name='n', description='d', steps=[], context_conditions={}, category=None)
+    assert strategy.tool_name is None and strategy.strategy_name is None
+    assert procedure.category is None
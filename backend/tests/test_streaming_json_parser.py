@@ -0,0 +1,110 @@
+"""
+Tests del parser JSON incremental: elementos emitidos al completarse y
+validación temprana contra el schema
+"""
+
+import pytest
+
+from src.services.streaming_json_parser import SchemaViolation, StreamingJSONError, StreamingJSONParser, fit_string
+
+STEP_SCHEMA = {
+    'type': 'object',
+    'required': ['steps'],
+    'properties': {
+        'steps': {
+            'type': 'array',
+            'minItems': 1,
+            'maxItems': 2,
+            'items': {
+                'type': 'object',
+                'required': ['title', 'tool'],
+                'properties': {
+                    'title': {'type': 'string', 'minLength': 3, 'maxLength': 20},
+                    'tool': {'type': 'string', 'enum': ['web_search', 'analysis']},
+                    'id': {'type': 'string', 'pattern': '^step-[0-9]+$'}
+                },
+                'additionalProperties': False
+            }
+        }
+    }
+}
+
+
+def feed_in_chunks(parser, text, size=3):
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+    return parser.close()
+
+
+def test_items_are_emitted_as_they_complete():
+    received = []
+    parser = StreamingJSONParser(schema=STEP_SCHEMA, item_paths=['steps'],
+                                 on_item=lambda path, step: received.append((path, parser.done)))
+    text = '{"steps": [{"title": "Buscar datos", "tool": "web_search"}, {"title": "Analizar", "tool": "analysis"}]}'
+    result = feed_in_chunks(parser, text)
+    assert [path for path, _ in received] == [('steps', 0), ('steps', 1)]
+    # Los pasos llegan antes de que se cierre el documento
+    assert not any(done for _, done in received)
+    assert result['steps'][1]['tool'] == 'analysis'
+
+
+def test_escaped_strings_across_chunks():
+    parser = StreamingJSONParser()
+    result = feed_in_chunks(parser, '{"text": "a \\"quoted\\" \\u00e9 value\\n"}', size=2)
+    assert result == {'text': 'a "quoted" é value\n'}
+
+
+@pytest.mark.parametrize('step, message', [
+    ('{"title": "ab", "tool": "analysis"}', 'menos de 3 caracteres'),
+    ('{"title": "' + 'x' * 21 + '", "tool": "analysis"}', 'más de 20 caracteres'),
+    ('{"title": "Buscar", "tool": "analysis", "id": "paso-1"}', 'no cumple el patrón'),
+    ('{"title": "Buscar", "tool": "shell"}', 'no está entre los valores permitidos'),
+    ('{"title": "Buscar", "tool": "analysis", "extra": 1}', 'propiedad no permitida'),
+    ('{"title": "Buscar"}', 'faltan propiedades requeridas'),
+    ('{"title": 5, "tool": "analysis"}', 'se esperaba string'),
+])
+def test_schema_violations(step, message):
+    parser = StreamingJSONParser(schema=STEP_SCHEMA, item_paths=['steps'])
+    with pytest.raises(SchemaViolation, match=message):
+        parser.feed('{"steps": [' + step + ']}')
+
+
+def test_violation_stops_before_the_document_ends():
+    parser = StreamingJSONParser(schema=STEP_SCHEMA, item_paths=['steps'])
+    steps = ', '.join('{"title": "Buscar", "tool": "analysis"}' for _ in range(3))
+    with pytest.raises(SchemaViolation, match='más de 2 elementos'):
+        parser.feed('{"steps": [' + steps)
+
+
+def test_invalid_json_raises():
+    parser = StreamingJSONParser()
+    with pytest.raises(StreamingJSONError):
+        parser.feed('{"a": 1 "b": 2}')
+
+
+def test_incomplete_document_raises_on_close():
+    parser = StreamingJSONParser()
+    parser.feed('{"a": [1, 2')
+    with pytest.raises(StreamingJSONError, match='incompleto'):
+        parser.close()
+
+
+def test_multiple_mode_skips_prose_and_captures_keys():
+    captured = []
+    parser = StreamingJSONParser(capture_keys=['tool_call'], multiple=True,
+                                 on_capture=lambda path, value: captured.append(value))
+    parser.feed('Voy a buscar {no es json} y luego {"tool_call": {"tool": "web_search", "query": "x"}} fin')
+    assert parser.close() == {'tool_call': {'tool': 'web_search', 'query': 'x'}}
+    assert captured == [{'tool': 'web_search', 'query': 'x'}]
+
+
+def test_truncate_strings_keeps_long_titles():
+    parser = StreamingJSONParser(schema=STEP_SCHEMA, item_paths=['steps'], truncate_strings=True)
+    result = feed_in_chunks(parser, '{"steps": [{"title": "' + 'x' * 40 + '", "tool": "analysis"}]}')
+    assert result['steps'][0]['title'] == 'x' * 19 + '…'
+    assert len(result['steps'][0]['title']) == 20
+
+
+def test_fit_string():
+    assert fit_string('corto', 10) == 'corto'
+    assert fit_string('una frase larga', 6) == 'una f…'
@@ -0,0 +1,124 @@
+"""
+Tests de la escritura en diferido (write-behind) del TaskManager con un
+servicio de base de datos en memoria
+"""
+
+import pytest
+
+pytest.importorskip('pymongo')
+
+from src.services.task_manager import TaskManager
+
+
+class FakeDatabaseService:
+    """DatabaseService en memoria que registra cada bulk_update_tasks"""
+
+    def __init__(self):
+        self.tasks = {}
+        self.batches = []
+        self.fail_writes = 0
+        self.during_write = None
+
+    def save_task(self, task):
+        self.tasks[task['task_id']] = dict(task)
+        return True
+
+    def get_task(self, task_id):
+        task = self.tasks.get(task_id)
+        return dict(task) if task else None
+
+    def update_task(self, task_id, updates):
+        self.tasks[task_id].update(updates)
+        return True
+
+    def bulk_update_tasks(self, batch):
+        if self.during_write:
+            callback, self.during_write = self.during_write, None
+            callback()
+        if self.fail_writes:
+            self.fail_writes -= 1
+            return False
+        self.batches.append({task_id: dict(fields) for task_id, fields in batch.items()})
+        for task_id, fields in batch.items():
+            self.tasks[task_id].update(fields)
+        return True
+
+    def delete_task(self, task_id):
+        return self.tasks.pop(task_id, None) is not None
+
+
+@pytest.fixture
+def db():
+    return FakeDatabaseService()
+
+
+@pytest.fixture
+def manager(db):
+    manager = TaskManager(db_service=db, write_behind=True, flush_interval=3600)
+    manager.create_task('t1', {'plan': [{'id': 's1', 'status': 'pending'}, {'id': 's2', 'status': 'pending'}]})
+    return manager
+
+
+def without_timestamp(fields):
+    return {key: value for key, value in fields.items() if key != 'updated_at'}
+
+
+def test_updates_are_merged_and_later_values_win(manager, db):
+    manager.update_task('t1', {'progress': 10, 'message': 'a'})
+    manager.update_task('t1', {'progress': 20})
+    assert db.batches == []
+
+    assert manager.flush_all()
+    assert len(db.batches) == 1
+    assert without_timestamp(db.batches[0]['t1']) == {'progress': 20, 'message': 'a'}
+    assert manager.write_stats['fields_merged'] == 2  # progress y updated_at
+
+
+def test_durable_field_is_written_at_once(manager, db):
+    manager.update_task('t1', {'progress': 50})
+    manager.update_task('t1', {'status': 'executing'})
+    assert without_timestamp(db.batches[0]['t1']) == {'progress': 50, 'status': 'executing'}
+    assert manager._dirty == {}
+
+
+def test_step_status_change_is_a_durability_point(manager, db):
+    plan = [{'id': 's1', 'status': 'pending'}, {'id': 's2', 'status': 'pending'}]
+    manager.update_task('t1', {'plan': plan})
+    assert db.batches == []
+
+    manager.update_task('t1', {'plan': [dict(plan[0], status='completed'), plan[1]]})
+    assert len(db.batches) == 1
+    assert db.batches[0]['t1']['plan'][0]['status'] == 'completed'
+
+
+def test_failed_write_requeues_fields_under_newer_ones(manager, db):
+    manager.update_task('t1', {'progress': 10, 'message': 'a'})
+    db.fail_writes = 1
+    # Llega una actualización mientras se escribe el lote que va a fallar
+    db.during_write = lambda: manager.update_task('t1', {'progress': 30})
+
+    assert not manager.flush_all()
+    assert without_timestamp(manager._dirty['t1']) == {'progress': 30, 'message': 'a'}
+    assert manager.write_stats['failed_flushes'] == 1
+
+    assert manager.flush_all()
+    assert db.tasks['t1']['progress'] == 30 and db.tasks['t1']['message'] == 'a'
+
+
+def test_get_task_overlays_pending_fields(manager, db):
+    manager.update_task('t1', {'progress': 70})
+    manager.active_cache.clear()
+    assert manager.get_task('t1')['progress'] == 70
+    assert 'progress' not in db.tasks['t1']
+
+
+def test_update_of_unknown_task_is_rejected(manager, db):
+    assert not manager.update_task('missing', {'progress': 1})
+    assert 'missing' not in manager._dirty
+    assert 'missing' not in manager.active_cache
+
+
+def test_final_status_drops_step_marks(manager):
+    assert 't1' in manager._step_marks
+    manager.update_task('t1', {'status': 'completed'})
+    assert 't1' not in manager._step_marks
@@ -0,0 +1,97 @@
+"""
+Tests del sync de estado por tarea: deltas JSON-patch, huecos en la
+secuencia y reanudación entre epochs
+"""
+
+import pytest
+
+from src.websocket.task_state_sync import TaskSyncLog, TaskSyncRegistry, apply_patch, json_diff
+
+
+@pytest.mark.parametrize('old, new', [
+    ({'items': [1, 2, 3, 4]}, {'items': [1, 2]}),
+    ({'items': [1]}, {'items': [1, 2, 3]}),
+    ({'items': [{'a': 1}, {'a': 2}]}, {'items': [{'a': 3}]}),
+    ({'a/b': 1, 'c~d': {'e/f~g': 2}}, {'a/b': 2, 'c~d': {'e/f~g': 3, '~1': 4}}),
+    ({'keep': 1, 'drop': 2}, {'keep': 1, 'new': [None, True]}),
+    ({'value': [1, 2]}, {'value': 'text'}),
+    ([1, 2], {'now': 'object'}),
+])
+def test_json_diff_round_trip(old, new):
+    ops = json_diff(old, new)
+    assert apply_patch(old, ops) == new
+
+
+def test_json_diff_escapes_keys():
+    ops = json_diff({}, {'a/b~c': 1})
+    assert ops == [{'op': 'add', 'path': '/a~1b~0c', 'value': 1}]
+
+
+def test_apply_patch_does_not_modify_the_base():
+    base = {'items': [1, 2, 3]}
+    apply_patch(base, json_diff(base, {'items': [1]}))
+    assert base == {'items': [1, 2, 3]}
+
+
+def test_repeated_channel_is_sent_as_patch():
+    log = TaskSyncLog('task-1')
+    payload = {'task_id': 'task-1', 'step_id': 's1', 'message': 'x' * 200, 'progress': 10}
+    first = log.encode('task_progress', payload)
+    second = log.encode('task_progress', dict(payload, progress=20))
+    assert 'data' in first
+    assert second['patch'] == [{'op': 'replace', 'path': '/progress', 'value': 20}]
+    assert apply_patch(first['data'], second['patch'])['progress'] == 20
+
+
+def test_since_returns_missed_items():
+    log = TaskSyncLog('task-1')
+    for index in range(5):
+        log.encode('log_message', {'message': index})
+    assert [item['seq'] for item in log.since(2)] == [3, 4, 5]
+    assert log.since(5) == []
+
+
+def test_since_detects_gap_outside_buffer():
+    log = TaskSyncLog('task-1', max_entries=3)
+    for index in range(6):
+        log.encode('log_message', {'message': index})
+    # Los seq 1-3 ya salieron del buffer
+    assert log.since(1) is None
+    assert [item['seq'] for item in log.since(3)] == [4, 5, 6]
+
+
+def test_resume_with_small_gap_is_delta():
+    registry = TaskSyncRegistry()
+    log = registry.get('task-1')
+    for index in range(4):
+        log.encode('step_started', {'step_id': f"s{index}"})
+    mode, seq, items = registry.resume('task-1', 3, registry.epoch)
+    assert (mode, seq) == ('delta', 4)
+    assert [item['seq'] for item in items] == [4]
+
+
+def test_resume_from_another_epoch_gets_snapshot():
+    registry = TaskSyncRegistry()
+    log = registry.get('task-1')
+    for index in range(4):
+        log.encode('step_started', {'step_id': f"s{index}"})
+    # El seq 3 lo asignó otro worker: no sirve como punto de reanudación
+    mode, seq, items = registry.resume('task-1', 3, 'other-epoch')
+    assert (mode, seq) == ('snapshot', 4)
+    assert all('data' in item for item in items)
+    assert [item['seq'] for item in items] == [1, 2, 3, 4]
+
+
+def test_resume_unknown_task():
+    assert TaskSyncRegistry().resume('missing', 0) == ('none', 0, [])
+
+
+def test_snapshot_keeps_latest_state_and_stream_tail():
+    registry = TaskSyncRegistry(snapshot_tail=2)
+    log = registry.get('task-1')
+    log.encode('task_progress', {'progress': 10})
+    for index in range(4):
+        log.encode('log_message', {'message': index})
+    log.encode('task_progress', {'progress': 50})
+    snapshot = log.snapshot()
+    assert [item['data'] for item in snapshot] == [{'message': 2}, {'message': 3}, {'progress': 50}]
@@ -0,0 +1,60 @@
+"""
+Tests del presupuesto de tokens del contexto: reparto por categoría,
+recorte de secciones y compactación de elementos
+"""
+
+from src.context.token_budget import ContextBudgeter, TokenCounter
+
+
+def history(count):
+    return [{'role': 'user', 'content': f"mensaje número {index} " + 'texto ' * 20} for index in range(count)]
+
+
+def test_context_within_budget_is_untouched():
+    context = {'query': 'hola', 'conversation_history': history(2)}
+    fitted, report = ContextBudgeter().fit(context, 'chat', 10000)
+    assert fitted == context
+    assert report['trimmed_sections'] == []
+    assert report['total_tokens'] == sum(report['sections'].values())
+
+
+def test_over_budget_context_fits_and_keeps_base_sections():
+    context = {
+        'query': 'resume el proyecto',
+        'type': 'chat',
+        'conversation_history': history(40),
+        'relevant_knowledge': ['dato ' * 50 for _ in range(20)],
+        'memory_context': 'recuerdo ' * 300,
+    }
+    budgeter = ContextBudgeter()
+    fitted, report = budgeter.fit(context, 'chat', 600)
+    assert report['total_tokens'] <= 600
+    assert set(report['trimmed_sections']) == {'conversation_history', 'relevant_knowledge', 'memory_context'}
+    assert fitted['query'] == context['query'] and fitted['type'] == 'chat'
+    # El historial conserva los mensajes más recientes
+    assert fitted['conversation_history'] and fitted['conversation_history'][-1] == context['conversation_history'][-1]
+    assert fitted['memory_context'].endswith('…')
+
+
+def test_budget_a_section_does_not_need_goes_to_the_others():
+    counter = TokenCounter()
+    context = {'memory_context': 'breve', 'relevant_knowledge': ['dato ' * 40 for _ in range(30)]}
+    fitted, report = ContextBudgeter(counter).fit(context, 'default', 400)
+    assert fitted['memory_context'] == 'breve'
+    # Más que su peso (30%) del presupuesto: recibe lo que la memoria no usa
+    assert report['sections']['relevant_knowledge'] > 0.3 * 400
+    assert report['total_tokens'] <= 400
+
+
+def test_last_item_is_compacted_instead_of_dropped():
+    context = {'similar_plans': [{'title': 'plan', 'description': 'paso ' * 400}]}
+    fitted, report = ContextBudgeter().fit(context, 'task_planning', 120)
+    assert fitted['similar_plans'][0]['title'] == 'plan'
+    assert fitted['similar_plans'][0]['description'].endswith('…')
+    assert report['total_tokens'] <= 120
+
+
+def test_truncate_respects_token_limit():
+    counter = TokenCounter()
+    truncated = counter.truncate('palabra ' * 200, 30)
+    assert counter.count(truncated) <= 30 and truncated.endswith('…')
@@ -0,0 +1,78 @@
+"""
+Tests del pipeline de salida del WebSocket: coalescencia, deduplicación y
+envío por lotes por tarea
+"""
+
+from src.websocket.event_bus import InProcessBus
+from src.websocket.websocket_manager import TaskOutbox, WebSocketManager
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emits = []
+        self.background = []
+
+    def emit(self, event, data, room=None, **kwargs):
+        self.emits.append((event, data, room))
+
+    def start_background_task(self, target, *args):
+        self.background.append((target, args))
+
+
+def make_manager():
+    manager = WebSocketManager()
+    manager.socketio = FakeSocketIO()
+    manager.is_initialized = True
+    manager.bus = InProcessBus()
+    return manager
+
+
+def test_identical_state_events_are_deduplicated_ignoring_timestamps():
+    outbox = TaskOutbox()
+    assert outbox.add('step_started', {'step_id': 's1', 'timestamp': 1}) == 'queued'
+    assert outbox.add('step_started', {'step_id': 's1', 'timestamp': 2}) == 'deduplicated'
+    assert outbox.add('step_started', {'step_id': 's2', 'timestamp': 3}) == 'queued'
+
+
+def test_repeated_stream_events_are_kept():
+    outbox = TaskOutbox()
+    outbox.add('log_message', {'message': 'descargando'})
+    assert outbox.add('log_message', {'message': 'descargando'}) == 'queued'
+    assert len(outbox.events) == 2
+
+
+def test_progress_keeps_latest_value_in_first_position():
+    outbox = TaskOutbox()
+    outbox.add('task_progress', {'progress': 10}, 'task_progress:task_progress')
+    outbox.add('log_message', {'message': 'a'})
+    assert outbox.add('task_progress', {'progress': 30}, 'task_progress:task_progress') == 'coalesced'
+    assert [item['data'] for item in outbox.drain()] == [{'progress': 30}, {'message': 'a'}]
+    assert outbox.events == [] and not outbox.fingerprints and not outbox.coalesce_index
+
+
+def test_events_in_a_window_leave_as_one_batch():
+    manager = make_manager()
+    manager.emit_to_task('t1', 'task_progress', {'progress': 10})
+    manager.emit_to_task('t1', 'log_message', {'message': 'a'})
+    manager.emit_to_task('t1', 'task_progress', {'progress': 50})
+    manager.emit_to_task('t1', 'log_message', {'message': 'a'})
+    assert len(manager.socketio.background) == 1 and manager.socketio.emits == []
+
+    manager.flush_task('t1')
+    (event, batch, room), = manager.socketio.emits
+    assert (event, room) == ('task_batch', 't1')
+    assert [item['seq'] for item in batch['events']] == [1, 2, 3]
+    assert batch['events'][0]['data']['progress'] == 50
+    stats = manager.get_pipeline_stats()
+    assert (stats['queued'], stats['coalesced'], stats['emits']) == (3, 1, 1)
+
+
+def test_urgent_event_flushes_at_once():
+    manager = make_manager()
+    manager.emit_to_task('t1', 'log_message', {'message': 'a'})
+    manager.emit_to_task('t1', 'task_failed', {'error': 'boom'})
+    (event, batch, _), = manager.socketio.emits
+    assert [item['event'] for item in batch['events']] == ['log_message', 'task_failed']
+    # La ventana programada ya no tiene nada que enviar
+    manager.flush_task('t1')
+    assert len(manager.socketio.emits) == 1
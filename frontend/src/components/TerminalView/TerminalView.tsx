@@ -970,7 +970,8 @@ export const TerminalView = ({
           handleDataCollectionUpdate(data);
           break;
         case 'report_progress':
-          handleReportProgress(data);
+          // Los task_update anidan el payload en data.data
+          handleReportProgress(data.data ? { ...data.data, task_id: data.task_id } : data);
           break;
         case 'log_message':
           handleLogMessage(data);
@@ -44,6 +44,8 @@ export const usePlanManager = ({
   const isUpdatingRef = useRef(false);
   const lastStepsHashRef = useRef<string>('');
   const debounceTimeoutRef = useRef<NodeJS.Timeout | null>(null);
+  // Pasos recibidos mientras el backend genera el plan (se sustituyen por plan_updated)
+  const generatedStepsRef = useRef<TaskStep[]>([]);
 
   // ========================================================================
   // OBTENER ESTADO AISLADO DESDE CONTEXT
@@ -271,10 +273,39 @@ export const usePlanManager = ({
           active: step.active || false
         }));
         
+        generatedStepsRef.current = [];
         updatePlan(newSteps, 'websocket-plan_updated');
       }
     };
 
+    // Vista previa del plan: cada paso llega en cuanto el modelo lo termina
+    const handlePlanStepGenerated = (data: any) => {
+      if (data.task_id !== taskId || !data.step || typeof data.step_index !== 'number') return;
+      if (getTaskPlanState(taskId).plan.some(step => step.active || step.completed)) return; // Plan ya en ejecución
+      
+      const steps = [...generatedStepsRef.current];
+      steps[data.step_index] = {
+        id: data.step.id || `step-${data.step_index + 1}`,
+        title: data.step.title,
+        description: data.step.description,
+        tool: data.step.tool,
+        status: 'pending',
+        estimated_time: data.step.estimated_time,
+        completed: false,
+        active: false
+      };
+      generatedStepsRef.current = steps;
+      updatePlan(steps.filter(Boolean), 'websocket-plan_step_generated');
+    };
+
+    // El intento que generó esos pasos se descartó: retirar la vista previa
+    const handlePlanStepsReset = (data: any) => {
+      if (data.task_id !== taskId || generatedStepsRef.current.length === 0) return;
+      console.log(`♻️ [PLAN-${taskId}] Generated steps discarded (attempt ${data.attempt}): ${data.reason}`);
+      generatedStepsRef.current = [];
+      updatePlan([], 'websocket-plan_steps_reset');
+    };
+
     const handleStepStarted = (data: any) => {
       if (data.step_id) {
         console.log(`🚀 [PLAN-${taskId}] Step started via WebSocket:`, data.step_id);
@@ -306,6 +337,8 @@ export const usePlanManager = ({
 
     // Registrar listeners
     socket.on('plan_updated', handlePlanUpdated);
+    socket.on('plan_step_generated', handlePlanStepGenerated);
+    socket.on('plan_steps_reset', handlePlanStepsReset);
     socket.on('step_started', handleStepStarted);
     socket.on('step_completed', handleStepCompleted);
     socket.on('task_progress', handleTaskProgress);
@@ -323,6 +356,8 @@ export const usePlanManager = ({
       socket.off('connect', onConnect);
       socket.off('disconnect', onDisconnect);
       socket.off('plan_updated', handlePlanUpdated);
+      socket.off('plan_step_generated', handlePlanStepGenerated);
+      socket.off('plan_steps_reset', handlePlanStepsReset);
       socket.off('step_started', handleStepStarted);
       socket.off('step_completed', handleStepCompleted);
       socket.off('task_progress', handleTaskProgress);
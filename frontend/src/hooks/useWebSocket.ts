@@ -7,6 +7,7 @@
 import { useEffect, useRef, useState, useCallback } from 'react';
 import { io, Socket } from 'socket.io-client';
 import { API_CONFIG, getWebSocketConfig } from '../config/api';
+import { resolveTaskBatch, TaskBatch, TaskStream } from '../utils/taskSync';
 
 interface WebSocketEvents {
   task_started: (data: any) => void;
@@ -18,6 +19,8 @@ interface WebSocketEvents {
   step_failed: (data: any) => void;
   step_needs_more_work: (data: any) => void;
   plan_updated: (data: any) => void;
+  plan_step_generated: (data: any) => void;
+  plan_steps_reset: (data: any) => void;
   tool_result: (data: any) => void;
   context_changed: (data: any) => void;
   error: (data: any) => void;
@@ -41,14 +44,29 @@ interface UseWebSocketReturn {
   leaveTaskRoom: (taskId: string) => void;
   addEventListeners: (events: Partial<WebSocketEvents>) => void;
   removeEventListeners: () => void;
+  setFrameRate: (fps: number) => void;
 }
 
+// Object URLs de frames que se mantienen vivos (la galería muestra los últimos 10)
+const MAX_FRAME_URLS = 12;
+
 export const useWebSocket = (): UseWebSocketReturn => {
   const [socket, setSocket] = useState<Socket | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [connectionType, setConnectionType] = useState<'websocket' | 'polling' | 'disconnected'>('disconnected');
   const eventListenersRef = useRef<Partial<WebSocketEvents>>({});
   const pendingRoomsRef = useRef<Set<string>>(new Set()); // ✅ TRACK PENDING ROOMS
+  const joinedRoomsRef = useRef<Set<string>>(new Set());
+  const taskStreamsRef = useRef<Record<string, TaskStream>>({}); // Última seq y payload por canal de cada tarea
+  const frameUrlsRef = useRef<string[]>([]);
+
+  // Al (re)unirse se envía la última seq recibida (y su epoch) para recibir solo lo que falta
+  const joinPayload = (taskId: string) => {
+    const stream = taskStreamsRef.current[taskId];
+    return stream && stream.seq > 0
+      ? { task_id: taskId, last_seq: stream.seq, epoch: stream.epoch }
+      : { task_id: taskId };
+  };
 
   useEffect(() => {
     const wsConfig = getWebSocketConfig();
@@ -62,12 +80,12 @@ export const useWebSocket = (): UseWebSocketReturn => {
       setIsConnected(true);
       setConnectionType(newSocket.io.engine.transport.name as 'websocket' | 'polling');
       
-      // ✅ AUTO-JOIN PENDING ROOMS
-      const pendingRooms = Array.from(pendingRoomsRef.current);
+      // ✅ AUTO-JOIN PENDING ROOMS (y reanudar las ya unidas tras una reconexión)
+      const pendingRooms = Array.from(new Set([...pendingRoomsRef.current, ...joinedRoomsRef.current]));
       if (pendingRooms.length > 0) {
         console.log('🎯 Auto-joining pending rooms:', pendingRooms);
         pendingRooms.forEach(taskId => {
-          newSocket.emit('join_task', { task_id: taskId });
+          newSocket.emit('join_task', joinPayload(taskId));
           console.log('🔗 Auto-joined room:', taskId);
         });
       }
@@ -89,11 +107,43 @@ export const useWebSocket = (): UseWebSocketReturn => {
       console.log('📡 Connection status received:', data);
     });
     
+    // El backend agrupa los eventos de cada tarea en una sola emisión por ventana;
+    // se reconstruyen los deltas y se reparten en orden a los listeners de cada evento
+    newSocket.on('task_batch', (batch: TaskBatch) => {
+      if (!batch?.task_id) return;
+      if (!taskStreamsRef.current[batch.task_id]) {
+        taskStreamsRef.current[batch.task_id] = { seq: 0, channels: {} };
+      }
+      const stream = taskStreamsRef.current[batch.task_id];
+      const { events, resync } = resolveTaskBatch(stream, batch);
+      events.forEach(({ event, data }) => {
+        newSocket.listeners(event).forEach(listener => listener(data));
+      });
+      if (resync) {
+        console.warn(`⚠️ Gap in task ${batch.task_id} events after seq ${stream.seq}, resyncing`);
+        newSocket.emit('join_task', joinPayload(batch.task_id));
+      }
+    });
+
+    // Screenshots binarios: se convierten en object URL y se entregan como el evento original
+    newSocket.on('browser_frame', (frame: any) => {
+      if (!frame?.image) return;
+      const url = URL.createObjectURL(new Blob([frame.image], { type: frame.mime || 'image/jpeg' }));
+      frameUrlsRef.current.push(url);
+      while (frameUrlsRef.current.length > MAX_FRAME_URLS) {
+        URL.revokeObjectURL(frameUrlsRef.current.shift() as string);
+      }
+      const { image, ...rest } = frame;
+      const data = { ...rest, screenshot: url, screenshot_url: url };
+      newSocket.listeners(frame.event || 'browser_visual').forEach(listener => listener(data));
+    });
+
     newSocket.on('joined_task', (data) => {
       console.log('✅ Successfully joined task room:', data);
       // Remove from pending once joined
       if (data.task_id) {
         pendingRoomsRef.current.delete(data.task_id);
+        joinedRoomsRef.current.add(data.task_id);
       }
     });
     
@@ -102,6 +152,8 @@ export const useWebSocket = (): UseWebSocketReturn => {
     return () => {
       console.log('🧹 Cleaning up WebSocket connection');
       newSocket.disconnect();
+      frameUrlsRef.current.forEach(url => URL.revokeObjectURL(url));
+      frameUrlsRef.current = [];
     };
   }, []);
 
@@ -111,13 +163,15 @@ export const useWebSocket = (): UseWebSocketReturn => {
     
     if (socket && isConnected) {
       console.log('🔗 Joining task room immediately:', taskId);
-      socket.emit('join_task', { task_id: taskId });
+      socket.emit('join_task', joinPayload(taskId));
     } else {
       console.warn('⚠️ Socket not ready, added to pending rooms:', taskId);
     }
   }, [socket, isConnected]);
 
   const leaveTaskRoom = useCallback((taskId: string) => {
+    joinedRoomsRef.current.delete(taskId);
+    delete taskStreamsRef.current[taskId];
     if (socket && isConnected) {
       console.log('🔗 Leaving task room:', taskId);
       socket.emit('leave_task', { task_id: taskId });
@@ -147,6 +201,13 @@ export const useWebSocket = (): UseWebSocketReturn => {
     eventListenersRef.current = {};
   }, [socket]);
 
+  // Pide al backend menos frames de navegación por segundo (0 = sin límite)
+  const setFrameRate = useCallback((fps: number) => {
+    if (socket && isConnected) {
+      socket.emit('set_frame_rate', { fps });
+    }
+  }, [socket, isConnected]);
+
   return {
     socket,
     isConnected,
@@ -154,6 +215,7 @@ export const useWebSocket = (): UseWebSocketReturn => {
     joinTaskRoom,
     leaveTaskRoom,
     addEventListeners,
-    removeEventListeners
+    removeEventListeners,
+    setFrameRate
   };
 };
\ No newline at end of file
@@ -0,0 +1,99 @@
+import { describe, it, expect } from 'vitest'
+import { applyPatch, resolveTaskBatch, TaskStream } from '../utils/taskSync'
+
+const newStream = (): TaskStream => ({ seq: 0, channels: {} })
+
+describe('applyPatch', () => {
+  it('should apply add, replace and remove with escaped keys', () => {
+    const base = { 'a/b': 1, items: [1, 2, 3] }
+    const result = applyPatch(base, [
+      { op: 'replace', path: '/a~1b', value: 2 },
+      { op: 'add', path: '/c~0d', value: true },
+      { op: 'remove', path: '/items/2' },
+      { op: 'add', path: '/items/-', value: 9 }
+    ])
+    expect(result).toEqual({ 'a/b': 2, 'c~d': true, items: [1, 2, 9] })
+    expect(base.items).toEqual([1, 2, 3])
+  })
+})
+
+describe('resolveTaskBatch', () => {
+  it('should rebuild patched payloads from the channel base', () => {
+    const stream = newStream()
+    const { events, resync } = resolveTaskBatch(stream, {
+      task_id: 't1',
+      epoch: 'e1',
+      events: [
+        { event: 'task_progress', seq: 1, channel: 'task_progress', data: { progress: 10, step_id: 's1' } },
+        { event: 'task_progress', seq: 2, channel: 'task_progress', patch: [{ op: 'replace', path: '/progress', value: 20 }] }
+      ]
+    })
+    expect(resync).toBe(false)
+    expect(events.map(e => e.data.progress)).toEqual([10, 20])
+    expect(stream.seq).toBe(2)
+  })
+
+  it('should skip items already received', () => {
+    const stream = newStream()
+    resolveTaskBatch(stream, { task_id: 't1', events: [{ event: 'log_message', seq: 1, channel: 'log_message', data: { message: 'a' } }] })
+    const { events, resync } = resolveTaskBatch(stream, {
+      task_id: 't1',
+      events: [
+        { event: 'log_message', seq: 1, channel: 'log_message', data: { message: 'a' } },
+        { event: 'log_message', seq: 2, channel: 'log_message', data: { message: 'b' } }
+      ]
+    })
+    expect(resync).toBe(false)
+    expect(events.map(e => e.data.message)).toEqual(['b'])
+  })
+
+  it('should ask for a resync when a seq is missing', () => {
+    const stream = newStream()
+    resolveTaskBatch(stream, { task_id: 't1', events: [{ event: 'log_message', seq: 1, channel: 'log_message', data: { message: 'a' } }] })
+    const { events, resync } = resolveTaskBatch(stream, {
+      task_id: 't1',
+      events: [{ event: 'log_message', seq: 3, channel: 'log_message', data: { message: 'c' } }]
+    })
+    expect(resync).toBe(true)
+    expect(events).toHaveLength(0)
+    expect(stream.seq).toBe(1)
+  })
+
+  it('should ask for a resync when a patch has no base', () => {
+    const stream = newStream()
+    const { events, resync } = resolveTaskBatch(stream, {
+      task_id: 't1',
+      events: [
+        { event: 'log_message', seq: 1, channel: 'log_message', data: { message: 'a' } },
+        { event: 'task_progress', seq: 2, channel: 'task_progress', patch: [{ op: 'replace', path: '/progress', value: 20 }] }
+      ]
+    })
+    expect(resync).toBe(true)
+    expect(events.map(e => e.event)).toEqual(['log_message'])
+  })
+
+  it('should ask for a resync when the batch comes from another epoch', () => {
+    const stream = newStream()
+    resolveTaskBatch(stream, { task_id: 't1', epoch: 'e1', events: [{ event: 'log_message', seq: 1, channel: 'log_message', data: {} }] })
+    const { resync } = resolveTaskBatch(stream, {
+      task_id: 't1',
+      epoch: 'e2',
+      events: [{ event: 'log_message', seq: 2, channel: 'log_message', data: {} }]
+    })
+    expect(resync).toBe(true)
+  })
+
+  it('should reset the stream on a snapshot', () => {
+    const stream = newStream()
+    resolveTaskBatch(stream, { task_id: 't1', epoch: 'e1', events: [{ event: 'log_message', seq: 7, channel: 'log_message', data: {} }] })
+    const { events, resync } = resolveTaskBatch(stream, {
+      task_id: 't1',
+      epoch: 'e2',
+      snapshot: true,
+      events: [{ event: 'task_progress', seq: 3, channel: 'task_progress', data: { progress: 50 } }]
+    })
+    expect(resync).toBe(false)
+    expect(events).toHaveLength(1)
+    expect(stream).toEqual({ seq: 3, epoch: 'e2', channels: { task_progress: { progress: 50 } } })
+  })
+})
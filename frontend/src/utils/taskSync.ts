@@ -0,0 +1,104 @@
+/**
+ * Sincronización de eventos de tarea con números de secuencia y deltas JSON-patch
+ * El backend envía cada evento con su seq; los que repiten canal llegan como
+ * operaciones sobre el último payload de ese canal y aquí se reconstruyen.
+ * Las seq solo valen dentro de un epoch (el worker que las asignó); si llega
+ * un lote de otro epoch hay que resincronizar.
+ */
+
+export interface PatchOperation {
+  op: 'add' | 'remove' | 'replace';
+  path: string;
+  value?: any;
+}
+
+export interface TaskBatchItem {
+  event: string;
+  seq: number;
+  channel: string;
+  data?: any;
+  patch?: PatchOperation[];
+}
+
+export interface TaskBatch {
+  task_id: string;
+  epoch?: string;
+  events: TaskBatchItem[];
+  snapshot?: boolean;
+}
+
+export interface TaskStream {
+  seq: number;
+  epoch?: string;
+  channels: Record<string, any>;
+}
+
+const unescapeToken = (token: string) => token.replace(/~1/g, '/').replace(/~0/g, '~');
+
+/**
+ * Aplica operaciones add/remove/replace (RFC 6902) sobre una copia del documento
+ */
+export const applyPatch = (document: any, ops: PatchOperation[]): any => {
+  let result = JSON.parse(JSON.stringify(document));
+  for (const op of ops) {
+    if (op.path === '') {
+      result = op.value;
+      continue;
+    }
+    const tokens = op.path.split('/').slice(1).map(unescapeToken);
+    let parent = result;
+    for (const token of tokens.slice(0, -1)) {
+      parent = Array.isArray(parent) ? parent[Number(token)] : parent[token];
+    }
+    const last = tokens[tokens.length - 1];
+    if (Array.isArray(parent)) {
+      const index = last === '-' ? parent.length : Number(last);
+      if (op.op === 'add') parent.splice(index, 0, op.value);
+      else if (op.op === 'remove') parent.splice(index, 1);
+      else parent[index] = op.value;
+    } else if (op.op === 'remove') {
+      delete parent[last];
+    } else {
+      parent[last] = op.value;
+    }
+  }
+  return result;
+};
+
+/**
+ * Reconstruye los payloads de un lote en orden
+ *
+ * Devuelve los eventos listos para despachar y `resync` si falta una parte
+ * de la secuencia (o la base de un delta) y hay que pedir la reanudación.
+ */
+export const resolveTaskBatch = (
+  stream: TaskStream,
+  batch: TaskBatch
+): { events: { event: string; data: any }[]; resync: boolean } => {
+  const events: { event: string; data: any }[] = [];
+  if (batch.snapshot) {
+    stream.channels = {};
+    stream.seq = 0;
+    stream.epoch = batch.epoch;
+  } else if (stream.seq > 0 && batch.epoch && stream.epoch && batch.epoch !== stream.epoch) {
+    return { events, resync: true };
+  } else if (batch.epoch) {
+    stream.epoch = batch.epoch;
+  }
+  for (const item of batch.events || []) {
+    if (!batch.snapshot && stream.seq > 0 && item.seq <= stream.seq) continue; // Ya recibido
+    if (!batch.snapshot && stream.seq > 0 && item.seq > stream.seq + 1) {
+      return { events, resync: true };
+    }
+    let data = item.data;
+    if (item.patch) {
+      const base = stream.channels[item.channel];
+      if (base === undefined) return { events, resync: true };
+      data = applyPatch(base, item.patch);
+    }
+    stream.channels[item.channel] = data;
+    stream.seq = item.seq;
+    events.push({ event: item.event, data });
+  }
+  return { events, resync: false };
+};